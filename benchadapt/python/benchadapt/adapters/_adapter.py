@@ -165,9 +165,18 @@ class BenchmarkAdapter(abc.ABC):
 
         return result
 
-    def post_results(self) -> list:
+    def post_results(self, ndjson: bool = False) -> list:
         """
         Post results of run to conbench
+
+        Parameters
+        ----------
+        ndjson : bool
+            If true, post results in batches (as newline-delimited JSON) instead
+            of one request per result, and return one status object per result
+            (results that were rejected are logged, but do not raise an
+            exception). Requires a conbench server that supports
+            ``POST /api/benchmark-results/batch``.
         """
         if not self.results:
             fatal_and_log(
@@ -177,6 +186,12 @@ class BenchmarkAdapter(abc.ABC):
         log.info("Initializing conbench client")
         client = ConbenchClient()
 
+        if ndjson:
+            log.info("Posting results to conbench in batches")
+            return client.post_results_ndjson(
+                result.to_publishable_dict() for result in self.results
+            )
+
         log.info("Posting results to conbench")
         res_list = []
         error = None
@@ -1,6 +1,7 @@
+import itertools
 import logging
 import os
-from typing import Optional
+from typing import Iterable, List, Optional
 
 import requests
 from requests.adapters import HTTPAdapter
@@ -95,6 +96,59 @@ class ConbenchClient(RetryingHTTPClient):
 
         log.info("%s: initialized", self.__class__.__name__)
 
+    # The response to a batch submission request contains a status
+    # object per result, sent while the request is being processed. Keep the
+    # number of results per request moderate so that a request (which is
+    # retried as a whole) does not take too long.
+    results_per_batch_request = 1000
+
+    def post_results_ndjson(self, results: Iterable[dict]) -> List[dict]:
+        """
+        Submit benchmark results (BenchmarkResultCreate objects) via `POST
+        /api/benchmark-results/batch` as newline-delimited JSON, in chunks of
+        `results_per_batch_request` results (one request per chunk).
+        `results` is consumed lazily.
+
+        Return one status object per result (same order, see API
+        documentation). Rejected results are logged, but do not raise an
+        exception. Raise ConbenchClientException if the server reports an
+        error during processing, or if a response lacks the summary line
+        (truncated response).
+        """
+        statuses: List[dict] = []
+        results = iter(results)
+        while True:
+            chunk = list(itertools.islice(results, self.results_per_batch_request))
+            if not chunk:
+                break
+
+            docs = self.post_ndjson("/benchmark-results/batch", chunk)
+            chunk_statuses = [d for d in docs if "line" in d]
+            errors = [d["error"] for d in docs if "error" in d]
+            if errors or not docs or "summary" not in docs[-1]:
+                raise ConbenchClientException(
+                    f"incomplete batch response after {len(statuses)} results "
+                    f"({len(chunk_statuses)} of this request acknowledged): "
+                    + ("; ".join(errors) or "no summary line (truncated)")
+                )
+
+            for status in chunk_statuses:
+                # Line numbers relative to the request, make them relative to
+                # `results` (1-based, too).
+                status["line"] += len(statuses)
+                if status["status"] != 201:
+                    log.error(
+                        "result %s rejected: %s", status["line"], status["description"]
+                    )
+            statuses.extend(chunk_statuses)
+
+        log.info(
+            "submitted %s results, %s rejected",
+            len(statuses),
+            sum(1 for s in statuses if s["status"] != 201),
+        )
+        return statuses
+
     # This method is required by parent class
     @property
     def _base_url(self) -> str:
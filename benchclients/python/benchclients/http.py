@@ -2,6 +2,7 @@ import logging
 import time
 from abc import ABC, abstractmethod
 from json import dumps as jsondumps
+from json import loads as jsonloads
 from typing import Dict, List, Literal, Optional, Tuple, Union
 
 import requests
@@ -168,6 +169,28 @@ class RetryingHTTPClient(ABC):
 
         return None
 
+    def post_ndjson(self, path: str, docs: List[dict]) -> List[dict]:
+        """
+        Make POST request. Send the JSON documents `docs` in the request body,
+        one per line (newline-delimited JSON). Expect response with status
+        code 200 and a newline-delimited JSON body.
+
+        Return the deserialized JSON documents (one per non-empty response
+        body line) or raise an exception.
+        """
+        body = "".join(jsondumps(doc) + "\n" for doc in docs).encode("utf-8")
+        log.debug("POST request NDJSON body: %s lines", len(docs))
+
+        resp = self._make_request(
+            "POST",
+            self._abs_url_from_path(path),
+            200,
+            data=body,
+            headers={"Content-Type": "application/x-ndjson"},
+        )
+
+        return [jsonloads(line) for line in resp.iter_lines() if line]
+
     def _make_request(
         self,
         method: TypeHTTPMethods,
@@ -120,3 +120,59 @@ def test_cc_get_500(httpserver: HTTPServer):
     httpserver.expect_request("/api/foobar").respond_with_response(Response(500))
     with pytest.raises(RetryingHTTPClientDeadlineReached, match="giving up after"):
         assert c.get("/foobar") == [1, 2]
+
+
+def test_cc_post_results_ndjson(httpserver: HTTPServer):
+    set_cb_base_url(httpserver)
+    c = ConbenchClient()
+    c.results_per_batch_request = 2
+
+    for body, resp in [
+        (
+            '{"r": 1}\n{"r": 2}\n',
+            '{"line": 1, "status": 201, "id": "a"}\n'
+            '{"line": 2, "status": 400, "description": "bad"}\n'
+            '{"summary": {"processed": 2, "created": 1, "failed": 1}}\n',
+        ),
+        (
+            '{"r": 3}\n',
+            '{"line": 1, "status": 201, "id": "b"}\n'
+            '{"summary": {"processed": 1, "created": 1, "failed": 0}}\n',
+        ),
+    ]:
+        httpserver.expect_ordered_request(
+            "/api/benchmark-results/batch",
+            method="POST",
+            headers={"Content-Type": "application/x-ndjson"},
+            data=body,
+        ).respond_with_data(resp, status=200, content_type="application/x-ndjson")
+
+    statuses = c.post_results_ndjson({"r": i} for i in range(1, 4))
+    assert statuses == [
+        {"line": 1, "status": 201, "id": "a"},
+        {"line": 2, "status": 400, "description": "bad"},
+        {"line": 3, "status": 201, "id": "b"},
+    ]
+    httpserver.check_assertions()
+
+
+@pytest.mark.parametrize(
+    "resp",
+    [
+        # Server-side error after the response status was sent.
+        '{"line": 1, "status": 201, "id": "a"}\n'
+        '{"error": "processing stopped, unexpected error: boom"}\n'
+        '{"summary": {"processed": 1, "created": 1, "failed": 0}}\n',
+        # Truncated response.
+        '{"line": 1, "status": 201, "id": "a"}\n',
+    ],
+)
+def test_cc_post_results_ndjson_incomplete(httpserver: HTTPServer, resp):
+    set_cb_base_url(httpserver)
+    c = ConbenchClient()
+    httpserver.expect_request(
+        "/api/benchmark-results/batch", method="POST"
+    ).respond_with_data(resp, status=200, content_type="application/x-ndjson")
+
+    with pytest.raises(ConbenchClientException, match="incomplete batch response"):
+        c.post_results_ndjson([{"r": 1}, {"r": 2}])
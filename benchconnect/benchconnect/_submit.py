@@ -14,6 +14,13 @@ from .utils import ENV_VAR_HELP, load_json
 
 def augment_and_post_result(json: dict, client: ConbenchClient) -> None:
     "Augment a result from the statefile and class, then post it"
+    augmented = augment_result(json=json)
+
+    post_blob(json=augmented, endpoint="/benchmarks/", client=client)
+
+
+def augment_result(json: dict) -> dict:
+    "Augment a result from the statefile and class"
     statefile_path = Path(STATEFILE).resolve()
 
     if not statefile_path.exists():
@@ -37,9 +44,7 @@ def augment_and_post_result(json: dict, client: ConbenchClient) -> None:
 
         json[result_key] = abstract_result[result_key]
 
-    augmented = augment_blob(json=json, cls=BenchmarkResult)
-
-    post_blob(json=augmented, endpoint="/benchmarks/", client=client)
+    return augment_blob(json=json, cls=BenchmarkResult)
 
 
 @click.command(
@@ -62,6 +67,11 @@ this method to fail.
 When all benchmarks are submitted, run `benchconnect finish run` to close the run
 and delete the statefile.
 
+With `--ndjson`, results are sent in batches of 1000 per request (as
+newline-delimited JSON to POST /api/benchmark-results/batch) instead of one
+request per result. Use this for large numbers of results. This requires a
+Conbench server that supports that endpoint.
+
 \b
 Other methods in this workflow:
   benchconnect start run
@@ -78,10 +88,30 @@ Other methods in this workflow:
     type=click.Path(exists=True, resolve_path=True),
     help="Path to a JSON file or directory of JSON files containing results to augment and send to a Conbench API",
 )
+@click.option(
+    "--ndjson",
+    "batch",
+    is_flag=True,
+    default=False,
+    help="Submit results in batches (newline-delimited JSON) instead of one by one",
+)
 @click.argument("ndjson", required=False)
-def submit_result(json: str, path: str, ndjson: str):
+def submit_result(json: str, path: str, ndjson: str, batch: bool):
     blob_list = load_json(json=json, path=path, ndjson=ndjson)
     client = ConbenchClient()
 
+    if batch:
+        statuses = client.post_results_ndjson(
+            augment_result(json=blob) for blob in blob_list
+        )
+        rejected = [s for s in statuses if s["status"] != 201]
+        if rejected:
+            fatal_and_log(
+                f"{len(rejected)} of {len(statuses)} results were rejected "
+                f"(first: result {rejected[0]['line']}: {rejected[0]['description']})",
+                click.ClickException,
+            )
+        return
+
     for blob in blob_list:
         augment_and_post_result(json=blob, client=client)
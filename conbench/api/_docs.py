@@ -70,10 +70,37 @@ spec.components.response("400", _error("Bad Request", ex.API_400, "ErrorBadReque
 spec.components.response("401", _error("Unauthorized", ex.API_401, "Error"))
 spec.components.response("404", _error("Not Found", ex.API_404, "Error"))
 spec.components.response("Ping", _200_ok(ex.API_PING, "Ping"))
+spec.components.response("Ready", _200_ok(ex.API_READY, "Ready"))
+spec.components.response(
+    "ReadyNotReady", _error("Service Unavailable", ex.API_READY_WARMING, "Ready")
+)
 spec.components.response("Index", _200_ok(ex.API_INDEX))
 spec.components.response("BenchmarkEntity", _200_ok(ex.BENCHMARK_ENTITY))
 spec.components.response("BenchmarkList", _200_ok([ex.BENCHMARK_ENTITY]))
 spec.components.response("BenchmarkResultCreated", _201_created(ex.BENCHMARK_ENTITY))
+spec.components.response(
+    "BenchmarkResultBatchCreated",
+    {
+        "description": "Created (all results)",
+        "content": {"application/json": {"example": ex.BENCHMARK_RESULT_BATCH_CREATED}},
+    },
+)
+spec.components.response(
+    "BenchmarkResultBatchPartial",
+    {
+        "description": "Multi-Status (not all results were created)",
+        "content": {"application/json": {"example": ex.BENCHMARK_RESULT_BATCH_PARTIAL}},
+    },
+)
+spec.components.response(
+    "BenchmarkResultBatchStream",
+    {
+        "description": "OK (streamed, one status object per line)",
+        "content": {
+            "application/x-ndjson": {"example": ex.BENCHMARK_RESULT_BATCH_STREAM}
+        },
+    },
+)
 spec.components.response("CommitEntity", _200_ok(ex.COMMIT_ENTITY))
 spec.components.response("CommitList", _200_ok([ex.COMMIT_ENTITY]))
 spec.components.response("CompareEntity", _200_ok(ex.COMPARE_ENTITY))
@@ -82,6 +109,7 @@ spec.components.response("ContextEntity", _200_ok(ex.CONTEXT_ENTITY))
 spec.components.response("ContextList", _200_ok([ex.CONTEXT_ENTITY]))
 spec.components.response("InfoList", _200_ok([ex.INFO_ENTITY]))
 spec.components.response("HistoryList", _200_ok([ex.HISTORY_ENTITY]))
+spec.components.response("HistoryBatch", _200_ok(ex.HISTORY_BATCH))
 spec.components.response("InfoEntity", _200_ok(ex.INFO_ENTITY))
 spec.components.response("HardwareEntity", _200_ok(ex.HARDWARE_ENTITY))
 spec.components.response("HardwareList", _200_ok([ex.HARDWARE_ENTITY]))
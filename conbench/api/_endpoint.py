@@ -25,17 +25,22 @@ def maybe_login_required(func):
     return maybe
 
 
+def empty_strings_to_none(data):
+    # Note(JP): replace first-level zero-length string values with
+    # None? So that users can pass "" instead of null | non-exist?
+    munged = data.copy() if data else data
+    for field, value in data.items():
+        if isinstance(value, str) and not value.strip():
+            munged[field] = None
+    return munged
+
+
 class ApiEndpoint(flask.views.MethodView):
     def validate(self, schema):
         # Emits a 400 response if req does not have expected Content-Type set.
         data = f.request.get_json()
 
-        # Note(JP): replace first-level zero-length string values with
-        # None? So that users can pass "" instead of null | non-exist?
-        munged = data.copy() if data else data
-        for field, value in data.items():
-            if isinstance(value, str) and not value.strip():
-                munged[field] = None
+        munged = empty_strings_to_none(data)
 
         try:
             # `schema.load()` (instead of only `schema.validate()`) implies
@@ -1,4 +1,5 @@
 import copy
+import json
 
 
 class FakeUser1:
@@ -527,6 +528,49 @@ HISTORY_ENTITY = _api_history_entity(
     "some-context-uuid-1",
     "some run name",
 )
+HISTORY_BATCH = {
+    "series": [
+        {
+            "case_id": "some-case-uuid-1",
+            "context_id": "some-context-uuid-1",
+            "hardware_hash": "diana-2-2-4-17179869184",
+            "repository": "https://github.com/org/repo",
+            "benchmark_result_ids": ["some-benchmark-uuid-1"],
+            "history": HISTORY_ENTITY,
+        }
+    ],
+    "benchmark_result_ids_not_found": [],
+    "benchmark_result_ids_without_history": [],
+}
+BENCHMARK_RESULT_BATCH_CREATED = [
+    {"status": 201, "id": "some-benchmark-uuid-1"},
+    {"status": 201, "id": "some-benchmark-uuid-2"},
+]
+BENCHMARK_RESULT_BATCH_PARTIAL = [
+    {"status": 201, "id": "some-benchmark-uuid-1"},
+    {"status": 400, "description": {"run_id": ["Missing data for required field."]}},
+]
+BENCHMARK_RESULT_BATCH_STREAM = "\n".join(
+    [
+        json.dumps({"line": i, **status})
+        for i, status in enumerate(BENCHMARK_RESULT_BATCH_PARTIAL, start=1)
+    ]
+    + [
+        json.dumps(
+            {
+                "summary": {
+                    "processed": len(BENCHMARK_RESULT_BATCH_PARTIAL),
+                    "created": sum(
+                        s["status"] == 201 for s in BENCHMARK_RESULT_BATCH_PARTIAL
+                    ),
+                    "failed": sum(
+                        s["status"] != 201 for s in BENCHMARK_RESULT_BATCH_PARTIAL
+                    ),
+                }
+            }
+        )
+    ]
+)
 INFO_ENTITY = _api_info_entity("some-info-uuid-1")
 HARDWARE_ENTITY = _api_hardware_entity("some-machine-uuid-1", "some-machine-name")
 RUN_ENTITY_WITH_BASELINES = _api_run_entity(
@@ -569,6 +613,18 @@ API_PING = {
     "alembic_version": "0d4e564b1876",
     "date": "Thu, 22 Oct 2020 15:53:55 UTC",
 }
+API_READY = {
+    "ready": True,
+    "bmrt_cache_state": "ready",
+    "bmrt_cache_age_seconds": 12.3,
+    "bmrt_cache_n_results": 800000,
+}
+API_READY_WARMING = {
+    "ready": False,
+    "bmrt_cache_state": "warming",
+    "bmrt_cache_age_seconds": None,
+    "bmrt_cache_n_results": 0,
+}
 API_INDEX = {
     "links": {
         "benchmarks": "http://localhost/api/benchmarks/",
@@ -1,20 +1,143 @@
+import base64
+import binascii
+import datetime
+import urllib.parse
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import flask as f
+import marshmallow
 import orjson
 
 from ..api import rule
+from ..api._docs import spec
 from ..api._endpoint import ApiEndpoint, maybe_login_required
 from ..entities._entity import NotFound
-from ..entities.history import get_history_for_benchmark
-from ._resp import json_response_for_byte_sequence
+from ..entities.history import (
+    HistorySample,
+    TypeCCHR,
+    get_cchr_for_benchmark_results,
+    get_history_for_benchmark,
+    get_history_for_cchrs,
+)
+
+# Maximum number of items (benchmark result IDs plus timeseries keys) in one
+# batch request.
+HISTORY_BATCH_MAX_ITEMS = 1000
+
+
+class HistoryQuerySchema(marshmallow.Schema):
+    """
+    URL query parameters of `GET /api/history/<benchmark_result_id>/`.
+    Naive timestamps are interpreted in UTC.
+    """
+
+    class Meta:
+        # Ignore unrelated URL query parameters.
+        unknown = marshmallow.EXCLUDE
+
+    start = marshmallow.fields.AwareDateTime(
+        default_timezone=datetime.timezone.utc, load_default=None
+    )
+    end = marshmallow.fields.AwareDateTime(
+        default_timezone=datetime.timezone.utc, load_default=None
+    )
+    limit = marshmallow.fields.Integer(
+        load_default=None, validate=marshmallow.validate.Range(min=1)
+    )
+    cursor = marshmallow.fields.String(load_default=None)
+    include_data = marshmallow.fields.Boolean(load_default=True)
+    format = marshmallow.fields.String(
+        load_default="json", validate=marshmallow.validate.OneOf(["json", "ndjson"])
+    )
+
+
+def _encode_cursor(sample: HistorySample) -> str:
+    raw = f"{sample.commit_timestamp.isoformat()}|{sample.benchmark_result_id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def _decode_cursor(cursor: str) -> Tuple[datetime.datetime, str]:
+    """
+    Raise ValueError for a cursor that was not emitted by _encode_cursor().
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+    except (binascii.Error, UnicodeError) as exc:
+        raise ValueError(str(exc))
+
+    ts, sep, bmrid = raw.partition("|")
+    if not sep or not bmrid:
+        raise ValueError("unexpected cursor content")
+
+    # _encode_cursor() emits tz-naive timestamps. Do not compare a tz-aware
+    # timestamp (hand-crafted cursor) with the tz-naive commit timestamps.
+    after = _to_naive_utc(datetime.datetime.fromisoformat(ts))
+    assert after is not None
+    return after, bmrid
+
+
+def _to_naive_utc(dt: Optional[datetime.datetime]) -> Optional[datetime.datetime]:
+    # Commit timestamps are stored tz-naive, to be interpreted in UTC. A
+    # tz-naive input is interpreted in UTC, too.
+    if dt is None or dt.tzinfo is None:
+        return dt
+    return dt.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+
+def _samples_page(
+    samples: List[HistorySample], args: dict
+) -> Tuple[List[HistorySample], Optional[HistorySample]]:
+    """
+    Apply time range, cursor and limit. Return the samples to emit, and the
+    last emitted sample if there is a next page (`None` otherwise).
+
+    The complete history is required for computing the rolling statistics
+    anyway (and is cached, see conbench/entities/history_cache.py), i.e. this
+    bounds the size of the response, not the size of the database query.
+    Samples are ordered by commit timestamp, then by benchmark result ID, for
+    a stable cursor.
+    """
+    start, end = _to_naive_utc(args["start"]), _to_naive_utc(args["end"])
+    after = None
+    if args["cursor"] is not None:
+        after = _decode_cursor(args["cursor"])
+
+    def _key(s: HistorySample) -> Tuple[datetime.datetime, str]:
+        return s.commit_timestamp, s.benchmark_result_id
+
+    page = [
+        s
+        for s in sorted(samples, key=_key)
+        if (start is None or s.commit_timestamp >= start)
+        and (end is None or s.commit_timestamp < end)
+        and (after is None or _key(s) > after)
+    ]
+
+    limit = args["limit"]
+    if limit is None or len(page) <= limit:
+        return page, None
+
+    return page[:limit], page[limit - 1]
 
 
 class HistoryEntityAPI(ApiEndpoint):
+    query_schema = HistoryQuerySchema()
+
     @maybe_login_required
-    def get(self, benchmark_result_id):
+    def get(self, benchmark_result_id) -> f.Response:
         """
         ---
-        description: Get benchmark history.
+        description: |
+            Get benchmark history: the samples in the timeseries that the
+            benchmark result is part of, ordered by commit timestamp.
+
+            The response body is streamed. For long timeseries, use `limit`
+            (and follow the `Link` header with `rel="next"`) to fetch the
+            history in pages, use `start`/`end` to fetch a time range, and set
+            `include_data=false` if the per-iteration data is not needed.
         responses:
             "200": "HistoryList"
+            "400": "400"
             "401": "401"
             "404": "404"
         parameters:
@@ -22,9 +145,60 @@ class HistoryEntityAPI(ApiEndpoint):
             in: path
             schema:
                 type: string
+          - in: query
+            name: start
+            description: |
+                Only emit samples with a commit timestamp at or after this
+                point in time (ISO 8601, UTC if no offset is given).
+            schema:
+                type: string
+                format: date-time
+          - in: query
+            name: end
+            description: |
+                Only emit samples with a commit timestamp before this point
+                in time (ISO 8601, UTC if no offset is given).
+            schema:
+                type: string
+                format: date-time
+          - in: query
+            name: limit
+            description: |
+                Emit at most this many samples. If there are more, the
+                response has a `Link` header with the URL of the next page.
+            schema:
+                type: integer
+                minimum: 1
+          - in: query
+            name: cursor
+            description: Opaque cursor, from the `Link` header.
+            schema:
+                type: string
+          - in: query
+            name: include_data
+            description: |
+                Set to false to omit the per-iteration `data` and `times`
+                arrays from each sample.
+            schema:
+                type: boolean
+                default: true
+          - in: query
+            name: format
+            description: |
+                `json`: a JSON array. `ndjson`: one JSON object per line
+                (newline-delimited JSON).
+            schema:
+                type: string
+                enum: [json, ndjson]
+                default: json
         tags:
           - History
         """
+        try:
+            args = self.query_schema.load(f.request.args)
+        except marshmallow.ValidationError as exc:
+            self.abort_400_bad_request(exc.messages)
+
         # TODO: think about the case where samples if of zero length. Can this
         # happen? If it can happen: which response would we want to emit to the
         # HTTP client? An empty array, or something more convenient?
@@ -33,19 +207,205 @@ class HistoryEntityAPI(ApiEndpoint):
         except NotFound:
             self.abort_404_not_found()
 
-        # Note: wrap this into an array if there is just 1 sample, for
-        # consistency (clients expect an array).
-        jsonbytes: bytes = orjson.dumps(
-            [s._dict_for_api_json() for s in samples],
-            option=orjson.OPT_INDENT_2,
+        try:
+            page, last = _samples_page(samples, args)
+        except ValueError:
+            self.abort_400_bad_request({"cursor": ["Invalid cursor."]})
+
+        headers = {}
+        if last is not None:
+            query = dict(f.request.args, cursor=_encode_cursor(last))
+            next_url = f"{f.request.base_url}?{urllib.parse.urlencode(query)}"
+            headers["Link"] = f'<{next_url}>; rel="next"'
+
+        include_data = args["include_data"]
+
+        # Serialize (and emit) one sample at a time, instead of building the
+        # complete response body in memory first.
+        if args["format"] == "ndjson":
+
+            def _generate() -> Iterator[bytes]:
+                for s in page:
+                    yield orjson.dumps(
+                        s._dict_for_api_json(include_data),
+                        option=orjson.OPT_APPEND_NEWLINE,
+                    )
+
+            return f.Response(
+                _generate(),
+                status=200,
+                headers=headers,
+                content_type="application/x-ndjson",
+            )
+
+        def _generate_array() -> Iterator[bytes]:
+            # Note: emit an array also if there is just 1 sample, for
+            # consistency (clients expect an array).
+            yield b"["
+            for i, s in enumerate(page):
+                if i > 0:
+                    yield b","
+                yield orjson.dumps(s._dict_for_api_json(include_data))
+            yield b"]"
+
+        return f.Response(
+            _generate_array(),
+            status=200,
+            headers=headers,
+            content_type="application/json",
         )
-        return json_response_for_byte_sequence(jsonbytes, 200)
+
+
+class TimeseriesKeySchema(marshmallow.Schema):
+    case_id = marshmallow.fields.String(required=True)
+    context_id = marshmallow.fields.String(required=True)
+    hardware_hash = marshmallow.fields.String(required=True)
+    repository = marshmallow.fields.String(
+        required=True, metadata={"description": "Repository URL"}
+    )
+
+
+class HistoryBatchSchema(marshmallow.Schema):
+    benchmark_result_ids = marshmallow.fields.List(
+        marshmallow.fields.String(),
+        load_default=list,
+        metadata={"description": "Get the history of each of these benchmark results."},
+    )
+    series = marshmallow.fields.List(
+        marshmallow.fields.Nested(TimeseriesKeySchema()),
+        load_default=list,
+        metadata={
+            "description": (
+                "Get the history for each of these "
+                "case/context/hardware/repository combinations."
+            )
+        },
+    )
+
+    @marshmallow.validates_schema
+    def validate_item_count(self, data, **kwargs):
+        n_items = len(data["benchmark_result_ids"]) + len(data["series"])
+        if n_items == 0:
+            raise marshmallow.ValidationError(
+                "Either benchmark_result_ids or series must be non-empty"
+            )
+        if n_items > HISTORY_BATCH_MAX_ITEMS:
+            raise marshmallow.ValidationError(
+                f"Too many items: {n_items} (max {HISTORY_BATCH_MAX_ITEMS})"
+            )
+
+
+class HistoryBatchAPI(ApiEndpoint):
+    schema = HistoryBatchSchema()
+
+    @maybe_login_required
+    def post(self) -> f.Response:
+        """
+        ---
+        description: |
+            Get the history of many benchmark results (or of many
+            case/context/hardware/repository combinations) in one request.
+
+            Each history (timeseries) is emitted once (in no particular
+            order), with the IDs of the requested benchmark results that it is
+            the history of. The items in `history` are the same as emitted by
+            `GET /api/history/<benchmark_result_id>/`.
+
+            IDs of benchmark results that do not exist are listed in
+            `benchmark_result_ids_not_found`. IDs of benchmark results that
+            do not have history (no commit context, or no history on the
+            default branch) are listed in `benchmark_result_ids_without_history`.
+        responses:
+            "200": "HistoryBatch"
+            "400": "400"
+            "401": "401"
+        requestBody:
+            content:
+                application/json:
+                    schema: HistoryBatch
+        tags:
+          - History
+        """
+        data = self.validate(self.schema)
+
+        cchr_by_bmrid, in_history = get_cchr_for_benchmark_results(
+            data["benchmark_result_ids"]
+        )
+
+        bmrids_by_cchr: Dict[TypeCCHR, List[str]] = {}
+        for key in data["series"]:
+            cchr = (
+                key["case_id"],
+                key["context_id"],
+                key["hardware_hash"],
+                key["repository"],
+            )
+            bmrids_by_cchr.setdefault(cchr, [])
+
+        not_found: List[str] = []
+        for bmrid in data["benchmark_result_ids"]:
+            if bmrid not in cchr_by_bmrid:
+                not_found.append(bmrid)
+                continue
+            cchr_for_bmr = cchr_by_bmrid[bmrid]
+            if cchr_for_bmr is not None:
+                bmrids_by_cchr.setdefault(cchr_for_bmr, []).append(bmrid)
+
+        # One database query, one pass for computing the rolling stats. Do not
+        # serve a cached history that lacks any of the requested results that
+        # are part of it.
+        required = {
+            cchr: [bmrid for bmrid in bmrids if bmrid in in_history]
+            for cchr, bmrids in bmrids_by_cchr.items()
+        }
+        samples_by_cchr = get_history_for_cchrs(bmrids_by_cchr.keys(), required)
+
+        without_history = [
+            bmrid
+            for bmrid in data["benchmark_result_ids"]
+            if bmrid in cchr_by_bmrid and cchr_by_bmrid[bmrid] not in samples_by_cchr
+        ]
+
+        def _generate() -> Iterator[bytes]:
+            # Serialize (and emit) one timeseries at a time, instead of
+            # building the complete response body in memory first.
+            yield b'{"series":['
+            for i, (cchr, samples) in enumerate(samples_by_cchr.items()):
+                case_id, context_id, hardware_hash, repository = cchr
+                if i > 0:
+                    yield b","
+                yield orjson.dumps(
+                    {
+                        "case_id": case_id,
+                        "context_id": context_id,
+                        "hardware_hash": hardware_hash,
+                        "repository": repository,
+                        "benchmark_result_ids": bmrids_by_cchr[cchr],
+                        "history": [s._dict_for_api_json() for s in samples],
+                    }
+                )
+            yield b'],"benchmark_result_ids_not_found":'
+            yield orjson.dumps(not_found)
+            yield b',"benchmark_result_ids_without_history":'
+            yield orjson.dumps(without_history)
+            yield b"}"
+
+        return f.Response(_generate(), status=200, content_type="application/json")
 
 
 history_entity_view = HistoryEntityAPI.as_view("history")
+history_batch_view = HistoryBatchAPI.as_view("history-batch")
 
 rule(
     "/history/<benchmark_result_id>/",
     view_func=history_entity_view,
     methods=["GET"],
 )
+rule(
+    "/history/batch/",
+    view_func=history_batch_view,
+    methods=["POST"],
+)
+
+
+spec.components.schema("HistoryBatch", schema=HistoryBatchSchema)
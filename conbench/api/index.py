@@ -6,6 +6,7 @@ import flask_login
 import marshmallow
 from sqlalchemy.sql import text
 
+import conbench.job
 from conbench.dbsession import current_session
 
 from ..api import api, rule
@@ -191,12 +192,65 @@ class PingAPI(ApiEndpoint):
         }
 
 
+class ReadySchema(marshmallow.Schema):
+    ready = marshmallow.fields.Boolean(
+        metadata={"description": "Whether this process should receive traffic"},
+        required=True,
+    )
+    bmrt_cache_state = marshmallow.fields.String(
+        metadata={"description": "One of cold, warming, ready, stale"},
+        required=True,
+    )
+    bmrt_cache_age_seconds = marshmallow.fields.Float(
+        allow_none=True,
+        metadata={"description": "Time since the cache was last updated"},
+    )
+    bmrt_cache_n_results = marshmallow.fields.Integer(
+        metadata={"description": "Number of results in the cache"}
+    )
+
+
+class ReadyAPI(ApiEndpoint):
+    def get(self):
+        """
+        ---
+        description: |
+            Readiness check (for load balancers and orchestrators). Does not
+            query the database.
+
+            Report the state of the in-memory cache for recent benchmark
+            results which some UI views are built from: `cold` (not
+            populated, population not started), `warming` (first population
+            in progress), `ready`, or `stale` (not updated for a while).
+
+            Respond with status code 200 when the cache is `ready` or `stale`
+            (a stale cache is likely a problem shared by all replicas; better
+            serve old data than nothing), and with 503 otherwise.
+        responses:
+            "200": "Ready"
+            "503": "ReadyNotReady"
+        tags:
+          - Ping
+        """
+        state = conbench.job.cache_state()
+        age = conbench.job.cache_age_seconds()
+        ready = state in ("ready", "stale")
+        body = {
+            "ready": ready,
+            "bmrt_cache_state": state,
+            "bmrt_cache_age_seconds": round(age, 1) if age is not None else None,
+            "bmrt_cache_n_results": conbench.job.bmrt_cache["meta"].n_results,
+        }
+        return body, 200 if ready else 503
+
+
 def register_api(view, endpoint, url):
     view_func = view.as_view(endpoint)
     rule(url, view_func=view_func, methods=["GET"])
 
 
 register_api(PingAPI, "ping", "/ping/")
+register_api(ReadyAPI, "ready", "/ready/")
 register_api(IndexAPI, "index", "/")
 
 
@@ -219,3 +273,4 @@ if Config.TESTING:
 
 
 spec.components.schema("Ping", schema=PingSchema)
+spec.components.schema("Ready", schema=ReadySchema)
@@ -1,7 +1,10 @@
+import collections
 import logging
+from typing import Any, Dict, List, Optional, Tuple
 
 import flask as f
 import flask_login
+import marshmallow
 import orjson
 from sqlalchemy import select
 
@@ -10,7 +13,7 @@ from conbench.dbsession import current_session
 
 from ..api import rule
 from ..api._docs import spec
-from ..api._endpoint import ApiEndpoint, maybe_login_required
+from ..api._endpoint import ApiEndpoint, empty_strings_to_none, maybe_login_required
 from ..entities._entity import NotFound
 from ..entities.benchmark_result import (
     BenchmarkResult,
@@ -24,6 +27,13 @@ from ._resp import json_response_for_byte_sequence, resp400
 
 log = logging.getLogger(__name__)
 
+# The maximum number of results accepted by one batch submission request.
+BATCH_MAX_RESULTS = 1000
+
+# The number of lines of an NDJSON batch submission request that are
+# validated and stored together.
+NDJSON_CHUNK_SIZE = 500
+
 
 class BenchmarkValidationMixin:
     def validate_benchmark(self, schema):
@@ -251,6 +261,188 @@ class BenchmarkListAPI(ApiEndpoint, BenchmarkValidationMixin):
         return self.response_201_created(self.serializer.one.dump(benchmark_result))
 
 
+class BenchmarkResultBatchAPI(ApiEndpoint):
+    schema = BenchmarkResultFacadeSchema()
+
+    @flask_login.login_required
+    def post(self) -> f.Response:
+        """
+        ---
+        description: |
+            Submit many BenchmarkResults at once.
+
+            Each result is validated and stored as if it were submitted via
+            `POST /api/benchmark-results/`. A result that fails validation does
+            not prevent the other results from being stored.
+
+            With `Content-Type: application/json`, the request body is a JSON
+            array of BenchmarkResultCreate objects (at most 1000). The valid
+            results are inserted in one database transaction. Entities that
+            they refer to (runs, commits, hardware, cases, contexts, infos)
+            are created beforehand, in separate transactions, i.e. the request
+            is not atomic as a whole. The response contains
+            one status object per submitted result, in the same order:
+            `{"status": 201, "id": ...}` for a stored result, `{"status": 400,
+            "description": ...}` for a rejected result. The response status
+            code is 201 if all results were stored, and 207 otherwise.
+
+            With `Content-Type: application/x-ndjson`, the request body
+            contains one BenchmarkResultCreate object per line, without limit
+            on the number of lines. The body is read, validated and stored in
+            chunks of lines, and the response (status code 200, newline-
+            delimited JSON) is streamed: one status object per non-empty line,
+            with the (1-based) line number under the `line` key. The status
+            objects for a chunk are sent after the chunk has been stored.
+
+            The last line of a complete response is a summary object:
+            `{"summary": {"processed": ..., "created": ..., "failed": ...}}`.
+            If processing stops because of an unexpected error (after the
+            response status code was sent), an `{"error": ...}` line precedes
+            the summary. Lines not acknowledged by then were not processed.
+            A response without summary line is truncated.
+        responses:
+            "200": "BenchmarkResultBatchStream"
+            "201": "BenchmarkResultBatchCreated"
+            "207": "BenchmarkResultBatchPartial"
+            "400": "400"
+            "401": "401"
+        requestBody:
+            content:
+                application/json:
+                    schema:
+                        type: array
+                        items:
+                            $ref: '#/components/schemas/BenchmarkResultCreate'
+                application/x-ndjson:
+                    schema:
+                        $ref: '#/components/schemas/BenchmarkResultCreate'
+        tags:
+          - Benchmarks
+        """
+        if f.request.mimetype == "application/x-ndjson":
+            return self._post_ndjson()
+
+        # Emits a 400 response if req does not have expected Content-Type set.
+        data = f.request.get_json()
+        if not isinstance(data, list) or not data:
+            self.abort_400_bad_request(
+                "Expected a non-empty JSON array of benchmark results."
+            )
+        if len(data) > BATCH_MAX_RESULTS:
+            self.abort_400_bad_request(
+                f"Too many benchmark results: {len(data)} (at most "
+                f"{BATCH_MAX_RESULTS} are allowed per request)."
+            )
+
+        statuses = self._create_results(data)
+        n_created = sum(1 for s in statuses if s["status"] == 201)
+        return f.make_response(
+            f.jsonify(statuses), 201 if n_created == len(data) else 207
+        )
+
+    def _post_ndjson(self) -> f.Response:
+        def _gen():
+            # Read the next chunk of lines only after the status
+            # objects for the previous chunk were handed over to the WSGI
+            # server. That bounds memory usage (at most one chunk is held),
+            # and a client that does not keep up with reading the response
+            # slows down ingestion (instead of this process buffering the
+            # response).
+            lines: List[Tuple[int, Optional[dict]]] = []
+            items: List[Any] = []
+            counts = {"processed": 0, "created": 0, "failed": 0}
+
+            def _flush():
+                if not lines:
+                    return
+                statuses = iter(self._create_results(items))
+                for lineno, status in lines:
+                    status = {"line": lineno, **(status or next(statuses))}
+                    counts["processed"] += 1
+                    counts["created" if status["status"] == 201 else "failed"] += 1
+                    yield orjson.dumps(status) + b"\n"
+                lines.clear()
+                items.clear()
+
+            def _process():
+                for lineno, line in enumerate(f.request.stream, start=1):
+                    if not line.strip():
+                        continue
+
+                    try:
+                        items.append(orjson.loads(line))
+                        lines.append((lineno, None))
+                    except orjson.JSONDecodeError as exc:
+                        lines.append(
+                            (
+                                lineno,
+                                {"status": 400, "description": f"Invalid JSON: {exc}"},
+                            )
+                        )
+
+                    if len(lines) >= NDJSON_CHUNK_SIZE:
+                        yield from _flush()
+
+                yield from _flush()
+
+            try:
+                yield from _process()
+            except Exception as exc:
+                # The response status code was sent already. Tell the client
+                # that the stream ends prematurely (instead of just ending it).
+                log.exception("error during NDJSON batch processing: %s", exc)
+                current_session.rollback()
+                yield orjson.dumps(
+                    {"error": f"processing stopped, unexpected error: {exc}"}
+                ) + b"\n"
+
+            yield orjson.dumps({"summary": counts}) + b"\n"
+
+        return f.Response(
+            f.stream_with_context(_gen()),
+            status=200,
+            mimetype="application/x-ndjson",
+        )
+
+    def _create_results(self, data: List[Any]) -> List[dict]:
+        """
+        Validate and store the user-given results `data`. Return one status
+        object per item in `data` (same order).
+        """
+        statuses: List[dict] = [{} for _ in data]
+        userresults: Dict[int, dict] = {}
+        for ix, item in enumerate(data):
+            if not isinstance(item, dict):
+                statuses[ix] = {
+                    "status": 400,
+                    "description": {"_schema": ["Expected a JSON object."]},
+                }
+                continue
+            try:
+                userresults[ix] = self.schema.create.load(empty_strings_to_none(item))
+            except marshmallow.ValidationError as exc:
+                statuses[ix] = {"status": 400, "description": exc.messages}
+
+        outcomes = BenchmarkResult.create_many(list(userresults.values()))
+
+        created: List[BenchmarkResult] = []
+        for ix, outcome in zip(userresults, outcomes):
+            if isinstance(outcome, BenchmarkResultValidationError):
+                statuses[ix] = {"status": 400, "description": str(outcome)}
+            else:
+                statuses[ix] = {"status": 201, "id": outcome.id}
+                created.append(outcome)
+
+        for repourl, count in collections.Counter(
+            r.run.associated_commit_repo_url for r in created
+        ).items():
+            conbench.metrics.COUNTER_BENCHMARK_RESULTS_INGESTED.labels(
+                repourl=repourl
+            ).inc(count)
+
+        return statuses
+
+
 benchmark_entity_view = BenchmarkEntityAPI.as_view("benchmark")
 benchmark_list_view = BenchmarkListAPI.as_view("benchmarks")
 
@@ -279,6 +471,11 @@ rule(
     view_func=benchmark_entity_view,
     methods=["GET", "DELETE", "PUT"],
 )
+rule(
+    "/benchmark-results/batch",
+    view_func=BenchmarkResultBatchAPI.as_view("benchmark-results-batch"),
+    methods=["POST"],
+)
 spec.components.schema(
     "BenchmarkResultCreate", schema=BenchmarkResultFacadeSchema.create
 )
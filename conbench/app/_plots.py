@@ -12,7 +12,11 @@ import bokeh.plotting
 from conbench import util
 from conbench.api.history import get_history_for_benchmark
 from conbench.entities.benchmark_result import BenchmarkResult
-from conbench.entities.history import HistorySample, HistorySampleZscoreStats
+from conbench.entities.history import (
+    HistorySample,
+    HistorySampleZscoreStats,
+    downsample_history_samples,
+)
 from conbench.numstr import numstr
 
 from ..hacks import sorted_data
@@ -20,6 +24,10 @@ from .types import BokehPlotJSONOrError, HighlightInHistPlot
 
 log = logging.getLogger(__name__)
 
+# For history plots with many results: plot at most one result per this many
+# pixels of plot width (see downsample_history_samples()).
+PLOT_PIXELS_PER_RESULT = 2
+
 
 class HistoryUserFacingError(Exception):
     """
@@ -509,7 +517,14 @@ def time_series_plot(
     height=420,
     width=1100,
     highlight_result_in_hist: Optional[Tuple[HistorySample, str]] = None,
+    downsample: bool = True,
 ):
+    """
+    If `downsample` is True then plot a representative subset of `samples`
+    if there are more samples than can be told apart at the given plot
+    `width`. That reduces transfer and render time of plots for long
+    timeseries.
+    """
     # log.info(
     #     "Time series plot for:\n%s",
     #     json.dumps([s._dict_for_api_json() for s in samples], indent=2, default=str),
@@ -523,6 +538,15 @@ def time_series_plot(
     unit = units.pop()
     unit_str_for_plot_axis_label = get_display_unit(unit)
 
+    n_samples_total = len(samples)
+    if downsample:
+        keep_ids = [current_benchmark_result.id]
+        if highlight_result_in_hist is not None:
+            keep_ids.append(highlight_result_in_hist[0].benchmark_result_id)
+        samples = downsample_history_samples(
+            samples, width // PLOT_PIXELS_PER_RESULT, keep_ids
+        )
+
     with_dist = [s for s in samples if s.zscorestats.rolling_mean]
     inliers = [s for s in samples if not s.zscorestats.is_outlier]
     outliers = [s for s in samples if s.zscorestats.is_outlier]
@@ -839,7 +863,9 @@ def time_series_plot(
     )
 
     p.legend.title_text_color = "darkgray"
-    p.legend.title = f"number of results: {len(samples)}"
+    p.legend.title = f"number of results: {n_samples_total}"
+    if len(samples) < n_samples_total:
+        p.legend.title += f" ({len(samples)} shown)"
     p.legend.location = "top_left"
     p.legend.label_text_font_size = "12px"
 
@@ -3,20 +3,25 @@ import functools
 import logging
 import math
 import time
-from typing import Dict, List, Tuple, TypedDict, TypeVar
+from typing import Dict, List, Sequence, Tuple, TypedDict, TypeVar
 
 import flask
 import numpy as np
-import numpy.polynomial
 import orjson
-import pandas as pd
 
+import conbench.metrics
 import conbench.numstr
 from conbench.app import app
 from conbench.app._endpoint import authorize_or_terminate
 from conbench.config import Config
-from conbench.job import BMRTBenchmarkResult, TBenchmarkName, bmrt_cache
-from conbench.outlier import remove_outliers_by_iqrdist
+from conbench.job import (
+    BMRTBenchmarkResult,
+    TBenchmarkName,
+    TimeseriesFrame,
+    bmrt_cache,
+    cache_state,
+)
+from conbench.outlier import outlier_mask_by_iqrdist_grouped
 
 """
 Experimental: UX around 'conceptual benchmarks'
@@ -32,11 +37,13 @@ numstr8 = functools.partial(conbench.numstr.numstr, sigfigs=8)
 log = logging.getLogger(__name__)
 
 
-def newest_of_many_results(results: List[BMRTBenchmarkResult]) -> BMRTBenchmarkResult:
+def newest_of_many_results(
+    results: Sequence[BMRTBenchmarkResult],
+) -> BMRTBenchmarkResult:
     return max(results, key=lambda r: r.started_at)
 
 
-def time_of_newest_of_many_results(results: List[BMRTBenchmarkResult]) -> float:
+def time_of_newest_of_many_results(results: Sequence[BMRTBenchmarkResult]) -> float:
     return max(r.started_at for r in results)
 
 
@@ -45,6 +52,38 @@ def time_of_newest_of_many_results(results: List[BMRTBenchmarkResult]) -> float:
 GenDict = TypeVar("GenDict")  # the variable name must coincide with the string
 
 
+def _count_cache_read(view: str, hit: bool) -> None:
+    conbench.metrics.COUNTER_BMRT_CACHE_READS.labels(
+        view=view, outcome="hit" if hit else "miss"
+    ).inc()
+
+
+def unless_cache_warming(func):
+    """
+    Decorator for views built from the BMRT cache: while the cache is being
+    populated for the first time (right after boot), do not render a page
+    that looks like data loss. Respond quickly with 503 instead (telling
+    clients to retry soon), so that load balancers / clients can prefer warm
+    replicas, see /api/ready/.
+    """
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if cache_state() == "warming":
+            conbench.metrics.COUNTER_BMRT_CACHE_READS.labels(
+                view=func.__name__, outcome="warming"
+            ).inc()
+            return (
+                "Benchmark results are being loaded into memory; "
+                "please retry in a few seconds.",
+                503,
+                {"Retry-After": "10"},
+            )
+        return func(*args, **kwargs)
+
+    return wrapper
+
+
 def get_first_n_dict_subset(d: GenDict, n: int) -> GenDict:
     # A bit of discussion here:
     # https://stackoverflow.com/a/12980510/145400
@@ -54,7 +93,9 @@ def get_first_n_dict_subset(d: GenDict, n: int) -> GenDict:
 
 @app.route("/c-benchmarks/", methods=["GET"])  # type: ignore
 @authorize_or_terminate
+@unless_cache_warming
 def list_benchmarks() -> str:
+    _count_cache_read("list_benchmarks", hit=True)
     # Sort alphabetically by string key
     benchmarks_by_name_sorted_alphabetically = dict(
         sorted(
@@ -141,18 +182,94 @@ def list_benchmarks() -> str:
     )
 
 
+def relchange_by_series(
+    tsframe: TimeseriesFrame, series_codes: np.ndarray, reftime: float
+) -> Dict[int, float]:
+    """
+    Analyze the time series `series_codes` of `tsframe` for a trend: after
+    rough outlier removal, make a linear regression for each series. Return
+    the relative change (slope / ordinate) by series code.
+
+    Skip time series with little history (less than 10 non-NaN data points)
+    and those where the newest data point is more than 30 days older than
+    `reftime`.
+
+    All time series are analyzed at once, with vectorized operations (instead
+    of calling remove_outliers_by_iqrdist() and Polynomial.fit() for each
+    time series, on many copies of smallish dataframes).
+    """
+    offsets = tsframe.offsets
+    starts, ends = offsets[series_codes], offsets[series_codes + 1]
+
+    # count(): number of non-NaN values. Skip if there's little history
+    # anyway. Recency criterion: time of newest data point (series are sorted
+    # by time).
+    nonnan_cumsum = np.concatenate(([0], np.cumsum(~np.isnan(tsframe.svs))))
+    nonnan_counts = nonnan_cumsum[ends] - nonnan_cumsum[starts]
+    keep = (nonnan_counts >= 10) & (
+        reftime - tsframe.started_at[ends - 1] <= 86400 * 30
+    )
+    series_codes, starts, ends = series_codes[keep], starts[keep], ends[keep]
+    if len(series_codes) == 0:
+        return {}
+
+    # Gather the data points of the remaining series: `group` is the position
+    # in `series_codes`.
+    lengths = ends - starts
+    group = np.repeat(np.arange(len(series_codes)), lengths)
+    positions = np.arange(lengths.sum()) + np.repeat(
+        starts - np.cumsum(lengths) + lengths, lengths
+    )
+    t = tsframe.started_at[positions]
+    y = tsframe.svs[positions].copy()
+
+    # Outliers are marked with NaN. Then drop NaNs because the linear
+    # regression method below does not tolerate NaN in input.
+    y[outlier_mask_by_iqrdist_grouped(y, group)] = np.nan
+    valid = ~np.isnan(y)
+    t, y, group = t[valid], y[valid], group[valid]
+
+    n_groups = len(series_codes)
+    n = np.bincount(group, minlength=n_groups).astype(float)
+
+    # Least squares linear fit, equivalent to numpy.polynomial.Polynomial.fit(t,
+    # y, 1): the fit is done after mapping each series' time domain to the
+    # window [-1, 1], and the coefficients refer to that window (the slope sign
+    # and slope/ordinate ratio are what matters).
+    tmin = np.full(n_groups, np.inf)
+    tmax = np.full(n_groups, -np.inf)
+    np.minimum.at(tmin, group, t)
+    np.maximum.at(tmax, group, t)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        u = (2 * t - (tmin + tmax)[group]) / (tmax - tmin)[group]
+        su = np.bincount(group, weights=u, minlength=n_groups)
+        sy = np.bincount(group, weights=y, minlength=n_groups)
+        suu = np.bincount(group, weights=u * u, minlength=n_groups)
+        suy = np.bincount(group, weights=u * y, minlength=n_groups)
+        slope = (n * suy - su * sy) / (n * suu - su * su)
+        ordinate = (sy - slope * su) / n
+        # Do a 'normalization' here to find _relative change_. For the offset
+        # use data from the linear fit (the constant part of the linearity).
+        # Think: the smaller most of the values are, the _more_ does the
+        # _same_ slope reflect relative change.
+        relchange = slope / ordinate
+
+    # Skip if after outlier removal there's little history left, and where the
+    # fit failed.
+    ok = (n >= 10) & ~np.isnan(slope)
+    return dict(zip(series_codes[ok].tolist(), relchange[ok].tolist()))
+
+
 @app.route("/c-benchmarks/<bname>/trends", methods=["GET"])  # type: ignore
 @authorize_or_terminate
+@unless_cache_warming
 def show_trends_for_benchmark(bname: TBenchmarkName) -> str:
-    # Narrow down relevant dataframes.
-    dfs_by_t3: Dict[Tuple[str, str, str], pd.DataFrame] = {}
-    for (ibname, case_id, context_id, hardware_id), df in bmrt_cache[
-        "by_4t_df"
-    ].items():
-        if ibname == bname:
-            dfs_by_t3[(case_id, context_id, hardware_id)] = df
-
-    log.info("built dfs_by_t3, len: %s", len(dfs_by_t3))
+    _count_cache_read(
+        "show_trends_for_benchmark", hit=bname in bmrt_cache["by_benchmark_name"]
+    )
+    tsframe = bmrt_cache["timeseries"]
+    series_codes = tsframe.codes_for_benchmark_name(bname)
+    log.info("number of time series: %s", len(series_codes))
 
     # This might be one of the most inefficient methods to get the point of
     # time of the newest result, but shrug for now.
@@ -161,93 +278,12 @@ def show_trends_for_benchmark(bname: TBenchmarkName) -> str:
     # Do this trend analysis only for those timeseries that are recent.
     # Criterion here for now: simple cutoff relative to the time of the newest
     # result for this conceptual benchmark.
+    relchange_by_code = relchange_by_series(tsframe, series_codes, reftime=t_newest)
 
-    reftime = t_newest
     relchange_by_t3: Dict[Tuple[str, str, str], float] = {}
-
-    # Note that below we operate on one DF per each of T timeseries. We call
-    # remove_outliers_by_iqrdist() and Polynomial.fit() T times, and create
-    # many copies of smallish dataframes. It is probably a lot faster by
-    # preparing one tidy dataframe that then does outlier removal as well as
-    # linear fit in "one line of Python", for each column in the df.
-    for t3, df in dfs_by_t3.items():
-        # Note(JP): make a linear regression: derive a slope value. this is
-        # mainly about the sign of the slope. that means: we can work with the
-        # absolute t/time values we have. for the y values the goal is to make
-        # change comparable across different scenarios. Not across different
-        # units, though.
-        #
-        # Interesting: benchmark result time distribution vs. commit
-        # distribution over time. assume that code evolution is highly
-        # correlated with benchmark start time evolution.
-
-        # Ignore df rows in here where results reported SVS being NAN.
-        # Update: do this later below where we have to dropna anyway.
-        # df = df[df["svs"].notna()]
-
-        # count(): number of non-NaN values
-        if df["svs"].count() < 10:
-            # Skip if there's little history anyway.
-            continue
-
-        # Recency criterion.
-        newest_timestamp = df.index[-1].timestamp()
-        if reftime - newest_timestamp > 86400 * 30:
-            continue
-
-        # TODO: basic outlier detection before the fit.
-        # Either rolling window median based, or maybe
-        # huber loss https://stackoverflow.com/a/61144766
-
-        # Did some of that before here:
-        # https://github.com/jgehrcke/covid-19-analysis/blob/4950649a27c51c2bf36baba258757249385f2808/process.py#L227
-        # it's a bit of a seemingly complex(?) converstion from pd
-        # datetimeindex back to float values. Remove 10^15 from these
-        # nanoseconds-since-epoch to make the numeric values a little less
-        # extreme for printing/debugging.
-
-        # Do not modify dataframe objects in BMRT cache.
-        df = df.copy()
-        remove_outliers_by_iqrdist(df, "svs")
-
-        # Now it's important to drop nans again because the outliers have been
-        # marked with NaN, and the linear regression method chosen below does
-        # not tolerate NaN in input.
-        df = df.dropna()
-        if len(df.index) < 10:
-            # Skip if after outlier removal there's little history left.
-            continue
-
-        # The .astype(float) conversion from a pandas DateTimeIndex yields
-        # numbers proportional to time, but not in unit 'seconds'. The division
-        # is not necessary for obtaining a meaningful fit. It's just so that
-        # numbers are not so huge when printing/debugging. Also see
-        # https://stackoverflow.com/a/46501718
-        tfloats = df.index.values.astype(float)  # / 10**15
-        yfloats = df["svs"].values
-
-        # Least squares linear fit using modern numpy API.
-        fitted_series = numpy.polynomial.Polynomial.fit(tfloats, yfloats, 1)
-
-        # print(fitted_series)
-        # https://numpy.org/doc/stable/reference/generated/numpy.polynomial.polynomial.Polynomial.fit.html#numpy.polynomial.polynomial.Polynomial.fit
-        slope, ordinate = fitted_series.coef[1], fitted_series.coef[0]
-        # print(slope, ordinate)
-
-        # these values might be nan if the fit failed. if the input has a
-        # nan then the fit fails: clean the input! But even then maybe the
-        # fit might fail? Looks like nan has high sort order.
-        # check for this value upon data emission? No.
-        if math.isnan(slope):
-            continue
-
-        # Do a 'normalization' here to find _relative change_. For the offset
-        # use data from the linear fit (the constant part of the linearity).
-        # Think: the smaller most of the values are, the _more_ does the _same_
-        # slope reflect relative change.
-        relchange = slope / ordinate
-        #  print(f"slope: {slope}")
-        relchange_by_t3[t3] = relchange
+    for code, relchange in relchange_by_code.items():
+        _, case_id, context_id, hardware_id = tsframe.t4s[code]
+        relchange_by_t3[(case_id, context_id, hardware_id)] = relchange
 
     # sort by relative change, largest first.
     relchange_by_t3_sorted_inctrend: Dict[Tuple[str, str, str], float] = dict(
@@ -394,11 +430,14 @@ def _build_plotinfo_from_topnt3_dict(
 
 @app.route("/c-benchmarks/<bname>", methods=["GET"])  # type: ignore
 @authorize_or_terminate
+@unless_cache_warming
 def show_benchmark_cases(bname: TBenchmarkName) -> str:
     # Do not catch KeyError upon lookup for checking for key, because this
     # would insert the key into the defaultdict(list) (as an empty list).
     if bname not in bmrt_cache["by_benchmark_name"]:
+        _count_cache_read("show_benchmark_cases", hit=False)
         return f"benchmark name not known: `{bname}`"
+    _count_cache_read("show_benchmark_cases", hit=True)
 
     matching_results = bmrt_cache["by_benchmark_name"][bname]
     results_by_case_id: Dict[str, List[BMRTBenchmarkResult]] = collections.defaultdict(
@@ -532,12 +571,15 @@ class TypeUIPlotInfo(TypedDict):
 
 @app.route("/c-benchmarks/<bname>/<caseid>", methods=["GET"])  # type: ignore
 @authorize_or_terminate
+@unless_cache_warming
 def show_benchmark_results(bname: TBenchmarkName, caseid: str) -> str:
     # First, filter by benchmark name.
     try:
         results_all_with_bname = bmrt_cache["by_benchmark_name"][bname]
     except KeyError:
+        _count_cache_read("show_benchmark_results", hit=False)
         return f"benchmark name not known: `{bname}`"
+    _count_cache_read("show_benchmark_results", hit=True)
 
     # Now, filter those that have the required case ID set.
     matching_results = []
@@ -702,7 +744,7 @@ def maybe_longer_unit(unit: str) -> str:
 
 
 def avg_starttime_of_newest_n_percent_of_results(
-    results: List[BMRTBenchmarkResult], npc: int
+    results: Sequence[BMRTBenchmarkResult], npc: int
 ) -> float:
     """
     Return average start time of the newest N percent of those results in the
@@ -0,0 +1,316 @@
+"""
+A memory-mappable snapshot of the BMRT cache (see conbench/job.py).
+
+The BMRT cache can be populated by a dedicated process (the cache builder)
+instead of by a thread in each web application process. The builder writes the
+cache's columnar store (see conbench/bmrtstore.py) into a directory (typically
+on a tmpfs such as /dev/shm) as a set of NumPy arrays in .npy format, one file
+per array. That includes the groupings (by benchmark name, by case ID, by
+4-tuple) as arrays of row indices plus offsets.
+
+Web application processes memory-map these arrays (read-only). That is, N
+processes share one copy of the data (the page cache), and attaching to a new
+snapshot does not require deserializing the results. Only the (comparatively
+small) entity tables are decoded upon attach; case and context dictionaries
+are decoded on first access.
+
+A snapshot is published by writing it into a new directory and then
+atomically re-pointing the `current` symlink to it. Readers poll that symlink.
+Directories of older snapshots are removed by the builder; on Linux that is
+safe even if a reader still has memory-mapped files from that directory.
+
+A new snapshot is only published when the cache content changed. After each
+successful cache update the builder touches a heartbeat file, so that readers
+can tell an up-to-date (but unchanged) snapshot from a stale one.
+
+The same format is used for persisting the cache on disk (see
+Config.BMRT_CACHE_PERSIST_DIR), for populating the cache quickly after a
+restart.
+"""
+import dataclasses
+import logging
+import os
+import shutil
+import time
+from collections.abc import Sequence
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+import orjson
+
+from conbench.bmrtstore import ENTITY_TABLES, GROUPINGS, BMRTStore
+from conbench.job import CacheDict, CacheUpdateMetaInfo
+
+log = logging.getLogger(__name__)
+
+# Bump this when changing the layout. A reader refuses to attach to a
+# snapshot with a different format version.
+FORMAT_VERSION = 3
+
+# Name of the symlink pointing to the most recently published snapshot.
+CURRENT_LINK_NAME = "current"
+
+# Name of the file touched by the builder after each successful cache update.
+HEARTBEAT_FILE_NAME = "heartbeat"
+
+# Number of published snapshot directories to keep around (including the
+# current one). Keeping the previous one reduces the likelihood for a reader to
+# try to attach to a directory that got removed right after it looked up the
+# symlink.
+_N_SNAPSHOTS_TO_KEEP = 2
+
+_SNAPSHOT_DIR_PREFIX = "snapshot-"
+
+# Entity table columns holding dictionaries, stored as JSON documents. All
+# other table columns hold strings.
+_JSON_COLUMNS = ("case_dict", "context_dict")
+
+# Arrays of BMRTStore, by file name.
+_STORE_ARRAYS = (
+    "ids",
+    "id_argsort",
+    "svs",
+    "started_at",
+    "non_null_sample_count",
+    "data_offsets",
+    "data_values",
+)
+
+
+def publish(
+    cache: CacheDict,
+    basedir: str,
+    update_seconds: float,
+    newest_result_timestamp: Optional[datetime] = None,
+) -> str:
+    """
+    Write a snapshot of `cache` into a new directory in `basedir`, then
+    atomically make it the current snapshot. Return the path to the new
+    snapshot directory.
+
+    `update_seconds` is the duration of the cache update that resulted in the
+    content of `cache`, recorded for informational purposes.
+
+    `newest_result_timestamp`: the timestamp (as in the database) of the
+    newest result seen while populating the cache. Required for continuing
+    with delta updates after loading the snapshot.
+    """
+    t0 = time.monotonic()
+    os.makedirs(basedir, exist_ok=True)
+
+    # The time in nanoseconds is unique enough (there is a single builder),
+    # and sorts naturally -- also across restarts of the builder.
+    name = f"{_SNAPSHOT_DIR_PREFIX}{time.time_ns()}"
+
+    # Write into a hidden directory first so that readers never see a partial
+    # snapshot.
+    tmppath = os.path.join(basedir, f".{name}")
+    write_snapshot(cache, tmppath, update_seconds, newest_result_timestamp)
+    path = os.path.join(basedir, name)
+    os.rename(tmppath, path)
+
+    # Atomically replace the symlink (rename(2) on the same file system).
+    tmplink = os.path.join(basedir, f".{CURRENT_LINK_NAME}.tmp")
+    if os.path.lexists(tmplink):
+        os.unlink(tmplink)
+    os.symlink(name, tmplink)
+    os.replace(tmplink, os.path.join(basedir, CURRENT_LINK_NAME))
+
+    _remove_old_snapshots(basedir)
+
+    log.info(
+        "BMRT snapshot: published %s (%s results, took %.3f s)",
+        path,
+        len(cache["by_id"]),
+        time.monotonic() - t0,
+    )
+    return path
+
+
+def current_snapshot_path(basedir: str) -> Optional[str]:
+    """
+    Return the path to the most recently published snapshot in `basedir`, or
+    `None` if there is none.
+    """
+    try:
+        name = os.readlink(os.path.join(basedir, CURRENT_LINK_NAME))
+    except FileNotFoundError:
+        return None
+    return os.path.join(basedir, name)
+
+
+def touch_heartbeat(basedir: str) -> None:
+    """
+    Record that the most recently published snapshot in `basedir` reflects
+    the result of a cache update that just succeeded.
+    """
+    path = os.path.join(basedir, HEARTBEAT_FILE_NAME)
+    with open(path, "ab"):
+        pass
+    os.utime(path)
+
+
+def heartbeat_age_seconds(basedir: str) -> Optional[float]:
+    """
+    Return the time that passed since the builder last touched the heartbeat
+    file in `basedir`, or `None` if it never did.
+    """
+    try:
+        return (
+            time.time() - os.stat(os.path.join(basedir, HEARTBEAT_FILE_NAME)).st_mtime
+        )
+    except FileNotFoundError:
+        return None
+
+
+def _remove_old_snapshots(basedir: str) -> None:
+    names = sorted(n for n in os.listdir(basedir) if n.startswith(_SNAPSHOT_DIR_PREFIX))
+    for name in names[:-_N_SNAPSHOTS_TO_KEEP]:
+        shutil.rmtree(os.path.join(basedir, name), ignore_errors=True)
+
+    # Remove left-overs from a builder that got interrupted while writing. The
+    # caller is the only writer, i.e. there is no concurrent write.
+    for name in os.listdir(basedir):
+        if name.startswith(f".{_SNAPSHOT_DIR_PREFIX}"):
+            shutil.rmtree(os.path.join(basedir, name), ignore_errors=True)
+
+
+def write_snapshot(
+    cache: CacheDict,
+    path: str,
+    update_seconds: float = 0.0,
+    newest_result_timestamp: Optional[datetime] = None,
+) -> None:
+    """
+    Write the content of `cache` into the (new) directory `path`.
+    """
+    os.makedirs(path)
+
+    def save(name: str, arr: np.ndarray) -> None:
+        np.save(os.path.join(path, f"{name}.npy"), arr, allow_pickle=False)
+
+    store = cache["store"]
+
+    for name in _STORE_ARRAYS:
+        save(name, getattr(store, name))
+
+    for name, codes in store.codes.items():
+        save(f"codes.{name}", codes)
+
+    for name, (order, offsets) in store.groupings.items():
+        save(f"{name}.order", order)
+        save(f"{name}.offsets", offsets)
+
+    for columns in ENTITY_TABLES.values():
+        for column in columns:
+            table = store.tables[column]
+            if column in _JSON_COLUMNS:
+                docs = (orjson.dumps(d) for d in table)  # pylint: disable=E1101
+                save(f"table.{column}", _bytes_array(docs))
+            else:
+                save(f"table.{column}", _bytes_array(v.encode("utf-8") for v in table))
+
+    with open(os.path.join(path, "meta.json"), "wb") as f:
+        f.write(
+            orjson.dumps(  # pylint: disable=E1101
+                {
+                    "format_version": FORMAT_VERSION,
+                    "update_seconds": update_seconds,
+                    "newest_result_timestamp": newest_result_timestamp.isoformat()
+                    if newest_result_timestamp is not None
+                    else None,
+                    "cache_meta": dataclasses.asdict(cache["meta"]),
+                    # The number of table rows (an empty table is stored with
+                    # one row, see _bytes_array()).
+                    "table_lengths": {
+                        column: len(table) for column, table in store.tables.items()
+                    },
+                }
+            )
+        )
+
+
+def _bytes_array(values: Iterable[bytes]) -> np.ndarray:
+    # The resulting dtype is `S<maxlen>`. Make sure to not create a
+    # zero-itemsize array (which cannot be memory-mapped).
+    return np.array(list(values) or [b""], dtype=np.bytes_)
+
+
+class Snapshot:
+    """
+    A published snapshot, attached to via read-only memory maps.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+        with open(os.path.join(path, "meta.json"), "rb") as f:
+            meta = orjson.loads(f.read())  # pylint: disable=E1101
+
+        if meta["format_version"] != FORMAT_VERSION:
+            raise ValueError(
+                f"BMRT snapshot {path}: unexpected format version "
+                f"{meta['format_version']} (expected {FORMAT_VERSION})"
+            )
+
+        self.meta = CacheUpdateMetaInfo(**meta["cache_meta"])
+        self.update_seconds: float = meta["update_seconds"]
+        self.newest_result_timestamp: Optional[datetime] = (
+            datetime.fromisoformat(meta["newest_result_timestamp"])
+            if meta["newest_result_timestamp"] is not None
+            else None
+        )
+
+        tables: Dict[str, Sequence] = {}
+        for columns in ENTITY_TABLES.values():
+            for column in columns:
+                table = self._load(f"table.{column}")[: meta["table_lengths"][column]]
+                if column in _JSON_COLUMNS:
+                    tables[column] = _JsonTable(table)
+                else:
+                    tables[column] = [v.decode("utf-8") for v in table.tolist()]
+
+        arrays = {name: self._load(name) for name in _STORE_ARRAYS}
+        self.store = BMRTStore(
+            ids=arrays["ids"],
+            svs=arrays["svs"],
+            started_at=arrays["started_at"],
+            non_null_sample_count=arrays["non_null_sample_count"],
+            data_offsets=arrays["data_offsets"],
+            data_values=arrays["data_values"],
+            codes={name: self._load(f"codes.{name}") for name in ENTITY_TABLES},
+            tables=tables,
+            id_argsort=arrays["id_argsort"],
+            groupings={
+                name: (self._load(f"{name}.order"), self._load(f"{name}.offsets"))
+                for name in GROUPINGS
+            },
+        )
+
+    def _load(self, name: str) -> np.ndarray:
+        return np.load(
+            os.path.join(self.path, f"{name}.npy"), mmap_mode="r", allow_pickle=False
+        )
+
+
+class _JsonTable(Sequence):
+    """
+    A table of JSON documents, decoded on first access. The same dictionary
+    object is returned for repeated access.
+    """
+
+    def __init__(self, docs: np.ndarray):
+        self._docs = docs
+        self._decoded: Dict[int, Dict] = {}
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def __getitem__(self, i):  # type: ignore[override]
+        i = int(i)
+        doc = self._decoded.get(i)
+        if doc is None:
+            doc = orjson.loads(bytes(self._docs[i]))  # pylint: disable=E1101
+            self._decoded[i] = doc
+        return doc
@@ -0,0 +1,944 @@
+"""
+Columnar (struct-of-arrays) storage for the benchmark results in the BMRT
+cache (see conbench/job.py).
+
+Instead of one Python object per benchmark result (each holding a list of
+floats, dictionaries, and a number of strings) all results are stored in a
+small number of NumPy arrays:
+
+- numeric columns (single value summary, start time) as float64 arrays
+- the per-iteration samples of all results as one flat float64 array, plus an
+  offsets array (samples of result i: `values[offsets[i]:offsets[i+1]]`)
+- references to entities (benchmark name, case, context, hardware, run, ...)
+  as int32 codes, indexing into per-entity tables. Each entity table holds
+  the entity's key (e.g. the case ID) and attributes derived from the entity
+  (e.g. the case dictionary), i.e. those are stored once per entity and not
+  once per result.
+
+Results are exposed via BMRTBenchmarkResult, a light-weight view on one row.
+Attributes (including the preformatted UI strings) are computed on access.
+
+A BMRTStore is immutable after construction. Rows are sorted by benchmark
+start time, newest first.
+"""
+import array
+import dataclasses
+import functools
+import logging
+import math
+import sys
+from collections.abc import Mapping, Sequence
+from datetime import datetime
+from typing import (
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    NewType,
+    Optional,
+    Tuple,
+    Union,
+    cast,
+)
+
+import numpy as np
+import pandas as pd
+
+import conbench.util
+from conbench.entities.benchmark_result import ui_mean_and_uncertainty, ui_rel_sem
+
+log = logging.getLogger(__name__)
+
+
+# Do this for case ID, etc, too.
+TBenchmarkName = NewType("TBenchmarkName", str)
+
+# This type is used often. It's the famous 4-tuple defining a timeseries. Or
+# maybe turn this into a namedtuple or sth like this. Watch out a bit for mem
+# consumption.
+Tt4 = Tuple[TBenchmarkName, str, str, str]
+
+
+# Entity tables. Key: name of the code column. Value: names of the table
+# columns, the first one being the key identifying the entity. The other
+# columns are determined by the key.
+ENTITY_TABLES: Dict[str, Tuple[str, ...]] = {
+    "benchmark_name": ("benchmark_name",),
+    "case": ("case_id", "case_text_id", "case_dict"),
+    "context": ("context_id", "context_dict"),
+    "hardware": ("hardware_id", "hardware_name"),
+    "run": ("run_id", "run_reason"),
+    "svs_type": ("svs_type",),
+    "unit": ("unit",),
+}
+
+# Entity tables whose attributes never change for a given key (see
+# BMRTStoreBuilder's `intern_from`).
+_INTERNED_TABLES = ("case", "context")
+
+# Map table column name to name of code column.
+_CODE_COLUMN_FOR = {c: code for code, cols in ENTITY_TABLES.items() for c in cols}
+
+# Groupings of results, defined by code columns. Within each group, results are
+# sorted newest first.
+GROUPINGS: Dict[str, Tuple[str, ...]] = {
+    "by_benchmark_name": ("benchmark_name",),
+    "by_case_id": ("case",),
+    "by_4t": ("benchmark_name", "case", "context", "hardware"),
+}
+
+
+class BMRTStore:
+    def __init__(
+        self,
+        ids: np.ndarray,
+        svs: np.ndarray,
+        started_at: np.ndarray,
+        non_null_sample_count: np.ndarray,
+        data_offsets: np.ndarray,
+        data_values: np.ndarray,
+        codes: Dict[str, np.ndarray],
+        tables: Mapping[str, Sequence],
+        id_argsort: Optional[np.ndarray] = None,
+        groupings: Optional[Dict[str, Tuple[np.ndarray, np.ndarray]]] = None,
+    ):
+        # Result IDs (UTF-8-encoded), dtype `S<maxlen>`.
+        self.ids = ids
+        self.svs = svs
+        self.started_at = started_at
+        self.non_null_sample_count = non_null_sample_count
+        self.data_offsets = data_offsets
+        self.data_values = data_values
+        self.codes = codes
+        self.tables = tables
+        self.n_results = len(svs)
+
+        if id_argsort is not None:
+            self.__dict__["id_argsort"] = id_argsort
+        if groupings is not None:
+            self.__dict__["groupings"] = groupings
+
+    @functools.cached_property
+    def id_argsort(self) -> np.ndarray:
+        """
+        For looking up a result by ID via binary search.
+        """
+        return np.argsort(self.ids, kind="stable")
+
+    @functools.cached_property
+    def groupings(self) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+        """
+        For each grouping: row indices (grouped), and group offsets.
+        """
+        return {name: self._group_by(cols) for name, cols in GROUPINGS.items()}
+
+    def _group_by(self, code_columns: Tuple[str, ...]) -> Tuple[np.ndarray, np.ndarray]:
+        columns = [self.codes[c] for c in code_columns]
+        radixes = [int(c.max()) + 1 if len(c) else 1 for c in columns]
+        if math.prod(radixes) < 2**63:
+            # Combine codes into one integer per result (mixed radix). Much
+            # faster than np.unique(..., axis=0).
+            group_codes = np.zeros(self.n_results, dtype=np.int64)
+            for codes, radix in zip(columns, radixes):
+                group_codes = group_codes * radix + codes
+        else:
+            _, group_codes = np.unique(
+                np.stack(columns, axis=1), axis=0, return_inverse=True
+            )
+            group_codes = group_codes.reshape(-1)
+
+        # A stable sort retains the newest-first order within each group.
+        order = np.argsort(group_codes, kind="stable").astype(np.int32)
+        boundaries = np.flatnonzero(np.diff(group_codes[order])) + 1
+        offsets = np.concatenate(([0], boundaries, [self.n_results])).astype(np.int64)
+        if self.n_results == 0:
+            offsets = np.zeros(1, dtype=np.int64)
+        return order, offsets
+
+    def row(self, i: int) -> "BMRTBenchmarkResult":
+        return BMRTBenchmarkResult(self, i)
+
+    def value(self, column: str, i: int):
+        """
+        Return value of table column `column` for the result in row `i`.
+        """
+        return self.tables[column][self.codes[_CODE_COLUMN_FOR[column]][i]]
+
+    def groups(self, grouping: str) -> Iterator["ResultList"]:
+        order, offsets = self.groupings[grouping]
+        for a, b in zip(offsets[:-1].tolist(), offsets[1:].tolist()):
+            yield ResultList(self, order[a:b])
+
+    def head(self, n: int) -> "BMRTStore":
+        """
+        Return a store containing the newest `n` results (or all, if there
+        are fewer). Tables are shared.
+        """
+        if n >= self.n_results:
+            return self
+        return self._take_rows(0, n)
+
+    def _take_rows(self, start: int, stop: int) -> "BMRTStore":
+        d0, d1 = int(self.data_offsets[start]), int(self.data_offsets[stop])
+        data_offsets = self.data_offsets[start:stop]
+        return BMRTStore(
+            ids=self.ids[start:stop],
+            svs=self.svs[start:stop],
+            started_at=self.started_at[start:stop],
+            non_null_sample_count=self.non_null_sample_count[start:stop],
+            data_offsets=np.append(data_offsets, d1) - d0,
+            data_values=self.data_values[d0:d1],
+            codes={k: v[start:stop] for k, v in self.codes.items()},
+            tables=self.tables,
+        )
+
+    def take(self, rows: np.ndarray) -> "BMRTStore":
+        """
+        Return a store containing the results in `rows` (row indices, sorted
+        ascendingly: the newest-first order is retained).
+
+        The returned store's tables only contain entities referenced by these
+        results, i.e. codes are re-assigned (the tables are not an extension
+        of this store's tables).
+        """
+        lengths = np.diff(self.data_offsets)[rows]
+        data_offsets = np.concatenate(([0], np.cumsum(lengths))).astype(np.int64)
+        # Positions of the samples of the selected results in `data_values`.
+        positions = np.arange(data_offsets[-1]) + np.repeat(
+            self.data_offsets[rows] - data_offsets[:-1], lengths
+        )
+
+        codes: Dict[str, np.ndarray] = {}
+        tables: Dict[str, List] = {}
+        for name, columns in ENTITY_TABLES.items():
+            used, inverse = np.unique(self.codes[name][rows], return_inverse=True)
+            codes[name] = inverse.reshape(-1).astype(np.int32)
+            for column in columns:
+                table = self.tables[column]
+                tables[column] = [table[c] for c in used.tolist()]
+
+        return BMRTStore(
+            ids=self.ids[rows],
+            svs=self.svs[rows],
+            started_at=self.started_at[rows],
+            non_null_sample_count=self.non_null_sample_count[rows],
+            data_offsets=data_offsets,
+            data_values=self.data_values[positions],
+            codes=codes,
+            tables=tables,
+        )
+
+    @functools.cached_property
+    def series_index_and_rank(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        For each result: the index of its time series (4-tuple, in the order
+        of the `by_4t` grouping), and its rank within that time series (0 for
+        the newest result).
+        """
+        order, offsets = self.groupings["by_4t"]
+        lengths = np.diff(offsets)
+        series = np.empty(self.n_results, dtype=np.int64)
+        rank = np.empty(self.n_results, dtype=np.int64)
+        series[order] = np.repeat(np.arange(len(lengths)), lengths)
+        rank[order] = np.arange(self.n_results) - np.repeat(offsets[:-1], lengths)
+        return series, rank
+
+    def row_nbytes(self) -> np.ndarray:
+        """
+        Return the (approximate) number of bytes used by each result: its
+        share of the arrays of this store, including the groupings.
+        """
+        fixed = (
+            self.ids.itemsize
+            + self.svs.itemsize
+            + self.started_at.itemsize
+            + self.non_null_sample_count.itemsize
+            + self.data_offsets.itemsize
+            + sum(c.itemsize for c in self.codes.values())
+            # id_argsort, and one row index per grouping.
+            + 8
+            + 4 * len(GROUPINGS)
+        )
+        return fixed + self.data_values.itemsize * np.diff(self.data_offsets)
+
+    def tables_nbytes(self) -> int:
+        """
+        Return the (approximate) number of bytes used by the entity tables.
+        """
+        return sum(
+            _deep_sizeof(value) for table in self.tables.values() for value in table
+        )
+
+    def retain(
+        self,
+        min_started_at: Optional[float] = None,
+        max_per_series: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+    ) -> "RetentionOutcome":
+        """
+        Evict results according to a retention policy:
+
+        - `min_started_at`: evict results that started before that (unix
+          timestamp, see BMRTBenchmarkResult.started_at).
+        - `max_per_series`: retain at most that many results per time series
+          (the newest ones).
+        - `max_bytes`: limit the (approximate) size of arrays plus tables.
+          This is enforced by lowering the per-series limit (as much as
+          needed), not by evicting the oldest results overall. That is, time
+          series with many results are truncated first, and a time series with
+          few results retains its (possibly long) history.
+
+        Within each time series results are sorted newest first, i.e. each
+        criterion evicts the oldest results of a time series.
+        """
+        series, rank = self.series_index_and_rank
+        keep = np.ones(self.n_results, dtype=bool)
+        if min_started_at is not None:
+            keep &= self.started_at >= min_started_at
+
+        cap = max_per_series
+        if max_bytes is not None and self.n_results:
+            # Approximation: the tables of the resulting store may be smaller.
+            budget = max_bytes - self.tables_nbytes()
+            # Total size of the results with rank < r, for each r.
+            cumulative = np.cumsum(
+                np.bincount(rank[keep], weights=self.row_nbytes()[keep])
+            )
+            budget_cap = int(np.searchsorted(cumulative, budget, side="right"))
+            if budget_cap < len(cumulative):
+                cap = budget_cap if cap is None else min(cap, budget_cap)
+
+        n_series_truncated = 0
+        if cap is not None:
+            truncated = keep & (rank >= cap)
+            n_series_truncated = len(np.unique(series[truncated]))
+            keep &= ~truncated
+
+        n_evicted = self.n_results - int(np.count_nonzero(keep))
+        return RetentionOutcome(
+            store=self if n_evicted == 0 else self.take(np.flatnonzero(keep)),
+            n_evicted=n_evicted,
+            max_per_series=cap,
+            n_series_truncated=n_series_truncated,
+        )
+
+    def concat(self, older: "BMRTStore") -> "BMRTStore":
+        """
+        Return a new store containing the results of this store followed by
+        the results of `older`. Each table of this store must be an extension
+        of the corresponding table of `older` (see BMRTStoreBuilder), so that
+        the codes of `older` remain valid.
+        """
+        for name, table in older.tables.items():
+            assert len(self.tables[name]) >= len(table)
+
+        return BMRTStore(
+            ids=np.concatenate((self.ids, older.ids)),
+            svs=np.concatenate((self.svs, older.svs)),
+            started_at=np.concatenate((self.started_at, older.started_at)),
+            non_null_sample_count=np.concatenate(
+                (self.non_null_sample_count, older.non_null_sample_count)
+            ),
+            data_offsets=np.concatenate(
+                (self.data_offsets[:-1], older.data_offsets + self.data_offsets[-1])
+            ),
+            data_values=np.concatenate((self.data_values, older.data_values)),
+            codes={
+                k: np.concatenate((v, older.codes[k])) for k, v in self.codes.items()
+            },
+            tables=self.tables,
+        )
+
+    def nbytes(self) -> int:
+        """
+        Return the size of the arrays in this store, in bytes (not including
+        the tables).
+        """
+        arrays = [
+            self.ids,
+            self.svs,
+            self.started_at,
+            self.non_null_sample_count,
+            self.data_offsets,
+            self.data_values,
+            self.id_argsort,
+        ]
+        arrays.extend(self.codes.values())
+        for order, offsets in self.groupings.values():
+            arrays.extend((order, offsets))
+        return sum(a.nbytes for a in arrays)
+
+    def dedup_bytes_saved(self) -> Dict[str, int]:
+        """
+        For each entity table: the (approximate) number of bytes saved by
+        storing entity attributes once per entity instead of once per result
+        (each result referencing an entity would otherwise hold its own copy
+        of e.g. the context dictionary).
+
+        Cost is proportional to the number of entities, not to the number of
+        results.
+        """
+        saved = {}
+        for name, columns in ENTITY_TABLES.items():
+            counts = np.bincount(
+                self.codes[name], minlength=len(self.tables[columns[0]])
+            )
+            sizes = np.array(
+                [
+                    sum(_deep_sizeof(self.tables[c][code]) for c in columns)
+                    for code in range(len(counts))
+                ],
+                dtype=np.int64,
+            )
+            saved[name] = int(np.sum(sizes * np.maximum(counts - 1, 0)))
+        return saved
+
+
+@dataclasses.dataclass
+class RetentionOutcome:
+    """
+    See BMRTStore.retain().
+    """
+
+    store: BMRTStore
+    n_evicted: int
+    # The effective limit for the number of results per time series (derived
+    # from the memory budget, if that is the tighter limit).
+    max_per_series: Optional[int]
+    # Number of time series that had results evicted as of that limit.
+    n_series_truncated: int
+
+
+def _deep_sizeof(obj) -> int:
+    """
+    Approximate size of `obj` in memory, including the size of the keys and
+    values if `obj` is a dictionary (the values in the entity tables are
+    strings or dictionaries with string keys).
+    """
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            size += sys.getsizeof(k) + _deep_sizeof(v)
+    return size
+
+
+class BMRTStoreBuilder:
+    """
+    Build a BMRTStore, result by result (newest first).
+
+    If `extends` is provided then the tables of the resulting store are
+    extensions of the tables of `extends` (existing entities retain their
+    code).
+
+    If `intern_from` is provided then the attributes of entities of an
+    immutable kind (cases, contexts) that are known in `intern_from` are
+    taken from there (the same objects are shared, and deriving the
+    attributes from the database entity is skipped). Codes are not retained.
+    """
+
+    def __init__(
+        self,
+        extends: Optional[BMRTStore] = None,
+        intern_from: Optional[BMRTStore] = None,
+    ):
+        self._ids: List[str] = []
+        self._svs = array.array("d")
+        self._started_at = array.array("d")
+        self._non_null_sample_count = array.array("i")
+        self._data_lengths = array.array("q")
+        self._data_values = array.array("d")
+        self._codes: Dict[str, array.array] = {
+            name: array.array("i") for name in ENTITY_TABLES
+        }
+
+        self._tables: Dict[str, List] = {}
+        self._code_by_key: Dict[str, Dict[str, int]] = {}
+        for name, columns in ENTITY_TABLES.items():
+            for column in columns:
+                self._tables[column] = (
+                    list(extends.tables[column]) if extends is not None else []
+                )
+            self._code_by_key[name] = {
+                key: code for code, key in enumerate(self._tables[columns[0]])
+            }
+
+        # Per entity table: keys of entities whose attributes are yet to be
+        # set (see `encode_deferred()`).
+        self._deferred: Dict[str, List[str]] = {name: [] for name in ENTITY_TABLES}
+
+        # Per entity table: key -> code in `intern_from`.
+        self._intern_from = intern_from
+        self._interned_code_by_key: Dict[str, Dict[str, int]] = {}
+        if intern_from is not None:
+            for name in _INTERNED_TABLES:
+                self._interned_code_by_key[name] = {
+                    key: code
+                    for code, key in enumerate(
+                        intern_from.tables[ENTITY_TABLES[name][0]]
+                    )
+                }
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def encode(
+        self, table: str, key: str, attrs: Optional[Callable[[], Tuple]] = None
+    ) -> int:
+        """
+        Return the code for the entity identified by `key` in entity table
+        `table`, adding the entity to the table if it is not yet known.
+        `attrs` returns the values for the other columns of that table (only
+        called for an entity not seen before).
+        """
+        code_by_key = self._code_by_key[table]
+        code = code_by_key.get(key)
+        if code is not None:
+            return code
+
+        code = len(code_by_key)
+        code_by_key[key] = code
+        columns = ENTITY_TABLES[table]
+
+        interned_code = self._interned_code_by_key.get(table, {}).get(key)
+        if interned_code is not None:
+            assert self._intern_from is not None
+            tables = self._intern_from.tables
+            values = tuple(tables[c][interned_code] for c in columns)
+        else:
+            values = (key,) + (attrs() if attrs is not None else ())
+        assert len(values) == len(columns)
+        for column, value in zip(columns, values):
+            self._tables[column].append(value)
+        return code
+
+    def encode_deferred(self, table: str, key: str) -> int:
+        """
+        Like `encode()`, but the attributes of an entity not seen before are
+        set later, via `resolve_deferred()`. That allows for fetching the
+        attributes of many entities at once.
+        """
+        if key in self._code_by_key[table] or key in self._interned_code_by_key.get(
+            table, {}
+        ):
+            return self.encode(table, key)
+
+        self._deferred[table].append(key)
+        n_attrs = len(ENTITY_TABLES[table]) - 1
+        return self.encode(table, key, lambda: (None,) * n_attrs)
+
+    def deferred_keys(self, table: str) -> List[str]:
+        """
+        Return the keys of the entities in `table` whose attributes have not
+        been set yet (see `encode_deferred()`).
+        """
+        return list(self._deferred[table])
+
+    def resolve_deferred(self, table: str, attrs_by_key: Mapping[str, Tuple]) -> None:
+        """
+        Set the attributes of the entities in `table` that have been added via
+        `encode_deferred()`. `attrs_by_key` must contain each of these keys.
+        """
+        columns = ENTITY_TABLES[table]
+        for key in self._deferred[table]:
+            code = self._code_by_key[table][key]
+            values = attrs_by_key[key]
+            assert len(values) == len(columns) - 1
+            for column, value in zip(columns[1:], values):
+                self._tables[column][code] = value
+        self._deferred[table] = []
+
+    def add(
+        self,
+        id: str,
+        svs: float,
+        started_at: float,
+        data: List[float],
+        non_null_sample_count: int,
+        codes: Dict[str, int],
+    ) -> None:
+        """
+        `codes`: entity codes (see `encode()`), one for each entity table.
+        """
+        self._ids.append(id)
+        self._svs.append(svs)
+        self._started_at.append(started_at)
+        self._non_null_sample_count.append(non_null_sample_count)
+        self._data_lengths.append(len(data))
+        self._data_values.extend(data)
+        for name, code in codes.items():
+            self._codes[name].append(code)
+
+    def build(self) -> BMRTStore:
+        assert not any(self._deferred.values()), "unresolved entity attributes"
+        return BMRTStore(
+            # Make sure to not create a zero-itemsize array.
+            ids=np.array([i.encode("utf-8") for i in self._ids] or [b""])[
+                : len(self._ids)
+            ],
+            svs=np.frombuffer(self._svs, dtype=np.float64),
+            started_at=np.frombuffer(self._started_at, dtype=np.float64),
+            non_null_sample_count=np.frombuffer(
+                self._non_null_sample_count, dtype=np.int32
+            ),
+            data_offsets=np.concatenate(
+                ([0], np.cumsum(np.frombuffer(self._data_lengths, dtype=np.int64)))
+            ).astype(np.int64),
+            data_values=np.frombuffer(self._data_values, dtype=np.float64),
+            codes={
+                name: np.frombuffer(codes, dtype=np.int32)
+                for name, codes in self._codes.items()
+            },
+            tables=self._tables,
+        )
+
+
+class BMRTBenchmarkResult:
+    """
+    A read-only view on one benchmark result in a BMRTStore.
+
+    There is conceptual duplication between the class BenchmarkResult and this
+    class BMRTBenchmarkResult. Fundamentally, it might make sense that we have
+    two types of classes, with distinct values:
+    - one for database abstraction (the 'big instances', mutable, ...)
+    - one for data mangling (small mem footprint, immutable, ...)
+    """
+
+    __slots__ = ("_s", "_i")
+
+    def __init__(self, store: BMRTStore, i: int):
+        self._s = store
+        self._i = i
+
+    def __repr__(self) -> str:
+        return f"<BMRTBenchmarkResult {self.id}>"
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, BMRTBenchmarkResult):
+            return NotImplemented
+        return self._s is other._s and self._i == other._i
+
+    def __hash__(self) -> int:
+        return hash((id(self._s), self._i))
+
+    @property
+    def id(self) -> str:
+        return self._s.ids[self._i].decode("utf-8")
+
+    @property
+    def svs(self) -> float:
+        return float(self._s.svs[self._i])
+
+    @property
+    def started_at(self) -> float:
+        return float(self._s.started_at[self._i])
+
+    @property
+    def data(self) -> List[float]:
+        start = self._s.data_offsets[self._i]
+        end = self._s.data_offsets[self._i + 1]
+        return self._s.data_values[start:end].tolist()
+
+    @property
+    def benchmark_name(self) -> TBenchmarkName:
+        return self._s.value("benchmark_name", self._i)
+
+    @property
+    def case_id(self) -> str:
+        return self._s.value("case_id", self._i)
+
+    @property
+    def case_text_id(self) -> str:
+        return self._s.value("case_text_id", self._i)
+
+    @property
+    def case_dict(self) -> Dict[str, str]:
+        return self._s.value("case_dict", self._i)
+
+    @property
+    def context_id(self) -> str:
+        return self._s.value("context_id", self._i)
+
+    @property
+    def context_dict(self) -> Dict:
+        return self._s.value("context_dict", self._i)
+
+    @property
+    def hardware_id(self) -> str:
+        return self._s.value("hardware_id", self._i)
+
+    @property
+    def hardware_name(self) -> str:
+        return self._s.value("hardware_name", self._i)
+
+    @property
+    def run_id(self) -> str:
+        return self._s.value("run_id", self._i)
+
+    @property
+    def run_reason(self) -> str:
+        return self._s.value("run_reason", self._i)
+
+    @property
+    def svs_type(self) -> str:
+        return self._s.value("svs_type", self._i)
+
+    @property
+    def unit(self) -> str:
+        return self._s.value("unit", self._i)
+
+    @property
+    def ui_time_started_at(self) -> str:
+        # `started_at` was derived from a tz-naive datetime object (in UTC)
+        # via `.timestamp()`, i.e. `fromtimestamp()` is the inverse.
+        return (
+            datetime.fromtimestamp(self.started_at).strftime("%Y-%m-%d %H:%M:%S")
+            + " UTC"
+        )
+
+    @property
+    def ui_hardware_short(self) -> str:
+        hwid, hwname = self.hardware_id, self.hardware_name
+        if len(hwname) > 15:
+            return f"{hwid[:4]}: " + hwname[:15]
+
+        return f"{hwid[:4]}: " + hwname
+
+    @property
+    def ui_non_null_sample_count(self) -> str:
+        return str(self._s.non_null_sample_count[self._i])
+
+    @property
+    def ui_mean_and_uncertainty(self) -> str:
+        return ui_mean_and_uncertainty(self.data, self.unit)
+
+    @property
+    def ui_rel_sem(self) -> Tuple[str, str]:
+        return ui_rel_sem(self.data)
+
+    @property
+    def started_at_iso(self) -> str:
+        """
+        Add an ISO timestring on the object so that JavaScript's `new
+        Date(input)` can parse this into a tz-aware object.
+        """
+        return conbench.util.tznaive_dt_to_aware_iso8601_for_api(
+            datetime.fromtimestamp(self.started_at)
+        )
+
+
+class ResultList(Sequence):
+    """
+    An immutable sequence of results, backed by an array of row indices.
+    """
+
+    __slots__ = ("_s", "_idx")
+
+    def __init__(self, store: BMRTStore, idx: np.ndarray):
+        self._s = store
+        self._idx = idx
+
+    @property
+    def store(self) -> BMRTStore:
+        return self._s
+
+    @property
+    def indices(self) -> np.ndarray:
+        return self._idx
+
+    def __len__(self) -> int:
+        return len(self._idx)
+
+    def __getitem__(self, i: Union[int, slice]):  # type: ignore[override]
+        if isinstance(i, slice):
+            return ResultList(self._s, self._idx[i])
+        return BMRTBenchmarkResult(self._s, int(self._idx[i]))
+
+    def __iter__(self) -> Iterator[BMRTBenchmarkResult]:
+        s = self._s
+        for i in self._idx.tolist():
+            yield BMRTBenchmarkResult(s, i)
+
+
+class ResultsById(Mapping):
+    """
+    Mapping from result ID to result, via binary search.
+    """
+
+    def __init__(self, store: BMRTStore):
+        self._s = store
+
+    def __getitem__(self, key: str) -> BMRTBenchmarkResult:
+        s = self._s
+        k = key.encode("utf-8")
+        pos = int(np.searchsorted(s.ids, k, sorter=s.id_argsort))
+        if pos < s.n_results:
+            i = int(s.id_argsort[pos])
+            if s.ids[i] == k:
+                return BMRTBenchmarkResult(s, i)
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        for i in range(self._s.n_results):
+            yield self._s.ids[i].decode("utf-8")
+
+    def __len__(self) -> int:
+        return self._s.n_results
+
+    def values(self):  # type: ignore[override]
+        return ResultList(self._s, np.arange(self._s.n_results))
+
+
+class TimeseriesFrame(Mapping):
+    """
+    All time series (one per 4-tuple) of a store in one set of arrays.
+
+    The series are numbered (the series code), in the order of the store's
+    `by_4t` grouping. The arrays `rows`, `started_at` and `svs` hold the data
+    points of all series, sorted by series code and then by time (oldest
+    first). The data points of series `c` are at positions
+    `offsets[c]:offsets[c+1]`.
+
+    This allows for analyzing many time series at once, with vectorized
+    operations (instead of iterating over thousands of tiny dataframes).
+
+    For consumers that look at individual time series this also is a mapping
+    from 4-tuple to time series dataframe (built on access, see
+    `tsdf_from_arrays()`). The arrays are built on first access.
+    """
+
+    def __init__(self, store: BMRTStore, t4s: Sequence[Tt4]):
+        self._s = store
+        # The 4-tuple for each series code.
+        self.t4s = t4s
+        self._dfs: Dict[Tt4, pd.DataFrame] = {}
+
+    @functools.cached_property
+    def code_by_t4(self) -> Dict[Tt4, int]:
+        return {t4: code for code, t4 in enumerate(self.t4s)}
+
+    @functools.cached_property
+    def offsets(self) -> np.ndarray:
+        return self._s.groupings["by_4t"][1]
+
+    @functools.cached_property
+    def series_codes(self) -> np.ndarray:
+        """
+        The series code for each data point.
+        """
+        return np.repeat(
+            np.arange(len(self.t4s), dtype=np.int32), np.diff(self.offsets)
+        )
+
+    @functools.cached_property
+    def rows(self) -> np.ndarray:
+        """
+        The store row index for each data point.
+        """
+        order = self._s.groupings["by_4t"][0]
+        # Within each group, rows are sorted newest first. Sort by time,
+        # oldest first, retaining the grouping.
+        return order[np.lexsort((self._s.started_at[order], self.series_codes))].astype(
+            np.int32
+        )
+
+    @functools.cached_property
+    def started_at(self) -> np.ndarray:
+        return self._s.started_at[self.rows]
+
+    @functools.cached_property
+    def svs(self) -> np.ndarray:
+        return self._s.svs[self.rows]
+
+    @functools.cached_property
+    def benchmark_name_codes(self) -> np.ndarray:
+        """
+        The benchmark name code (see BMRTStore.codes) for each series.
+        """
+        first_rows = self._s.groupings["by_4t"][0][self.offsets[:-1]]
+        return self._s.codes["benchmark_name"][first_rows]
+
+    def codes_for_benchmark_name(self, bname: TBenchmarkName) -> np.ndarray:
+        """
+        Return the codes of the series for benchmark `bname`.
+        """
+        table = self._s.tables["benchmark_name"]
+        try:
+            bcode = table.index(bname)
+        except ValueError:
+            return np.zeros(0, dtype=np.int64)
+        return np.flatnonzero(self.benchmark_name_codes == bcode)
+
+    def frame(self) -> pd.DataFrame:
+        """
+        Return all time series as one dataframe. Index: MultiIndex (series
+        code, time), one column: single value summary.
+        """
+        return pd.DataFrame(
+            {"svs": self.svs},
+            index=pd.MultiIndex.from_arrays(
+                [
+                    self.series_codes,
+                    pd.to_datetime(self.started_at, unit="s", utc=True),
+                ],
+                names=["series", "time"],
+            ),
+        )
+
+    def __getitem__(self, key: Tt4) -> pd.DataFrame:
+        df = self._dfs.get(key)
+        if df is None:
+            code = self.code_by_t4[key]
+            a, b = int(self.offsets[code]), int(self.offsets[code + 1])
+            df = tsdf_from_arrays(self.svs[a:b], self.started_at[a:b])
+            self._dfs[key] = df
+        return df
+
+    def __iter__(self) -> Iterator[Tt4]:
+        return iter(self.t4s)
+
+    def __len__(self) -> int:
+        return len(self.t4s)
+
+
+def t4_for_result(r: BMRTBenchmarkResult) -> Tt4:
+    return (r.benchmark_name, r.case_id, r.context_id, r.hardware_id)
+
+
+def groupings_as_dicts(
+    store: BMRTStore,
+) -> Tuple[
+    Dict[TBenchmarkName, ResultList], Dict[str, ResultList], Dict[Tt4, ResultList]
+]:
+    """
+    Return the groupings of `store` as dictionaries (by benchmark name, by
+    case ID, by 4-tuple). The cost of this is proportional to the number of
+    groups, not to the number of results.
+    """
+    by_name = {
+        cast(TBenchmarkName, g[0].benchmark_name): g
+        for g in store.groups("by_benchmark_name")
+    }
+    by_case_id = {g[0].case_id: g for g in store.groups("by_case_id")}
+    by_4t = {t4_for_result(g[0]): g for g in store.groups("by_4t")}
+    return by_name, by_case_id, by_4t
+
+
+def tsdf_from_arrays(svs, started_at) -> pd.DataFrame:
+    """
+    Build a pandas DataFrame representing a time series from a sequence of
+    single value summaries and a sequence of corresponding (floaty unix
+    timestamp) start times (not necessarily sorted by time). Index:
+    pd.DateTimeIndex (tz-aware), one column: single value summary.
+    """
+    df = pd.DataFrame(
+        {"svs": svs},
+        # Note(jp): The `unit="s"` is the critical ingredient to convert
+        # floaty unix timestamps to datetime representation. `utc=True` is
+        # required to localize the pandas DateTimeIndex to UTC (input is
+        # tz-naive).
+        index=pd.to_datetime(started_at, unit="s", utc=True),
+    )
+    # Sort by time.
+    df = df.sort_index()
+    df.index.rename("time", inplace=True)
+    return df
@@ -29,6 +29,80 @@ class ConfigClass:
     # default.
     DISTRIBUTION_COMMITS = int(os.environ.get("DISTRIBUTION_COMMITS", 100))
 
+    # When this is set (to a directory path, ideally on a tmpfs such as
+    # /dev/shm) then the BMRT cache is not populated by the web application
+    # process itself. Instead, a dedicated cache builder process (started by
+    # gunicorn's master process) publishes snapshots of the cache into this
+    # directory, and each web application process attaches to the most recent
+    # snapshot. That allows for running more than one gunicorn worker process.
+    BMRT_CACHE_SHM_DIR = os.environ.get("CONBENCH_BMRT_CACHE_SHM_DIR") or None
+
+    # When this is set (to a directory path on persistent storage) then the
+    # process building the BMRT cache periodically writes a snapshot of the
+    # cache into this directory. Upon startup, the cache is populated from the
+    # most recent snapshot found there (memory-mapped, takes about a second),
+    # and then updated incrementally. That is, after a restart/deployment the
+    # UI can show the last known state right away.
+    BMRT_CACHE_PERSIST_DIR = os.environ.get("CONBENCH_BMRT_CACHE_PERSIST_DIR") or None
+
+    # Retention policy for the BMRT cache, in addition to the maximum number
+    # of results (BMRT_CACHE_SIZE in job.py). Each limit is disabled when not
+    # set (or set to 0).
+    # - MAX_AGE_DAYS: evict results older than that.
+    # - MAX_RESULTS_PER_SERIES: retain at most that many (the newest) results
+    #   per time series (benchmark name, case, context, hardware).
+    # - MAX_BYTES: approximate memory budget. Enforced by lowering the
+    #   per-series limit, so that time series with many results are truncated
+    #   first and sparse time series retain a long history.
+    BMRT_CACHE_MAX_AGE_DAYS = int(os.environ.get("CONBENCH_BMRT_CACHE_MAX_AGE_DAYS", 0))
+    BMRT_CACHE_MAX_RESULTS_PER_SERIES = int(
+        os.environ.get("CONBENCH_BMRT_CACHE_MAX_RESULTS_PER_SERIES", 0)
+    )
+    BMRT_CACHE_MAX_BYTES = int(os.environ.get("CONBENCH_BMRT_CACHE_MAX_BYTES", 0))
+
+    # In-process state: each (gunicorn worker) process has its own caches
+    # (history, entity primary keys, commit graphs) and its own commit
+    # resolution queue. A write invalidates the caches of the process that
+    # handled it, but not those of other processes: these may serve stale
+    # data until the entry expires (max age settings below), or until the
+    # entry is found to be stale otherwise. Each module documents how it
+    # bounds staleness.
+
+    # In-process LRU cache for benchmark result history (see
+    # conbench/entities/history_cache.py): the maximum number of timeseries
+    # to keep (0 disables the cache), and the maximum age of an entry.
+    HISTORY_CACHE_MAX_ENTRIES = int(
+        os.environ.get("CONBENCH_HISTORY_CACHE_MAX_ENTRIES", 2000)
+    )
+    HISTORY_CACHE_MAX_AGE_SECONDS = float(
+        os.environ.get("CONBENCH_HISTORY_CACHE_MAX_AGE_SECONDS", 300)
+    )
+
+    # In-process LRU cache for the primary keys of Case/Context/Info rows (see
+    # conbench/entities/pk_cache.py): the maximum number of entries (0
+    # disables the cache).
+    ENTITY_PK_CACHE_MAX_ENTRIES = int(
+        os.environ.get("CONBENCH_ENTITY_PK_CACHE_MAX_ENTRIES", 10000)
+    )
+
+    # Maximum age of an in-process commit graph (see
+    # conbench/entities/commit_graph.py). 0 disables the commit graph
+    # (ancestry questions are then answered by database queries).
+    COMMIT_GRAPH_MAX_AGE_SECONDS = float(
+        os.environ.get("CONBENCH_COMMIT_GRAPH_MAX_AGE_SECONDS", 300)
+    )
+
+    # Persist GitHub HTTP API responses in the database, and use conditional
+    # requests for revalidation (see conbench/entities/github_response.py).
+    GITHUB_RESPONSE_CACHE = (
+        os.environ.get("CONBENCH_GITHUB_RESPONSE_CACHE", "true") == "true"
+    )
+    # Cached responses for mutable resources (e.g. repository metadata, pull
+    # requests, comparisons) are deleted after this many days.
+    GITHUB_RESPONSE_CACHE_MAX_AGE_DAYS = float(
+        os.environ.get("CONBENCH_GITHUB_RESPONSE_CACHE_MAX_AGE_DAYS", 7)
+    )
+
     LOG_LEVEL_STDERR = os.environ.get("CONBENCH_LOG_LEVEL_STDERR", "INFO")
     LOG_LEVEL_FILE = None
     LOG_LEVEL_SQLALCHEMY = "WARNING"
@@ -47,6 +121,15 @@ class ConfigClass:
     if os.environ.get("FLASK_ENV") == "development":
         TESTING = True
 
+    # Resolve commit metadata via the GitHub HTTP API in a background thread
+    # instead of during the HTTP request that submits a run/result (see
+    # conbench/entities/commit_resolver.py). Off by default: the work queue is
+    # not persisted, i.e. commits that are pending when the process
+    # terminates stay placeholders until they are referenced again.
+    COMMIT_RESOLUTION_ASYNC = (
+        os.environ.get("CONBENCH_COMMIT_RESOLUTION_ASYNC", "false") == "true"
+    )
+
     def __init__(self):
         self.INTENDED_BASE_URL = self._get_intended_base_url_from_env_or_exit()
         self.OIDC_ISSUER_URL = self._get_oidc_issuer_url_from_env_or_exit()
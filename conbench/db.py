@@ -10,6 +10,7 @@ import tenacity
 from sqlalchemy import create_engine
 
 from .config import Config
+from .entities.pk_cache import entity_pk_cache
 
 engine = None
 session_maker = sqlalchemy.orm.sessionmaker()
@@ -117,6 +118,7 @@ def empty_db_tables():
 
     _session.commit()
     log.debug("all deletions committed: %s", table)
+    entity_pk_cache.clear()
 
 
 def log_after_retry_attempt(retry_state: tenacity.RetryCallState):
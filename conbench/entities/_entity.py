@@ -1,5 +1,5 @@
 import functools
-from typing import Dict, Generic, List, Type, TypeVar
+from typing import Any, Dict, Generic, List, Type, TypeVar
 
 import flask as f
 import sqlalchemy
@@ -14,7 +14,11 @@ from uuid_extensions import uuid7
 
 from conbench.dbsession import current_session
 
-Base = declarative_base()
+from ..entities.pk_cache import entity_pk_cache
+
+# declarative_base() is typed to return Any. Make that explicit, so that mypy
+# does not need to infer it (within an import cycle).
+Base: Any = declarative_base()
 NotNull = functools.partial(mapped_column, nullable=False)
 Nullable = functools.partial(mapped_column, nullable=True)
 
@@ -145,6 +149,7 @@ class EntityMixin(Generic[T]):
     def delete_all(cls):
         current_session.query(cls).delete()
         current_session.commit()
+        entity_pk_cache.invalidate_entity(cls.__name__)
 
     @classmethod
     def create(cls, data):
@@ -176,6 +181,21 @@ class EntityMixin(Generic[T]):
     def delete(self):
         current_session.delete(self)
         current_session.commit()
+        entity_pk_cache.invalidate_entity(self.__class__.__name__)
+
+    @classmethod
+    def get_or_create_id(cls, props: Dict) -> str:
+        """
+        Like get_or_create(), but return the primary key only. Does not query
+        the database if the primary key is cached (see
+        conbench/entities/pk_cache.py).
+        """
+        pk = entity_pk_cache.get(entity_pk_cache.key(cls.__name__, props))
+        if pk is not None:
+            return pk
+
+        obj: Any = cls.get_or_create(props)
+        return obj.id
 
     @classmethod
     def get_or_create(cls: Type[T], props: Dict) -> T:
@@ -185,20 +205,38 @@ class EntityMixin(Generic[T]):
 
         Return (newly created, or previously existing) object, or raise an
         exception.
+
+        The primary key of the object is cached (see
+        conbench/entities/pk_cache.py), i.e. a subsequent call with the same
+        `props` is a primary key lookup.
         """
+        cache_key = entity_pk_cache.key(cls.__name__, props)
+
+        def _cached(obj: Any) -> T:
+            entity_pk_cache.put(cache_key, obj.id)
+            return obj
+
+        pk = entity_pk_cache.get(cache_key)
+        if pk is not None:
+            # Served from the session's identity map if the object is loaded
+            # already. `None` means that the row was deleted.
+            result = current_session.get(cls, pk)
+            if result is not None:
+                return result
+            entity_pk_cache.invalidate(cache_key)
 
         def _fetch_first():
             return current_session.scalars(select(cls).filter_by(**props)).first()
 
         result = _fetch_first()
         if result is not None:
-            return result
+            return _cached(result)
 
         obj = cls(**props)
         current_session.add(obj)
         try:
             current_session.commit()
-            return obj
+            return _cached(obj)
         except sqlalchemy.exc.IntegrityError as exc:
             if "violates unique constraint" not in str(exc):
                 raise
@@ -209,7 +247,7 @@ class EntityMixin(Generic[T]):
         current_session.rollback()
         result = _fetch_first()
         assert result is not None
-        return result
+        return _cached(result)
 
 
 class EntitySerializer:
@@ -1,4 +1,5 @@
 import functools
+import json
 import logging
 import math
 import statistics
@@ -22,6 +23,7 @@ from conbench.numstr import numstr
 
 from ..entities._entity import (
     Base,
+    EntityExists,
     EntityMixin,
     EntitySerializer,
     NotNull,
@@ -32,7 +34,9 @@ from ..entities._entity import (
 from ..entities.case import Case
 from ..entities.commit import TypeCommitInfoGitHub
 from ..entities.context import Context
+from ..entities.distribution_stats import DistributionStats
 from ..entities.hardware import ClusterSchema, MachineSchema
+from ..entities.history_cache import TypeCCHR, history_cache
 from ..entities.info import Info
 from ..entities.run import Run, SchemaGitHubCreate
 
@@ -164,53 +168,7 @@ class BenchmarkResult(Base, EntityMixin):
         validate_run_result_consistency(userres)
 
         # The dict that is used for DB insertion later, populated below.
-        result_data_for_db: Dict = {}
-
-        if "stats" in userres:
-            # First things first: use the complete user-given `stats` object
-            # for potential DB insertion down below. In `error` state, do not
-            # perform deeper validation of the user-given stats object (the
-            # benchmark result is not used for any kind of analysis, which is
-            # why it's probably ok to store the user-given 'stats' object w/o
-            # deeper validation, maybe the data is helpful for debugging). Note
-            # that what the user delivers under the `stats` key as a sub object
-            # (in the result JSON object) is mapped directly on top-level
-            # properties in the Python BenchmarkResult object. That is a bit of
-            # an annoying asymmetry between DB object and JSON representation.
-            result_data_for_db |= userres["stats"]  # PEP 584 update
-
-        # User indicated error with variant A: user-given error object set.
-        if "error" in userres:
-            # We have business logic elsewhere that checks only for presence of
-            # the `error` key (ignores its value, a value of `None` might
-            # elsewhere be interpreted as error -- this did cost me 30 minutes
-            # of debugging).
-            result_data_for_db["error"] = userres["error"]
-
-        # Check for a more subtle error condition based on the per-iteration
-        # samples. Invariant: if "error" is not present then "stats" is present
-        # as a key in this dictionary -- this is schema-enforced. he `stats`
-        # object is guaranteed to have a `data` key.
-        elif do_iteration_samples_look_like_error(userres["stats"]["data"]):
-            # User indicated error with variant B: missing or incomplete data.
-            # User unfortunately did not set `error` explicitly, but we err on
-            # the side auf caution here and treat the result as 'errored'. This
-            # is documented. Set generic error detail.
-            result_data_for_db["error"] = {
-                # Maybe tune this error message to be more generic.
-                "status": "Partial result: not all iterations completed"
-            }
-
-        else:
-            # process_samples_build_agg() must only be called if
-            # do_iteration_samples_look_like_error() returned False. That's
-            # the case here.
-            result_data_from_stats = validate_and_aggregate_samples(userres["stats"])
-
-            # Per-iteration samples looked good, and we did (potentially)
-            # rebuild aggregates. Merge dict `result_stats_data_for_db` on top
-            # of dict `benchmark_result_data`, overwriting upon conflict.
-            result_data_for_db |= result_data_from_stats  # PEP 584 update
+        result_data_for_db = result_data_from_userres(userres)
 
         # See https://github.com/conbench/conbench/issues/935,
         # At this point, assume that data["tags"] is a flat dictionary with
@@ -220,9 +178,9 @@ class BenchmarkResult(Base, EntityMixin):
         benchmark_name = tags.pop("name")
 
         # Create related DB entities if they do not exist yet.
-        case = Case.get_or_create({"name": benchmark_name, "tags": tags})
-        context = Context.get_or_create({"tags": userres["context"]})
-        info = Info.get_or_create({"tags": userres["info"]})
+        case_id = Case.get_or_create_id({"name": benchmark_name, "tags": tags})
+        context_id = Context.get_or_create_id({"tags": userres["context"]})
+        info_id = Info.get_or_create_id({"tags": userres["info"]})
 
         # Create a corresponding `Run` entity in the database if it doesn't
         # exist yet. Use the user-given `id` (string) as primary key. If the
@@ -236,47 +194,155 @@ class BenchmarkResult(Base, EntityMixin):
                 run.has_errors = True
                 run.save()
         else:
-            hardware_info_field = (
-                "machine_info" if "machine_info" in userres else "cluster_info"
-            )
-            Run.create(
-                {
-                    "id": userres["run_id"],
-                    "name": userres.pop("run_name", None),
-                    "reason": userres.pop("run_reason", None),
-                    "github": userres.pop("github", None),
-                    hardware_info_field: userres.pop(hardware_info_field),
-                    "has_errors": "error" in userres,
-                }
-            )
-            # The above's `create()` might fail (race condition), in which case
-            # we can re-read, but then we also have to call
-            # `validate_run_result_consistency(userres)` one more time (because
-            # _we_ are not the ones who created the Run).
-
-        result_data_for_db["run_id"] = userres["run_id"]
-        result_data_for_db["batch_id"] = userres["batch_id"]
-
-        # At this point `data["timestamp"]` is expected to be a tz-aware
-        # datetime object in UTC.
-        result_data_for_db["timestamp"] = userres["timestamp"]
-        result_data_for_db["validation"] = userres.get("validation")
-        result_data_for_db["change_annotations"] = {
-            key: value
-            for key, value in userres.get("change_annotations", {}).items()
-            if value is not None
-        }
-        result_data_for_db["case_id"] = case.id
-        result_data_for_db["optional_benchmark_info"] = userres.get(
-            "optional_benchmark_info"
-        )
-        result_data_for_db["info_id"] = info.id
-        result_data_for_db["context_id"] = context.id
+            # This might lose a race against a concurrent request creating the
+            # same Run. In that case, the Run is re-read and checked for
+            # consistency (because _we_ are not the ones who created the
+            # Run).
+            create_or_read_run_for_result(userres)
+
+        result_data_for_db["case_id"] = case_id
+        result_data_for_db["info_id"] = info_id
+        result_data_for_db["context_id"] = context_id
         benchmark_result = BenchmarkResult(**result_data_for_db)
-        benchmark_result.save()
+        current_session.add(benchmark_result)
+
+        # Errored results are not part of any distribution (history).
+        if benchmark_result.error is None:
+            current_session.flush()
+            timeseries = benchmark_result._timeseries()
+            _invalidate_distribution_stats(timeseries)
+            current_session.commit()
+            _invalidate_history_cache(timeseries)
+        else:
+            current_session.commit()
 
         return benchmark_result
 
+    @staticmethod
+    def create_many(
+        userresults: List[Any],
+    ) -> List[Union["BenchmarkResult", BenchmarkResultValidationError]]:
+        """
+        Like create(), for many user-given results at once (after schema
+        validation of each).
+
+        Return a list with one item per user-given result (same order): the
+        newly created BenchmarkResult, or the BenchmarkResultValidationError
+        for that result. A result that fails validation does not affect the
+        other results.
+
+        Each distinct Case, Context, Info and Run is looked up (or created)
+        once. The results are inserted in a single transaction (SQLAlchemy
+        emits multi-row INSERT statements for that).
+
+        This is not atomic as a whole. Runs (including their Commit
+        and Hardware), Cases, Contexts and Infos are created in separate
+        transactions before the results are inserted, like with create().
+        If inserting the results fails, none of the results is stored, but
+        these related entities may have been stored.
+        """
+        outcomes: List[Any] = [None] * len(userresults)
+        result_data_by_ix: Dict[int, Dict] = {}
+
+        for ix, userres in enumerate(userresults):
+            try:
+                validate_and_augment_result_tags(userres)
+                result_data_by_ix[ix] = result_data_from_userres(userres)
+            except BenchmarkResultValidationError as exc:
+                outcomes[ix] = exc
+
+        # Read the Runs that are known already with one query. Create the
+        # other Runs from the first result that refers to them (that is what
+        # sequential create() calls would do).
+        run_ids = {userresults[ix]["run_id"] for ix in result_data_by_ix}
+        runs: Dict[str, Run] = {
+            run.id: run
+            for run in current_session.scalars(select(Run).where(Run.id.in_(run_ids)))
+        }
+        runs_with_errors = set()
+        for ix in list(result_data_by_ix):
+            userres = userresults[ix]
+            run = runs.get(userres["run_id"])
+            try:
+                if run is None:
+                    runs[userres["run_id"]] = create_or_read_run_for_result(userres)
+                else:
+                    check_run_result_consistency(userres, run)
+            except BenchmarkResultValidationError as exc:
+                outcomes[ix] = exc
+                del result_data_by_ix[ix]
+                continue
+
+            if "error" in userres:
+                runs_with_errors.add(userres["run_id"])
+
+        for run_id in runs_with_errors:
+            if not runs[run_id].has_errors:
+                runs[run_id].has_errors = True
+                current_session.add(runs[run_id])
+        current_session.commit()
+
+        def _key(value: Any) -> str:
+            return json.dumps(value, sort_keys=True, default=str)
+
+        case_ids: Dict[str, str] = {}
+        context_ids: Dict[str, str] = {}
+        info_ids: Dict[str, str] = {}
+        for ix, result_data_for_db in result_data_by_ix.items():
+            userres = userresults[ix]
+            # See create() for the assumptions about `tags`.
+            tags = userres["tags"]
+            benchmark_name = tags.pop("name")
+
+            key = _key([benchmark_name, tags])
+            if key not in case_ids:
+                case_ids[key] = Case.get_or_create_id(
+                    {"name": benchmark_name, "tags": tags}
+                )
+            result_data_for_db["case_id"] = case_ids[key]
+
+            key = _key(userres["context"])
+            if key not in context_ids:
+                context_ids[key] = Context.get_or_create_id(
+                    {"tags": userres["context"]}
+                )
+            result_data_for_db["context_id"] = context_ids[key]
+
+            key = _key(userres["info"])
+            if key not in info_ids:
+                info_ids[key] = Info.get_or_create_id({"tags": userres["info"]})
+            result_data_for_db["info_id"] = info_ids[key]
+
+        benchmark_results: Dict[int, BenchmarkResult] = {
+            ix: BenchmarkResult(**result_data_for_db)
+            for ix, result_data_for_db in result_data_by_ix.items()
+        }
+        current_session.add_all(benchmark_results.values())
+        current_session.flush()
+
+        # Invalidate once per timeseries, in the same transaction. Errored
+        # results are not part of any distribution (history).
+        series: Dict[Tuple[str, str, str], BenchmarkResult] = {}
+        for ix, benchmark_result in benchmark_results.items():
+            outcomes[ix] = benchmark_result
+            if benchmark_result.error is None:
+                series.setdefault(
+                    (
+                        benchmark_result.case_id,
+                        benchmark_result.context_id,
+                        benchmark_result.run_id,
+                    ),
+                    benchmark_result,
+                )
+        timeseries_list = [r._timeseries() for r in series.values()]
+        for timeseries in timeseries_list:
+            _invalidate_distribution_stats(timeseries)
+        current_session.commit()
+        for timeseries in timeseries_list:
+            _invalidate_history_cache(timeseries)
+
+        return outcomes
+
     def update(self, data):
         old_change_annotations = self.change_annotations or {}
 
@@ -292,7 +358,38 @@ class BenchmarkResult(Base, EntityMixin):
             if value is not None
         }
 
-        super().update(data)
+        for field, value in data.items():
+            setattr(self, field, value)
+        current_session.add(self)
+        current_session.flush()
+
+        # For example, `begins_distribution_change` might have been changed.
+        timeseries = self._timeseries()
+        _invalidate_distribution_stats(timeseries)
+        current_session.commit()
+        _invalidate_history_cache(timeseries)
+
+    def delete(self):
+        timeseries = self._timeseries()
+        current_session.delete(self)
+        current_session.flush()
+        _invalidate_distribution_stats(timeseries)
+        current_session.commit()
+        _invalidate_history_cache(timeseries)
+
+    def _timeseries(self) -> Optional["TypeTimeseries"]:
+        """
+        Return the key of the timeseries (history) that this result is part
+        of, and the commit timestamp. Return `None` if this result is not
+        associated with commit context.
+        """
+        run = self.run
+        commit = run.commit
+        if commit is None:
+            return None
+
+        cchr = (self.case_id, self.context_id, run.hardware.hash, commit.repository)
+        return cchr, commit.timestamp
 
     def to_dict_for_json_api(benchmark_result):
         # `self` is just convention :-P
@@ -362,16 +459,7 @@ class BenchmarkResult(Base, EntityMixin):
         The criteria are conventions that we (hopefully) apply consistently
         across components.
         """
-        if self.data is None:
-            return True
-
-        if do_iteration_samples_look_like_error(self.data):
-            return True
-
-        if self.error is not None:
-            return True
-
-        return False
+        return result_is_failed(self.data, self.error)
 
     @property
     def svs(self) -> float:
@@ -426,20 +514,7 @@ class BenchmarkResult(Base, EntityMixin):
         - https://github.com/conbench/conbench/issues/640
         - https://github.com/conbench/conbench/issues/530
         """
-        values = self.measurements
-
-        if not values:
-            return math.nan
-
-        if self.mean is None:
-            # See https://github.com/conbench/conbench/issues/1169 -- Legacy
-            # database might have mean being None _despite the benchmark not
-            # being failed_. Because of a temporary logic error. Let's remove
-            # this code path again for sanity. `values` (from
-            # self.measurements) has only numbers.
-            return statistics.mean(values)
-
-        return float(self.mean)
+        return result_svs(self.measurements, self.mean)
 
     @functools.cached_property
     def measurements(self) -> List[float]:
@@ -457,22 +532,7 @@ class BenchmarkResult(Base, EntityMixin):
         We also may want to instruct SQLAlchemy to return numbers as floats
         directly.
         """
-        if self.is_failed:
-            return []
-
-        # The following two asserts explicitly document two assumptions that we
-        # rely on to be valid after is_failed returned False. Also, these the
-        # first assert statements is piicked up by mypy for type inference.
-        # Note that `assert all(d is not None for d in self.data)` did not help
-        # mypy narrow down the type. See
-        # https://github.com/python/mypy/issues/15180. To keep keep the
-        # feedback tight I have now chosen the `if d is not None` plus length
-        # constraint check, which should overall not have noticeable
-        # performance impact.
-        assert self.data is not None
-        result = [float(d) for d in self.data if d is not None]
-        assert len(result) == len(self.data)
-        return result
+        return result_measurements(self.data, self.error)
 
     @functools.cached_property
     def ui_mean_and_uncertainty(self) -> str:
@@ -516,6 +576,64 @@ class BenchmarkResult(Base, EntityMixin):
         return f"{hw.id[:4]}: " + hw.name
 
 
+def result_is_failed(data: Optional[List[Optional[Decimal]]], error: Any) -> bool:
+    """
+    See BenchmarkResult.is_failed. Module-level function for code paths that
+    fetch individual columns from the database instead of BenchmarkResult
+    objects (e.g. the BMRT cache).
+    """
+    if data is None:
+        return True
+
+    if do_iteration_samples_look_like_error(data):
+        return True
+
+    if error is not None:
+        return True
+
+    return False
+
+
+def result_measurements(
+    data: Optional[List[Optional[Decimal]]], error: Any
+) -> List[float]:
+    """
+    See BenchmarkResult.measurements.
+    """
+    if result_is_failed(data, error):
+        return []
+
+    # The following two asserts explicitly document two assumptions that we
+    # rely on to be valid after result_is_failed() returned False. Also, these
+    # the first assert statements is piicked up by mypy for type inference.
+    # Note that `assert all(d is not None for d in data)` did not help mypy
+    # narrow down the type. See https://github.com/python/mypy/issues/15180.
+    # To keep keep the feedback tight I have now chosen the `if d is not None`
+    # plus length constraint check, which should overall not have noticeable
+    # performance impact.
+    assert data is not None
+    result = [float(d) for d in data if d is not None]
+    assert len(result) == len(data)
+    return result
+
+
+def result_svs(measurements: List[float], mean: Optional[Any]) -> float:
+    """
+    See BenchmarkResult._single_value_summary.
+    """
+    if not measurements:
+        return math.nan
+
+    if mean is None:
+        # See https://github.com/conbench/conbench/issues/1169 -- Legacy
+        # database might have mean being None _despite the benchmark not
+        # being failed_. Because of a temporary logic error. Let's remove
+        # this code path again for sanity. `measurements` has only numbers.
+        return statistics.mean(measurements)
+
+    return float(mean)
+
+
 def ui_rel_sem(values: List[float]):
     """
     The first string in the tuple is a stringified float for sorting in a
@@ -584,6 +702,81 @@ def ui_mean_and_uncertainty(values: List[float], unit: str):
     return f"({mean_uncertainty_str}) {unit}"
 
 
+def result_data_from_userres(userres: Any) -> Dict:
+    """
+    Return the properties of the BenchmarkResult DB object that are derived
+    from the user-given result `userres`: all but the references to Case,
+    Context and Info.
+
+    Raises BenchmarkResultValidationError.
+    """
+    result_data_for_db: Dict = {}
+
+    if "stats" in userres:
+        # First things first: use the complete user-given `stats` object
+        # for potential DB insertion down below. In `error` state, do not
+        # perform deeper validation of the user-given stats object (the
+        # benchmark result is not used for any kind of analysis, which is
+        # why it's probably ok to store the user-given 'stats' object w/o
+        # deeper validation, maybe the data is helpful for debugging). Note
+        # that what the user delivers under the `stats` key as a sub object
+        # (in the result JSON object) is mapped directly on top-level
+        # properties in the Python BenchmarkResult object. That is a bit of
+        # an annoying asymmetry between DB object and JSON representation.
+        result_data_for_db |= userres["stats"]  # PEP 584 update
+
+    # User indicated error with variant A: user-given error object set.
+    if "error" in userres:
+        # We have business logic elsewhere that checks only for presence of
+        # the `error` key (ignores its value, a value of `None` might
+        # elsewhere be interpreted as error -- this did cost me 30 minutes
+        # of debugging).
+        result_data_for_db["error"] = userres["error"]
+
+    # Check for a more subtle error condition based on the per-iteration
+    # samples. Invariant: if "error" is not present then "stats" is present
+    # as a key in this dictionary -- this is schema-enforced. he `stats`
+    # object is guaranteed to have a `data` key.
+    elif do_iteration_samples_look_like_error(userres["stats"]["data"]):
+        # User indicated error with variant B: missing or incomplete data.
+        # User unfortunately did not set `error` explicitly, but we err on
+        # the side auf caution here and treat the result as 'errored'. This
+        # is documented. Set generic error detail.
+        result_data_for_db["error"] = {
+            # Maybe tune this error message to be more generic.
+            "status": "Partial result: not all iterations completed"
+        }
+
+    else:
+        # process_samples_build_agg() must only be called if
+        # do_iteration_samples_look_like_error() returned False. That's
+        # the case here.
+        result_data_from_stats = validate_and_aggregate_samples(userres["stats"])
+
+        # Per-iteration samples looked good, and we did (potentially)
+        # rebuild aggregates. Merge dict `result_stats_data_for_db` on top
+        # of dict `benchmark_result_data`, overwriting upon conflict.
+        result_data_for_db |= result_data_from_stats  # PEP 584 update
+
+    result_data_for_db["run_id"] = userres["run_id"]
+    result_data_for_db["batch_id"] = userres["batch_id"]
+
+    # At this point `data["timestamp"]` is expected to be a tz-aware
+    # datetime object in UTC.
+    result_data_for_db["timestamp"] = userres["timestamp"]
+    result_data_for_db["validation"] = userres.get("validation")
+    result_data_for_db["change_annotations"] = {
+        key: value
+        for key, value in userres.get("change_annotations", {}).items()
+        if value is not None
+    }
+    result_data_for_db["optional_benchmark_info"] = userres.get(
+        "optional_benchmark_info"
+    )
+
+    return result_data_for_db
+
+
 def validate_and_aggregate_samples(stats_usergiven: Any):
     """
     Raises BenchmarkResultValidationError upon logical inconsistencies.
@@ -756,6 +949,44 @@ def do_iteration_samples_look_like_error(samples: List[Optional[Decimal]]) -> bo
     return False
 
 
+# The key of a timeseries, and the commit timestamp of a result in it (see
+# BenchmarkResult._timeseries()).
+TypeTimeseries = Tuple[TypeCCHR, Optional[datetime]]
+
+
+def _invalidate_distribution_stats(timeseries: Optional[TypeTimeseries]) -> None:
+    """
+    Delete the persisted distribution stats that a result in `timeseries` is
+    (or was) potentially part of, see conbench/entities/distribution_stats.py.
+
+    Must be called after writing the result, in the same transaction. Does not
+    commit.
+    """
+    if timeseries is None:
+        return
+
+    (case_id, context_id, hardware_hash, repository), commit_timestamp = timeseries
+    if commit_timestamp is None:
+        # Not part of any commit ancestry, i.e. not part of any distribution.
+        return
+
+    DistributionStats.invalidate(
+        repository=repository,
+        since=commit_timestamp,
+        case_id=case_id,
+        context_id=context_id,
+        hardware_hash=hardware_hash,
+    )
+
+
+def _invalidate_history_cache(timeseries: Optional[TypeTimeseries]) -> None:
+    """
+    Must be called after committing the write of a result in `timeseries`.
+    """
+    if timeseries is not None:
+        history_cache.invalidate(timeseries[0])
+
+
 def validate_and_augment_result_tags(userres: Any):
     """
     Inspect and mutate userres['tags']. After that, all keys are non-empty
@@ -824,6 +1055,48 @@ def validate_and_augment_result_tags(userres: Any):
             )
 
 
+def create_run_for_result(userres: Any) -> Run:
+    """
+    Create the Run that the user-given result `userres` refers to, from the
+    run-specific properties of that result (this pops them from `userres`).
+
+    Raises EntityExists if the Run exists already.
+    """
+    hardware_info_field = (
+        "machine_info" if "machine_info" in userres else "cluster_info"
+    )
+    return Run.create(
+        {
+            "id": userres["run_id"],
+            "name": userres.pop("run_name", None),
+            "reason": userres.pop("run_reason", None),
+            "github": userres.pop("github", None),
+            hardware_info_field: userres.pop(hardware_info_field),
+            "has_errors": "error" in userres,
+        }
+    )
+
+
+def create_or_read_run_for_result(userres: Any) -> Run:
+    """
+    Like create_run_for_result(). If the Run exists already (created
+    concurrently), read it and check it for consistency with `userres`.
+
+    Raises BenchmarkResultValidationError in case of a mismatch.
+    """
+    # create_run_for_result() pops the run-specific properties.
+    userres_before = dict(userres)
+    try:
+        return create_run_for_result(userres)
+    except EntityExists:
+        current_session.rollback()
+
+    run = current_session.get(Run, userres["run_id"])
+    assert run is not None
+    check_run_result_consistency(userres_before, run)
+    return run
+
+
 def validate_run_result_consistency(userres: Any) -> None:
     """
     Read Run from database, based on userres["run_id"].
@@ -844,6 +1117,14 @@ def validate_run_result_consistency(userres: Any) -> None:
     if run is None:
         return
 
+    check_run_result_consistency(userres, run)
+
+
+def check_run_result_consistency(userres: Any, run: Run) -> None:
+    """
+    Like validate_run_result_consistency(), for a Run that was read from the
+    database before.
+    """
     # TODO: specification -- if userres.get("github") is None and if the Run
     # has associated commit information -- then consider this as a conflict or
     # not? what about branch name and PR number?
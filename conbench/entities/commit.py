@@ -25,6 +25,10 @@ from ..entities._entity import (
     Nullable,
     genprimkey,
 )
+from ..entities.commit_graph import CommitGraph, TypeCommitGraphRow, commit_graphs
+from ..entities.distribution_stats import DistributionStats
+from ..entities.github_response import GitHubResponse
+from ..entities.history_cache import history_cache
 
 log = logging.getLogger(__name__)
 
@@ -85,19 +89,148 @@ class Commit(Base, EntityMixin):
     # further down we use `.label()` which seems to be sqlalchemy-specific
     timestamp: Mapped[Optional[datetime]] = Nullable(s.DateTime(timezone=False))
 
+    # Position of this commit in the default branch's history of this
+    # repository (1 for the oldest commit known to Conbench, by timestamp).
+    # `None` for commits that are not on the default branch, or that do not
+    # have a timestamp. Maintained by `update_commit_order()` upon commit
+    # insertion. This allows for the "last N ancestors" questions (see
+    # commit_ancestry_query) to be answered with an index range scan.
+    commit_order: Mapped[Optional[int]] = Nullable(s.BigInteger)
+
     # Form a one-to-many relationship between Commit (one) and potentially
     # many Runs.
     runs: Mapped[List["Run"]] = relationship(back_populates="commit")  # type: ignore  # noqa
 
+    @classmethod
+    def create(cls, data):
+        commit = super().create(data)
+        commit._invalidate_dependents()
+        return commit
+
+    def update_github_context(self, github: dict) -> None:
+        """
+        Fill in the metadata fetched from GitHub (see
+        get_github_commit_metadata()) for a commit that was inserted via
+        create_unknown_context(). See conbench/entities/commit_resolver.py.
+        """
+        self.update(
+            {
+                "branch": github["branch"],
+                "fork_point_sha": github["fork_point_sha"],
+                "parent": github["parent"],
+                "timestamp": github["date"],
+                "message": github["message"],
+                "author_name": github["author_name"],
+                "author_login": github["author_login"],
+                "author_avatar": github["author_avatar"],
+            }
+        )
+        # Depends on the fork point.
+        self.__dict__.pop("on_default_branch", None)
+        self._invalidate_dependents()
+        # Results for this commit were not part of any history so far (that
+        # requires a commit timestamp).
+        history_cache.invalidate_repository(self.repository)
+
+    def _invalidate_dependents(self) -> None:
+        """
+        Must be called after inserting this commit, or after changing its
+        position in the commit graph.
+        """
+        commit_graphs.invalidate(self.repository)
+        if self.timestamp is not None:
+            if self.on_default_branch:
+                self.update_commit_order(self.repository, self.timestamp)
+            # The new commit might now be part of the commit ancestry (window)
+            # of commits with a later timestamp.
+            DistributionStats.invalidate(self.repository, self.timestamp)
+            current_session.commit()
+
+    @classmethod
+    def update_commit_order(cls, repository: str, since: datetime) -> None:
+        """
+        (Re-)number the default-branch commits in `repository` with a
+        timestamp at or after `since`. Must be called after inserting
+        default-branch commits, with `since` being the oldest timestamp among
+        them.
+
+        For the typical case (a new commit that is newer than all other
+        commits) this updates precisely one row. Commits inserted into the
+        middle of the history (backfill) shift the order of later commits.
+
+        Does not commit the transaction; that is left to the caller.
+
+        Concurrent insertion may temporarily result in two commits
+        with the same `commit_order`; the next insertion corrects that. Ties
+        in the timestamp are broken by commit ID, i.e. arbitrarily, but
+        consistently.
+        """
+        on_default_branch = [
+            cls.repository == repository,
+            cls.sha == cls.fork_point_sha,
+            cls.timestamp.isnot(None),
+        ]
+        n_older = (
+            s.select(s.func.count())
+            .select_from(cls)
+            .filter(*on_default_branch, cls.timestamp < since)
+            .scalar_subquery()
+        )
+        ranked = (
+            s.select(
+                cls.id,
+                (
+                    s.func.row_number().over(order_by=(cls.timestamp, cls.id)) + n_older
+                ).label("commit_order"),
+            )
+            .filter(*on_default_branch, cls.timestamp >= since)
+            .subquery()
+        )
+        current_session.execute(
+            s.update(cls)
+            .where(
+                cls.id == ranked.c.id,
+                cls.commit_order.is_distinct_from(ranked.c.commit_order),
+            )
+            .values(commit_order=ranked.c.commit_order)
+            .execution_options(synchronize_session=False)
+        )
+
     def get_parent_commit(self):
         # Hm -- should this not be done with a foreign key relationship?
-        return Commit.first(sha=self.parent, repository=self.repository)
+        if not commit_graphs.enabled:
+            return Commit.first(sha=self.parent, repository=self.repository)
+
+        graph = self.commit_graph
+        return self._get_by_graph_index(graph, graph.parent_ix[graph.index(self.sha)])
 
     def get_fork_point_commit(self) -> Optional["Commit"]:
         if self.sha == self.fork_point_sha:
             return self
-        else:
+        elif not commit_graphs.enabled:
             return Commit.first(sha=self.fork_point_sha, repository=self.repository)
+        else:
+            graph = self.commit_graph
+            return self._get_by_graph_index(
+                graph, graph.fork_point_ix[graph.index(self.sha)]
+            )
+
+    @property
+    def commit_graph(self) -> CommitGraph:
+        """
+        The (in-process) commit graph of this commit's repository, see
+        conbench/entities/commit_graph.py. Guaranteed to contain this commit.
+        """
+        return commit_graphs.get(
+            self.repository, _load_commit_graph_rows, require_sha=self.sha
+        )
+
+    @staticmethod
+    def _get_by_graph_index(graph: CommitGraph, ix: int) -> Optional["Commit"]:
+        if ix < 0:
+            return None
+        # Does not emit a query if the Commit is in the session's identity map.
+        return current_session.get(Commit, graph.ids[ix])
 
     @cached_property
     def on_default_branch(self) -> bool:
@@ -186,6 +319,8 @@ class Commit(Base, EntityMixin):
         direct ancestry of this commit, all the way back to the initial commit. Also
         returns whether the commit is on the default branch, and an ordering column.
 
+        See get_commit_ancestry_query() for limiting this to the last N commits.
+
         This is mostly used as an unordered subquery; e.g.
         ``subquery = commit.commit_ancestry_query.subquery()``. You may take advantage
         of this subquery's ``commit_order`` column to order by lineage. For example,
@@ -224,6 +359,19 @@ class Commit(Base, EntityMixin):
         E2 :  E2, C2, F, D, B, A
         G  :  G, F, D, B, A
 
+        Might raise CantFindAncestorCommitsError.
+        """
+        return self.get_commit_ancestry_query()
+
+    def get_commit_ancestry_query(self, max_commits: Optional[int] = None) -> Query:
+        """
+        See commit_ancestry_query.
+
+        If `max_commits` is set, the query may leave out commits that are more
+        than `max_commits` commits back in the ancestry; i.e. when ordering by
+        `commit_order` descending, the first `max_commits` rows are the same
+        as without `max_commits`.
+
         Might raise CantFindAncestorCommitsError.
         """
         if not self.branch:
@@ -233,31 +381,91 @@ class Commit(Base, EntityMixin):
         if not self.fork_point_sha:
             raise CantFindAncestorCommitsError("commit fork_point_sha is null")
 
+        if not commit_graphs.enabled:
+            return self._commit_ancestry_query_from_db(max_commits)
+
+        graph = self.commit_graph
+        fp_ix = graph.fork_point_ix[graph.index(self.sha)]
+        if fp_ix < 0:
+            raise CantFindAncestorCommitsError("the fork point commit isn't in the db")
+        if not graph.timestamps[fp_ix]:
+            raise CantFindAncestorCommitsError("fork_point_commit timestamp is null")
+        if graph.commit_order(fp_ix) is None:
+            raise CantFindAncestorCommitsError("fork_point_commit order is null")
+
+        # The ancestry is determined from the in-process commit graph (default
+        # branch commits before/including the fork point, plus commits on this
+        # commit's branch since the fork point), and passed to the database as
+        # a VALUES list.
+        ancestry = s.values(
+            s.column("ancestor_id", s.String),
+            s.column("ancestor_timestamp", s.DateTime),
+            s.column("on_default_branch", s.Boolean),
+            s.column("commit_order", s.BigInteger),
+            name="commit_ancestry",
+        ).data(graph.ancestry(graph.index(self.sha), max_commits))
+
+        return current_session.query(ancestry)
+
+    def _commit_ancestry_query_from_db(self, max_commits: Optional[int]) -> Query:
+        """
+        See get_commit_ancestry_query(). Without the commit graph: for the
+        default branch part of the ancestry, this is a range scan on the
+        `commit_order` index.
+        """
         fork_point_commit = self.get_fork_point_commit()
         if not fork_point_commit:
             raise CantFindAncestorCommitsError("the fork point commit isn't in the db")
         if not fork_point_commit.timestamp:
             raise CantFindAncestorCommitsError("fork_point_commit timestamp is null")
 
-        # Get default branch commits before/including the fork point
+        if fork_point_commit.commit_order is None:
+            raise CantFindAncestorCommitsError("fork_point_commit order is null")
+
+        # Get default branch commits before/including the fork point. That
+        # includes the default branch commits with the same timestamp as the
+        # fork point, regardless of their commit order: the range ends right
+        # before the first newer default branch commit (if any). Both
+        # subqueries are answered from the `commit_order` index, typically
+        # after looking at one row.
+        in_repo = [Commit.repository == self.repository]
+        next_newer_order = (
+            s.select(s.func.min(Commit.commit_order))
+            .filter(
+                *in_repo,
+                Commit.commit_order > fork_point_commit.commit_order,
+                Commit.timestamp > fork_point_commit.timestamp,
+            )
+            .scalar_subquery()
+        )
+        max_order = (
+            s.select(s.func.max(Commit.commit_order)).filter(*in_repo).scalar_subquery()
+        )
+        fp_order: int = current_session.scalar(
+            s.select(s.func.coalesce(next_newer_order - 1, max_order))
+        )
+        order_range = [Commit.commit_order <= fp_order]
+        if max_commits is not None:
+            order_range.append(Commit.commit_order > fp_order - max_commits)
+
         query = current_session.query(
             Commit.id.label("ancestor_id"),
             Commit.timestamp.label("ancestor_timestamp"),
             s.sql.expression.literal(True, s.Boolean).label("on_default_branch"),
-            s.func.concat("1_", Commit.timestamp).label("commit_order"),
-        ).filter(
-            Commit.repository == self.repository,
-            Commit.sha == Commit.fork_point_sha,  # aka: on default branch
-            Commit.timestamp <= fork_point_commit.timestamp,
-        )
+            Commit.commit_order.label("commit_order"),
+        ).filter(Commit.repository == self.repository, *order_range)
 
-        # If this commit is on a non-default branch, add all commits since the fork point
+        # If this commit is on a non-default branch, add all commits since the
+        # fork point. These are ordered by timestamp, after the fork point.
         if self != fork_point_commit:
             branch_query = current_session.query(
                 Commit.id.label("ancestor_id"),
                 Commit.timestamp.label("ancestor_timestamp"),
                 s.sql.expression.literal(False, s.Boolean).label("on_default_branch"),
-                s.func.concat("2_", Commit.timestamp).label("commit_order"),
+                (
+                    s.func.row_number().over(order_by=(Commit.timestamp, Commit.id))
+                    + fp_order
+                ).label("commit_order"),
             ).filter(
                 Commit.repository == self.repository,
                 Commit.branch == self.branch,
@@ -320,6 +528,26 @@ s.Index(
     unique=True,
 )
 
+# For ancestry (range) queries, see Commit.get_commit_ancestry_query().
+s.Index("commit_repository_order_index", Commit.repository, Commit.commit_order)
+
+
+def _load_commit_graph_rows(repository: str) -> List[TypeCommitGraphRow]:
+    return (
+        current_session.execute(
+            s.select(
+                Commit.id,
+                Commit.sha,
+                Commit.parent,
+                Commit.branch,
+                Commit.fork_point_sha,
+                Commit.timestamp,
+            ).filter(Commit.repository == repository)
+        )
+        .tuples()
+        .all()
+    )
+
 
 class _Serializer(EntitySerializer):
     def _dump(self, commit):
@@ -541,6 +769,10 @@ def backfill_default_branch_commits(repo_url: str, new_commit: Commit) -> None:
                 for commit_info in commits_to_try
             ]
         )
+        Commit.update_commit_order(repo_url, since)
+        DistributionStats.invalidate(repo_url, since)
+        current_session.commit()
+        commit_graphs.invalidate(repo_url)
 
 
 class GitHubHTTPApiClient:
@@ -840,8 +1072,22 @@ class GitHubHTTPApiClient:
         seconds) and the retrying method below must come to a conclusion before
         that.
 
+        Use the response cache (see conbench/entities/github_response.py):
+        serve immutable resources from the cache, and revalidate other cached
+        responses with a conditional request.
+
         Return deserialized JSON-structure or raise an exception.
         """
+        cached: Optional[GitHubResponse] = None
+        if GitHubResponse.cacheable(url):
+            cached = GitHubResponse.lookup(url)
+            if cached is not None and cached.immutable:
+                metrics.COUNTER_GITHUB_HTTP_API_CACHE_LOOKUPS.labels(
+                    outcome="hit"
+                ).inc()
+                metrics.COUNTER_GITHUB_HTTP_API_QUOTA_SAVED.inc()
+                return cached.body
+
         timeout_seconds = 20
 
         t0 = time.monotonic()
@@ -857,7 +1103,7 @@ class GitHubHTTPApiClient:
         while time.monotonic() < deadline:
             attempt += 1
 
-            result = self._get_response_retry_guts(url)
+            result = self._get_response_retry_guts(url, cached)
 
             if result is not None:
                 return result
@@ -882,11 +1128,24 @@ class GitHubHTTPApiClient:
             f"_get_response(): deadline exceeded, giving up after {time.monotonic()-t0:.3f} s"
         )
 
-    def _get_response_retry_guts(self, url) -> Optional[dict]:
+    def _get_response_retry_guts(
+        self, url, cached: Optional[GitHubResponse] = None
+    ) -> Optional[dict]:
         """
         Return deserialized JSON-structure or raise an exception or return
         `None` which indicates a retryable error.
+
+        If `cached` is given then send a conditional request, and return the
+        cached body upon 304 response.
         """
+        headers: Dict[str, str] = {}
+        if self._current_auth_token:
+            headers["Authorization"] = f"Bearer { self._current_auth_token}"
+        if cached is not None:
+            if cached.etag:
+                headers["If-None-Match"] = cached.etag
+            if cached.last_modified:
+                headers["If-Modified-Since"] = cached.last_modified
 
         # This counter is meant to count _attempts_. Errors (failed attempts)
         # are counted separately
@@ -898,13 +1157,7 @@ class GitHubHTTPApiClient:
             # has a little bit of retrying built-in by default for some of
             # these errors, but it's not trying too hard. Add more retrying
             # on top of that.
-            if self._current_auth_token:
-                resp = requests.get(
-                    url,
-                    headers={"Authorization": f"Bearer { self._current_auth_token}"},
-                )
-            else:
-                resp = requests.get(url)
+            resp = requests.get(url, headers=headers)
 
         except requests.exceptions.RequestException as exc:
             metrics.COUNTER_GITHUB_HTTP_API_RETRYABLE_ERRORS.inc()
@@ -929,7 +1182,26 @@ class GitHubHTTPApiClient:
             # This may raise an exception if JSON-deserialization fails. If
             # JSON deser succeeds then this is known to be a dict at the outest
             # level.
-            return resp.json()
+            body = resp.json()
+            if GitHubResponse.cacheable(url):
+                metrics.COUNTER_GITHUB_HTTP_API_CACHE_LOOKUPS.labels(
+                    outcome="miss" if cached is None else "stale"
+                ).inc()
+                GitHubResponse.store(
+                    url,
+                    etag=resp.headers.get("etag"),
+                    last_modified=resp.headers.get("last-modified"),
+                    body=body,
+                )
+            return body
+
+        if resp.status_code == 304 and cached is not None:
+            metrics.COUNTER_GITHUB_HTTP_API_CACHE_LOOKUPS.labels(
+                outcome="revalidated"
+            ).inc()
+            if "Authorization" in headers:
+                metrics.COUNTER_GITHUB_HTTP_API_QUOTA_SAVED.inc()
+            return cached.body
 
         # Log code and body prefix: important for debuggability.
         log.info(
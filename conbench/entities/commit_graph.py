@@ -0,0 +1,237 @@
+"""
+An in-process, per-repository representation of the commit graph, for
+answering commit ancestry questions (see Commit.get_commit_ancestry_query(),
+Commit.get_parent_commit(), Commit.get_fork_point_commit()) without database
+round trips.
+
+The graph for a repository is loaded with one database query (upon first
+use), and dropped when a commit is inserted into that repository (see
+Commit.create() and backfill_default_branch_commits()).
+
+Invalidation does not reach the graphs of other processes (see the note on
+in-process state in conbench/config.py). A graph therefore also expires
+after a maximum age, and it is reloaded when it does not contain the commit
+that a question is asked about (that commit is in the database, i.e. the
+graph is stale). Commits inserted by another process into the middle of the
+history (backfill) may be missing from the graph until it expires.
+"""
+import array
+import bisect
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from conbench import metrics
+
+from ..config import Config
+
+# (id, sha, parent sha, branch, fork point sha, timestamp), as stored in the
+# database.
+TypeCommitGraphRow = Tuple[
+    str, str, Optional[str], Optional[str], Optional[str], Optional[datetime]
+]
+
+# (ancestor commit id, ancestor timestamp, on default branch, commit order),
+# see Commit.commit_ancestry_query.
+TypeAncestor = Tuple[str, Optional[datetime], bool, int]
+
+
+class CommitGraph:
+    """
+    The commits of one repository. Commits are addressed by their integer
+    index in the arrays below.
+
+    Immutable after construction (a new commit requires a new graph).
+    """
+
+    def __init__(self, rows: Iterable[TypeCommitGraphRow]) -> None:
+        self.ids: List[str] = []
+        self.shas: List[str] = []
+        self.branches: List[Optional[str]] = []
+        self.fork_point_shas: List[Optional[str]] = []
+        self.timestamps: List[Optional[datetime]] = []
+        parent_shas: List[Optional[str]] = []
+
+        for cid, sha, parent, branch, fork_point_sha, timestamp in rows:
+            self.ids.append(cid)
+            self.shas.append(sha)
+            parent_shas.append(parent)
+            self.branches.append(branch)
+            self.fork_point_shas.append(fork_point_sha)
+            self.timestamps.append(timestamp)
+
+        self._ix_by_sha: Dict[str, int] = {sha: ix for ix, sha in enumerate(self.shas)}
+
+        # Index of the parent and of the fork point commit, -1 if that commit
+        # is not known.
+        self.parent_ix = array.array(
+            "l", (self._ix_by_sha.get(p, -1) if p else -1 for p in parent_shas)
+        )
+        self.fork_point_ix = array.array(
+            "l",
+            (self._ix_by_sha.get(f, -1) if f else -1 for f in self.fork_point_shas),
+        )
+
+        def _key(ix: int) -> Tuple[datetime, str]:
+            ts = self.timestamps[ix]
+            assert ts is not None
+            return ts, self.ids[ix]
+
+        # Default-branch commits with a timestamp, oldest first. The 1-based
+        # position in this list is the commit order (equivalent to
+        # Commit.commit_order).
+        self._default_ixs = sorted(
+            (
+                ix
+                for ix in range(len(self.ids))
+                if self.shas[ix] == self.fork_point_shas[ix]
+                and self.timestamps[ix] is not None
+            ),
+            key=_key,
+        )
+        self._order = array.array("l", [0]) * len(self.ids)
+        for pos, ix in enumerate(self._default_ixs, start=1):
+            self._order[ix] = pos
+        # Their timestamps (for bisection).
+        self._default_timestamps = [_key(ix)[0] for ix in self._default_ixs]
+
+        # Branch commits (with a timestamp) by (branch, fork point), oldest
+        # first.
+        self._branch_ixs: Dict[Tuple[Optional[str], Optional[str]], List[int]] = {}
+        for ix in range(len(self.ids)):
+            if self.timestamps[ix] is not None:
+                self._branch_ixs.setdefault(
+                    (self.branches[ix], self.fork_point_shas[ix]), []
+                ).append(ix)
+        # Their timestamps (for bisection).
+        self._branch_timestamps: Dict[
+            Tuple[Optional[str], Optional[str]], List[datetime]
+        ] = {}
+        for key, ixs in self._branch_ixs.items():
+            ixs.sort(key=_key)
+            self._branch_timestamps[key] = [_key(ix)[0] for ix in ixs]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, sha: str) -> bool:
+        return sha in self._ix_by_sha
+
+    def index(self, sha: Optional[str]) -> int:
+        """
+        Return the index of the commit, or -1 if it is not known.
+        """
+        if sha is None:
+            return -1
+        return self._ix_by_sha.get(sha, -1)
+
+    def commit_order(self, ix: int) -> Optional[int]:
+        """
+        Return the position of this commit in the default branch history
+        (oldest: 1), or `None` if this is not a default-branch commit.
+        """
+        return self._order[ix] or None
+
+    def ancestry(
+        self, ix: int, max_commits: Optional[int] = None
+    ) -> List[TypeAncestor]:
+        """
+        Return the ancestry of commit `ix`, newest first. See
+        Commit.commit_ancestry_query for the semantics.
+
+        The fork point of the commit must be known and be on the default
+        branch. If `max_commits` is set, return at most that many ancestors.
+        """
+        fp_ix = self.fork_point_ix[ix]
+        assert self._order[fp_ix] > 0
+        # Default-branch commits with the same timestamp as the fork point are
+        # part of the ancestry, too (regardless of their commit order).
+        fp_ts = self.timestamps[fp_ix]
+        assert fp_ts is not None
+        fp_order = bisect.bisect_right(self._default_timestamps, fp_ts)
+
+        result: List[TypeAncestor] = []
+
+        if ix != fp_ix:
+            # Commits on this branch since the fork point, up to this commit.
+            ts = self.timestamps[ix]
+            assert ts is not None
+            key = (self.branches[ix], self.fork_point_shas[ix])
+            branch_ixs = self._branch_ixs.get(key, [])
+            end = bisect.bisect_right(self._branch_timestamps.get(key, []), ts)
+            for rank in range(end, 0, -1):
+                b = branch_ixs[rank - 1]
+                result.append((self.ids[b], self.timestamps[b], False, fp_order + rank))
+
+        stop = 0
+        if max_commits is not None:
+            stop = max(fp_order - max(max_commits - len(result), 0), 0)
+
+        for pos in range(fp_order, stop, -1):
+            d = self._default_ixs[pos - 1]
+            result.append((self.ids[d], self.timestamps[d], True, pos))
+
+        if max_commits is not None:
+            return result[:max_commits]
+
+        return result
+
+
+class CommitGraphCache:
+    """
+    Per-repository commit graphs. Thread-safe.
+    """
+
+    def __init__(self) -> None:
+        # Values are (load time, graph).
+        self._graphs: Dict[str, Tuple[float, CommitGraph]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return Config.COMMIT_GRAPH_MAX_AGE_SECONDS > 0
+
+    def get(
+        self,
+        repository: str,
+        load: Callable[[str], Iterable[TypeCommitGraphRow]],
+        require_sha: Optional[str] = None,
+    ) -> CommitGraph:
+        """
+        Return the graph for `repository`. Build it from the rows returned by
+        `load(repository)` if it is not known, expired, or if it does not
+        contain the commit `require_sha`.
+        """
+        with self._lock:
+            entry = self._graphs.get(repository)
+
+        reason = "miss"
+        if entry is not None:
+            loaded_at, graph = entry
+            if time.monotonic() - loaded_at >= Config.COMMIT_GRAPH_MAX_AGE_SECONDS:
+                reason = "expired"
+            elif require_sha is not None and require_sha not in graph:
+                reason = "stale"
+            else:
+                return graph
+
+        # Build the graph outside of the lock. Concurrent loads for
+        # the same repository are possible (the last one wins), but do not
+        # block questions about other repositories.
+        metrics.COUNTER_COMMIT_GRAPH_LOADS.labels(reason=reason).inc()
+        graph = CommitGraph(load(repository))
+        with self._lock:
+            self._graphs[repository] = (time.monotonic(), graph)
+        return graph
+
+    def invalidate(self, repository: str) -> None:
+        with self._lock:
+            self._graphs.pop(repository, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._graphs.clear()
+
+
+commit_graphs = CommitGraphCache()
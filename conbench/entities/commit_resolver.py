@@ -0,0 +1,224 @@
+"""
+Resolve commit metadata via the GitHub HTTP API in a background thread,
+i.e. off the HTTP request path of benchmark result/run submission.
+
+When `Config.COMMIT_RESOLUTION_ASYNC` is set, a submission that references a
+commit that is not yet in the database inserts a placeholder Commit (see
+Commit.create_unknown_context()) and hands the commit over to the resolver
+(see commit_fetch_info_and_create_in_db_if_not_exists()). The resolver then
+fetches the metadata, fills in the placeholder (see
+Commit.update_github_context()), and backfills the default-branch commits
+(see backfill_default_branch_commits()). Both steps invalidate the dependent
+caches (commit graph, distribution stats, history).
+
+Concurrent submissions for the same (repository, commit hash) are coalesced
+into one fetch.
+
+The queue is not persisted (also see the note on in-process state in
+conbench/config.py). A commit that was enqueued but not resolved before the
+process terminated stays a placeholder until a run referencing it is
+submitted again (to a process that did not yet try to resolve it). The
+placeholder cannot be re-enqueued upon startup: the branch / pull request
+number of the submission is not stored with it. That is why this is opt-in
+(CONBENCH_COMMIT_RESOLUTION_ASYNC).
+"""
+import logging
+import queue
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, Optional, Set, Tuple
+
+from conbench import metrics
+
+from ..config import Config
+from ..entities.commit import (
+    Commit,
+    TypeCommitInfoGitHub,
+    backfill_default_branch_commits,
+    get_github_commit_metadata,
+)
+
+if TYPE_CHECKING:
+    import flask
+
+log = logging.getLogger(__name__)
+
+# (repository URL, commit hash)
+TypeCommitKey = Tuple[str, str]
+
+# Upper bound for the number of commits this process remembers as attempted.
+_MAX_ATTEMPTED = 10000
+
+
+class CommitResolver:
+    """
+    A work queue plus one worker thread (started upon first use).
+
+    Thread-safe.
+    """
+
+    def __init__(self) -> None:
+        self._queue: queue.Queue[
+            Tuple["flask.Flask", TypeCommitInfoGitHub]
+        ] = queue.Queue()
+        # Enqueued or in-progress commits. The event is set upon completion.
+        self._pending: Dict[TypeCommitKey, threading.Event] = {}
+        # Commits that this process tried to resolve (successfully or not).
+        self._attempted: Set[TypeCommitKey] = set()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def enabled(self) -> bool:
+        return Config.COMMIT_RESOLUTION_ASYNC
+
+    @staticmethod
+    def key(cinfo: TypeCommitInfoGitHub) -> TypeCommitKey:
+        return cinfo["repo_url"], cinfo["commit_hash"]
+
+    def attempted(self, cinfo: TypeCommitInfoGitHub) -> bool:
+        """
+        Return `True` if this commit is pending, or if this process already
+        tried to resolve it.
+        """
+        key = self.key(cinfo)
+        with self._lock:
+            return key in self._pending or key in self._attempted
+
+    def submit(
+        self, app: "flask.Flask", cinfo: TypeCommitInfoGitHub
+    ) -> threading.Event:
+        """
+        Enqueue the commit for resolution, unless it is pending already.
+
+        The worker uses an application context of `app` (and therefore its
+        own database session). Return an event that is set once the commit
+        has been processed.
+        """
+        key = self.key(cinfo)
+        with self._lock:
+            event = self._pending.get(key)
+            if event is not None:
+                metrics.COUNTER_COMMIT_RESOLUTIONS.labels(outcome="coalesced").inc()
+                return event
+
+            event = threading.Event()
+            self._pending[key] = event
+            self._queue.put((app, cinfo))
+            self._start_worker()
+
+        metrics.GAUGE_COMMIT_RESOLUTION_QUEUE_SIZE.set(self._queue.qsize())
+        return event
+
+    def wait(self, timeout: float) -> bool:
+        """
+        Wait until all pending commits have been processed. Return `False` if
+        that did not happen within `timeout` seconds.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                events = list(self._pending.values())
+            if not events:
+                return True
+            for event in events:
+                if not event.wait(max(deadline - time.monotonic(), 0)):
+                    return False
+
+    def clear(self) -> None:
+        with self._lock:
+            self._attempted.clear()
+
+    def _start_worker(self) -> None:
+        # Must be called with self._lock held.
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        self._thread = threading.Thread(
+            target=self._work, name="commit-resolver", daemon=True
+        )
+        self._thread.start()
+
+    def _work(self) -> None:
+        # conbench.job ultimately depends on this module. Avoid circular
+        # import.
+        from conbench import job
+
+        log.info("commit resolver: initiate")
+        while not job.SHUTDOWN:
+            try:
+                app, cinfo = self._queue.get(timeout=0.2)
+            except queue.Empty:
+                continue
+
+            key = self.key(cinfo)
+            t0 = time.monotonic()
+            try:
+                # The application context provides a database
+                # session for this thread (it is removed upon leaving the
+                # context).
+                with app.app_context():
+                    outcome = _resolve(cinfo)
+            except Exception as exc:
+                log.exception("commit resolver: unexpected error for %s: %s", key, exc)
+                outcome = "error"
+            finally:
+                with self._lock:
+                    if len(self._attempted) >= _MAX_ATTEMPTED:
+                        self._attempted.clear()
+                    self._attempted.add(key)
+                    self._pending.pop(key).set()
+                metrics.GAUGE_COMMIT_RESOLUTION_QUEUE_SIZE.set(self._queue.qsize())
+
+            metrics.COUNTER_COMMIT_RESOLUTIONS.labels(outcome=outcome).inc()
+            log.info(
+                "commit resolver: %s: %s, took %.3f s",
+                key,
+                outcome,
+                time.monotonic() - t0,
+            )
+
+        log.info("commit resolver: shut down")
+
+
+def _resolve(cinfo: TypeCommitInfoGitHub) -> str:
+    """
+    Fill in the placeholder Commit for `cinfo`, and backfill default-branch
+    commits. Return the outcome (for the metric).
+    """
+    dbcommit = Commit.first(sha=cinfo["commit_hash"], repository=cinfo["repo_url"])
+
+    if dbcommit is None:
+        # Deleted in the meantime.
+        return "skipped"
+
+    if dbcommit.timestamp is not None:
+        # Resolved in the meantime (e.g. by another process).
+        return "skipped"
+
+    try:
+        gh_commit_metadata_dict = get_github_commit_metadata(cinfo)
+    except Exception as exc:
+        log.info(
+            "keep unknown context: error during get_github_commit_metadata(): %s", exc
+        )
+        return "failed"
+
+    if not gh_commit_metadata_dict:
+        return "failed"
+
+    dbcommit.update_github_context(gh_commit_metadata_dict)
+
+    try:
+        backfill_default_branch_commits(cinfo["repo_url"], dbcommit)
+    except Exception as exc:
+        log.info(
+            "Could not backfill default branch commits. Ignoring error "
+            "during backfill_default_branch_commits():  %s",
+            exc,
+        )
+
+    return "resolved"
+
+
+commit_resolver = CommitResolver()
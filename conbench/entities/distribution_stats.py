@@ -0,0 +1,218 @@
+"""
+Persisted rolling distribution statistics, for z-score lookups.
+
+The lookback z-score analysis compares a contender benchmark result to the
+distribution of results in the same case/context/hardware/repository
+"series", in the git ancestry of a baseline commit (the last
+Config.DISTRIBUTION_COMMITS commits, inclusive). Calculating that
+distribution's (rolling) mean and standard deviation requires a history
+query plus a pandas/numpy pass over the history (see
+conbench/entities/history.py) -- for each comparison, again.
+
+Here, the result of that calculation is stored per (series, baseline commit,
+window size). A z-score for a contender then requires one indexed lookup
+unless the stats for the baseline commit are not known (yet): they are
+computed lazily, upon the first z-score calculation against that baseline
+commit (see history._get_distribution_stats()), and persisted. Result
+ingestion does not compute stats: it only deletes the rows that the new
+result invalidates (an indexed DELETE, in the transaction that writes the
+result).
+
+The rolling stats are not maintained incrementally (e.g. with running sums):
+the calculation involves outlier trimming, distribution change segments and
+a commit-count based window over the commit ancestry. Instead, a row is
+deleted whenever its input may have changed. The input for a
+baseline commit with timestamp T consists of results for commits with
+timestamp <= T (and of the commit ancestry up to T), i.e. a new result (or a
+new commit) with timestamp T' invalidates all rows with T >= T'. Rows for
+older baseline commits are retained.
+"""
+from datetime import datetime
+from typing import Dict, Optional, Set, Tuple
+
+import sqlalchemy as s
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.orm import Mapped
+
+from conbench.dbsession import current_session
+
+from ..config import Config
+from ..entities._entity import Base, EntityMixin, NotNull, Nullable, genprimkey
+
+# (case_id, context_id) -> (rolling_mean, rolling_stddev)
+TypeStatsByCaseContext = Dict[Tuple[str, str], Tuple[Optional[float], Optional[float]]]
+
+
+class DistributionStats(Base, EntityMixin):
+    __tablename__ = "distribution_stats"
+    id: Mapped[str] = NotNull(s.String(50), primary_key=True, default=genprimkey)
+    case_id: Mapped[str] = NotNull(
+        s.String(50), s.ForeignKey("case.id", ondelete="CASCADE")
+    )
+    context_id: Mapped[str] = NotNull(
+        s.String(50), s.ForeignKey("context.id", ondelete="CASCADE")
+    )
+    hardware_hash: Mapped[str] = NotNull(s.String(1000))
+    baseline_commit_id: Mapped[str] = NotNull(
+        s.String(50), s.ForeignKey("commit.id", ondelete="CASCADE")
+    )
+
+    # Denormalized from the baseline commit, for invalidation.
+    repository: Mapped[str] = NotNull(s.String(300))
+    baseline_commit_timestamp: Mapped[datetime] = NotNull(s.DateTime(timezone=False))
+
+    # The value of Config.DISTRIBUTION_COMMITS at the time of computation.
+    window_commits: Mapped[int] = NotNull(s.Integer)
+
+    # Both are `None` if there is no distribution to compare against (no
+    # results in the series in the ancestry of the baseline commit).
+    rolling_mean: Mapped[Optional[float]] = Nullable(s.Float)
+    rolling_stddev: Mapped[Optional[float]] = Nullable(s.Float)
+
+    computed_at: Mapped[datetime] = NotNull(
+        s.DateTime(timezone=False), server_default=s.sql.func.now()
+    )
+
+    @classmethod
+    def lookup(
+        cls,
+        baseline_commit_id: str,
+        hardware_hash: str,
+        case_context_pairs: Set[Tuple[str, str]],
+    ) -> TypeStatsByCaseContext:
+        """
+        Return the stored stats for those of the given (case_id, context_id)
+        pairs that are known for this baseline commit and hardware.
+        """
+        if not case_context_pairs:
+            return {}
+
+        stmt = s.select(
+            cls.case_id, cls.context_id, cls.rolling_mean, cls.rolling_stddev
+        ).filter(
+            cls.baseline_commit_id == baseline_commit_id,
+            cls.hardware_hash == hardware_hash,
+            cls.window_commits == Config.DISTRIBUTION_COMMITS,
+        )
+
+        if len(case_context_pairs) == 1:
+            ((case_id, context_id),) = case_context_pairs
+            stmt = stmt.filter(cls.case_id == case_id, cls.context_id == context_id)
+
+        return {
+            (row.case_id, row.context_id): (row.rolling_mean, row.rolling_stddev)
+            for row in current_session.execute(stmt)
+            if (row.case_id, row.context_id) in case_context_pairs
+        }
+
+    @classmethod
+    def store(
+        cls,
+        baseline_commit_id: str,
+        repository: str,
+        baseline_commit_timestamp: datetime,
+        hardware_hash: str,
+        stats: TypeStatsByCaseContext,
+    ) -> None:
+        """
+        Insert (or overwrite) stats for this baseline commit and hardware.
+        Does not commit the transaction; that is left to the caller.
+
+        A result ingested concurrently with the computation of `stats` might
+        not be reflected in `stats`, while the invalidation triggered by that
+        ingest might be committed before this insert. That race window is the
+        duration of one stats computation (a history query plus the rolling
+        stats pass); this is a cache of derived data, corrected by the next
+        invalidation of that series.
+        """
+        if not stats:
+            return
+
+        rows = [
+            {
+                "id": genprimkey(),
+                "case_id": case_id,
+                "context_id": context_id,
+                "hardware_hash": hardware_hash,
+                "baseline_commit_id": baseline_commit_id,
+                "repository": repository,
+                "baseline_commit_timestamp": baseline_commit_timestamp,
+                "window_commits": Config.DISTRIBUTION_COMMITS,
+                "rolling_mean": _to_float_or_none(mean),
+                "rolling_stddev": _to_float_or_none(stddev),
+            }
+            for (case_id, context_id), (mean, stddev) in stats.items()
+        ]
+
+        statement = postgresql_insert(cls).values(rows)
+        statement = statement.on_conflict_do_update(
+            index_elements=_UNIQUE_COLUMNS,
+            set_={
+                "rolling_mean": statement.excluded.rolling_mean,
+                "rolling_stddev": statement.excluded.rolling_stddev,
+                "computed_at": s.sql.func.now(),
+            },
+        )
+        current_session.execute(statement)
+
+    @classmethod
+    def invalidate(
+        cls,
+        repository: str,
+        since: datetime,
+        case_id: Optional[str] = None,
+        context_id: Optional[str] = None,
+        hardware_hash: Optional[str] = None,
+    ) -> None:
+        """
+        Delete the stats for all baseline commits in `repository` with a
+        commit timestamp at or after `since`. Optionally, limit this to one
+        case/context/hardware series.
+
+        Must be called when a (non-errored) result for a commit with timestamp
+        `since` is created/changed/deleted, or when a commit with timestamp
+        `since` is inserted: in the same transaction, after that write. Does
+        not commit the transaction; that is left to the caller.
+        """
+        stmt = s.delete(cls).filter(
+            cls.repository == repository, cls.baseline_commit_timestamp >= since
+        )
+        if case_id is not None:
+            stmt = stmt.filter(
+                cls.case_id == case_id,
+                cls.context_id == context_id,
+                cls.hardware_hash == hardware_hash,
+            )
+        current_session.execute(stmt)
+
+
+def _to_float_or_none(value) -> Optional[float]:
+    # Stats computed by pandas might be NaN instead of None.
+    if value is None or value != value:
+        return None
+    return float(value)
+
+
+_UNIQUE_COLUMNS = [
+    DistributionStats.case_id,
+    DistributionStats.context_id,
+    DistributionStats.hardware_hash,
+    DistributionStats.baseline_commit_id,
+    DistributionStats.window_commits,
+]
+
+s.Index("distribution_stats_index", *_UNIQUE_COLUMNS, unique=True)
+
+# For lookups: all stats for a baseline commit and hardware.
+s.Index(
+    "distribution_stats_baseline_index",
+    DistributionStats.baseline_commit_id,
+    DistributionStats.hardware_hash,
+)
+
+# For invalidation.
+s.Index(
+    "distribution_stats_repository_index",
+    DistributionStats.repository,
+    DistributionStats.baseline_commit_timestamp,
+)
@@ -0,0 +1,109 @@
+"""
+A persistent cache for GitHub HTTP API responses (see GitHubHTTPApiClient in
+conbench/entities/commit.py), shared by all processes.
+
+A response is stored by URL, together with its `ETag` and `Last-Modified`
+headers. The next request for that URL is a conditional request; a 304 (Not
+Modified) response is answered from the cache. Per GitHub's documentation, a
+304 response does not count against the rate limit of an authenticated
+client.
+
+A commit addressed by its full hash never changes: such responses are served
+from the cache without any request.
+
+Responses for URLs with a query string (paginated listings of commits within
+a time range) are not stored: these URLs are hardly ever requested twice.
+Responses for other mutable resources (e.g. the comparison of two commits)
+are deleted after `Config.GITHUB_RESPONSE_CACHE_MAX_AGE_DAYS`.
+
+The cache is written via a separate database connection (and transaction),
+i.e. independently of the database session of the caller. Writing to the
+cache is best-effort.
+"""
+import logging
+import re
+from datetime import datetime, timedelta
+from typing import Any, Optional
+
+import sqlalchemy as s
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.orm import Mapped
+
+from conbench.dbsession import current_session
+
+from ..config import Config
+from ..entities._entity import Base, EntityMixin, NotNull, Nullable
+
+log = logging.getLogger(__name__)
+
+# /repos/{org}/{repo}/commits/{full commit hash}
+_IMMUTABLE_URL_PATTERN = re.compile(r"/repos/[^/]+/[^/]+/commits/[0-9a-f]{40}$")
+
+
+class GitHubResponse(Base, EntityMixin):
+    __tablename__ = "github_response"
+    url: Mapped[str] = NotNull(s.Text, primary_key=True)
+    etag: Mapped[Optional[str]] = Nullable(s.Text)
+    last_modified: Mapped[Optional[str]] = Nullable(s.Text)
+    # The deserialized response body.
+    body: Mapped[Any] = NotNull(postgresql.JSONB)
+    immutable: Mapped[bool] = NotNull(s.Boolean, default=False)
+    fetched_at: Mapped[datetime] = NotNull(
+        s.DateTime(timezone=False), server_default=s.sql.func.now()
+    )
+
+    @staticmethod
+    def cacheable(url: str) -> bool:
+        return Config.GITHUB_RESPONSE_CACHE and "?" not in url
+
+    @staticmethod
+    def is_immutable(url: str) -> bool:
+        return _IMMUTABLE_URL_PATTERN.search(url) is not None
+
+    @classmethod
+    def lookup(cls, url: str) -> Optional["GitHubResponse"]:
+        return current_session.get(cls, url, populate_existing=True)
+
+    @classmethod
+    def store(
+        cls, url: str, etag: Optional[str], last_modified: Optional[str], body: Any
+    ) -> None:
+        """
+        Insert (or overwrite) the response for `url`, and delete expired
+        responses for mutable resources.
+
+        Log (and otherwise swallow) errors: the caller has the response
+        regardless.
+        """
+        statement = postgresql_insert(cls).values(
+            url=url,
+            etag=etag,
+            last_modified=last_modified,
+            body=body,
+            immutable=cls.is_immutable(url),
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=[cls.url],
+            set_={
+                "etag": statement.excluded.etag,
+                "last_modified": statement.excluded.last_modified,
+                "body": statement.excluded.body,
+                "immutable": statement.excluded.immutable,
+                "fetched_at": s.sql.func.now(),
+            },
+        )
+        max_age = timedelta(days=Config.GITHUB_RESPONSE_CACHE_MAX_AGE_DAYS)
+        expired = s.delete(cls).filter(
+            cls.immutable.is_(False), cls.fetched_at < s.sql.func.now() - max_age
+        )
+
+        try:
+            # Do not commit (or roll back) the caller's session:
+            # this is called in the middle of e.g. processing a run
+            # submission.
+            with current_session.get_bind().begin() as conn:
+                conn.execute(statement)
+                conn.execute(expired)
+        except Exception as exc:
+            log.warning("could not write GitHub HTTP API response cache: %s", exc)
@@ -1,11 +1,10 @@
-import copy
 import dataclasses
 import datetime
 import decimal
 import logging
 import math
 from collections import defaultdict
-from typing import Dict, List, Optional, Tuple, Union
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
 
 import numpy as np
 import pandas as pd
@@ -14,9 +13,15 @@ import sqlalchemy as s
 from conbench.dbsession import current_session
 
 from ..config import Config
-from ..entities.benchmark_result import BenchmarkResult
+from ..entities.benchmark_result import (
+    BenchmarkResult,
+    result_measurements,
+    result_svs,
+)
 from ..entities.commit import CantFindAncestorCommitsError, Commit
+from ..entities.distribution_stats import DistributionStats, TypeStatsByCaseContext
 from ..entities.hardware import Hardware
+from ..entities.history_cache import TypeCCHR, history_cache
 from ..entities.run import Run
 
 log = logging.getLogger(__name__)
@@ -105,8 +110,14 @@ class HistorySample:
     def __str__(self):
         return f"<{self.__class__.__name__}(mean:{self.mean}),data:{self.data}>"
 
-    def _dict_for_api_json(self) -> dict:
+    def _dict_for_api_json(self, include_data: bool = True) -> dict:
         d = dataclasses.asdict(self)
+        if not include_data:
+            # For clients that only need the single value summaries, the
+            # per-iteration data may dominate the response size.
+            del d["data"]
+            del d["times"]
+
         # if performance is a concern then https://pypi.org/project/orjson/
         # promises to be among the fastest for serializing python dataclass
         # instances into JSON.
@@ -134,12 +145,64 @@ def get_history_for_benchmark(benchmark_result_id: str) -> List[HistorySample]:
         # information
         return []
 
-    return get_history_for_cchr(
+    cchr = (
         benchmark_result.case_id,
         benchmark_result.context_id,
         benchmark_result.run.hardware.hash,
         benchmark_result.run.commit.repository,
     )
+    # The history cache of this process might not know about this result yet
+    # (if it was submitted through another process). Do not serve a history
+    # that lacks the result it was requested for.
+    required = None
+    if benchmark_result.error is None and benchmark_result.run.commit.on_default_branch:
+        required = {cchr: [benchmark_result_id]}
+
+    return get_history_for_cchrs([cchr], required).get(cchr, [])
+
+
+def get_cchr_for_benchmark_results(
+    benchmark_result_ids: Iterable[str],
+) -> Tuple[Dict[str, Optional[TypeCCHR]], Set[str]]:
+    """
+    Look up the timeseries key for each of the given benchmark results, with
+    one database query.
+
+    The returned dictionary does not have a key for IDs of benchmark results
+    that do not exist. The value is `None` for a benchmark result that is not
+    associated with commit context (there is no history for such a result).
+
+    Also return the IDs of those benchmark results that are part of the
+    history of their timeseries (non-errored, on the default branch).
+    """
+    rows = current_session.execute(
+        s.select(
+            BenchmarkResult.id,
+            BenchmarkResult.case_id,
+            BenchmarkResult.context_id,
+            BenchmarkResult.error,
+            Hardware.hash,
+            Commit.repository,
+            (Commit.sha == Commit.fork_point_sha).label("on_default_branch"),
+        )
+        .join(Run, Run.id == BenchmarkResult.run_id)
+        .join(Hardware, Hardware.id == Run.hardware_id)
+        .outerjoin(Commit, Commit.id == Run.commit_id)
+        .filter(BenchmarkResult.id.in_(list(benchmark_result_ids)))
+    ).all()
+
+    cchr_by_bmrid: Dict[str, Optional[TypeCCHR]] = {
+        row.id: (row.case_id, row.context_id, row.hash, row.repository)
+        if row.repository is not None
+        else None
+        for row in rows
+    }
+    in_history = {
+        row.id
+        for row in rows
+        if row.repository is not None and row.error is None and row.on_default_branch
+    }
+    return cchr_by_bmrid, in_history
 
 
 def get_history_for_cchr(
@@ -155,7 +218,55 @@ def get_history_for_cchr(
     For further detail on the stats columns, see the docs of
     ``_add_rolling_stats_columns_to_history_query()``.
     """
+    cchr = (case_id, context_id, hardware_hash, repo_url)
+    return get_history_for_cchrs([cchr]).get(cchr, [])
+
+
+def get_history_for_cchrs(
+    cchrs: Iterable[TypeCCHR],
+    required: Optional[Dict[TypeCCHR, List[str]]] = None,
+) -> Dict[TypeCCHR, List[HistorySample]]:
+    """
+    Like `get_history_for_cchr()`, but for many timeseries at once: with one
+    database query and one pass for computing the rolling stats (which are
+    computed per timeseries, see `_add_rolling_stats_columns_to_df()`).
 
+    Return a dictionary with one key per given timeseries that has history.
+
+    Use the history cache (see conbench/entities/history_cache.py), and only
+    query those timeseries that are not cached. `required` optionally maps a
+    timeseries to benchmark result IDs that are known to be part of its
+    history: a cached history that lacks any of them is stale (e.g. the
+    result was submitted through another process) and is queried again.
+    """
+    samples_by_cchr: Dict[TypeCCHR, List[HistorySample]] = {}
+    missing: Set[TypeCCHR] = set()
+    required = required or {}
+
+    for cchr in set(cchrs):
+        cached = history_cache.get(cchr) if history_cache.enabled else None
+        if cached is not None and cchr in required:
+            cached_ids = {s.benchmark_result_id for s in cached}
+            if not cached_ids.issuperset(required[cchr]):
+                cached = None
+        if cached is None:
+            missing.add(cchr)
+        elif cached:
+            samples_by_cchr[cchr] = cached
+
+    if missing:
+        fetched = _query_history_for_cchrs(missing)
+        for cchr in missing:
+            # Also cache the absence of history.
+            history_cache.put(cchr, fetched.get(cchr, []))
+        samples_by_cchr |= fetched
+
+    return samples_by_cchr
+
+
+def _query_history_for_cchrs(
+    cchrs: Set[TypeCCHR],
+) -> Dict[TypeCCHR, List[HistorySample]]:
     # Do not support history logic for results that are not associated with
     # 'commit context'. Here, we could/should inspect `repo` to not be an empty
     # string for example (there may be stray "no context" objects in the
@@ -163,42 +274,49 @@ def get_history_for_cchr(
     # repo=="" might even yield something).
 
     history = (
-        current_session.query(
-            BenchmarkResult,
-            Hardware.hash.label("hardware_hash"),
-            Commit.sha.label("commit_hash"),
+        s.select(
+            *_HISTORY_RESULT_COLUMNS,
+            BenchmarkResult.times,
+            BenchmarkResult.unit,
+            Hardware.hash.label("hash"),
             Commit.repository,
+            Commit.timestamp.label("timestamp"),
             Commit.message.label("commit_message"),
-            Commit.timestamp.label("commit_timestamp"),
+            Commit.sha.label("commit_hash"),
             Run.name.label("run_name"),
         )
+        .select_from(BenchmarkResult)
         .join(Run, Run.id == BenchmarkResult.run_id)
         .join(Hardware, Hardware.id == Run.hardware_id)
         .join(Commit, Commit.id == Run.commit_id)
         .filter(
-            BenchmarkResult.case_id == case_id,
-            BenchmarkResult.context_id == context_id,
+            # For one timeseries, Postgres' query planner turns this into
+            # four equality conditions.
+            s.tuple_(
+                BenchmarkResult.case_id,
+                BenchmarkResult.context_id,
+                Hardware.hash,
+                Commit.repository,
+            ).in_(list(cchrs)),
             BenchmarkResult.error.is_(None),
             # This `sha == Commit.fork_point_sha` cannot be satisfied for
             # results with an unknown commit context where commit parent/child
             # and branch information is not available. Consequence is to not
             # allow for history endpoint result for 'unknown context'.
             Commit.sha == Commit.fork_point_sha,  # on default branch
-            Commit.repository == repo_url,
-            Hardware.hash == hardware_hash,
         )
     )
 
-    history_df, bmrs_by_bmrid = execute_history_query_get_dataframe(history.statement)
+    history_df = execute_history_query_get_dataframe(history)
 
     if len(history_df) == 0:
-        return []
+        return {}
 
     history_df_rolling_stats = _add_rolling_stats_columns_to_df(
         history_df, include_current_commit_in_rolling_stats=False
     )
 
-    samples: List[HistorySample] = []
+    samples_by_cchr: Dict[TypeCCHR, List[HistorySample]] = defaultdict(list)
 
     # Iterate over rows of pandas dataframe; get each row as namedtuple.
     for sample in history_df_rolling_stats.itertuples():
@@ -210,9 +328,6 @@ def get_history_for_cchr(
         # invariant with an assertion.
         assert isinstance(sample.timestamp, datetime.datetime)
 
-        # Restore 'sample' (df row) correspondence to BenchmarkResult objects.
-        result = bmrs_by_bmrid[sample.benchmark_result_id]
-
         zstats = HistorySampleZscoreStats(
             begins_distribution_change=sample.begins_distribution_change,
             segment_id=sample.segment_id,
@@ -228,33 +343,35 @@ def get_history_for_cchr(
         # potentially empty. `data` and `times` contain more than one value if
         # this was a multi-sample benchmark.
         data = []
-        if result.data is not None:
-            data = [float(d) if d is not None else math.nan for d in result.data]
+        if sample.data is not None:
+            data = [float(d) if d is not None else math.nan for d in sample.data]
 
         times = []
-        if result.times is not None:
-            times = [float(t) if t is not None else math.nan for t in result.times]
+        if sample.times is not None:
+            times = [float(t) if t is not None else math.nan for t in sample.times]
 
-        samples.append(
+        samples_by_cchr[
+            (sample.case_id, sample.context_id, sample.hash, sample.repository)
+        ].append(
             HistorySample(
                 benchmark_result_id=sample.benchmark_result_id,
-                case_id=result.case_id,
-                context_id=result.context_id,
+                case_id=sample.case_id,
+                context_id=sample.context_id,
                 # Keep exposing the `mean` property like before. This was meant
                 # to be the single value summary, guaranteed to have a value
-                # set. So, actually read this from the new .svs property which
-                # still is the mean as of today. Do not read this from
+                # set. So, actually read this from the svs column which still
+                # is the mean as of today. Do not read this from
                 # BenchmarkResult.mean, because this can be None.
-                mean=result.svs,
-                svs=result.svs,
-                svs_type=result.svs_type,  # hard-code for now
+                mean=sample.svs,
+                svs=sample.svs,
+                svs_type="mean",  # hard-code for now, see BenchmarkResult.svs_type
                 data=data,
                 times=times,
                 # JSON schema requires unit to be set upon BMR insertion, so I
                 # do not think this 'undefined' is met often. Maybe empty
                 # strings can be inserted into the DB, and this would be
                 # handled here, too.
-                unit=result.unit if result.unit else "undefined",
+                unit=sample.unit if sample.unit else "undefined",
                 hardware_hash=sample.hash,
                 repository=sample.repository,
                 commit_msg=sample.commit_message,
@@ -265,7 +382,7 @@ def get_history_for_cchr(
             )
         )
 
-    return samples
+    return dict(samples_by_cchr)
 
 
 def set_z_scores(
@@ -293,19 +410,13 @@ def set_z_scores(
         )
     contender_run_id = contender_run_ids.pop()
 
-    if len(contender_benchmark_results) == 1:
-        # performance optimization
-        case_id = contender_benchmark_results[0].case_id
-        context_id = contender_benchmark_results[0].context_id
-    else:
-        case_id = None
-        context_id = None
-
-    distribution_stats = _query_and_calculate_distribution_stats(
+    distribution_stats = _get_distribution_stats(
         contender_run_id=contender_run_id,
         baseline_commit=baseline_commit,
-        case_id=case_id,
-        context_id=context_id,
+        case_context_pairs={
+            (result.case_id, result.context_id)
+            for result in contender_benchmark_results
+        },
     )
 
     for benchmark_result in contender_benchmark_results:
@@ -320,6 +431,58 @@ def set_z_scores(
         )
 
 
+def _get_distribution_stats(
+    contender_run_id: str,
+    baseline_commit: Commit,
+    case_context_pairs: Set[Tuple[str, str]],
+) -> TypeStatsByCaseContext:
+    """
+    Return the rolling stats of the baseline distribution for each of the
+    given case/context pairs (see `_query_and_calculate_distribution_stats()`
+    for the meaning of the returned dictionary).
+
+    Use the persisted stats where available (see
+    conbench/entities/distribution_stats.py). Calculate the missing ones, and
+    persist them.
+    """
+    hardware_hash = Run.get(contender_run_id).hardware.hash
+
+    stats = DistributionStats.lookup(
+        baseline_commit.id, hardware_hash, case_context_pairs
+    )
+    missing = case_context_pairs - set(stats)
+    if not missing:
+        return stats
+
+    if len(missing) == 1:
+        # performance optimization
+        ((case_id, context_id),) = missing
+    else:
+        case_id = None
+        context_id = None
+
+    computed = _query_and_calculate_distribution_stats(
+        contender_run_id=contender_run_id,
+        baseline_commit=baseline_commit,
+        case_id=case_id,
+        context_id=context_id,
+    )
+
+    # Persist the absence of a distribution, too (as `None` values).
+    computed = {pair: computed.get(pair, (None, None)) for pair in missing}
+    if baseline_commit.timestamp is not None:
+        DistributionStats.store(
+            baseline_commit_id=baseline_commit.id,
+            repository=baseline_commit.repository,
+            baseline_commit_timestamp=baseline_commit.timestamp,
+            hardware_hash=hardware_hash,
+            stats=computed,
+        )
+        current_session.commit()
+
+    return stats | computed
+
+
 def _query_and_calculate_distribution_stats(
     contender_run_id: str,
     baseline_commit: Commit,
@@ -351,7 +514,9 @@ def _query_and_calculate_distribution_stats(
     contender_run = Run.get(contender_run_id)
 
     try:
-        commits = baseline_commit.commit_ancestry_query.subquery()
+        commits = baseline_commit.get_commit_ancestry_query(
+            max_commits=Config.DISTRIBUTION_COMMITS
+        ).subquery()
     except CantFindAncestorCommitsError as e:
         log.debug(f"Couldn't _query_and_calculate_distribution_stats() because {e}")
         return {}
@@ -366,12 +531,11 @@ def _query_and_calculate_distribution_stats(
 
     # Find all historic results in the distribution to analyze
     history = (
-        current_session.query(
-            # we can use the `defer` method to not select all columns
-            BenchmarkResult,
-            Hardware.hash.label("hardware_hash"),
+        s.select(
+            *_HISTORY_RESULT_COLUMNS,
+            Hardware.hash.label("hash"),
             s.sql.expression.literal(baseline_commit.repository).label("repository"),
-            commits.c.ancestor_timestamp.label("commit_timestamp"),
+            commits.c.ancestor_timestamp.label("timestamp"),
         )
         .select_from(BenchmarkResult)
         .join(Run, Run.id == BenchmarkResult.run_id)
@@ -393,7 +557,7 @@ def _query_and_calculate_distribution_stats(
     else:
         # filter to *any* case/context attached to this Run
         these_cases_and_contexts = (
-            current_session.query(BenchmarkResult.case_id, BenchmarkResult.context_id)
+            s.select(BenchmarkResult.case_id, BenchmarkResult.context_id)
             .filter(BenchmarkResult.run_id == contender_run_id)
             .distinct()
             .subquery()
@@ -406,7 +570,7 @@ def _query_and_calculate_distribution_stats(
             ),
         )
 
-    history_df, _ = execute_history_query_get_dataframe(history.statement)
+    history_df = execute_history_query_get_dataframe(history)
 
     if len(history_df) == 0:
         return {}
@@ -426,127 +590,235 @@ def _query_and_calculate_distribution_stats(
     }
 
 
-def execute_history_query_get_dataframe(statement) -> Tuple[pd.DataFrame, Dict]:
+# The BenchmarkResult columns that every history query must select (labeled
+# like the corresponding dataframe columns), see
+# execute_history_query_get_dataframe().
+_HISTORY_RESULT_COLUMNS = (
+    BenchmarkResult.id.label("benchmark_result_id"),
+    BenchmarkResult.case_id,
+    BenchmarkResult.context_id,
+    BenchmarkResult.mean,
+    BenchmarkResult.data,
+    BenchmarkResult.change_annotations,
+    BenchmarkResult.timestamp.label("result_timestamp"),
+)
+
+
+def execute_history_query_get_dataframe(statement: s.Select) -> pd.DataFrame:
     """
     Emit prepared query statement to database.
 
-    Return a (df, dict) tuple. In the pandas DataFrame, each row represents a
-    benchmark result (BMR) plus associated metadata (that cannot be typically
-    found on the BenchmarkResult directly).
+    Return a pandas DataFrame in which each row represents a benchmark result
+    (BMR) plus associated metadata (that cannot be typically found on the
+    BenchmarkResult directly). The dataframe columns are the (labeled) columns
+    selected by `statement`, which must include `_HISTORY_RESULT_COLUMNS` and
+    the `hash`, `repository` and `timestamp` columns. The latter is the
+    timestamp we associate with this benchmark result for timeseries analysis:
+    the commit timestamp.
 
-    A row in the dataframe contains limited information about a BMR, such as
-    its ID. The dictionary mapping allows for looking up the full BMR via ID.
+    Additionally, this adds the `svs` column (single value summary, see
+    BenchmarkResult.svs), derived from the `data` and `mean` columns. It is
+    NaN for results with error-like data.
 
-    Think: this function returns a timeseries: one BenchmarkResult(+additional
-    info) per point in time, and the `BenchmarkResult(+additional info)` is
-    spread across two objects.
+    Return an empty DataFrame (without columns) if the query yields no rows.
+    """
+    result = current_session.execute(statement)
+    columns = list(result.keys())
+    rows = result.tuples().all()
 
-    Previously, we did
+    if len(rows) == 0:
+        log.debug("history query returned no results")
+        return pd.DataFrame({})
 
-        df = pd.read_sql(statement, current_session.connection())
+    history_df = pd.DataFrame.from_records(rows, columns=columns)
 
-    which unpacked individual BenchmarkResult columns into dataframe columns.
+    # Derive the SVS like BenchmarkResult.svs does. The history queries only
+    # select results with `error` being NULL; results with error-like data
+    # get a NaN SVS.
+    history_df["svs"] = [
+        result_svs(result_measurements(data, None), mean)
+        for data, mean in zip(history_df["data"], history_df["mean"])
+    ]
 
-    It was not easily possible to access the raw BenchmarkResult object.
+    return history_df
 
-    This paradigm here does more explicit iteration and creates more
-    intermediate objects, but also allows for more explicitly mapping items
-    into the dataframe.
 
-    If this fetches too many BMR columns, we can limit the columns fetched
-    actively with a "deferred loading" technique provided by SQLAlchemy.
+def _group_start_flags(*columns: np.ndarray) -> np.ndarray:
+    """
+    For arrays of equal length, sorted by group: return a boolean array which
+    is True for the first row of each group (a group is a run of rows with the
+    same values across all `columns`).
+    """
+    flags = np.zeros(len(columns[0]), dtype=bool)
+    flags[:1] = True
+    for col in columns:
+        flags[1:] |= col[1:] != col[:-1]
+    return flags
+
+
+def _commit_windows(
+    group_starts: np.ndarray,
+    timestamps: np.ndarray,
+    window_commits: int,
+    closed: str,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Return the (start, end) row indices (end exclusive) of the rolling window
+    for each row, counting commits (distinct timestamps), not rows, and not
+    time between commits.
+
+    Rows are sorted by group (see `group_starts`), then by (commit) timestamp.
+    Let `r` be the dense rank of the commit of a row within its group. Then
+    the window covers the rows of the commits with rank in `(r - window, r]`
+    for closed="right" and in `[r - window, r)` for closed="left" (which
+    excludes the row's own commit). A window never crosses a group boundary.
+    """
+    n = len(timestamps)
+    commit_starts = group_starts.copy()
+    commit_starts[1:] |= timestamps[1:] != timestamps[:-1]
+
+    # Ordinal of the commit of each row (across groups), and the first row
+    # for each commit ordinal (plus one past the last row).
+    ordinal = np.cumsum(commit_starts) - 1
+    first_row = np.append(np.flatnonzero(commit_starts), n)
+    group_first_row = np.flatnonzero(group_starts)[np.cumsum(group_starts) - 1]
+
+    if closed == "right":
+        end = first_row[ordinal + 1]
+        lo = ordinal - window_commits + 1
+    else:
+        assert closed == "left", closed
+        end = first_row[ordinal]
+        lo = ordinal - window_commits
 
-    Note that `row_iterator ` is an iterator that can only be consumed once,
-    i.e. we immediately store the data in mappings.
+    start = np.maximum(first_row[np.maximum(lo, 0)], group_first_row)
+    return start, end
 
-    Assume that history is not gigantic; and even when history is comprised of
-    O(1000) benchmark results then the two dictionaries and the one dataframe
-    creates in this function should be smallish (from a mem consumption point
-    of view).
+
+def _grouped_quantile(
+    values: np.ndarray, group_starts: np.ndarray, q: float
+) -> np.ndarray:
+    """
+    For each row, return the `q` quantile of the (non-NaN) values of the
+    row's group (NaN if there are none). Linear interpolation, precisely like
+    `pd.Series.quantile()` (via `np.percentile()`).
     """
-    row_iterator = current_session.execute(statement)
-    rows_by_bmrid = {}
-    bmrs_by_bmrid: Dict[str, BenchmarkResult] = {}
+    group_idx = np.flatnonzero(group_starts)
+    group_of_row = np.cumsum(group_starts) - 1
+    isnan = np.isnan(values)
 
-    for row in row_iterator:
-        bmr = row[0]
-        rows_by_bmrid[bmr.id] = row
-        bmrs_by_bmrid[bmr.id] = bmr
+    # Sort by group, then by value (NaN values last within each group).
+    sorted_values = values[np.lexsort((values, isnan, group_of_row))]
+    counts = np.add.reduceat(~isnan, group_idx)
 
-    if len(rows_by_bmrid) == 0:
-        log.debug("history query returned no results")
-        return pd.DataFrame({}), {}
-
-    # The dictionary from which a pandas DataFrame will be be created.
-    dict_for_df = defaultdict(list)
-
-    # Translate row-oriented result into column-oriented df, but picking only
-    # specific columns.
-    for bmr_id, row in rows_by_bmrid.items():
-        # Iterate over values in this row, and also get their metadata/column
-        # descriptions. See
-        # https://stackoverflow.com/a/6456360/145400
-        for coldesc, value in zip(statement.column_descriptions, row):
-            if coldesc["name"] == "BenchmarkResult":
-                assert bmr_id == value.id
-                dict_for_df["benchmark_result_id"].append(bmr_id)
-                dict_for_df["case_id"].append(value.case_id)
-                dict_for_df["context_id"].append(value.context_id)
-                # dict_for_df["mean"].append(value.mean)
-                dict_for_df["svs"].append(value.svs)
-                dict_for_df["change_annotations"].append(value.change_annotations)
-                dict_for_df["result_timestamp"].append(value.timestamp)
-            if coldesc["name"] == "hardware_hash":
-                dict_for_df["hash"].append(value)
-
-            if coldesc["name"] == "repository":
-                dict_for_df["repository"].append(value)
-
-            if coldesc["name"] == "commit_timestamp":
-                # The timestamp we associate with this benchmark result for
-                # timeseries analysis. This is chosen to be the commit
-                # timestamp.
-                dict_for_df["timestamp"].append(value)
-
-            # This does not need to be in the dataframe, but it's better
-            # than result.run.commit.message below
-            if coldesc["name"] in ("commit_message", "commit_hash", "run_name"):
-                dict_for_df[coldesc["name"]].append(value)
-
-    history_df = pd.DataFrame(dict_for_df)
-    # log.info("df:\n%s", history_df.to_string())
-
-    return history_df, bmrs_by_bmrid
-
-
-class _CommitIndexer(pd.api.indexers.BaseIndexer):
-    """pandas isn't great about rolling over ranges, so this class lets us roll over
-    the commit timestamp column correctly (not caring about time between commits)."""
-
-    def get_window_bounds(
-        self,
-        num_values: int = 0,
-        min_periods: Optional[int] = None,
-        center: Optional[bool] = None,
-        closed: Optional[str] = None,
-        step: Optional[int] = None,
+    virtual_index = (counts - 1) * q
+    prev_index = np.floor(virtual_index)
+    gamma = virtual_index - prev_index
+    prev_index = np.minimum(prev_index, np.maximum(counts - 1, 0)).astype(np.intp)
+    next_index = np.minimum(prev_index + 1, np.maximum(counts - 1, 0))
+
+    a = sorted_values[group_idx + prev_index]
+    b = sorted_values[group_idx + next_index]
+    diff_b_a = b - a
+    result = np.where(gamma >= 0.5, b - diff_b_a * (1 - gamma), a + diff_b_a * gamma)
+    result[counts == 0] = np.nan
+    return result[group_of_row]
+
+
+def _cumsum0(arr: np.ndarray) -> np.ndarray:
+    return np.concatenate(([0], np.cumsum(arr)))
+
+
+class _WindowSums:
+    """
+    Aggregate values over (many, overlapping) windows given as row index
+    ranges `[start, end)`, one window per row, via differences of cumulative
+    sums. The window of a row must be within the row's group. NaN values are
+    ignored.
+
+    The cumulative sums run across groups. To keep the floating point error
+    of a window sum small relative to the values in the window, values are
+    shifted by a per-group reference value (the group mean) and scaled by a
+    per-group scale (the maximum absolute deviation from that mean) before
+    summation.
+    """
+
+    def __init__(self, values: np.ndarray, group_starts: np.ndarray):
+        isnum = ~np.isnan(values)
+        group_idx = np.flatnonzero(group_starts)
+        group_of_row = np.cumsum(group_starts) - 1
+
+        nonnan_values = np.where(isnum, values, 0.0)
+        counts = np.add.reduceat(isnum.astype(np.float64), group_idx)
+        sums = np.add.reduceat(nonnan_values, group_idx)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            self.ref = np.nan_to_num(sums / counts)[group_of_row]
+
+        shifted = np.where(isnum, values - self.ref, 0.0)
+        scale = np.maximum.reduceat(np.abs(shifted), group_idx)
+        scale[scale == 0] = 1.0
+        self.scale = scale[group_of_row]
+        shifted /= self.scale
+
+        self._cnt = _cumsum0(isnum)
+        self._neg = _cumsum0(isnum & np.signbit(values))
+        self._sum = _cumsum0(shifted)
+        self._sqsum = _cumsum0(shifted * shifted)
+
+        # For detecting windows in which all (non-NaN) values are equal: for
+        # each non-NaN value, the position (in the sequence of non-NaN values)
+        # where the run of equal values it belongs to starts. The trailing
+        # element is a sentinel (for windows without values).
+        nonnan = values[isnum]
+        run_starts = _group_start_flags(nonnan) if len(nonnan) else nonnan
+        self._run_start = np.append(
+            np.maximum.accumulate(np.where(run_starts, np.arange(len(nonnan)), 0)),
+            0,
+        )
+        self._nonnan = np.append(nonnan, np.nan)
+
+    def _constant(
+        self, start: np.ndarray, end: np.ndarray, nobs: np.ndarray
     ) -> Tuple[np.ndarray, np.ndarray]:
-        """Return numpy arrays of the respective start and end indexes of all rolling
-        windows for this slice of commit timestamps.
         """
-        # self.index_array is the (sorted) current slice of the timestamp column,
-        # converted to an int64 np array. Find the dense rank of each timestamp.
-        commit_ranks = pd.Series(self.index_array).rank(method="dense").values
+        Return a boolean array indicating the windows in which all values are
+        equal, and that value (NaN for windows without values).
+        """
+        last = np.where(nobs > 0, self._cnt[end] - 1, len(self._nonnan) - 1)
+        constant = (nobs > 0) & (self._run_start[last] <= self._cnt[start])
+        return constant, self._nonnan[last]
+
+    def mean(self, start: np.ndarray, end: np.ndarray) -> np.ndarray:
+        nobs = self._cnt[end] - self._cnt[start]
+        neg = self._neg[end] - self._neg[start]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            result = (self._sum[end] - self._sum[start]) / nobs
+        result = result * self.scale + self.ref
+        result[nobs == 0] = np.nan
+
+        # Like pandas: avoid floating point artifacts for windows with equal
+        # values, and for windows with values of the same sign.
+        constant, value = self._constant(start, end, nobs)
+        result = np.where(constant, value, result)
+        result[~constant & (neg == 0) & (result < 0)] = 0
+        result[~constant & (neg == nobs) & (nobs > 0) & (result > 0)] = 0
+        return result
+
+    def std(self, start: np.ndarray, end: np.ndarray) -> np.ndarray:
+        """
+        Sample standard deviation (ddof=1). NaN for windows with fewer than
+        two values.
+        """
+        nobs = self._cnt[end] - self._cnt[start]
+        sums = self._sum[end] - self._sum[start]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            ssqdm = (self._sqsum[end] - self._sqsum[start]) - sums * sums / nobs
+            result = np.sqrt(np.maximum(ssqdm, 0) / (nobs - 1)) * self.scale
 
-        # np.searchsorted() finds the indices into which values would need to be
-        # inserted to maintain order. We can use that to find the indexes of the end of
-        # the window (same as the current commit) and start of the window (the current
-        # commit minus the window size).
-        end_ixs = np.searchsorted(commit_ranks, commit_ranks, side=closed)  # type: ignore[call-overload]
-        start_ixs = np.searchsorted(
-            commit_ranks, commit_ranks - self.window_size, side=closed
-        )  # type: ignore[call-overload]
-        return start_ixs, end_ixs
+        constant, _ = self._constant(start, end, nobs)
+        result[constant] = 0.0
+        result[nobs < 2] = np.nan
+        return result
 
 
 def _add_rolling_stats_columns_to_df(
@@ -601,7 +873,7 @@ def _add_rolling_stats_columns_to_df(
     """
     df = _detect_shifts_with_trimmed_estimators(df=df)
 
-    # pandas likes the data to be sorted
+    # Sort by timeseries, and within each timeseries by commit.
     df.sort_values(
         ["case_id", "context_id", "hash", "repository", "timestamp"],
         inplace=True,
@@ -621,52 +893,67 @@ def _add_rolling_stats_columns_to_df(
     # # Add in step changes automatically detected
     # df["begins_distribution_change"] = df["begins_distribution_change"] | df["is_step"]
 
-    # Add column with cumulative sum of distribution changes, to identify the segment
-    df["segment_id"] = (
-        df.groupby(["case_id", "context_id", "hash", "repository"])
-        .rolling(
-            _CommitIndexer(window_size=len(df) + 1),
-            on="timestamp",
-            closed="right",
-            min_periods=1,
-        )["begins_distribution_change"]
-        .sum()
-        .values
+    # The rolling windows below are defined in terms of commits (not
+    # rows, and not time): a window spans the results of up to N commits. The
+    # statistics are computed on NumPy arrays in one pass each, for all
+    # timeseries at once: rows are sorted by timeseries, then by commit;
+    # window boundaries are derived from the commit rank of each row, and
+    # window aggregates from cumulative sums. This is equivalent to the
+    # previous approach of grouping with pandas and rolling with a custom
+    # window indexer (based on the dense rank of the commit timestamps), but
+    # much faster for many and long timeseries.
+    timestamps = df["timestamp"].to_numpy(dtype="datetime64[ns]").view(np.int64)
+    series_starts = _group_start_flags(
+        *(df[c].to_numpy() for c in ("case_id", "context_id", "hash", "repository"))
     )
 
-    # Add column with rolling mean of the means (only inside of the segment)
-    df.loc[~df.is_outlier, "rolling_mean_excluding_this_commit"] = (
-        df.loc[~df.is_outlier]
-        .groupby(["case_id", "context_id", "hash", "repository", "segment_id"])
-        .rolling(
-            _CommitIndexer(window_size=Config.DISTRIBUTION_COMMITS),
-            on="timestamp",
-            # Exclude the current commit first...
-            closed="left",
-            min_periods=1,
-        )["svs"]
-        .mean()
-        .values
+    # Add column with cumulative sum of distribution changes, to identify the
+    # segment (all results of a commit are in the same segment).
+    start, end = _commit_windows(series_starts, timestamps, len(df) + 1, "right")
+    changes = _cumsum0(df["begins_distribution_change"].to_numpy(dtype=np.int64))
+    df["segment_id"] = (changes[end] - changes[start]).astype(np.float64)
+
+    # The rolling statistics are computed while ignoring outliers.
+    inlier = ~df["is_outlier"].to_numpy(dtype=bool)
+    ts_in = timestamps[inlier]
+    series_code_in = np.cumsum(series_starts)[inlier]
+    segment_starts_in = _group_start_flags(
+        series_code_in, df["segment_id"].to_numpy()[inlier]
     )
-    # (and fill NaNs at the beginning of segments with the first value)
-    df.loc[~df.is_outlier, "rolling_mean_excluding_this_commit"] = df.loc[
-        ~df.is_outlier, "rolling_mean_excluding_this_commit"
-    ].combine_first(df.loc[~df.is_outlier, "svs"])
+    series_starts_in = _group_start_flags(series_code_in)
+    svs_in = df["svs"].to_numpy(dtype=np.float64)[inlier]
+
+    def _column(values_in: np.ndarray) -> np.ndarray:
+        col = np.full(len(df), np.nan)
+        col[inlier] = values_in
+        return col
+
+    # Add column with rolling mean of the means (only inside of the segment),
+    # exclude the current commit first...
+    svs_sums = _WindowSums(svs_in, segment_starts_in) if len(svs_in) else None
+    rolling_mean_excl = np.array([], dtype=np.float64)
+    if svs_sums is not None:
+        rolling_mean_excl = svs_sums.mean(
+            *_commit_windows(
+                segment_starts_in, ts_in, Config.DISTRIBUTION_COMMITS, "left"
+            )
+        )
+        # (and fill NaNs at the beginning of segments with the first value)
+        rolling_mean_excl = np.where(
+            np.isnan(rolling_mean_excl), svs_in, rolling_mean_excl
+        )
+    df["rolling_mean_excluding_this_commit"] = _column(rolling_mean_excl)
 
     # ...but if requested, include the current commit
     if include_current_commit_in_rolling_stats:
-        df.loc[~df.is_outlier, "rolling_mean"] = (
-            df.loc[~df.is_outlier]
-            .groupby(["case_id", "context_id", "hash", "repository", "segment_id"])
-            .rolling(
-                _CommitIndexer(window_size=Config.DISTRIBUTION_COMMITS),
-                on="timestamp",
-                closed="right",
-                min_periods=1,
-            )["svs"]
-            .mean()
-            .values
-        )
+        rolling_mean = np.array([], dtype=np.float64)
+        if svs_sums is not None:
+            rolling_mean = svs_sums.mean(
+                *_commit_windows(
+                    segment_starts_in, ts_in, Config.DISTRIBUTION_COMMITS, "right"
+                )
+            )
+        df["rolling_mean"] = _column(rolling_mean)
     else:
         df["rolling_mean"] = df["rolling_mean_excluding_this_commit"]
 
@@ -676,22 +963,104 @@ def _add_rolling_stats_columns_to_df(
 
     # Add column with the rolling standard deviation of the residuals
     # (these can go outside the segment since we assume they don't change much)
-    df.loc[~df.is_outlier, "rolling_stddev"] = (
-        df.loc[~df.is_outlier]
-        .groupby(["case_id", "context_id", "hash", "repository"])  # not segment
-        .rolling(
-            _CommitIndexer(window_size=Config.DISTRIBUTION_COMMITS),
-            on="timestamp",
-            closed="right" if include_current_commit_in_rolling_stats else "left",
-            min_periods=1,
-        )["residual"]
-        .std()
-        .values
-    )
+    rolling_stddev = np.array([], dtype=np.float64)
+    if len(svs_in):
+        rolling_stddev = _WindowSums(
+            df["residual"].to_numpy(dtype=np.float64)[inlier], series_starts_in
+        ).std(
+            *_commit_windows(
+                series_starts_in,
+                ts_in,
+                Config.DISTRIBUTION_COMMITS,
+                "right" if include_current_commit_in_rolling_stats else "left",
+            )
+        )
+    df["rolling_stddev"] = _column(rolling_stddev)
 
     return df
 
 
+def downsample_history_samples(
+    samples: List[HistorySample],
+    max_samples: int,
+    keep_benchmark_result_ids: Iterable[str] = (),
+) -> List[HistorySample]:
+    """
+    Return a subset of `samples` (in the original order) that visually
+    represents the timeseries (commit timestamp, SVS) with approximately
+    `max_samples` points, for plotting.
+
+    Points are selected with the largest-triangle-three-buckets (LTTB)
+    algorithm, see https://skemman.is/handle/1946/15343. Distribution change
+    points, outliers and the results in `keep_benchmark_result_ids` are always
+    retained, i.e. the returned list may be longer than `max_samples`.
+
+    `samples` must be sorted by commit timestamp (as returned by
+    get_history_for_cchr()).
+    """
+    n = len(samples)
+    if n <= max_samples or max_samples < 3:
+        return samples
+
+    keep_ids = set(keep_benchmark_result_ids)
+    keep = np.array(
+        [
+            s.zscorestats.begins_distribution_change
+            or s.zscorestats.is_outlier
+            or s.benchmark_result_id in keep_ids
+            for s in samples
+        ],
+        dtype=bool,
+    )
+
+    x = np.array([s.commit_timestamp.timestamp() for s in samples], dtype=np.float64)
+    y = np.array([s.svs for s in samples], dtype=np.float64)
+    keep[_lttb_indexes(x, y, max(max_samples - int(keep.sum()), 3))] = True
+
+    return [s for s, k in zip(samples, keep) if k]
+
+
+def _lttb_indexes(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-triangle-three-buckets: return the indexes of `n_out` points
+    (including the first and the last one) of the series (x, y).
+
+    The points between the first and the last one are split into `n_out - 2`
+    buckets of (about) equal size. From each bucket, pick the point that forms
+    the largest triangle with the point picked from the previous bucket and
+    the average point of the next bucket.
+    """
+    n = len(x)
+    if n_out >= n:
+        return np.arange(n)
+
+    # Bucket boundaries; bucket i is [edges[i], edges[i + 1]), and the last
+    # point forms the last (single-point) bucket.
+    edges = (np.arange(n_out - 1) * ((n - 2) / (n_out - 2))).astype(np.int64) + 1
+    edges[-1] = n - 1
+    edges = np.append(edges, n)
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = edges[i + 1], edges[i + 2]
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        # Twice the triangle area, for each candidate point in this bucket.
+        areas = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(areas))
+        selected[i + 1] = a
+
+    return selected
+
+
 def _less_is_better(unit) -> bool:
     # For some units, "more is better":
     if unit in ["B/s", "i/s"]:
@@ -740,16 +1109,15 @@ def _detect_shifts_with_trimmed_estimators(
     - `is_step` (bool): Is this point the start of a new segment?
     - `is_outlier` (bool): Is this point an outlier that should be ignored?
     """
-    tmp_df = copy.deepcopy(df)
-
     # skip computation if no history
     if df.shape[0] == 0:
-        tmp_df["is_step"] = pd.Series([], dtype=bool)
-        tmp_df["is_outlier"] = pd.Series([], dtype=bool)
-        return tmp_df
+        return df.assign(
+            is_step=pd.Series([], dtype=bool), is_outlier=pd.Series([], dtype=bool)
+        )
 
-    # pandas likes the data to be sorted
-    tmp_df.sort_values(
+    # Sort by timeseries, then by time. This creates a new dataframe; input
+    # columns are not modified.
+    out_df = df.sort_values(
         [
             "case_id",
             "context_id",
@@ -758,44 +1126,48 @@ def _detect_shifts_with_trimmed_estimators(
             "timestamp",
             "result_timestamp",
         ],
-        inplace=True,
         ignore_index=True,
     )
 
-    # split / apply
-    out_group_df_list = []
-    for _, group_df in tmp_df.groupby(["case_id", "context_id", "hash", "repository"]):
-        # clean copy will only get result columns
-        out_group_df = copy.deepcopy(group_df)
-
-        group_df["svs_diff"] = group_df["svs"].diff()
-        svs_diff_clipped = copy.deepcopy(group_df.svs_diff)
-        svs_diff_clipped.loc[
-            (group_df.svs_diff < group_df.svs_diff.quantile(0.05))
-            | (group_df.svs_diff > group_df.svs_diff.quantile(0.95))
-        ] = np.nan
-        group_df["rolling_mean"] = svs_diff_clipped.rolling(
-            Config.DISTRIBUTION_COMMITS, min_periods=1
-        ).mean()
-        group_df["rolling_std"] = svs_diff_clipped.rolling(
-            Config.DISTRIBUTION_COMMITS, min_periods=1
-        ).std()
-        group_df["z_score"] = (
-            group_df.svs_diff - group_df.rolling_mean
-        ) / group_df.rolling_std
-
-        group_df["is_shift"] = group_df.z_score.abs() > z_score_threshold
-        group_df["reverts"] = group_df.is_shift & group_df.is_shift.shift(-1)
-        out_group_df["is_step"] = (
-            group_df.is_shift
-            & ~group_df.reverts
-            & ~group_df.reverts.shift(1, fill_value=False)
-        )
-        out_group_df["is_outlier"] = group_df.is_shift & group_df.reverts
-
-        out_group_df_list.append(out_group_df)
-
-    # combine
-    out_df = pd.concat(out_group_df_list)
+    # All timeseries are analyzed at once, on contiguous arrays
+    # (instead of splitting the dataframe into one dataframe per timeseries).
+    series_starts = _group_start_flags(
+        *(out_df[c].to_numpy() for c in ("case_id", "context_id", "hash", "repository"))
+    )
+    n = len(out_df)
+
+    svs = out_df["svs"].to_numpy(dtype=np.float64)
+    svs_diff = np.empty(n)
+    svs_diff[0] = np.nan
+    np.subtract(svs[1:], svs[:-1], out=svs_diff[1:])
+    svs_diff[series_starts] = np.nan
+
+    # Trim: ignore the most extreme changes (per timeseries).
+    svs_diff_clipped = svs_diff.copy()
+    svs_diff_clipped[
+        (svs_diff < _grouped_quantile(svs_diff, series_starts, 0.05))
+        | (svs_diff > _grouped_quantile(svs_diff, series_starts, 0.95))
+    ] = np.nan
+
+    # Rolling windows over the last N rows (within the timeseries).
+    rows = np.arange(n)
+    series_first_row = np.flatnonzero(series_starts)[np.cumsum(series_starts) - 1]
+    start = np.maximum(rows - Config.DISTRIBUTION_COMMITS + 1, series_first_row)
+    end = rows + 1
+    sums = _WindowSums(svs_diff_clipped, series_starts)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        z_score = (svs_diff - sums.mean(start, end)) / sums.std(start, end)
+
+    with np.errstate(invalid="ignore"):
+        is_shift = np.abs(z_score) > z_score_threshold
+
+    # A shift that is immediately followed by a shift (in the same timeseries)
+    # reverts: the point in between is an outlier.
+    series_ends = np.append(series_starts[1:], True)
+    reverts = is_shift & ~series_ends & np.append(is_shift[1:], False)
+    reverted_before = ~series_starts & np.insert(reverts[:-1], 0, False)
+
+    out_df["is_step"] = is_shift & ~reverts & ~reverted_before
+    out_df["is_outlier"] = is_shift & reverts
 
     return out_df
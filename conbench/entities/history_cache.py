@@ -0,0 +1,112 @@
+"""
+An in-process cache for benchmark result history (timeseries), see
+conbench/entities/history.py.
+
+Building the history for a case/context/hardware/repo combination requires a
+database query plus the computation of rolling stats, for each history API
+request and for each history plot. The history only changes when a result in
+that timeseries is created, changed, or deleted. That is when the
+corresponding cache entry is invalidated (see BenchmarkResult).
+
+Invalidation does not reach the caches of other processes (see the note on
+in-process state in conbench/config.py). Entries therefore also expire after
+a maximum age. A history requested for a specific result is not served from
+a cached entry that lacks this result (see get_history_for_cchrs()).
+"""
+import collections
+import threading
+import time
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+from conbench import metrics
+
+from ..config import Config
+
+if TYPE_CHECKING:
+    from ..entities.history import HistorySample
+
+
+# The key of a timeseries (history): a case/context/hardware/repo
+# combination, as (case_id, context_id, hardware_hash, repo_url).
+TypeCCHR = Tuple[str, str, str, str]
+
+
+class HistoryCache:
+    """
+    A size-bounded LRU mapping of timeseries key to history samples. Entries
+    expire after `Config.HISTORY_CACHE_MAX_AGE_SECONDS`.
+
+    Thread-safe.
+    """
+
+    def __init__(self) -> None:
+        # Values are (insertion time, samples). Most recently used last.
+        self._entries: collections.OrderedDict[
+            TypeCCHR, Tuple[float, List["HistorySample"]]
+        ] = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return Config.HISTORY_CACHE_MAX_ENTRIES > 0
+
+    def get(self, cchr: TypeCCHR) -> Optional[List["HistorySample"]]:
+        """
+        Return a (new) list with the cached samples, or `None` upon miss.
+        """
+        with self._lock:
+            entry = self._entries.get(cchr)
+            if entry is not None:
+                inserted_at, samples = entry
+                if (
+                    time.monotonic() - inserted_at
+                    < Config.HISTORY_CACHE_MAX_AGE_SECONDS
+                ):
+                    self._entries.move_to_end(cchr)
+                    metrics.COUNTER_HISTORY_CACHE_LOOKUPS.labels(outcome="hit").inc()
+                    return list(samples)
+
+                del self._entries[cchr]
+                metrics.COUNTER_HISTORY_CACHE_EVICTIONS.labels(reason="expired").inc()
+
+        metrics.COUNTER_HISTORY_CACHE_LOOKUPS.labels(outcome="miss").inc()
+        return None
+
+    def put(self, cchr: TypeCCHR, samples: List["HistorySample"]) -> None:
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self._entries[cchr] = (time.monotonic(), list(samples))
+            self._entries.move_to_end(cchr)
+            while len(self._entries) > Config.HISTORY_CACHE_MAX_ENTRIES:
+                self._entries.popitem(last=False)
+                metrics.COUNTER_HISTORY_CACHE_EVICTIONS.labels(reason="lru").inc()
+
+    def invalidate(self, cchr: TypeCCHR) -> None:
+        with self._lock:
+            if self._entries.pop(cchr, None) is not None:
+                metrics.COUNTER_HISTORY_CACHE_EVICTIONS.labels(
+                    reason="invalidated"
+                ).inc()
+
+    def invalidate_repository(self, repo_url: str) -> None:
+        """
+        Invalidate all timeseries of the repository `repo_url`.
+        """
+        with self._lock:
+            for cchr in [k for k in self._entries if k[3] == repo_url]:
+                del self._entries[cchr]
+                metrics.COUNTER_HISTORY_CACHE_EVICTIONS.labels(
+                    reason="invalidated"
+                ).inc()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+history_cache = HistoryCache()
@@ -0,0 +1,106 @@
+"""
+An in-process cache for EntityMixin.get_or_create() lookups (Case, Context,
+Info): it maps the lookup properties (e.g. name and tags) to the primary key
+of the corresponding database row.
+
+Each benchmark result submission looks up its Case, Context and Info, which
+requires comparing (potentially large) JSONB tags. A run typically reuses a
+handful of these entities many times, so that steady-state ingest can skip
+these queries.
+
+A primary key is only stored after the row was read from or committed to the
+database. Rows of these tables are not modified after creation, i.e. an entry
+can only become stale when the row is deleted. That happens via
+EntityMixin.delete()/delete_all() (which invalidate the entries for the
+entity type) and via empty_db_tables() (which clears the cache).
+
+Deletions in another process are not seen here (see the note on in-process
+state in conbench/config.py). In practice, Case/Context/Info rows are not
+deleted outside of the test suite.
+"""
+import collections
+import hashlib
+import json
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+from conbench import metrics
+
+from ..config import Config
+
+# (entity class name, hash of the lookup properties)
+TypePKCacheKey = Tuple[str, str]
+
+
+class PrimaryKeyCache:
+    """
+    A size-bounded LRU mapping of lookup key to primary key.
+
+    Thread-safe.
+    """
+
+    def __init__(self) -> None:
+        # Most recently used last.
+        self._entries: collections.OrderedDict[
+            TypePKCacheKey, str
+        ] = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return Config.ENTITY_PK_CACHE_MAX_ENTRIES > 0
+
+    @staticmethod
+    def key(entity_name: str, props: Dict[str, Any]) -> TypePKCacheKey:
+        """
+        Return the cache key for looking up an entity of type `entity_name`
+        (e.g. "Case") by `props`. Equal props (regardless of dictionary key
+        order) have equal keys.
+        """
+        canonical = json.dumps(
+            props, sort_keys=True, separators=(",", ":"), default=str
+        )
+        return entity_name, hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def get(self, key: TypePKCacheKey) -> Optional[str]:
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            pk = self._entries.get(key)
+            if pk is not None:
+                self._entries.move_to_end(key)
+
+        metrics.COUNTER_ENTITY_PK_CACHE_LOOKUPS.labels(
+            outcome="miss" if pk is None else "hit"
+        ).inc()
+        return pk
+
+    def put(self, key: TypePKCacheKey, pk: str) -> None:
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self._entries[key] = pk
+            self._entries.move_to_end(key)
+            while len(self._entries) > Config.ENTITY_PK_CACHE_MAX_ENTRIES:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: TypePKCacheKey) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def invalidate_entity(self, entity_name: str) -> None:
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == entity_name]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+entity_pk_cache = PrimaryKeyCache()
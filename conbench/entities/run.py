@@ -30,6 +30,7 @@ from ..entities.commit import (
     backfill_default_branch_commits,
     get_github_commit_metadata,
 )
+from ..entities.commit_resolver import commit_resolver
 from ..entities.hardware import (
     Cluster,
     ClusterSchema,
@@ -170,7 +171,8 @@ class Run(Base, EntityMixin):
 
         try:
             ancestor_commits = (
-                baseline_commit.commit_ancestry_query.order_by(s.desc("commit_order"))
+                baseline_commit.get_commit_ancestry_query(max_commits=commit_limit)
+                .order_by(s.desc("commit_order"))
                 .limit(commit_limit)
                 .subquery()
             )
@@ -306,7 +308,8 @@ def commit_fetch_info_and_create_in_db_if_not_exists(
 
     If Commit not yet known in database: fetch data about commit (and related
     commits) from GitHub HTTP API if possible. Exceptions during this process
-    are logged and otherwise swallowed.
+    are logged and otherwise swallowed. With `Config.COMMIT_RESOLUTION_ASYNC`,
+    insert a placeholder instead, and fetch from a background thread.
 
     Return Commit.id (DB primary key) of existing Commit entity or of newly
     created one. Expect database collision upon insert (in this case the ID for
@@ -330,8 +333,26 @@ def commit_fetch_info_and_create_in_db_if_not_exists(
         dbcommit = Commit.first(sha=cinfo["commit_hash"], repository=cinfo["repo_url"])
 
         if dbcommit is not None:
+            if (
+                commit_resolver.enabled
+                and dbcommit.timestamp is None
+                and not commit_resolver.attempted(cinfo)
+            ):
+                # A placeholder that this process did not try to resolve yet
+                # (e.g. enqueued by a process that has terminated since).
+                commit_resolver.submit(f.current_app._get_current_object(), cinfo)
             return dbcommit, False
 
+        if commit_resolver.enabled:
+            # Do not interact with the GitHub HTTP API during this HTTP
+            # request. Insert a placeholder, and fill it in from a background
+            # thread (see conbench/entities/commit_resolver.py).
+            dbcommit = Commit.create_unknown_context(
+                commit_hash=cinfo["commit_hash"], repo_url=cinfo["repo_url"]
+            )
+            commit_resolver.submit(f.current_app._get_current_object(), cinfo)
+            return dbcommit, True
+
         # Try to fetch metadata for commit via GitHub HTTP API. Fall back
         # gracefully if that does not work.
         gh_commit_metadata_dict = None
@@ -1,5 +1,6 @@
 import os
 import signal
+import subprocess
 import sys
 
 """
@@ -28,14 +29,22 @@ loglevel = "info"  # d efault
 # Reduce connection backlog from default (2048)
 backlog = 300
 
-# Run gunicorn as a single-process N thread model (these are real threads,
-# based on CPython threading.Thread, using Unix pthreads). Assume that C copies
-# of this are created by higher-level orchestration (so that more than one CPU
-# core is after all serving requests).
+# By default, run gunicorn as a single-process N thread model (these are real
+# threads, based on CPython threading.Thread, using Unix pthreads). Assume that
+# C copies of this are created by higher-level orchestration (so that more than
+# one CPU core is after all serving requests).
 # https://github.com/conbench/conbench/issues/1018
-workers = 1
+# More than one worker process can be configured. Then the BMRT cache must be
+# shared across worker processes: a dedicated cache builder process publishes
+# snapshots into a directory (default: on /dev/shm, make sure that this tmpfs
+# is large enough) which the worker processes memory-map. Note that Prometheus
+# metrics are then tracked per worker process.
+workers = int(os.environ.get("CONBENCH_GUNICORN_WORKERS", "1"))
 threads = 15
 
+if workers > 1:
+    os.environ.setdefault("CONBENCH_BMRT_CACHE_SHM_DIR", "/dev/shm/conbench-bmrt-cache")
+
 # This is the worker timeout; an observer process will terminate the observed
 # worker process if the observed process hasn't responded within that
 # timeframe. This was more relevant at times when we ran more than one worker
@@ -54,6 +63,40 @@ keepalive = 70
 worker_connections = 400
 
 
+# The BMRT cache builder process (if any).
+_bmrt_cache_builder = None
+
+
+def when_ready(server):
+    # Start the BMRT cache builder process from the master process. Do not
+    # import conbench here: that would (depending on the environment) create
+    # the WSGI/Flask application object in the master process. Also make sure
+    # that the child process does not create it.
+    global _bmrt_cache_builder
+    if not os.environ.get("CONBENCH_BMRT_CACHE_SHM_DIR"):
+        return
+
+    env = os.environ.copy()
+    env.pop("FLASK_APP", None)
+    server.log.info("gunicorn when_ready hook: start BMRT cache builder process")
+    _bmrt_cache_builder = subprocess.Popen(
+        [sys.executable, "-c", "import conbench.job; conbench.job.run_cache_builder()"],
+        env=env,
+    )
+
+
+def on_exit(server):
+    if _bmrt_cache_builder is None:
+        return
+
+    server.log.info("gunicorn on_exit hook: terminate BMRT cache builder process")
+    _bmrt_cache_builder.terminate()
+    try:
+        _bmrt_cache_builder.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        _bmrt_cache_builder.kill()
+
+
 def post_worker_init(worker):
     # Starting the BMRT cache job machinery in this hook means that it is not
     # automatically started as a side-effect by creating / importing the
@@ -1,25 +1,44 @@
 import dataclasses
 import logging
+import os
 import signal
 import threading
 import time
-from collections import defaultdict
-from datetime import datetime
-from typing import Dict, List, NewType, Tuple, TypedDict, cast
+from collections.abc import Mapping, Sequence
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional, TypedDict
 
+import numpy as np
 import pandas as pd
 import sqlalchemy
 import sqlalchemy.orm
 
+import conbench.logger
 import conbench.metrics
-import conbench.util
+from conbench.bmrtstore import (  # noqa: F401 (re-exported)
+    BMRTBenchmarkResult,
+    BMRTStore,
+    BMRTStoreBuilder,
+    ResultList,
+    ResultsById,
+    RetentionOutcome,
+    TBenchmarkName,
+    TimeseriesFrame,
+    Tt4,
+    groupings_as_dicts,
+)
 from conbench.config import Config
-from conbench.db import session_maker
+from conbench.db import configure_engine, session_maker
 from conbench.entities.benchmark_result import (
     BenchmarkResult,
-    ui_mean_and_uncertainty,
-    ui_rel_sem,
+    result_measurements,
+    result_svs,
 )
+from conbench.entities.case import Case
+from conbench.entities.commit import Commit
+from conbench.entities.context import Context
+from conbench.entities.hardware import Hardware
+from conbench.entities.run import Run
 from conbench.hacks import get_case_kvpair_strings
 
 # A memory profiler, and a CPU profiler that are both tested to work well
@@ -34,7 +53,8 @@ most recent benchmark results, the tail end. Benchmark result tail-end cache:
 BMRT cache.
 
 Central cache data structure are Python dictionaries (with thread-safe(atomic)
-set/get operations).
+set/get operations). The results themselves are stored in a columnar fashion,
+see conbench/bmrtstore.py.
 """
 
 original_sigint_handler = signal.getsignal(signal.SIGINT)
@@ -49,80 +69,32 @@ class CacheUpdateMetaInfo:
     oldest_result_time_str: str
     covered_timeframe_days_approx: str  # stringified integer, for UI
     n_results: int
+    # Effective coverage, as of the retention policy (see
+    # Config.BMRT_CACHE_MAX_*).
+    n_timeseries: int = 0
+    # Median (across time series) of the time span covered by a time series.
+    timeseries_covered_days_median: str = "n/a"
+    # Number of time series truncated by the per-series limit (or memory
+    # budget) during the last update.
+    n_timeseries_truncated: int = 0
+    nbytes_approx: int = 0
+    retention_policy: str = "n/a"
 
 
-# CPython 3.10/3.11 feature:  dataclass nicely integrated with slots. __slots__
-# saves memory: prevents the automatic creation of __dict__ and __weakref__ for
-# each instance. See
-# https://docs.python.org/3/reference/datamodel.html#object.__slots__
-# https://www.trueblade.com/blogs/news/python-3-10-new-dataclass-features
-@dataclasses.dataclass(slots=True)
-class BMRTBenchmarkResult:
-    id: str
-    case_id: str
-    context_id: str
-    run_id: str
-    data: List[float]
-    svs: float
-    svs_type: str
-    unit: str
-    benchmark_name: str
-    started_at: float
-    hardware_id: str
-    hardware_name: str
-    case_text_id: str
-    case_dict: Dict[str, str]
-    context_dict: Dict
-    ui_time_started_at: str
-    ui_hardware_short: str
-    ui_non_null_sample_count: str
-    run_reason: str
-
-    # There is conceptual duplication between the class BenchmarkResult
-    # and this class BMRTBenchmarkResult. Fundamentally, it might make sense
-    # that we have two types of classes, with distinct values:
-    # - one for database abstraction (the 'big instances', mutable, ...)
-    # - one for data mangling (small mem footprint, immutable, ...)
-    @property
-    def ui_mean_and_uncertainty(self) -> str:
-        return ui_mean_and_uncertainty(self.data, self.unit)
-
-    @property
-    def ui_rel_sem(self) -> Tuple[str, str]:
-        return ui_rel_sem(self.data)
-
-    @property
-    def started_at_iso(self) -> str:
-        """
-        Add an ISO timestring on the object so that JavaScript's `new
-        Date(input)` can parse this into a tz-aware object.
-        """
-        return conbench.util.tznaive_dt_to_aware_iso8601_for_api(
-            datetime.fromtimestamp(self.started_at)
-        )
-
-
-# Do this for case ID, etc, too.
-TBenchmarkName = NewType("TBenchmarkName", str)
-
-# This type is used often. It's the famous 4-tuple defining a timeseries. Or
-# maybe turn this into a namedtuple or sth like this. Watch out a bit for mem
-# consumption.
-Tt4 = Tuple[TBenchmarkName, str, str, str]
-
-# A type for a dictionary: key is 4-tuple defining a time series, and value is
-# a pandas dataframe containing the time series (index: pd.DateTimeIndex
-# tz-aware, one column: single value summary).
-TDict4tdf = Dict[Tt4, pd.DataFrame]
-TDict4tlist = Dict[Tt4, List[BMRTBenchmarkResult]]
+TDict4tlist = Dict[Tt4, ResultList]
 
 
 class CacheDict(TypedDict):
-    by_id: Dict[str, BMRTBenchmarkResult]
-    by_benchmark_name: Dict[TBenchmarkName, List[BMRTBenchmarkResult]]
-    by_case_id: Dict[str, List[BMRTBenchmarkResult]]
-    by_4t_df: TDict4tdf
+    # All results are stored in `store` (columnar). The other values are
+    # different views on these results.
+    store: BMRTStore
+    by_id: Mapping[str, BMRTBenchmarkResult]
+    by_benchmark_name: Dict[TBenchmarkName, ResultList]
+    by_case_id: Dict[str, ResultList]
     by_4t_list: TDict4tlist
+    # All time series (one per 4-tuple), in one set of arrays. Also a mapping
+    # from 4-tuple to time series dataframe.
+    timeseries: TimeseriesFrame
     meta: CacheUpdateMetaInfo
 
 
@@ -131,50 +103,331 @@ class ResultTimeseries:
     t4: Tt4
     benchmark_name: str
     df: pd.DataFrame
-    bmrlist: List[BMRTBenchmarkResult]
-
-
-# Think: do work in a child process, provide dictionary via shared memory to
-# parent, maybe via https://pypi.org/project/shared-memory-dict/ this is _not_
-# as stdlib pickling dict
-# https://github.com/luizalabs/shared-memory-dict/issues/10
-bmrt_cache: CacheDict = {
-    "by_id": {},
-    "by_benchmark_name": {},
-    "by_case_id": {},
-    "by_4t_list": {},
-    "by_4t_df": {},
-    "meta": CacheUpdateMetaInfo(
+    bmrlist: Sequence[BMRTBenchmarkResult]
+
+
+def _cache_dict_from_store(store: BMRTStore, meta: CacheUpdateMetaInfo) -> CacheDict:
+    by_name_dict, by_case_id_dict, bmrlist_by_4tuple = groupings_as_dicts(store)
+    return {
+        "store": store,
+        "by_id": ResultsById(store),
+        "by_benchmark_name": by_name_dict,
+        "by_case_id": by_case_id_dict,
+        "by_4t_list": bmrlist_by_4tuple,
+        # The arrays and dataframes are built on demand.
+        "timeseries": TimeseriesFrame(store, list(bmrlist_by_4tuple)),
+        "meta": meta,
+    }
+
+
+# When Config.BMRT_CACHE_SHM_DIR is set then the store is not built in this
+# process, but backed by a memory-mapped snapshot published by the cache
+# builder process (see conbench/bmrtsnapshot.py).
+bmrt_cache: CacheDict = _cache_dict_from_store(
+    BMRTStoreBuilder().build(),
+    CacheUpdateMetaInfo(
         newest_result_time_str="n/a",
         oldest_result_time_str="n/a",
         n_results=0,
         covered_timeframe_days_approx="n/a",
     ),
-}
+)
 
 SHUTDOWN = False
 _STARTED = False
 
+# time.monotonic() when the cache content was last replaced, or confirmed to
+# be up-to-date (see cache_age_seconds()).
+_CACHE_CONFIRMED_AT: Optional[float] = None
+
+# The cache state is considered stale (see cache_state()) when it has not been
+# confirmed to be up-to-date for that long. Normally, an update happens every
+# couple of minutes.
+BMRT_CACHE_STALE_AFTER_SECONDS = 30 * 60
+
+# Sleep briefly after processing each row during cache population, so that
+# request-handling threads in the same process get a chance to run. Disabled in
+# the dedicated cache builder process.
+_SPREAD_OUT_CPU_WORK = True
+
+# Set in the cache builder process: the PID of the parent process (gunicorn's
+# master process). The builder terminates itself when it becomes orphaned.
+_BUILDER_PARENT_PID: Optional[int] = None
+
 BMRT_CACHE_SIZE = 0.8 * 10**6
 if Config.TESTING:
     # quicker update in testing
     BMRT_CACHE_SIZE = 0.05 * 10**6
 
+# Most update cycles only fetch results newer than the newest result seen so
+# far (delta update). Every Nth cycle re-populate the cache from scratch. That
+# full rebuild picks up changes that the delta logic cannot see: results
+# submitted with a (user-given) timestamp older than the newest cached result,
+# deleted results, results whose commit was later found to be on the default
+# branch, etc.
+BMRT_CACHE_FULL_REFRESH_EVERY_N_CYCLES = 10
+
+# When Config.BMRT_CACHE_PERSIST_DIR is set: minimum time between writing two
+# snapshots to disk. A full rebuild is always persisted.
+BMRT_CACHE_PERSIST_MIN_INTERVAL_SECONDS = 300
+
+
+@dataclasses.dataclass
+class _CacheRefreshState:
+    # Timestamp (tz-naive, UTC, like in the DB) of the newest result seen
+    # during the last fetch. `None` means: cache not populated yet.
+    newest_result_timestamp: Optional[datetime] = None
+    # The maximum number of results to retain in the cache during delta
+    # updates. Set after each full rebuild.
+    window_size: int = int(BMRT_CACHE_SIZE)
+    cycles_since_full_refresh: int = 0
+
+
+_refresh_state = _CacheRefreshState()
+
 
 # Fetching one million items from a sample DB takes ~1 minute on my machine
 # (the `results = Session.scalars(....all())` call takes that long.
 def _fetch_and_cache_most_recent_results() -> None:
     # https://docs.sqlalchemy.org/en/20/orm/session_api.html#sqlalchemy.orm.sessionmaker.begin
 
+    full_refresh = _next_update_is_full_refresh()
+
     # This pattern is weird, see https://github.com/sqlalchemy/sqlalchemy/issues/6519
     # not trivial!
     dbsession = session_maker()
     with dbsession:
         with dbsession.begin():
-            _fetch_and_cache_most_recent_results_guts(dbsession)
+            if full_refresh:
+                _fetch_and_cache_most_recent_results_guts(dbsession)
+                _refresh_state.cycles_since_full_refresh = 0
+            else:
+                _fetch_and_cache_new_results_delta(dbsession)
+                _refresh_state.cycles_since_full_refresh += 1
             # commits transaction, closes session
 
 
+def _next_update_is_full_refresh() -> bool:
+    return (
+        _refresh_state.newest_result_timestamp is None
+        or _refresh_state.cycles_since_full_refresh
+        >= BMRT_CACHE_FULL_REFRESH_EVERY_N_CYCLES
+    )
+
+
+def _query_results_newest_first(
+    dbsession: sqlalchemy.orm.session.Session,
+    newer_than_or_equal: Optional[datetime] = None,
+) -> sqlalchemy.engine.Result:
+    """
+    Return an iterator over result rows (see _COLUMNS_FOR_CACHE), newest
+    first (by user-given benchmark start time), at most BMRT_CACHE_SIZE of
+    them. Only results obtained for a commit on the default branch are
+    considered.
+
+    If `newer_than_or_equal` is set then only return those results with a
+    timestamp greater than or equal to that.
+    """
+    # A Core-level query, selecting only those columns that the
+    # cache stores. Compared to loading BenchmarkResult objects (plus Run,
+    # Commit, Hardware via relationship loading) this skips ORM object
+    # construction and identity map bookkeeping for each row. The
+    # default-branch criterion (see Commit.on_default_branch) is applied in
+    # the database, so that the limit applies to relevant results only.
+    # Case and context dictionaries are not fetched here (they would be
+    # transferred once per row); see _resolve_entity_attributes().
+    query_statement = (
+        sqlalchemy.select(*_COLUMNS_FOR_CACHE)
+        .join(Case, Case.id == BenchmarkResult.case_id)
+        .join(Run, Run.id == BenchmarkResult.run_id)
+        .join(Commit, Commit.id == Run.commit_id)
+        .join(Hardware, Hardware.id == Run.hardware_id)
+        .where(Commit.sha == Commit.fork_point_sha)
+    )
+
+    if newer_than_or_equal is not None:
+        # Benefits from the index on benchmark_result.timestamp.
+        query_statement = query_statement.where(
+            BenchmarkResult.timestamp >= newer_than_or_equal
+        )
+
+    # Process query result rows in a streaming-like fashion in smaller chunks
+    # to keep peak memory usage in check: `yield_per` implies a server-side
+    # cursor (`stream_results`). Also see
+    # https://docs.sqlalchemy.org/en/20/core/connections.html#using-server-side-cursors-a-k-a-stream-results
+    query_statement = (
+        query_statement.order_by(BenchmarkResult.timestamp.desc()).limit(
+            int(BMRT_CACHE_SIZE)
+        )
+    ).execution_options(yield_per=2000)
+
+    # Consume the returned value as an iterator. `all()` would consume all
+    # results and would defeat the purpose of the memory-saving exercise.
+    return dbsession.execute(query_statement)
+
+
+_COLUMNS_FOR_CACHE = (
+    BenchmarkResult.id,
+    BenchmarkResult.timestamp,
+    BenchmarkResult.data,
+    BenchmarkResult.error,
+    BenchmarkResult.mean,
+    BenchmarkResult.unit,
+    BenchmarkResult.case_id,
+    BenchmarkResult.context_id,
+    BenchmarkResult.run_id,
+    Case.name.label("benchmark_name"),
+    Run.reason.label("run_reason"),
+    Run.hardware_id,
+    Hardware.name.label("hardware_name"),
+)
+
+
+def _add_db_row_to_store_builder(builder: BMRTStoreBuilder, row) -> None:
+    """
+    Add the result in `row` (see _COLUMNS_FOR_CACHE) to `builder`. The case
+    and context attributes of entities not seen before are resolved later, in
+    bulk (see _resolve_entity_attributes()).
+    """
+    # For now: put both, failed and non-failed results into the cache.
+    # It would be a nice code simplification to only consider succeeded
+    # ones, but then we miss out on reporting about the failed ones.
+    measurements = result_measurements(row.data, row.error)
+
+    # The str() indirections below are here to quickly make sure that there is
+    # no more SQLAlchemy magic associated to objects we store here (no more
+    # mapping to columns). Maybe that is not needed but instead of making that
+    # experiment I took the quick way.
+    # Case, context, hardware, run attributes are stored once per entity (and
+    # not once per result). For example, the context dictionaries can be a
+    # rather big collection of strings. However, by the nature of the
+    # processed data there can be a high degree of duplication across
+    # benchmark results. The data source uses a unique constraint (enforced in
+    # DB) with an index on the entire dictionary.
+    enc = builder.encode
+    builder.add(
+        id=str(row.id),
+        svs=result_svs(measurements, row.mean),
+        started_at=row.timestamp.timestamp(),
+        data=measurements,
+        non_null_sample_count=0
+        if row.data is None
+        else sum(1 for x in row.data if x is not None),
+        codes={
+            "benchmark_name": enc("benchmark_name", str(row.benchmark_name)),
+            "case": builder.encode_deferred("case", str(row.case_id)),
+            "context": builder.encode_deferred("context", str(row.context_id)),
+            "hardware": enc(
+                "hardware", str(row.hardware_id), lambda: (str(row.hardware_name),)
+            ),
+            "run": enc(
+                "run",
+                str(row.run_id),
+                lambda: (row.run_reason if row.run_reason else "n/a",),
+            ),
+            # See BenchmarkResult.svs_type.
+            "svs_type": enc("svs_type", "mean"),
+            "unit": enc("unit", str(row.unit) if row.unit else "n/a"),
+        },
+    )
+
+
+def _resolve_entity_attributes(
+    dbsession: sqlalchemy.orm.session.Session, builder: BMRTStoreBuilder
+) -> None:
+    """
+    Fetch the case and context dictionaries for the entities added to
+    `builder` that are not yet known (one query per chunk of entities, not
+    one per result).
+    """
+
+    def case_attrs(casedict):
+        # A textual representation of the case permutation. As it is
+        # 'complete' it should also work as a proper identifier (like primary
+        # key).
+        return (" ".join(get_case_kvpair_strings(casedict)), casedict)
+
+    for table, entity, to_attrs in (
+        ("case", Case, case_attrs),
+        ("context", Context, lambda ctxdict: (ctxdict,)),
+    ):
+        keys = builder.deferred_keys(table)
+        attrs_by_key = {}
+        for i in range(0, len(keys), 5000):
+            rows = dbsession.execute(
+                sqlalchemy.select(entity.id, entity.tags).where(
+                    entity.id.in_(keys[i : i + 5000])  # noqa: E203
+                )
+            )
+            for key, tags in rows:
+                attrs_by_key[key] = to_attrs(tags)
+        builder.resolve_deferred(table, attrs_by_key)
+
+
+def _retention_cutoff_timestamp() -> Optional[datetime]:
+    """
+    Return the (tz-naive, UTC, like in the DB) timestamp that results must
+    not be older than, or `None` if there is no such limit.
+    """
+    if not Config.BMRT_CACHE_MAX_AGE_DAYS:
+        return None
+    return datetime.utcnow() - timedelta(days=Config.BMRT_CACHE_MAX_AGE_DAYS)
+
+
+def _apply_retention_policy(store: BMRTStore) -> RetentionOutcome:
+    cutoff = _retention_cutoff_timestamp()
+    return store.retain(
+        # The inverse of how BMRTBenchmarkResult.started_at is derived.
+        min_started_at=cutoff.timestamp() if cutoff is not None else None,
+        max_per_series=Config.BMRT_CACHE_MAX_RESULTS_PER_SERIES or None,
+        max_bytes=Config.BMRT_CACHE_MAX_BYTES or None,
+    )
+
+
+def _meta_for_store(
+    store: BMRTStore, retention: RetentionOutcome
+) -> CacheUpdateMetaInfo:
+    policy = [f"max {int(BMRT_CACHE_SIZE)} results"]
+    if Config.BMRT_CACHE_MAX_AGE_DAYS:
+        policy.append(f"max age {Config.BMRT_CACHE_MAX_AGE_DAYS} days")
+    if Config.BMRT_CACHE_MAX_BYTES:
+        policy.append(f"max {Config.BMRT_CACHE_MAX_BYTES / 10**6:.0f} MB")
+    if retention.max_per_series is not None:
+        policy.append(f"max {retention.max_per_series} results per time series")
+
+    if store.n_results == 0:
+        return CacheUpdateMetaInfo(
+            newest_result_time_str="n/a",
+            oldest_result_time_str="n/a",
+            n_results=0,
+            covered_timeframe_days_approx="n/a",
+            retention_policy=", ".join(policy),
+        )
+
+    newest = store.row(0)
+    oldest = store.row(store.n_results - 1)
+
+    # Time span covered by each time series (newest first within each).
+    order, offsets = store.groupings["by_4t"]
+    spans = (
+        store.started_at[order[offsets[:-1]]] - store.started_at[order[offsets[1:] - 1]]
+    )
+
+    return CacheUpdateMetaInfo(
+        newest_result_time_str=newest.ui_time_started_at,
+        covered_timeframe_days_approx=str(
+            int((newest.started_at - oldest.started_at) / 86400)
+        ),
+        oldest_result_time_str=oldest.ui_time_started_at,
+        n_results=store.n_results,
+        n_timeseries=len(spans),
+        timeseries_covered_days_median=f"{float(np.median(spans)) / 86400:.1f}",
+        n_timeseries_truncated=retention.n_series_truncated,
+        nbytes_approx=store.nbytes() + store.tables_nbytes(),
+        retention_policy=", ".join(policy),
+    )
+
+
 def _fetch_and_cache_most_recent_results_guts(
     dbsession: sqlalchemy.orm.session.Session,
 ):
@@ -184,38 +437,19 @@ def _fetch_and_cache_most_recent_results_guts(
     )
     t0 = time.monotonic()
 
-    # Note(JP): process query result rows in a streaming-like fashion in
-    # smaller chunks to keep peak memory usage in check. Also see
-    # https://docs.sqlalchemy.org/en/20/core/connections.html#using-server-side-cursors-a-k-a-stream-results
-    # https://docs.sqlalchemy.org/en/20/orm/queryguide/api.html#fetching-large-result-sets-with-yield-per
-    # Also fetch hardware from associated Run, so that result.run is in cache,
-    # too, and so that result.run.hardware is a quick lookup. Use selectinload
-    # for fetching Run data -- "The yield_per execution option is not
-    # compatible with “subquery” eager loading loading or “joined” eager
-    # loading when using collections. It is potentially compatible with “select
-    # in” eager loading , provided the database driver supports multiple,
-    # independent cursors." -- seems to result in overall less queries.
-    query_statement = (
-        sqlalchemy.select(BenchmarkResult)
-        .options(sqlalchemy.orm.selectinload(BenchmarkResult.run))
-        .order_by(BenchmarkResult.timestamp.desc())
-        .limit(int(BMRT_CACHE_SIZE))
-    ).execution_options(yield_per=2000)
-
-    # Corresponding to the `yield_per` magic, consume the returned value as an
-    # iterator. `all()` would consume all results and would defeat the purpose
-    # of the memory-saving exercise. The following line of code does not do
-    # much of the work yet; that begins once the iterator is consumed (maybe it
-    # fetches the first chunk?).
-    result_rows_iterator = dbsession.scalars(query_statement)
+    result_rows_iterator = _query_results_newest_first(
+        dbsession, newer_than_or_equal=_retention_cutoff_timestamp()
+    )
 
-    by_id_dict: Dict[str, BMRTBenchmarkResult] = {}
-    by_name_dict: Dict[TBenchmarkName, List[BMRTBenchmarkResult]] = defaultdict(list)
-    by_case_id_dict: Dict[str, List[BMRTBenchmarkResult]] = defaultdict(list)
+    # Re-use case and context dictionaries (and case text IDs) of the
+    # currently cached results: derive these only for entities not seen
+    # before.
+    builder = BMRTStoreBuilder(intern_from=bmrt_cache["store"])
 
-    first_result = None
-    last_result = None
-    for result in result_rows_iterator:  # pylint: disable=E1133
+    newest_timestamp = None
+    n_rows = 0
+    phases = _UpdatePhaseTimer()
+    for row in result_rows_iterator:  # pylint: disable=E1133
         # Note that the DB might feed us so quickly that this loop body becomes
         # CPU-bound. In that case, given the current deployment model, we
         # starve the other threads (hello, GIL!) that want to process HTTP
@@ -223,174 +457,211 @@ def _fetch_and_cache_most_recent_results_guts(
         # iteration here (e.g. 0.1 s). We will see. Better would be do do the
         # update from a separate process, and share the outcome via shared mem
         # (e.g. SHM, but anything goes as long as we don't re-serialize).
-        # Update: Spread out the CPU work a little more.
-        time.sleep(0.0001)
-
-        # Keep track of the first (newest) and last (oldest) result
-        # while consuming the iterator. If n=1 they are the same.
-        last_result = result
-        if first_result is None:
-            first_result = result
-
-        # For now: put both, failed and non-failed results into the cache.
-        # It would be a nice code simplification to only consider succeeded
-        # ones, but then we miss out on reporting about the failed ones.
-        # Note: with named types it's here not enough to to # type: ...
-        # but an explicit cast is required? perf impact? dunno.
-        # Related: https://github.com/python/typing/discussions/1146
-        benchmark_name = cast(TBenchmarkName, str(result.case.name))
-
-        # A textual representation of the case permutation. As it is 'complete'
-        # it should also work as a proper identifier (like primary key).
-        casedict = result.case.to_dict()
-        case_text_id = " ".join(get_case_kvpair_strings(casedict))
-
-        bmrrun = result.run
-
-        # Skip results that have not been obtained for the default code branch.
-        bmrcommit = bmrrun.commit
-        if bmrcommit is None:
-            continue
+        # Update: Spread out the CPU work a little more. Update: that
+        # separate process exists now (see run_cache_builder()); there, this
+        # is not needed.
+        if _SPREAD_OUT_CPU_WORK:
+            time.sleep(0.0001)
+        n_rows += 1
 
-        if not bmrcommit.on_default_branch:
-            continue
+        # Keep track of the first (newest) result.
+        if newest_timestamp is None:
+            newest_timestamp = row.timestamp
 
-        bmr = BMRTBenchmarkResult(
-            id=str(result.id),
-            benchmark_name=benchmark_name,
-            started_at=result.timestamp.timestamp(),
-            data=result.measurements,
-            svs=result.svs,  # float(result.mean) if result.mean else None,
-            svs_type=result.svs_type,
-            unit=str(result.unit) if result.unit else "n/a",
-            hardware_id=str(bmrrun.hardware.id),
-            hardware_name=str(bmrrun.hardware.name),
-            case_id=str(result.case_id),
-            context_id=str(result.context_id),
-            run_id=str(result.run_id),
-            # These context dictionaries are often the largest part of these
-            # BMRTBenchmarkResult object (in terms of memory usage) -- they can
-            # be a rather big collection of strings. However, by the nature of
-            # the processed data there can be a high degree of duplication
-            # across benchmark results. The data source uses a unique
-            # constraint (enforced in DB) with an index on the entire
-            # dictionary, i.e. use the _same_ object here and assume it may be
-            # shared across potentially many BMRTBenchmarkResult objects.
-            context_dict=result.context.to_dict(),
-            case_text_id=case_text_id,
-            case_dict=casedict,
-            ui_hardware_short=str(result.ui_hardware_short),
-            ui_time_started_at=str(result.ui_time_started_at),
-            ui_non_null_sample_count=result.ui_non_null_sample_count,
-            run_reason=bmrrun.reason if bmrrun.reason else "n/a",
-        )
+        _add_db_row_to_store_builder(builder, row)
 
-        # The str() indirections below (and above) are here to quickly make
-        # sure that there is no more SQLAlchemy magic associated to objects we
-        # store here (no more mapping to columns). Maybe that is not needed
-        # but instead of making that experiment I took the quick way.
-        by_id_dict[str(result.id)] = bmr
-        by_name_dict[benchmark_name].append(bmr)
+    phases.done("fetch")
+    conbench.metrics.COUNTER_BMRT_CACHE_ROWS_FETCHED.labels(kind="full").inc(n_rows)
 
-        # Add a property on the Case object, on the fly.
-        # Build the textual representation of this case which should also
-        # uniquely / unambiguously define/identify this specific case.
-        by_case_id_dict[str(result.case_id)].append(bmr)
-
-    t1 = time.monotonic()
-
-    if len(by_name_dict) == 0:
+    if len(builder) == 0:
         log.info("BMRT cache: no results")
+        # Expose that (and not the state from before, or from boot): the cache
+        # is populated, with nothing.
+        empty = builder.build()
+        _set_cache(
+            _cache_dict_from_store(
+                empty, _meta_for_store(empty, _apply_retention_policy(empty))
+            )
+        )
         return
 
     # This helps mypy, too.
-    assert first_result
-    assert last_result
+    assert newest_timestamp
 
-    # Group all benchmark results into timeseries
-    dict4tdf, bmrlist_by_4tuple = _generate_tsdf_per_4tuple(by_name_dict)
+    _resolve_entity_attributes(dbsession, builder)
+    phases.done("resolve_entities")
+    t1 = time.monotonic()
 
-    # Mutate the dictionary which is accessed by other threads, do this in a
-    # quick fashion -- each of this assignments is atomic (thread-safe), but
-    # between those two assignments a thread might perform read access. (minor
-    # inconsistency is possible). Of course we can add another lookup
-    # indirection layer by assembling a completely new dictionary here and then
-    # re-defining the name bmrt_cache.
-    bmrt_cache["by_id"] = by_id_dict
-    bmrt_cache["by_benchmark_name"] = by_name_dict
-    bmrt_cache["by_case_id"] = by_case_id_dict
-    bmrt_cache["by_4t_df"] = dict4tdf
-    bmrt_cache["by_4t_list"] = bmrlist_by_4tuple
-    bmrt_cache["meta"] = CacheUpdateMetaInfo(
-        newest_result_time_str=first_result.ui_time_started_at,
-        covered_timeframe_days_approx=str(
-            (first_result.timestamp - last_result.timestamp).days
-        ),
-        oldest_result_time_str=last_result.ui_time_started_at,
-        n_results=len(by_id_dict),
-    )
+    built = builder.build()
+    phases.done("build")
+    retention = _apply_retention_policy(built)
+    phases.done("retention")
+    store = retention.store
+    cache = _cache_dict_from_store(store, _meta_for_store(store, retention))
+    phases.done("grouping")
+    t2 = time.monotonic()
+
+    # Swap in the new cache state (quickly, see _set_cache()).
+    _set_cache(cache)
+
+    _refresh_state.newest_result_timestamp = newest_timestamp
+    # If the query was limited by BMRT_CACHE_SIZE then the cache now covers
+    # the intended window: keep the cache at that size during delta updates.
+    # Otherwise the database does not yet hold that many results; allow the
+    # cache to grow.
+    if n_rows >= int(BMRT_CACHE_SIZE):
+        _refresh_state.window_size = built.n_results
+    else:
+        _refresh_state.window_size = int(BMRT_CACHE_SIZE)
 
     conbench.metrics.GAUGE_BMRT_CACHE_LAST_UPDATE_SECONDS.set(t1 - t0)
+    _report_update_metrics("full", phases, n_evicted={"retention": retention.n_evicted})
 
+    dedup_saved = store.dedup_bytes_saved()
     log.info(
-        ("BMRT cache population done (%s results, took %.3f s)"),
-        len(bmrt_cache["by_id"]),
+        (
+            "BMRT cache population done (%s results, %s time series, took %.3f s, "
+            "grouping took %.3f s, arrays: %.1f MB, entity dedup saved %.1f MB: %s)"
+        ),
+        store.n_results,
+        len(cache["by_4t_list"]),
         t1 - t0,
+        t2 - t1,
+        store.nbytes() / 10**6,
+        sum(dedup_saved.values()) / 10**6,
+        ", ".join(f"{k}: {v / 10**6:.1f} MB" for k, v in dedup_saved.items()),
     )
 
 
-def _periodically_fetch_last_n_benchmark_results() -> None:
+def _fetch_and_cache_new_results_delta(
+    dbsession: sqlalchemy.orm.session.Session,
+):
     """
-    Immediately return after having spawned a thread triggers periodic action.
+    Fetch only those results that are newer than (or as new as) the newest
+    result seen during the previous fetch. Build a new store containing these
+    new results followed by the previously cached ones, and evict the oldest
+    results so that the cache does not grow beyond its window size.
+
+    The store currently exposed via `bmrt_cache` is accessed by other threads
+    (request handlers); it is immutable. The new store's tables extend the
+    tables of the current store, so that the codes of already cached results
+    remain valid. The arrays are concatenated, which is cheap compared to a
+    full rebuild (no per-result Python work for the cached results).
     """
-    first_sleep_seconds = 3
-    min_delay_between_runs_seconds = 120
+    assert _refresh_state.newest_result_timestamp is not None
+    t0 = time.monotonic()
 
-    if Config.TESTING:
-        first_sleep_seconds = 2
-        min_delay_between_runs_seconds = 20
+    old_store = bmrt_cache["store"]
+    by_id_old = bmrt_cache["by_id"]
+    builder = BMRTStoreBuilder(extends=old_store)
+
+    newest_timestamp = _refresh_state.newest_result_timestamp
+    n_rows = 0
+    n_skipped = 0
+    phases = _UpdatePhaseTimer()
+    for row in _query_results_newest_first(  # pylint: disable=E1133
+        dbsession, newer_than_or_equal=_refresh_state.newest_result_timestamp
+    ):
+        n_rows += 1
+        newest_timestamp = max(newest_timestamp, row.timestamp)
+
+        # The query is inclusive with respect to the timestamp of the newest
+        # result seen before (there may be more than one result with that
+        # timestamp). Skip those that are already in the cache.
+        if str(row.id) in by_id_old:
+            n_skipped += 1
+            continue
 
-    def _run_forever():
-        global SHUTDOWN
-        global _STARTED
-        _STARTED = True
+        _add_db_row_to_store_builder(builder, row)
 
-        delay_s = first_sleep_seconds
+    phases.done("fetch")
+    conbench.metrics.COUNTER_BMRT_CACHE_ROWS_FETCHED.labels(kind="delta").inc(n_rows)
+    conbench.metrics.COUNTER_BMRT_CACHE_ROWS_SKIPPED.labels(
+        reason="already_cached"
+    ).inc(n_skipped)
 
-        while True:
-            # Build responsive sleep loop that inspects SHUTDOWN often.
-            deadline = time.monotonic() + delay_s
-            while time.monotonic() < deadline:
-                if SHUTDOWN:
-                    log.debug("_run_forever: shut down")
-                    return
+    _resolve_entity_attributes(dbsession, builder)
+    phases.done("resolve_entities")
 
-                time.sleep(0.1)
+    _refresh_state.newest_result_timestamp = newest_timestamp
 
-            t0 = time.monotonic()
+    n_new = len(builder)
+    if n_new == 0:
+        _confirm_cache_is_current()
+        log.info(
+            "BMRT cache delta update: no new results (took %.3f s)",
+            time.monotonic() - t0,
+        )
+        return
 
-            # yappi.start()
+    # All new results are at least as new as the newest cached result, i.e.
+    # the newest-first order is retained. Drop the oldest results to keep the
+    # window size. Then apply the retention policy (which may evict results
+    # from any time series).
+    window_size = _refresh_state.window_size
+    n_evicted = max(0, n_new + old_store.n_results - window_size)
+    built = builder.build().concat(old_store.head(old_store.n_results - n_evicted))
+    phases.done("build")
+    retention = _apply_retention_policy(built)
+    phases.done("retention")
+    store = retention.store
+
+    cache = _cache_dict_from_store(store, _meta_for_store(store, retention))
+    phases.done("grouping")
+    _set_cache(cache)
 
-            try:
-                # filprofile(lambda: _fetch_and_cache_most_recent_results(), "fil-result")
-                _fetch_and_cache_most_recent_results()
-            except Exception as exc:
-                # For now, log all error detail. (but handle all exceptions; do
-                # some careful log-reading after rolling this out).
-                log.exception("BMRT cache: exception during update: %s", exc)
+    t1 = time.monotonic()
+    conbench.metrics.GAUGE_BMRT_CACHE_LAST_UPDATE_SECONDS.set(t1 - t0)
+    _report_update_metrics(
+        "delta",
+        phases,
+        n_evicted={"window": n_evicted, "retention": retention.n_evicted},
+    )
+    n_evicted += retention.n_evicted
 
-            # yappi.stop()
-            # yappi_print_threads_stats()
+    log.info(
+        "BMRT cache delta update done (%s new, %s evicted, %s results, took %.3f s)",
+        n_new,
+        n_evicted,
+        store.n_results,
+        t1 - t0,
+    )
 
-            last_call_duration_s = time.monotonic() - t0
 
-            # Generally we want to spent the majority of the time _not_ doing
-            # this thing here. So, if the last iteration lasted for e.g. ~60
-            # seconds, then keep waiting for ~five minutes until triggering the
-            # next run.
-            delay_s = max(min_delay_between_runs_seconds, 5 * last_call_duration_s)
-            log.info("BMRT cache: trigger next fetch in %.3f s", delay_s)
+class _UpdatePhaseTimer(Dict[str, float]):
+    """
+    Duration of the phases of a cache update (in seconds), by phase name.
+    Call done(<phase>) at the end of each phase.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._t = time.monotonic()
+
+    def done(self, phase: str) -> None:
+        now = time.monotonic()
+        self[phase] = now - self._t
+        self._t = now
+
+
+def _report_update_metrics(
+    kind: str, phases: _UpdatePhaseTimer, n_evicted: Dict[str, int]
+) -> None:
+    for phase, seconds in phases.items():
+        conbench.metrics.GAUGE_BMRT_CACHE_UPDATE_PHASE_SECONDS.labels(
+            kind=kind, phase=phase
+        ).set(seconds)
+    conbench.metrics.HISTOGRAM_BMRT_CACHE_UPDATE_SECONDS.labels(kind=kind).observe(
+        sum(phases.values())
+    )
+    for reason, n in n_evicted.items():
+        conbench.metrics.COUNTER_BMRT_CACHE_RESULTS_EVICTED.labels(reason=reason).inc(n)
+
 
+def _periodically_fetch_last_n_benchmark_results() -> None:
+    """
+    Immediately return after having spawned a thread triggers periodic action.
+    """
     if not Config.CREATE_ALL_TABLES:
         # This needs to be done more cleanly -- when running the DB migration,
         # the app should not even initialize so far.
@@ -406,98 +677,358 @@ def _periodically_fetch_last_n_benchmark_results() -> None:
     # thread.
 
 
-def _generate_tsdf_per_4tuple(
-    by_name_dict: Dict[TBenchmarkName, List[BMRTBenchmarkResult]]
-) -> Tuple[TDict4tdf, TDict4tlist]:
-    t2 = time.monotonic()
-    by_name_dict_with_timeseries_tuplekeys: Dict[
-        TBenchmarkName, Dict[Tuple, List[BMRTBenchmarkResult]]
-    ] = {}
-
-    for bname, results in by_name_dict.items():
-        # The magic time series 4-tuple is
-        # bname, caseid, hwid, ctxid
-        by_ts_tuple: Dict[Tuple, List[BMRTBenchmarkResult]] = defaultdict(list)
-        for r in results:
-            by_ts_tuple[(r.case_id, r.context_id, r.hardware_id)].append(r)
-        by_name_dict_with_timeseries_tuplekeys[bname] = by_ts_tuple
-
-    t3 = time.monotonic()
-
-    tsdf_by_4tuple: TDict4tdf = {}
-    bmrlist_by_4tuple: TDict4tlist = {}
-
-    # Brutal, slow, approach: (ideally we find a way to represent all data in a
-    # single dataframe with decent multi-index -- that could be a major speedup
-    # for timeseries analysis on all of these series in a bulk.) one dataframe
-    # per 4-tuple: (bname, case_id, context_id, hardware_id).
-    # I have seen this below DF construction loop to take 3 seconds for 2*10^5
-    # results.
-    for bname, unsorted_timeseries in by_name_dict_with_timeseries_tuplekeys.items():
-        for (
-            case_id,
-            context_id,
-            hardware_id,
-        ), usresults in unsorted_timeseries.items():
-            # Think: `usresults` is a list not yet sorted by time.
-
-            df = pd.DataFrame(
-                # Note(jp:): cannot use a generator expression here, len needs
-                # to be known.
-                {"svs": [r.svs for r in usresults]},
-                # Note(jp): also no generator expression possible. The
-                # `unit="s"` is the critical ingredient to convert this list of
-                # floaty unix timestamps to datetime representation. `utc=True`
-                # is required to localize the pandas DateTimeIndex to UTC
-                # (input is tz-naive).
-                index=pd.to_datetime(
-                    [r.started_at for r in usresults], unit="s", utc=True
-                ),
+def _should_stop() -> bool:
+    if SHUTDOWN:
+        return True
+
+    # In the cache builder process: stop when the parent went away (then
+    # this process has been re-parented).
+    if _BUILDER_PARENT_PID is not None and os.getppid() != _BUILDER_PARENT_PID:
+        log.info("BMRT cache builder: parent process went away")
+        return True
+
+    return False
+
+
+def _run_forever(after_update: Optional[Callable[[float], None]] = None) -> None:
+    """
+    Periodically update the BMRT cache, until told to shut down.
+
+    If `after_update` is provided then call it after each (successful) cache
+    update, passing the duration of the update in seconds.
+    """
+    global _STARTED
+    _STARTED = True
+
+    first_sleep_seconds = 3
+    min_delay_between_runs_seconds = 120
+    # A delta update is cheap; do it more often so that the UI does not lag
+    # behind ingest for too long.
+    min_delay_between_delta_runs_seconds = 30
+
+    if Config.TESTING:
+        first_sleep_seconds = 2
+        min_delay_between_runs_seconds = 20
+        min_delay_between_delta_runs_seconds = 5
+
+    delay_s: float = first_sleep_seconds
+    last_full_refresh_duration_s = 0.0
+
+    persist = None
+    if Config.BMRT_CACHE_PERSIST_DIR:
+        if _warm_start_from_persisted_snapshot(Config.BMRT_CACHE_PERSIST_DIR):
+            if after_update is not None:
+                after_update(0.0)
+        persist = _snapshot_persister(Config.BMRT_CACHE_PERSIST_DIR)
+
+    while True:
+        # Build responsive sleep loop that inspects SHUTDOWN often.
+        deadline = time.monotonic() + delay_s
+        while time.monotonic() < deadline:
+            if _should_stop():
+                log.debug("_run_forever: shut down")
+                return
+
+            time.sleep(0.1)
+
+        t0 = time.monotonic()
+        is_full_refresh = _next_update_is_full_refresh()
+
+        # yappi.start()
+
+        try:
+            # filprofile(lambda: _fetch_and_cache_most_recent_results(), "fil-result")
+            _fetch_and_cache_most_recent_results()
+            if after_update is not None:
+                after_update(time.monotonic() - t0)
+            if persist is not None:
+                persist(time.monotonic() - t0, is_full_refresh)
+        except Exception as exc:
+            # For now, log all error detail. (but handle all exceptions; do
+            # some careful log-reading after rolling this out).
+            log.exception("BMRT cache: exception during update: %s", exc)
+
+        # yappi.stop()
+        # yappi_print_threads_stats()
+
+        last_call_duration_s = time.monotonic() - t0
+        if is_full_refresh:
+            last_full_refresh_duration_s = last_call_duration_s
+
+        # Generally we want to spent the majority of the time _not_ doing
+        # this thing here. So, if the last full refresh lasted for e.g.
+        # ~60 seconds, then keep waiting for ~five minutes until
+        # triggering the next full refresh. Delta updates in between.
+        if _next_update_is_full_refresh():
+            delay_s = max(
+                min_delay_between_runs_seconds, 5 * last_full_refresh_duration_s
+            )
+        else:
+            delay_s = max(
+                min_delay_between_delta_runs_seconds, 5 * last_call_duration_s
             )
-            # Sort by time.
-            df = df.sort_index()
-            df.index.rename("time", inplace=True)
-            tsdf_by_4tuple[(bname, case_id, context_id, hardware_id)] = df
-            bmrlist_by_4tuple[(bname, case_id, context_id, hardware_id)] = usresults
-
-    t4 = time.monotonic()
-    log.info("BMRT cache pop: quadratic sort loop took %.3f s", t3 - t2)
+        log.info("BMRT cache: trigger next fetch in %.3f s", delay_s)
+
+
+def _warm_start_from_persisted_snapshot(basedir: str) -> bool:
+    """
+    Populate the cache from the most recent snapshot persisted in `basedir`
+    (if there is one). The arrays are memory-mapped, i.e. this is quick.
+    Subsequent cache updates are delta updates on top of that state (the
+    periodic full rebuild eventually replaces it).
+
+    Return `True` if the cache got populated.
+    """
+    # Avoid circular import.
+    from conbench import bmrtsnapshot
+
+    try:
+        path = bmrtsnapshot.current_snapshot_path(basedir)
+        if path is None:
+            log.info("BMRT cache: no persisted snapshot in %s", basedir)
+            return False
+        snapshot = bmrtsnapshot.Snapshot(path)
+    except Exception as exc:
+        # For example, a snapshot written by an older version of this code.
+        log.exception("BMRT cache: could not load persisted snapshot: %s", exc)
+        return False
+
+    if snapshot.newest_result_timestamp is None or snapshot.store.n_results == 0:
+        return False
+
+    _set_cache(_cache_dict_from_store(snapshot.store, snapshot.meta))
+    _refresh_state.newest_result_timestamp = snapshot.newest_result_timestamp
+    _refresh_state.window_size = int(BMRT_CACHE_SIZE)
+    _refresh_state.cycles_since_full_refresh = 0
+
     log.info(
-        "BMRT cache pop: df constr took %.3f s (%s time series)",
-        t4 - t3,
-        len(tsdf_by_4tuple),
+        "BMRT cache: loaded persisted snapshot %s (%s results, newest: %s)",
+        path,
+        snapshot.store.n_results,
+        snapshot.meta.newest_result_time_str,
     )
+    return True
+
+
+def _snapshot_persister(basedir: str) -> Callable[[float, bool], None]:
+    """
+    Return a function to be called after each cache update. It writes a
+    snapshot of the cache into `basedir` after a full rebuild, and otherwise
+    at most every BMRT_CACHE_PERSIST_MIN_INTERVAL_SECONDS (if the cache
+    changed).
+    """
+    # Avoid circular import.
+    from conbench import bmrtsnapshot
+
+    # The cache may have been populated from a persisted snapshot.
+    persisted_by_id = bmrt_cache["by_id"]
+    last_persisted_at = time.monotonic()
+
+    def persist(update_seconds: float, is_full_refresh: bool) -> None:
+        nonlocal persisted_by_id, last_persisted_at
+        by_id = bmrt_cache["by_id"]
+        if by_id is persisted_by_id or len(by_id) == 0:
+            return
+        if (
+            not is_full_refresh
+            and time.monotonic() - last_persisted_at
+            < BMRT_CACHE_PERSIST_MIN_INTERVAL_SECONDS
+        ):
+            return
+        try:
+            bmrtsnapshot.publish(
+                bmrt_cache,
+                basedir,
+                update_seconds,
+                newest_result_timestamp=_refresh_state.newest_result_timestamp,
+            )
+        except OSError as exc:
+            log.warning("BMRT cache: could not persist snapshot: %s", exc)
+            return
+        persisted_by_id = by_id
+        last_persisted_at = time.monotonic()
+
+    return persist
+
 
-    # The following comment is provides insight into the structure of the
-    # return value. It shows one example for the key (4-tuple) and
-    # corresponding value (and its properties; Index, h)
-
-    # for i, (t4, dffff) in enumerate(tsdf_per_4tuple.items()):
-    #     if i % 1000 == 0:
-    #         print(t4)
-    #         print(dffff)
-    # ('tpch-foobar', '750317efddda4b76a80f72d9ac44f882', 'c99e3d44ccf9415996209006244d6b10', '31ce04b765d44f32a4f2c6a7762e2ddb')
-    #                                             svs
-    # 2022-09-28 02:25:54.315165043+00:00   93.072853
-    # 2022-09-28 10:32:56.099033117+00:00  100.253622
-    # 2022-09-28 13:51:49.347893+00:00     102.833077
-    # 2022-09-28 15:57:35.356076002+00:00   99.807175
-    # 2022-09-28 17:06:46.327281952+00:00  102.777138
-    # 2022-09-28 17:14:14.036443949+00:00  100.854897
-    # 2022-09-28 20:08:16.950268984+00:00   99.565141
-    # 2022-09-28 20:10:27.393528938+00:00   93.057321
-    # 2022-09-29 00:02:27.419251919+00:00   99.077197
-    # 2022-09-29 00:17:44.202492952+00:00   96.842827
-    # 2022-09-29 02:26:19.996010065+00:00   91.103735
-    # 2022-09-29 03:18:40.925746918+00:00         NaN
-    # 2022-09-29 03:52:28.406414986+00:00         NaN
-
-    return tsdf_by_4tuple, bmrlist_by_4tuple
+def run_cache_builder() -> None:
+    """
+    Entry point for the dedicated BMRT cache builder process (started by the
+    gunicorn master process, see gunicorn-conf.py). Periodically update the
+    cache (in this process), and publish each new cache state as a snapshot
+    into Config.BMRT_CACHE_SHM_DIR. Web application processes attach to those
+    snapshots.
+
+    Doing the CPU-intensive cache population in a separate process means that
+    it does not starve request-handling threads (GIL), and that the work is
+    done once, regardless of the number of web application processes.
+
+    Return when told to shut down (SIGTERM, SIGINT) or when the parent
+    process went away.
+    """
+    global _SPREAD_OUT_CPU_WORK, _BUILDER_PARENT_PID
+
+    basedir = Config.BMRT_CACHE_SHM_DIR
+    assert basedir
+
+    conbench.logger.setup(
+        level_stderr=Config.LOG_LEVEL_STDERR,
+        level_file=Config.LOG_LEVEL_FILE,
+        level_sqlalchemy=Config.LOG_LEVEL_SQLALCHEMY,
+    )
+
+    if not Config.CREATE_ALL_TABLES:
+        log.info("BMRT cache builder: CREATE_ALL_TABLES is false, assume migration")
+        return
+
+    # Avoid circular import.
+    from conbench import bmrtsnapshot
+
+    configure_engine(Config.SQLALCHEMY_DATABASE_URI)
+
+    _SPREAD_OUT_CPU_WORK = False
+    _BUILDER_PARENT_PID = os.getppid()
+    log.info("BMRT cache builder: start, publish to %s", basedir)
+
+    published_by_id = None
+
+    def publish(update_seconds: float) -> None:
+        nonlocal published_by_id
+        # A delta update that did not find new results does not replace the
+        # cache dictionaries. Nothing to publish then.
+        by_id = bmrt_cache["by_id"]
+        if by_id is not published_by_id:
+            bmrtsnapshot.publish(bmrt_cache, basedir, update_seconds)
+            published_by_id = by_id
+        bmrtsnapshot.touch_heartbeat(basedir)
+
+    _run_forever(after_update=publish)
+    log.info("BMRT cache builder: exit")
+
+
+def _periodically_attach_to_snapshot(basedir: str) -> None:
+    """
+    Immediately return after having spawned a thread which periodically
+    checks for a new snapshot (published by the cache builder process) and
+    attaches to it.
+    """
+    # Avoid circular import.
+    from conbench import bmrtsnapshot
+
+    def _attach_forever():
+        global _STARTED
+        _STARTED = True
+        attached_path = None
+
+        while True:
+            # This is a cheap check (a readlink() call): do it often.
+            deadline = time.monotonic() + 1
+            while time.monotonic() < deadline:
+                if SHUTDOWN:
+                    log.debug("_attach_forever: shut down")
+                    return
+
+                time.sleep(0.1)
+
+            try:
+                path = bmrtsnapshot.current_snapshot_path(basedir)
+                if path is not None and path == attached_path:
+                    # The cache builder publishes a new snapshot only upon
+                    # change. Otherwise it signals that it is alive, and that
+                    # the current snapshot is up-to-date.
+                    age = bmrtsnapshot.heartbeat_age_seconds(basedir)
+                    if age is not None:
+                        _confirm_cache_is_current(age)
+                if path is None or path == attached_path:
+                    continue
+                snapshot = bmrtsnapshot.Snapshot(path)
+                _set_cache(_cache_dict_from_store(snapshot.store, snapshot.meta))
+                attached_path = path
+                conbench.metrics.GAUGE_BMRT_CACHE_LAST_UPDATE_SECONDS.set(
+                    snapshot.update_seconds
+                )
+                log.info("BMRT cache: attached to snapshot %s", path)
+            except Exception as exc:
+                # For example, the builder may have removed the snapshot
+                # directory right after we looked up the symlink. Retry soon.
+                log.exception("BMRT cache: could not attach to snapshot: %s", exc)
+
+    threading.Thread(target=_attach_forever).start()
+
+
+def _set_cache(cache: CacheDict) -> None:
+    # Mutate the dictionary which is accessed by other threads, do this in a
+    # quick fashion -- each of this assignments is atomic (thread-safe), but
+    # between those assignments a thread might perform read access. (minor
+    # inconsistency is possible). Of course we can add another lookup
+    # indirection layer by assembling a completely new dictionary here and then
+    # re-defining the name bmrt_cache.
+    bmrt_cache["store"] = cache["store"]
+    bmrt_cache["by_id"] = cache["by_id"]
+    bmrt_cache["by_benchmark_name"] = cache["by_benchmark_name"]
+    bmrt_cache["by_case_id"] = cache["by_case_id"]
+    bmrt_cache["by_4t_list"] = cache["by_4t_list"]
+    bmrt_cache["timeseries"] = cache["timeseries"]
+    bmrt_cache["meta"] = cache["meta"]
+
+    _confirm_cache_is_current()
+    meta = cache["meta"]
+    conbench.metrics.GAUGE_BMRT_CACHE_RESULTS.set(meta.n_results)
+    conbench.metrics.GAUGE_BMRT_CACHE_TIMESERIES.set(meta.n_timeseries)
+    conbench.metrics.GAUGE_BMRT_CACHE_BYTES.set(meta.nbytes_approx)
+
+
+def _confirm_cache_is_current(age_seconds: float = 0.0) -> None:
+    global _CACHE_CONFIRMED_AT
+    _CACHE_CONFIRMED_AT = time.monotonic() - age_seconds
+
+
+def cache_age_seconds() -> Optional[float]:
+    """
+    Return the time that passed since the cache content was last replaced
+    (populated, updated, attached to a snapshot) or confirmed to be
+    up-to-date (by a delta update without new results), or `None` if neither
+    happened in this process.
+    """
+    if _CACHE_CONFIRMED_AT is None:
+        return None
+    return time.monotonic() - _CACHE_CONFIRMED_AT
+
+
+def cache_state() -> str:
+    """
+    Return one of
+
+    - "cold": the cache has not been populated, and the job populating it has
+      not been started in this process (e.g. in a CLI context, or when
+      CREATE_ALL_TABLES is false).
+    - "warming": the job has been started, but the cache has not been
+      populated yet. Views based on the cache would show incomplete data.
+    - "ready": the cache is populated and up-to-date.
+    - "stale": the cache is populated, but has not been updated for longer
+      than BMRT_CACHE_STALE_AFTER_SECONDS (e.g. because of database trouble,
+      or because the cache builder process went away).
+    """
+    age = cache_age_seconds()
+    if age is None:
+        return "warming" if _STARTED else "cold"
+    if age > BMRT_CACHE_STALE_AFTER_SECONDS:
+        return "stale"
+    return "ready"
+
+
+conbench.metrics.GAUGE_BMRT_CACHE_AGE_SECONDS.set_function(
+    lambda: age if (age := cache_age_seconds()) is not None else -1
+)
 
 
 def start_jobs():
-    log.info("start job: periodic BMRT cache population")
-    _periodically_fetch_last_n_benchmark_results()
+    if Config.BMRT_CACHE_SHM_DIR:
+        log.info("start job: periodically attach to BMRT cache snapshot")
+        _periodically_attach_to_snapshot(Config.BMRT_CACHE_SHM_DIR)
+    else:
+        log.info("start job: periodic BMRT cache population")
+        _periodically_fetch_last_n_benchmark_results()
     log.info("start job: metrics.periodically_set_q_rem()")
     conbench.metrics.periodically_set_q_rem()
 
@@ -54,6 +54,23 @@ COUNTER_GITHUB_HTTP_API_403RESPONSES = prometheus_client.Counter(
 )
 
 
+COUNTER_GITHUB_HTTP_API_CACHE_LOOKUPS = prometheus_client.Counter(
+    "conbench_github_httpapi_cache_lookups_total",
+    "The total number of GitHub HTTP API response cache lookups (see "
+    "github_response.py). `outcome`: hit (immutable, no request), revalidated "
+    "(304 response), stale (entry replaced by 200 response), miss (no entry).",
+    labelnames=["outcome"],
+)
+
+
+COUNTER_GITHUB_HTTP_API_QUOTA_SAVED = prometheus_client.Counter(
+    "conbench_github_httpapi_quota_saved_total",
+    "The total number of GitHub HTTP API requests that did not count against "
+    "the rate limit because of the response cache: cache hits, and 304 "
+    "responses to authenticated conditional requests.",
+)
+
+
 GAUGE_GITHUB_HTTP_API_QUOTA_REMAINING = prometheus_client.Gauge(
     "conbench_github_httpapi_quota_remaining",
     "A gauge that shows the last-observed x-ratelimit-remaining response "
@@ -66,6 +83,139 @@ GAUGE_BMRT_CACHE_LAST_UPDATE_SECONDS = prometheus_client.Gauge(
 )
 
 
+# BMRT cache internals. Note that when the cache is built by the dedicated
+# builder process (see job.run_cache_builder()) then the metrics about the
+# update procedure (phases, rows fetched, evictions) are not set in web
+# application processes; the gauges describing the cache state are (upon
+# attaching to a snapshot).
+GAUGE_BMRT_CACHE_UPDATE_PHASE_SECONDS = prometheus_client.Gauge(
+    "conbench_bmrt_cache_update_phase_seconds",
+    "The time individual phases of the last cache update took. `kind`: full "
+    "or delta. `phase`: fetch (query, consume rows), resolve_entities, build, "
+    "retention, grouping.",
+    labelnames=["kind", "phase"],
+)
+
+
+HISTOGRAM_BMRT_CACHE_UPDATE_SECONDS = prometheus_client.Histogram(
+    "conbench_bmrt_cache_update_duration_seconds",
+    "The distribution of the duration of BMRT cache updates (full rebuild vs "
+    "delta update).",
+    labelnames=["kind"],
+    buckets=(0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0),
+)
+
+
+COUNTER_BMRT_CACHE_ROWS_FETCHED = prometheus_client.Counter(
+    "conbench_bmrt_cache_rows_fetched_total",
+    "The total number of result rows fetched from the database for populating "
+    "the BMRT cache (only results for the default branch are fetched).",
+    labelnames=["kind"],
+)
+
+
+COUNTER_BMRT_CACHE_ROWS_SKIPPED = prometheus_client.Counter(
+    "conbench_bmrt_cache_rows_skipped_total",
+    "The total number of fetched result rows that were not added to the "
+    "BMRT cache. `reason`: already_cached (delta update overlap).",
+    labelnames=["reason"],
+)
+
+
+COUNTER_BMRT_CACHE_RESULTS_EVICTED = prometheus_client.Counter(
+    "conbench_bmrt_cache_results_evicted_total",
+    "The total number of results evicted from the BMRT cache during delta "
+    "updates or dropped by the retention policy. `reason`: window (max number "
+    "of results), retention (max age, per-series limit, memory budget).",
+    labelnames=["reason"],
+)
+
+
+GAUGE_BMRT_CACHE_RESULTS = prometheus_client.Gauge(
+    "conbench_bmrt_cache_results",
+    "The number of results in the BMRT cache",
+)
+
+
+GAUGE_BMRT_CACHE_TIMESERIES = prometheus_client.Gauge(
+    "conbench_bmrt_cache_timeseries",
+    "The number of time series (benchmark name, case, context, hardware) in "
+    "the BMRT cache",
+)
+
+
+GAUGE_BMRT_CACHE_BYTES = prometheus_client.Gauge(
+    "conbench_bmrt_cache_bytes_estimated",
+    "Estimated memory footprint of the BMRT cache (arrays plus entity tables). "
+    "Memory-mapped arrays are shared across processes.",
+)
+
+
+GAUGE_BMRT_CACHE_AGE_SECONDS = prometheus_client.Gauge(
+    "conbench_bmrt_cache_age_seconds",
+    "Time since the BMRT cache content was last replaced (-1: never)",
+)
+
+
+COUNTER_BMRT_CACHE_READS = prometheus_client.Counter(
+    "conbench_bmrt_cache_reads_total",
+    "The total number of reads from the BMRT cache, by view (HTTP handler). "
+    "`outcome`: hit, miss (the requested item is not in the cache), or warming "
+    "(the cache is not populated yet, the request was rejected).",
+    labelnames=["view", "outcome"],
+)
+
+
+COUNTER_HISTORY_CACHE_LOOKUPS = prometheus_client.Counter(
+    "conbench_history_cache_lookups_total",
+    "The total number of benchmark result history (timeseries) lookups in the "
+    "history cache. `outcome`: hit, miss.",
+    labelnames=["outcome"],
+)
+
+
+COUNTER_HISTORY_CACHE_EVICTIONS = prometheus_client.Counter(
+    "conbench_history_cache_evictions_total",
+    "The total number of entries removed from the history cache. `reason`: "
+    "lru (size limit), expired (max age), invalidated (a result in the "
+    "timeseries was created, changed or deleted).",
+    labelnames=["reason"],
+)
+
+
+COUNTER_ENTITY_PK_CACHE_LOOKUPS = prometheus_client.Counter(
+    "conbench_entity_pk_cache_lookups_total",
+    "The total number of Case/Context/Info primary key lookups in the entity "
+    "primary key cache. `outcome`: hit, miss.",
+    labelnames=["outcome"],
+)
+
+
+COUNTER_COMMIT_RESOLUTIONS = prometheus_client.Counter(
+    "conbench_commit_resolutions_total",
+    "The total number of background commit metadata resolutions (see "
+    "commit_resolver.py). `outcome`: resolved, failed (GitHub HTTP API), "
+    "skipped (commit resolved or deleted in the meantime), error (bug), "
+    "coalesced (commit was already pending, no additional fetch).",
+    labelnames=["outcome"],
+)
+
+
+GAUGE_COMMIT_RESOLUTION_QUEUE_SIZE = prometheus_client.Gauge(
+    "conbench_commit_resolution_queue_size",
+    "The number of commits waiting for background metadata resolution.",
+)
+
+
+COUNTER_COMMIT_GRAPH_LOADS = prometheus_client.Counter(
+    "conbench_commit_graph_loads_total",
+    "The total number of commit graph (re)loads from the database. `reason`: "
+    "miss (not loaded yet, or a commit was inserted by this process), expired "
+    "(max age), stale (a commit was inserted by another process).",
+    labelnames=["reason"],
+)
+
+
 # The topic of Gauge initiatlization in the Prometheus ecosystem is confusing.
 # The spec says "Gauges MUST start at 0"
 # (https://prometheus.io/docs/instrumenting/writing_clientlibs/). There are
@@ -102,3 +102,35 @@ def remove_outliers_by_iqrdist(
     # Mutate the input dataframe: set outliers to NaN.
     df.loc[outlier_index_mask, colname] = np.nan
     return df_outliers
+
+
+def outlier_mask_by_iqrdist_grouped(
+    values: np.ndarray, groups: np.ndarray, iqdistance=10, keep_last_n=2
+) -> np.ndarray:
+    """
+    Vectorized variant of `remove_outliers_by_iqrdist()` for many time series
+    at once.
+
+    `values`: the data points of all time series, `groups`: the (integer)
+    series for each data point. Data points of the same series must be
+    adjacent and sorted by time.
+
+    Return a boolean array, `True` for data points that are outliers (the
+    caller can then for example set those to NaN). Note that median and
+    quantiles are calculated per series, ignoring NaN values.
+    """
+    # Series index 0..N-1, so that per-series statistics can be mapped back to
+    # data points via fancy indexing.
+    codes, _ = pd.factorize(groups)
+    g = pd.Series(values).groupby(codes)
+    median = g.median().to_numpy()[codes]
+    iqr = (g.quantile(0.75) - g.quantile(0.25)).to_numpy()[codes]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mask = np.abs((values - median) / iqr) > iqdistance
+
+    # Special treatment of the tail end of each series, see
+    # remove_outliers_by_iqrdist().
+    position_from_end = g.cumcount(ascending=False).to_numpy()
+    mask[position_from_end < keep_last_n] = False
+    return mask
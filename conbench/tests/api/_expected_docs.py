@@ -183,6 +183,41 @@
                 },
                 "description": "OK",
             },
+            "BenchmarkResultBatchCreated": {
+                "content": {
+                    "application/json": {
+                        "example": [
+                            {"id": "some-benchmark-uuid-1", "status": 201},
+                            {"id": "some-benchmark-uuid-2", "status": 201},
+                        ]
+                    }
+                },
+                "description": "Created (all results)",
+            },
+            "BenchmarkResultBatchPartial": {
+                "content": {
+                    "application/json": {
+                        "example": [
+                            {"id": "some-benchmark-uuid-1", "status": 201},
+                            {
+                                "description": {
+                                    "run_id": ["Missing data for required field."]
+                                },
+                                "status": 400,
+                            },
+                        ]
+                    }
+                },
+                "description": "Multi-Status (not all results were created)",
+            },
+            "BenchmarkResultBatchStream": {
+                "content": {
+                    "application/x-ndjson": {
+                        "example": '{"line": 1, "status": 201, "id": "some-benchmark-uuid-1"}\n{"line": 2, "status": 400, "description": {"run_id": ["Missing data for required field."]}}\n{"summary": {"processed": 2, "created": 1, "failed": 1}}'
+                    }
+                },
+                "description": "OK (streamed, one status object per line)",
+            },
             "BenchmarkResultCreated": {
                 "content": {
                     "application/json": {
@@ -585,6 +620,76 @@
                 },
                 "description": "OK",
             },
+            "HistoryBatch": {
+                "content": {
+                    "application/json": {
+                        "example": {
+                            "benchmark_result_ids_not_found": [],
+                            "benchmark_result_ids_without_history": [],
+                            "series": [
+                                {
+                                    "benchmark_result_ids": ["some-benchmark-uuid-1"],
+                                    "case_id": "some-case-uuid-1",
+                                    "context_id": "some-context-uuid-1",
+                                    "hardware_hash": "diana-2-2-4-17179869184",
+                                    "history": [
+                                        {
+                                            "benchmark_result_id": "some-benchmark-uuid-1",
+                                            "case_id": "some-case-uuid-1",
+                                            "commit_hash": "02addad336ba19a654f9c857ede546331be7b631",
+                                            "commit_msg": "ARROW-11771: [Developer][Archery] Move benchmark tests (so CI runs them)",
+                                            "commit_timestamp": "2021-02-25T01:02:51",
+                                            "context_id": "some-context-uuid-1",
+                                            "data": [
+                                                0.099094,
+                                                0.037129,
+                                                0.036381,
+                                                0.148896,
+                                                0.008104,
+                                                0.005496,
+                                                0.009871,
+                                                0.006008,
+                                                0.007978,
+                                                0.004733,
+                                            ],
+                                            "hardware_hash": "diana-2-2-4-17179869184",
+                                            "mean": 0.036369,
+                                            "repository": "https://github.com/org/repo",
+                                            "run_name": "some run name",
+                                            "single_value_summary": 0.036369,
+                                            "single_value_summary_type": "mean",
+                                            "times": [
+                                                0.099094,
+                                                0.037129,
+                                                0.036381,
+                                                0.148896,
+                                                0.008104,
+                                                0.005496,
+                                                0.009871,
+                                                0.006008,
+                                                0.007978,
+                                                0.004733,
+                                            ],
+                                            "unit": "s",
+                                            "zscorestats": {
+                                                "begins_distribution_change": False,
+                                                "is_outlier": False,
+                                                "residual": 0.0,
+                                                "rolling_mean": 0.036369,
+                                                "rolling_mean_excluding_this_commit": 0.036369,
+                                                "rolling_stddev": 0.0,
+                                                "segment_id": 0.0,
+                                            },
+                                        }
+                                    ],
+                                    "repository": "https://github.com/org/repo",
+                                }
+                            ],
+                        }
+                    }
+                },
+                "description": "OK",
+            },
             "HistoryList": {
                 "content": {
                     "application/json": {
@@ -717,6 +822,34 @@
                 },
                 "description": "OK",
             },
+            "Ready": {
+                "content": {
+                    "application/json": {
+                        "example": {
+                            "bmrt_cache_age_seconds": 12.3,
+                            "bmrt_cache_n_results": 800000,
+                            "bmrt_cache_state": "ready",
+                            "ready": True,
+                        },
+                        "schema": {"$ref": "#/components/schemas/Ready"},
+                    }
+                },
+                "description": "OK",
+            },
+            "ReadyNotReady": {
+                "content": {
+                    "application/json": {
+                        "example": {
+                            "bmrt_cache_age_seconds": None,
+                            "bmrt_cache_n_results": 0,
+                            "bmrt_cache_state": "warming",
+                            "ready": False,
+                        },
+                        "schema": {"$ref": "#/components/schemas/Ready"},
+                    }
+                },
+                "description": "Service Unavailable",
+            },
             "RunCreated": {
                 "content": {
                     "application/json": {
@@ -1236,6 +1369,21 @@
                 },
                 "type": "object",
             },
+            "HistoryBatch": {
+                "properties": {
+                    "benchmark_result_ids": {
+                        "description": "Get the history of each of these benchmark results.",
+                        "items": {"type": "string"},
+                        "type": "array",
+                    },
+                    "series": {
+                        "description": "Get the history for each of these case/context/hardware/repository combinations.",
+                        "items": {"$ref": "#/components/schemas/TimeseriesKey"},
+                        "type": "array",
+                    },
+                },
+                "type": "object",
+            },
             "Login": {
                 "properties": {
                     "email": {"format": "email", "type": "string"},
@@ -1294,6 +1442,29 @@
                 "required": ["date"],
                 "type": "object",
             },
+            "Ready": {
+                "properties": {
+                    "bmrt_cache_age_seconds": {
+                        "description": "Time since the cache was last updated",
+                        "nullable": True,
+                        "type": "number",
+                    },
+                    "bmrt_cache_n_results": {
+                        "description": "Number of results in the cache",
+                        "type": "integer",
+                    },
+                    "bmrt_cache_state": {
+                        "description": "One of cold, warming, ready, stale",
+                        "type": "string",
+                    },
+                    "ready": {
+                        "description": "Whether this process should receive traffic",
+                        "type": "boolean",
+                    },
+                },
+                "required": ["bmrt_cache_state", "ready"],
+                "type": "object",
+            },
             "Register": {
                 "properties": {
                     "email": {"format": "email", "type": "string"},
@@ -1376,6 +1547,16 @@
                 "required": ["commit", "repository"],
                 "type": "object",
             },
+            "TimeseriesKey": {
+                "properties": {
+                    "case_id": {"type": "string"},
+                    "context_id": {"type": "string"},
+                    "hardware_hash": {"type": "string"},
+                    "repository": {"description": "Repository URL", "type": "string"},
+                },
+                "required": ["case_id", "context_id", "hardware_hash", "repository"],
+                "type": "object",
+            },
             "UserCreate": {
                 "properties": {
                     "email": {"format": "email", "type": "string"},
@@ -1408,6 +1589,42 @@
                 "tags": ["Index"],
             }
         },
+        "/api/benchmark-results/batch": {
+            "post": {
+                "description": 'Submit many BenchmarkResults at once.\n\nEach result is validated and stored as if it were submitted via\n`POST /api/benchmark-results/`. A result that fails validation does\nnot prevent the other results from being stored.\n\nWith `Content-Type: application/json`, the request body is a JSON\narray of BenchmarkResultCreate objects (at most 1000). The valid\nresults are inserted in one database transaction. Entities that\nthey refer to (runs, commits, hardware, cases, contexts, infos)\nare created beforehand, in separate transactions, i.e. the request\nis not atomic as a whole. The response contains\none status object per submitted result, in the same order:\n`{"status": 201, "id": ...}` for a stored result, `{"status": 400,\n"description": ...}` for a rejected result. The response status\ncode is 201 if all results were stored, and 207 otherwise.\n\nWith `Content-Type: application/x-ndjson`, the request body\ncontains one BenchmarkResultCreate object per line, without limit\non the number of lines. The body is read, validated and stored in\nchunks of lines, and the response (status code 200, newline-\ndelimited JSON) is streamed: one status object per non-empty line,\nwith the (1-based) line number under the `line` key. The status\nobjects for a chunk are sent after the chunk has been stored.\n\nThe last line of a complete response is a summary object:\n`{"summary": {"processed": ..., "created": ..., "failed": ...}}`.\nIf processing stops because of an unexpected error (after the\nresponse status code was sent), an `{"error": ...}` line precedes\nthe summary. Lines not acknowledged by then were not processed.\nA response without summary line is truncated.\n',
+                "requestBody": {
+                    "content": {
+                        "application/json": {
+                            "schema": {
+                                "items": {
+                                    "$ref": "#/components/schemas/BenchmarkResultCreate"
+                                },
+                                "type": "array",
+                            }
+                        },
+                        "application/x-ndjson": {
+                            "schema": {
+                                "$ref": "#/components/schemas/BenchmarkResultCreate"
+                            }
+                        },
+                    }
+                },
+                "responses": {
+                    "200": {
+                        "$ref": "#/components/responses/BenchmarkResultBatchStream"
+                    },
+                    "201": {
+                        "$ref": "#/components/responses/BenchmarkResultBatchCreated"
+                    },
+                    "207": {
+                        "$ref": "#/components/responses/BenchmarkResultBatchPartial"
+                    },
+                    "400": {"$ref": "#/components/responses/400"},
+                    "401": {"$ref": "#/components/responses/401"},
+                },
+                "tags": ["Benchmarks"],
+            }
+        },
         "/api/benchmarks/": {
             "get": {
                 "description": "Return a JSON array of benchmark results.\n\nNote that this endpoint does not provide on-the-fly change\ndetection analysis (lookback z-score method).\n\nBehavior at the time of writing (subject to change):\n\nBenchmark results are usually returned in order of their\ntimestamp property (user-given benchmark start time), newest first.\n\nWhen no argument is provided, the last 1000 benchmark results\nare emitted.\n\nThe `run_id` argument can be provided to obtain benchmark\nresults for one or more specific runs. This attempts to fetch\nall associated benchmark results from the database and tries\nto return them all in a single response; use that with caution:\nkeep the number of run_ids low or equal to, unless you know better.\n",
@@ -1661,19 +1878,78 @@
                 "tags": ["Hardware"],
             }
         },
+        "/api/history/batch/": {
+            "post": {
+                "description": "Get the history of many benchmark results (or of many\ncase/context/hardware/repository combinations) in one request.\n\nEach history (timeseries) is emitted once (in no particular\norder), with the IDs of the requested benchmark results that it is\nthe history of. The items in `history` are the same as emitted by\n`GET /api/history/<benchmark_result_id>/`.\n\nIDs of benchmark results that do not exist are listed in\n`benchmark_result_ids_not_found`. IDs of benchmark results that\ndo not have history (no commit context, or no history on the\ndefault branch) are listed in `benchmark_result_ids_without_history`.\n",
+                "requestBody": {
+                    "content": {
+                        "application/json": {
+                            "schema": {"$ref": "#/components/schemas/HistoryBatch"}
+                        }
+                    }
+                },
+                "responses": {
+                    "200": {"$ref": "#/components/responses/HistoryBatch"},
+                    "400": {"$ref": "#/components/responses/400"},
+                    "401": {"$ref": "#/components/responses/401"},
+                },
+                "tags": ["History"],
+            }
+        },
         "/api/history/{benchmark_result_id}/": {
             "get": {
-                "description": "Get benchmark history.",
+                "description": 'Get benchmark history: the samples in the timeseries that the\nbenchmark result is part of, ordered by commit timestamp.\n\nThe response body is streamed. For long timeseries, use `limit`\n(and follow the `Link` header with `rel="next"`) to fetch the\nhistory in pages, use `start`/`end` to fetch a time range, and set\n`include_data=false` if the per-iteration data is not needed.\n',
                 "parameters": [
                     {
                         "in": "path",
                         "name": "benchmark_result_id",
                         "required": True,
                         "schema": {"type": "string"},
-                    }
+                    },
+                    {
+                        "description": "Only emit samples with a commit timestamp at or after this\npoint in time (ISO 8601, UTC if no offset is given).\n",
+                        "in": "query",
+                        "name": "start",
+                        "schema": {"format": "date-time", "type": "string"},
+                    },
+                    {
+                        "description": "Only emit samples with a commit timestamp before this point\nin time (ISO 8601, UTC if no offset is given).\n",
+                        "in": "query",
+                        "name": "end",
+                        "schema": {"format": "date-time", "type": "string"},
+                    },
+                    {
+                        "description": "Emit at most this many samples. If there are more, the\nresponse has a `Link` header with the URL of the next page.\n",
+                        "in": "query",
+                        "name": "limit",
+                        "schema": {"minimum": 1, "type": "integer"},
+                    },
+                    {
+                        "description": "Opaque cursor, from the `Link` header.",
+                        "in": "query",
+                        "name": "cursor",
+                        "schema": {"type": "string"},
+                    },
+                    {
+                        "description": "Set to false to omit the per-iteration `data` and `times`\narrays from each sample.\n",
+                        "in": "query",
+                        "name": "include_data",
+                        "schema": {"default": True, "type": "boolean"},
+                    },
+                    {
+                        "description": "`json`: a JSON array. `ndjson`: one JSON object per line\n(newline-delimited JSON).\n",
+                        "in": "query",
+                        "name": "format",
+                        "schema": {
+                            "default": "json",
+                            "enum": ["json", "ndjson"],
+                            "type": "string",
+                        },
+                    },
                 ],
                 "responses": {
                     "200": {"$ref": "#/components/responses/HistoryList"},
+                    "400": {"$ref": "#/components/responses/400"},
                     "401": {"$ref": "#/components/responses/401"},
                     "404": {"$ref": "#/components/responses/404"},
                 },
@@ -1740,6 +2016,16 @@
                 "tags": ["Ping"],
             }
         },
+        "/api/ready/": {
+            "get": {
+                "description": "Readiness check (for load balancers and orchestrators). Does not\nquery the database.\n\nReport the state of the in-memory cache for recent benchmark\nresults which some UI views are built from: `cold` (not\npopulated, population not started), `warming` (first population\nin progress), `ready`, or `stale` (not updated for a while).\n\nRespond with status code 200 when the cache is `ready` or `stale`\n(a stale cache is likely a problem shared by all replicas; better\nserve old data than nothing), and with 503 otherwise.\n",
+                "responses": {
+                    "200": {"$ref": "#/components/responses/Ready"},
+                    "503": {"$ref": "#/components/responses/ReadyNotReady"},
+                },
+                "tags": ["Ping"],
+            }
+        },
         "/api/redoc": {},
         "/api/register/": {
             "post": {
@@ -1949,7 +2235,7 @@
         {"description": "Benchmark runs", "name": "Runs"},
         {"description": "Monitor status", "name": "Ping"},
         {
-            "description": '## BenchmarkResultCreate\n<SchemaDefinition schemaRef="#/components/schemas/BenchmarkResultCreate" />\n\n## BenchmarkResultStats\n<SchemaDefinition schemaRef="#/components/schemas/BenchmarkResultStats" />\n\n## BenchmarkResultUpdate\n<SchemaDefinition schemaRef="#/components/schemas/BenchmarkResultUpdate" />\n\n## ClusterCreate\n<SchemaDefinition schemaRef="#/components/schemas/ClusterCreate" />\n\n## Error\n<SchemaDefinition schemaRef="#/components/schemas/Error" />\n\n## ErrorBadRequest\n<SchemaDefinition schemaRef="#/components/schemas/ErrorBadRequest" />\n\n## ErrorValidation\n<SchemaDefinition schemaRef="#/components/schemas/ErrorValidation" />\n\n## Login\n<SchemaDefinition schemaRef="#/components/schemas/Login" />\n\n## MachineCreate\n<SchemaDefinition schemaRef="#/components/schemas/MachineCreate" />\n\n## Ping\n<SchemaDefinition schemaRef="#/components/schemas/Ping" />\n\n## Register\n<SchemaDefinition schemaRef="#/components/schemas/Register" />\n\n## RunCreate\n<SchemaDefinition schemaRef="#/components/schemas/RunCreate" />\n\n## RunUpdate\n<SchemaDefinition schemaRef="#/components/schemas/RunUpdate" />\n\n## SchemaGitHubCreate\n<SchemaDefinition schemaRef="#/components/schemas/SchemaGitHubCreate" />\n\n## UserCreate\n<SchemaDefinition schemaRef="#/components/schemas/UserCreate" />\n\n## UserUpdate\n<SchemaDefinition schemaRef="#/components/schemas/UserUpdate" />\n',
+            "description": '## BenchmarkResultCreate\n<SchemaDefinition schemaRef="#/components/schemas/BenchmarkResultCreate" />\n\n## BenchmarkResultStats\n<SchemaDefinition schemaRef="#/components/schemas/BenchmarkResultStats" />\n\n## BenchmarkResultUpdate\n<SchemaDefinition schemaRef="#/components/schemas/BenchmarkResultUpdate" />\n\n## ClusterCreate\n<SchemaDefinition schemaRef="#/components/schemas/ClusterCreate" />\n\n## Error\n<SchemaDefinition schemaRef="#/components/schemas/Error" />\n\n## ErrorBadRequest\n<SchemaDefinition schemaRef="#/components/schemas/ErrorBadRequest" />\n\n## ErrorValidation\n<SchemaDefinition schemaRef="#/components/schemas/ErrorValidation" />\n\n## HistoryBatch\n<SchemaDefinition schemaRef="#/components/schemas/HistoryBatch" />\n\n## Login\n<SchemaDefinition schemaRef="#/components/schemas/Login" />\n\n## MachineCreate\n<SchemaDefinition schemaRef="#/components/schemas/MachineCreate" />\n\n## Ping\n<SchemaDefinition schemaRef="#/components/schemas/Ping" />\n\n## Ready\n<SchemaDefinition schemaRef="#/components/schemas/Ready" />\n\n## Register\n<SchemaDefinition schemaRef="#/components/schemas/Register" />\n\n## RunCreate\n<SchemaDefinition schemaRef="#/components/schemas/RunCreate" />\n\n## RunUpdate\n<SchemaDefinition schemaRef="#/components/schemas/RunUpdate" />\n\n## SchemaGitHubCreate\n<SchemaDefinition schemaRef="#/components/schemas/SchemaGitHubCreate" />\n\n## TimeseriesKey\n<SchemaDefinition schemaRef="#/components/schemas/TimeseriesKey" />\n\n## UserCreate\n<SchemaDefinition schemaRef="#/components/schemas/UserCreate" />\n\n## UserUpdate\n<SchemaDefinition schemaRef="#/components/schemas/UserUpdate" />\n',
             "name": "Models",
             "x-displayName": "Object models",
         },
@@ -1,3 +1,8 @@
+import base64
+import datetime
+
+import orjson
+
 from ...api._examples import _api_history_entity
 from ...tests.api import _asserts, _fixtures
 
@@ -26,3 +31,172 @@ class TestHistoryGet(_asserts.GetEnforcer):
         hist_endpont_resp_deser = response.json
         expected_resp_deser = _expected_entity(benchmark_result)
         assert hist_endpont_resp_deser == expected_resp_deser
+
+    def test_get_history_pages(self, client):
+        self.authenticate(client)
+        _, benchmark_results = _fixtures.gen_fake_data()
+        url = f"/api/history/{benchmark_results[0].id}/"
+        full = client.get(url).json
+        assert len(full) == 6
+
+        # Follow the `Link` header until there is no next page.
+        pages = []
+        resp = client.get(url, query_string={"limit": 4})
+        while True:
+            assert resp.status_code == 200, resp.text
+            pages.append(resp.json)
+            if "Link" not in resp.headers:
+                break
+            next_url, rel = resp.headers["Link"].split("; ")
+            assert rel == 'rel="next"'
+            resp = client.get(next_url.strip("<>"))
+
+        assert [len(p) for p in pages] == [4, 2]
+        assert pages[0] + pages[1] == full
+        timestamps = [s["commit_timestamp"] for s in full]
+        assert timestamps == sorted(timestamps)
+
+    def test_get_history_time_range(self, client):
+        self.authenticate(client)
+        _, benchmark_results = _fixtures.gen_fake_data()
+        url = f"/api/history/{benchmark_results[0].id}/"
+        full = client.get(url).json
+        resp = client.get(
+            url,
+            query_string={
+                "start": "2022-01-02T00:00:00",
+                "end": "2022-01-05T00:00:00Z",
+            },
+        )
+        assert resp.status_code == 200, resp.text
+        assert resp.json == [
+            s
+            for s in full
+            if "2022-01-02T00:00:00" <= s["commit_timestamp"] < "2022-01-05T00:00:00"
+        ]
+        assert 0 < len(resp.json) < len(full)
+
+    def test_get_history_ndjson_without_data(self, client):
+        self.authenticate(client)
+        benchmark_result = self._create()
+        resp = client.get(
+            f"/api/history/{benchmark_result.id}/",
+            query_string={"format": "ndjson", "include_data": "false"},
+        )
+        assert resp.status_code == 200, resp.text
+        assert resp.headers["Content-Type"] == "application/x-ndjson"
+        lines = resp.text.splitlines()
+        assert [orjson.loads(line) for line in lines] == [
+            {k: v for k, v in s.items() if k not in ("data", "times")}
+            for s in _expected_entity(benchmark_result)
+        ]
+
+    def test_get_history_bad_request(self, client):
+        self.authenticate(client)
+        benchmark_result = self._create()
+        url = f"/api/history/{benchmark_result.id}/"
+        for args in ({"limit": 0}, {"format": "xml"}, {"start": "yesterday"}):
+            resp = client.get(url, query_string=args)
+            assert resp.status_code == 400, resp.text
+
+        resp = client.get(url, query_string={"cursor": "bm90IGEgY3Vyc29y"})
+        self.assert_400_bad_request(resp, {"cursor": ["Invalid cursor."]})
+
+    def test_get_history_cursor_with_utc_offset(self, client):
+        self.authenticate(client)
+        benchmark_result = self._create()
+        url = f"/api/history/{benchmark_result.id}/"
+        full = client.get(url).json
+        first = full[0]
+
+        # A hand-crafted cursor with a tz-aware timestamp, pointing to the
+        # first sample.
+        ts = datetime.datetime.fromisoformat(first["commit_timestamp"])
+        ts = ts.replace(tzinfo=datetime.timezone.utc).astimezone(
+            datetime.timezone(datetime.timedelta(hours=2))
+        )
+        cursor = base64.urlsafe_b64encode(
+            f"{ts.isoformat()}|{first['benchmark_result_id']}".encode("utf-8")
+        ).decode("ascii")
+
+        resp = client.get(url, query_string={"cursor": cursor})
+        assert resp.status_code == 200, resp.text
+        assert resp.json == full[1:]
+
+
+class TestHistoryBatchPost(_asserts.ApiEndpointTest):
+    url = "/api/history/batch/"
+
+    def test_batch_matches_individual_history(self, client):
+        self.authenticate(client)
+        commits, benchmark_results = _fixtures.gen_fake_data()
+        bmrids = [r.id for r in benchmark_results]
+        resp = client.post(self.url, json={"benchmark_result_ids": bmrids})
+        assert resp.status_code == 200, resp.text
+
+        series = resp.json["series"]
+        assert resp.json["benchmark_result_ids_not_found"] == []
+        assert len(series) > 1
+
+        # Each requested result is listed in precisely one timeseries, or
+        # listed as having no history.
+        listed = [bmrid for s in series for bmrid in s["benchmark_result_ids"]]
+        without_history = resp.json["benchmark_result_ids_without_history"]
+        assert sorted(listed + without_history) == sorted(bmrids)
+        for bmrid in without_history:
+            assert client.get(f"/api/history/{bmrid}/").json == []
+
+        for s in series:
+            for bmrid in s["benchmark_result_ids"]:
+                expected = client.get(f"/api/history/{bmrid}/").json
+                assert sorted(
+                    s["history"], key=lambda h: h["benchmark_result_id"]
+                ) == sorted(expected, key=lambda h: h["benchmark_result_id"])
+            for sample in s["history"]:
+                assert sample["case_id"] == s["case_id"]
+                assert sample["context_id"] == s["context_id"]
+                assert sample["hardware_hash"] == s["hardware_hash"]
+                assert sample["repository"] == s["repository"]
+
+    def test_batch_by_series_key(self, client):
+        self.authenticate(client)
+        benchmark_result = _fixtures.benchmark_result()
+        key = {
+            "case_id": benchmark_result.case_id,
+            "context_id": benchmark_result.context_id,
+            "hardware_hash": benchmark_result.run.hardware.hash,
+            "repository": benchmark_result.run.commit.repository,
+        }
+        unknown_key = dict(key, case_id="unknown")
+        resp = client.post(
+            self.url,
+            json={"series": [key, unknown_key], "benchmark_result_ids": ["unknown"]},
+        )
+        assert resp.status_code == 200, resp.text
+        assert resp.json == {
+            "series": [
+                dict(
+                    key,
+                    benchmark_result_ids=[],
+                    history=_expected_entity(benchmark_result),
+                )
+            ],
+            "benchmark_result_ids_not_found": ["unknown"],
+            "benchmark_result_ids_without_history": [],
+        }
+
+    def test_batch_bad_request(self, client):
+        self.authenticate(client)
+        resp = client.post(self.url, json={"benchmark_result_ids": []})
+        self.assert_400_bad_request(
+            resp,
+            {"_schema": ["Either benchmark_result_ids or series must be non-empty"]},
+        )
+
+        resp = client.post(self.url, json={"series": [{"case_id": "x"}]})
+        assert resp.status_code == 400, resp.text
+
+    def test_unauthenticated(self, client, monkeypatch):
+        monkeypatch.setenv("BENCHMARKS_DATA_PUBLIC", "off")
+        resp = client.post(self.url, json={"benchmark_result_ids": ["x"]})
+        self.assert_401_unauthorized(resp)
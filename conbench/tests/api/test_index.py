@@ -1,6 +1,7 @@
 import datetime
 import importlib.metadata as importlib_metadata
 
+from ... import job
 from ...api._examples import API_INDEX
 from ...tests.api import _asserts
 
@@ -32,6 +33,33 @@ class TestAPI(_asserts.ApiEndpointTest):
         # if/when this ever changes then this test can change, too.
         assert len(data["commit"]) == 40
 
+    def test_ready(self, client, monkeypatch):
+        monkeypatch.setattr(job, "_STARTED", True)
+        monkeypatch.setattr(job, "_CACHE_CONFIRMED_AT", None)
+        response = client.get("/api/ready/")
+        assert response.status_code == 503
+        assert response.json["ready"] is False
+        assert response.json["bmrt_cache_state"] == "warming"
+
+        # Views built from the cache respond quickly, with a retry hint.
+        response = client.get("/c-benchmarks/")
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "10"
+
+        job._confirm_cache_is_current()
+        response = client.get("/api/ready/")
+        assert response.status_code == 200
+        assert response.json["ready"] is True
+        assert response.json["bmrt_cache_state"] == "ready"
+        assert response.json["bmrt_cache_age_seconds"] < 60
+        assert client.get("/c-benchmarks/").status_code == 200
+
+        # A stale cache is still good enough for serving traffic.
+        job._confirm_cache_is_current(job.BMRT_CACHE_STALE_AFTER_SECONDS + 1)
+        response = client.get("/api/ready/")
+        assert response.status_code == 200
+        assert response.json["bmrt_cache_state"] == "stale"
+
     def test_wipe(self, client):
         # This endpoint is here for convenience in local development/testing.
         response = client.get("/api/wipe-db")
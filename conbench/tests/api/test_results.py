@@ -1,11 +1,18 @@
 import copy
 from uuid import uuid4
 
+import orjson
 import pytest
 
+import conbench.api.results
+import conbench.entities.benchmark_result
+
 from ...api._examples import _api_benchmark_entity
 from ...entities._entity import NotFound
 from ...entities.benchmark_result import BenchmarkResult
+from ...entities.commit import Commit
+from ...entities.distribution_stats import DistributionStats
+from ...entities.history import set_z_scores
 from ...entities.run import Run
 from ...tests.api import _asserts, _fixtures
 from ...tests.helpers import _uuid
@@ -1190,3 +1197,222 @@ class TestBenchmarkResultPost(_asserts.PostEnforcer):
 
         if len(samples) < 3:
             assert bmrdict["stats"][uekey] is None
+
+    def test_create_result_defers_distribution_stats(self, client):
+        _fixtures.gen_fake_data()
+        commit = Commit.first(sha="66666")
+
+        self.authenticate(client)
+        payload = copy.deepcopy(self.valid_payload)
+        payload["run_id"] = _uuid()
+        payload["github"] = {
+            "commit": commit.sha,
+            "repository": commit.repository,
+            "branch": None,
+        }
+        resp = client.post("/api/benchmark-results/", json=payload)
+        assert resp.status_code == 201, resp.text
+        benchmark_result = BenchmarkResult.one(id=resp.json["id"])
+
+        # Ingest does not compute stats for the result's commit.
+        assert DistributionStats.all(baseline_commit_id=commit.id) == []
+
+        # The first comparison against this commit computes and persists
+        # them, so that later comparisons do not require calculating them.
+        set_z_scores([benchmark_result], commit)
+        rows = DistributionStats.all(baseline_commit_id=commit.id)
+        assert len(rows) == 1
+        assert rows[0].case_id == benchmark_result.case_id
+        assert rows[0].hardware_hash == benchmark_result.run.hardware.hash
+        assert rows[0].rolling_mean is not None
+
+
+class TestBenchmarkResultBatchPost(_asserts.Enforcer):
+    url = "/api/benchmark-results/batch"
+
+    def _payloads(self, n):
+        run_id = _uuid()
+        payloads = []
+        for i in range(n):
+            payload = copy.deepcopy(_fixtures.VALID_RESULT_PAYLOAD)
+            payload["run_id"] = run_id
+            payload["tags"]["name"] = f"batch-benchmark-{i % 2}"
+            payloads.append(payload)
+        return payloads
+
+    def test_unauthenticated(self, client):
+        response = client.post(self.url, json=self._payloads(1))
+        self.assert_401_unauthorized(response)
+
+    def test_create_batch(self, client):
+        self.authenticate(client)
+        payloads = self._payloads(3)
+        resp = client.post(self.url, json=payloads)
+        assert resp.status_code == 201, resp.text
+        assert [item["status"] for item in resp.json] == [201, 201, 201]
+
+        # The results are the same as if they were submitted one by one.
+        for item, payload in zip(resp.json, payloads):
+            benchmark_result = BenchmarkResult.one(id=item["id"])
+            assert benchmark_result.run_id == payload["run_id"]
+            assert benchmark_result.case.name == payload["tags"]["name"]
+            resp = client.get(f"/api/benchmark-results/{item['id']}/")
+            self.assert_200_ok(resp, _expected_entity(benchmark_result))
+
+        results = BenchmarkResult.all(run_id=payloads[0]["run_id"])
+        assert len(results) == 3
+        assert len({r.case_id for r in results}) == 2
+        assert len({r.context_id for r in results}) == 1
+        assert len({r.info_id for r in results}) == 1
+
+    def test_create_batch_partial_failure(self, client):
+        self.authenticate(client)
+        payloads = self._payloads(4)
+        del payloads[1]["batch_id"]
+        payloads[2]["github"]["commit"] = "aaaa" + payloads[2]["github"]["commit"][4:]
+        payloads[3]["error"] = {"stack_trace": "some trace"}
+        del payloads[3]["stats"]
+
+        resp = client.post(self.url, json=payloads)
+        assert resp.status_code == 207, resp.text
+        assert [item["status"] for item in resp.json] == [201, 400, 400, 201]
+        assert resp.json[1]["description"] == {
+            "batch_id": ["Missing data for required field."]
+        }
+        assert "Result refers to commit hash 'aaaa" in resp.json[2]["description"]
+
+        run = Run.one(id=payloads[0]["run_id"])
+        assert run.has_errors
+        assert {r.id for r in BenchmarkResult.all(run_id=run.id)} == {
+            resp.json[0]["id"],
+            resp.json[3]["id"],
+        }
+
+    def test_create_batch_defers_distribution_stats(self, client):
+        _fixtures.gen_fake_data()
+        commit = Commit.first(sha="66666")
+
+        self.authenticate(client)
+        payloads = self._payloads(2)
+        for payload in payloads:
+            payload["github"] = {
+                "commit": commit.sha,
+                "repository": commit.repository,
+                "branch": None,
+            }
+        resp = client.post(self.url, json=payloads)
+        assert resp.status_code == 201, resp.text
+
+        assert DistributionStats.all(baseline_commit_id=commit.id) == []
+
+        benchmark_results = [BenchmarkResult.one(id=item["id"]) for item in resp.json]
+        set_z_scores(benchmark_results, commit)
+        rows = DistributionStats.all(baseline_commit_id=commit.id)
+        assert {row.case_id for row in rows} == {r.case_id for r in benchmark_results}
+
+    @pytest.mark.parametrize("payload", [{}, [], "foo"])
+    def test_create_batch_bad_payload(self, client, payload):
+        self.authenticate(client)
+        resp = client.post(self.url, json=payload)
+        self.assert_400_bad_request(
+            resp, {"_errors": ["Expected a non-empty JSON array of benchmark results."]}
+        )
+
+    def test_create_batch_too_many(self, client, monkeypatch):
+        monkeypatch.setattr(conbench.api.results, "BATCH_MAX_RESULTS", 2)
+        self.authenticate(client)
+        resp = client.post(self.url, json=self._payloads(3))
+        assert resp.status_code == 400, resp.text
+        assert "Too many benchmark results: 3" in resp.text
+
+    @pytest.mark.parametrize("commit_matches", [True, False])
+    def test_create_batch_run_created_concurrently(
+        self, client, monkeypatch, commit_matches
+    ):
+        self.authenticate(client)
+        payloads = self._payloads(2)
+        create_run_for_result = conbench.entities.benchmark_result.create_run_for_result
+
+        def _racy(userres):
+            # A concurrent request creates the Run first.
+            concurrent = copy.deepcopy(userres)
+            if not commit_matches:
+                concurrent["github"]["commit_hash"] = _fixtures.PARENT
+            create_run_for_result(concurrent)
+            return create_run_for_result(userres)
+
+        monkeypatch.setattr(
+            conbench.entities.benchmark_result, "create_run_for_result", _racy
+        )
+
+        resp = client.post(self.url, json=payloads)
+        if commit_matches:
+            assert resp.status_code == 201, resp.text
+            assert [item["status"] for item in resp.json] == [201, 201]
+        else:
+            assert resp.status_code == 207, resp.text
+            assert [item["status"] for item in resp.json] == [400, 400]
+            assert "refers to commit hash" in resp.json[0]["description"]
+
+    def test_create_batch_ndjson(self, client, monkeypatch):
+        monkeypatch.setattr(conbench.api.results, "NDJSON_CHUNK_SIZE", 2)
+        self.authenticate(client)
+        payloads = self._payloads(4)
+        del payloads[2]["batch_id"]
+        lines = [orjson.dumps(p) for p in payloads]
+        lines.insert(1, b"")
+        lines.insert(3, b"{not json")
+
+        resp = client.post(
+            self.url,
+            data=b"\n".join(lines) + b"\n",
+            content_type="application/x-ndjson",
+        )
+        assert resp.status_code == 200, resp.text
+        assert resp.mimetype == "application/x-ndjson"
+
+        acks = [orjson.loads(line) for line in resp.data.splitlines()]
+        assert acks.pop() == {"summary": {"processed": 5, "created": 3, "failed": 2}}
+        assert [(a["line"], a["status"]) for a in acks] == [
+            (1, 201),
+            (3, 201),
+            (4, 400),
+            (5, 400),
+            (6, 201),
+        ]
+        assert acks[2]["description"].startswith("Invalid JSON")
+        assert acks[3]["description"] == {
+            "batch_id": ["Missing data for required field."]
+        }
+        assert {r.id for r in BenchmarkResult.all(run_id=payloads[0]["run_id"])} == {
+            a["id"] for a in acks if a["status"] == 201
+        }
+
+    def test_create_batch_ndjson_error(self, client, monkeypatch):
+        monkeypatch.setattr(conbench.api.results, "NDJSON_CHUNK_SIZE", 2)
+        self.authenticate(client)
+
+        # Fail while storing the second chunk.
+        create_many = BenchmarkResult.create_many
+        calls = []
+
+        def _create_many(userresults):
+            calls.append(userresults)
+            if len(calls) == 2:
+                raise RuntimeError("boom")
+            return create_many(userresults)
+
+        monkeypatch.setattr(BenchmarkResult, "create_many", _create_many)
+
+        resp = client.post(
+            self.url,
+            data=b"".join(orjson.dumps(p) + b"\n" for p in self._payloads(4)),
+            content_type="application/x-ndjson",
+        )
+        assert resp.status_code == 200, resp.text
+
+        lines = [orjson.loads(line) for line in resp.data.splitlines()]
+        assert [a["status"] for a in lines[:2]] == [201, 201]
+        assert "boom" in lines[2]["error"]
+        assert lines[3] == {"summary": {"processed": 2, "created": 2, "failed": 0}}
+        assert len(lines) == 4
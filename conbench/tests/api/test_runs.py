@@ -1,3 +1,4 @@
+import threading
 from datetime import datetime, timedelta, timezone
 
 import pytest
@@ -5,6 +6,8 @@ import pytest
 from conbench.util import tznaive_dt_to_aware_iso8601_for_api
 
 from ...api._examples import _api_run_entity
+from ...config import Config
+from ...entities import commit_resolver as cr
 from ...entities._entity import NotFound
 from ...entities.run import Run
 from ...tests.api import _asserts, _fixtures
@@ -662,3 +665,39 @@ class TestRunPost(_asserts.PostEnforcer):
         # for tolerance interval but use abs(), i.e. don't expect a certain
         # order between test runner clock and db clock.
         assert abs(delta.total_seconds()) < 5.0
+
+    def test_create_run_resolves_commit_in_background(self, client, monkeypatch):
+        monkeypatch.setattr(Config, "COMMIT_RESOLUTION_ASYNC", True)
+
+        # Hold the background fetch until both runs have been submitted.
+        proceed = threading.Event()
+        calls = []
+        fetch = cr.get_github_commit_metadata
+
+        def _fetch(cinfo):
+            calls.append(cinfo)
+            proceed.wait(10)
+            return fetch(cinfo)
+
+        monkeypatch.setattr(cr, "get_github_commit_metadata", _fetch)
+
+        self.authenticate(client)
+        run_ids = [_uuid(), _uuid()]
+        for run_id in run_ids:
+            resp = client.post(self.url, json=dict(self.valid_payload, id=run_id))
+            assert resp.status_code == 201, resp.text
+
+        # Both runs reference the same placeholder commit.
+        commits = [client.get(f"/api/runs/{i}/").json["commit"] for i in run_ids]
+        assert commits[0]["id"] == commits[1]["id"]
+        assert commits[0]["timestamp"] is None
+
+        proceed.set()
+        assert cr.commit_resolver.wait(timeout=10)
+        # One fetch for both submissions.
+        assert len(calls) == 1
+
+        commit = client.get(f"/api/runs/{run_ids[1]}/").json["commit"]
+        assert commit["id"] == commits[0]["id"]
+        assert commit["timestamp"] is not None
+        assert commit["branch"] == "some_user_or_org:some_branch"
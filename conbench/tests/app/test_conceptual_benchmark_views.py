@@ -1,5 +1,17 @@
+import math
+
+import numpy as np
+import numpy.polynomial
 import pytest
 
+from ...app.benchmarks import relchange_by_series
+from ...bmrtstore import (
+    BMRTStore,
+    BMRTStoreBuilder,
+    TimeseriesFrame,
+    groupings_as_dicts,
+)
+from ...outlier import remove_outliers_by_iqrdist
 from ...tests.app import _asserts
 
 
@@ -20,3 +32,88 @@ class TestCBenchmarks(_asserts.AppEndpointTest):
         monkeypatch.setenv("BENCHMARKS_DATA_PUBLIC", "off")
         self.logout(client)
         assert_response_is_login_page(client.get(relpath, follow_redirects=True))
+
+
+def _relchange_by_series_reference(tsframe, series_codes, reftime):
+    # The original implementation: one dataframe per time series.
+    relchange_by_code = {}
+    for code in series_codes:
+        df = tsframe[tsframe.t4s[code]]
+        if df["svs"].count() < 10:
+            continue
+        if reftime - df.index[-1].timestamp() > 86400 * 30:
+            continue
+        df = df.copy()
+        remove_outliers_by_iqrdist(df, "svs")
+        df = df.dropna()
+        if len(df.index) < 10:
+            continue
+        fitted_series = numpy.polynomial.Polynomial.fit(
+            df.index.values.astype(float), df["svs"].values, 1
+        )
+        slope, ordinate = fitted_series.coef[1], fitted_series.coef[0]
+        if math.isnan(slope):
+            continue
+        relchange_by_code[code] = slope / ordinate
+    return relchange_by_code
+
+
+def test_relchange_by_series_matches_per_dataframe_analysis():
+    rng = np.random.default_rng(7)
+    builder = BMRTStoreBuilder()
+    t0 = 1.6e9
+    n = 0
+    for s in range(40):
+        length = int(rng.integers(5, 60))
+        # Some series are old (not recent enough to be analyzed).
+        tstart = t0 - (86400 * 90 if s % 7 == 0 else 0)
+        times = np.sort(tstart + rng.uniform(0, 86400 * 20, length))
+        values = 100 + s + rng.normal(0, 1, length) + np.linspace(0, s % 5, length)
+        # NaNs and extreme outliers.
+        values[rng.random(length) < 0.1] = np.nan
+        values[rng.random(length) < 0.05] = 10**4
+        for t, v in zip(times[::-1], values[::-1]):
+            enc = builder.encode
+            builder.add(
+                id=str(n),
+                svs=float(v),
+                started_at=float(t),
+                data=[float(v)],
+                non_null_sample_count=1,
+                codes={
+                    "benchmark_name": enc("benchmark_name", f"b{s % 2}"),
+                    "case": enc("case", f"c{s}", lambda: ("", {})),
+                    "context": enc("context", "ctx", lambda: ({},)),
+                    "hardware": enc("hardware", "hw", lambda: ("",)),
+                    "run": enc("run", "run", lambda: ("",)),
+                    "svs_type": enc("svs_type", "mean"),
+                    "unit": enc("unit", "s"),
+                },
+            )
+            n += 1
+
+    # Newest first (as in the BMRT cache).
+    store = builder.build()
+    order = np.argsort(-store.started_at, kind="stable")
+    store = BMRTStore(
+        ids=store.ids[order],
+        svs=store.svs[order],
+        started_at=store.started_at[order],
+        non_null_sample_count=store.non_null_sample_count[order],
+        data_offsets=np.arange(store.n_results + 1),
+        data_values=store.data_values[order],
+        codes={k: v[order] for k, v in store.codes.items()},
+        tables=store.tables,
+    )
+    _, _, by_4t = groupings_as_dicts(store)
+    tsframe = TimeseriesFrame(store, list(by_4t))
+
+    reftime = float(store.started_at.max())
+    for bname in ("b0", "b1"):
+        codes = tsframe.codes_for_benchmark_name(bname)
+        expected = _relchange_by_series_reference(tsframe, codes.tolist(), reftime)
+        actual = relchange_by_series(tsframe, codes, reftime)
+        assert len(expected) > 5
+        assert actual.keys() == expected.keys()
+        for code, relchange in expected.items():
+            assert actual[code] == pytest.approx(relchange, rel=1e-6)
@@ -4,6 +4,9 @@ from .. import create_application
 from ..config import TestConfig
 from ..db import _session as Session
 from ..db import configure_engine, create_all, drop_all, empty_db_tables
+from ..entities.commit_graph import commit_graphs
+from ..entities.commit_resolver import commit_resolver
+from ..entities.history_cache import history_cache
 
 pytest.register_assert_rewrite("conbench.tests.api._asserts")
 pytest.register_assert_rewrite("conbench.tests.app._asserts")
@@ -23,6 +26,9 @@ def create_db_tables():
 @pytest.fixture(autouse=True)
 def clear_db_state_between_tests():
     empty_db_tables()
+    history_cache.clear()
+    commit_graphs.clear()
+    commit_resolver.clear()
 
 
 @pytest.fixture
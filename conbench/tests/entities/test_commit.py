@@ -4,9 +4,15 @@ import logging
 import os
 from datetime import timezone
 
+import prometheus_client
 import pytest
 import sqlalchemy as s
+from pytest_httpserver import HTTPServer
+from werkzeug import Request, Response
 
+from ...config import Config
+from ...dbsession import current_session
+from ...entities import commit as commit_module
 from ...entities.commit import (
     CantFindAncestorCommitsError,
     Commit,
@@ -16,6 +22,8 @@ from ...entities.commit import (
     repository_to_name,
     repository_to_url,
 )
+from ...entities.commit_graph import commit_graphs
+from ...entities.github_response import GitHubResponse
 from ...tests.api import _fixtures
 
 this_dir = os.path.abspath(os.path.dirname(__file__))
@@ -55,7 +63,14 @@ def test_upsert_do_nothing():
     assert commit == commit_2
 
 
-def test_ancestor_commit_query():
+@pytest.fixture(params=[True, False], ids=["commit-graph", "no-commit-graph"])
+def commit_graph_enabled(request, monkeypatch):
+    if not request.param:
+        monkeypatch.setattr(Config, "COMMIT_GRAPH_MAX_AGE_SECONDS", 0)
+    return request.param
+
+
+def test_ancestor_commit_query(commit_graph_enabled):
     commits, _ = _fixtures.gen_fake_data()
     for commit_sha, expected_ancestor_commit_shas in [
         ("11111", ["11111"]),
@@ -86,7 +101,102 @@ def test_ancestor_commit_query():
         assert actual_ancestor_ids == expected_ancestor_ids
 
 
-def test_ancestor_commit_query_bad_input():
+def test_ancestor_commit_query_max_commits(commit_graph_enabled):
+    commits, _ = _fixtures.gen_fake_data()
+    for commit in commits.values():
+        try:
+            query = commit.commit_ancestry_query
+        except CantFindAncestorCommitsError:
+            continue
+        expected = [row[0] for row in query.order_by(s.desc("commit_order")).all()]
+        for max_commits in (1, 2, 3, 10):
+            actual = [
+                row[0]
+                for row in commit.get_commit_ancestry_query(max_commits=max_commits)
+                .order_by(s.desc("commit_order"))
+                .limit(max_commits)
+                .all()
+            ]
+            assert actual == expected[:max_commits]
+
+
+def test_ancestor_commit_query_timestamp_tie(commit_graph_enabled):
+    # Default branch commits with the same timestamp as the fork point are
+    # ancestors, regardless of their commit order.
+    repo = "https://github.com/org/tie"
+    t0 = datetime.datetime(2022, 1, 1)
+
+    def _create(sha, branch, fork_point_sha, hours):
+        return Commit.create(
+            {
+                "sha": sha,
+                "branch": branch,
+                "fork_point_sha": fork_point_sha,
+                "parent": None,
+                "repository": repo,
+                "message": "message",
+                "author_name": "author_name",
+                "timestamp": t0 + datetime.timedelta(hours=hours),
+            }
+        )
+
+    old = _create("00001", "default", "00001", 0)
+    tied = [
+        _create("00002", "default", "00002", 1),
+        _create("00003", "default", "00003", 1),
+    ]
+    _create("00004", "default", "00004", 2)
+    # Fork from the tied commit that comes first in the commit order.
+    fork_point = min(tied, key=lambda c: c.commit_order)
+    branch_commit = _create("0000b", "branch", fork_point.sha, 3)
+
+    for commit in (fork_point, branch_commit):
+        expected = {c.id for c in [commit, old, *tied]}
+        assert {row[0] for row in commit.commit_ancestry_query.all()} == expected
+        for max_commits in (1, 2, 3, 10):
+            ancestors = [
+                row[0]
+                for row in commit.get_commit_ancestry_query(max_commits=max_commits)
+                .order_by(s.desc("commit_order"))
+                .limit(max_commits)
+                .all()
+            ]
+            assert len(ancestors) == min(max_commits, len(expected))
+            assert set(ancestors) <= expected
+
+
+def test_commit_order():
+    commits, _ = _fixtures.gen_fake_data()
+
+    def _order(*shas):
+        return [
+            Commit.first(sha=sha, repository=_fixtures.REPO).commit_order
+            for sha in shas
+        ]
+
+    default_branch = ["11111", "22222", "33333", "44444", "55555", "66666"]
+    assert _order(*default_branch) == [1, 2, 3, 4, 5, 6]
+    # Not on the default branch.
+    assert _order("aaaaa", "ccccc") == [None, None]
+
+    # A commit inserted into the middle of the history shifts later commits.
+    Commit.create(
+        {
+            "sha": "33334",
+            "branch": "default",
+            "fork_point_sha": "33334",
+            "parent": "33333",
+            "repository": _fixtures.REPO,
+            "message": "message",
+            "author_name": "author_name",
+            "timestamp": datetime.datetime(2022, 1, 3, 12),
+        }
+    )
+    new_order = _order(*default_branch[:3], "33334", *default_branch[3:])
+    assert new_order == list(range(1, 8))
+
+
+def test_ancestor_commit_query_bad_input(commit_graph_enabled):
     default_kwargs = {"repository": "r", "message": "m", "author_name": "a"}
     kwargs = default_kwargs.copy()
 
@@ -118,6 +228,52 @@ def test_ancestor_commit_query_bad_input():
         commit.commit_ancestry_query
 
 
+def test_parent_and_fork_point_commit(commit_graph_enabled):
+    commits, _ = _fixtures.gen_fake_data()
+    for commit in commits.values():
+        parent = Commit.first(sha=commit.parent, repository=commit.repository)
+        assert commit.get_parent_commit() == parent
+        if commit.fork_point_sha is not None:
+            fork_point = Commit.first(
+                sha=commit.fork_point_sha, repository=commit.repository
+            )
+            assert commit.get_fork_point_commit() == fork_point
+
+
+def test_commit_graph_reload(monkeypatch):
+    commits, _ = _fixtures.gen_fake_data()
+    loads = prometheus_client.REGISTRY.get_sample_value
+
+    def _n_loads(reason):
+        return loads("conbench_commit_graph_loads_total", {"reason": reason}) or 0
+
+    commit = commits["66666"]
+    assert len(commit.commit_ancestry_query.all()) == 6
+    n_miss, n_stale = _n_loads("miss"), _n_loads("stale")
+    assert commit.get_parent_commit() == commits["55555"]
+    assert _n_loads("miss") == n_miss
+
+    # A commit inserted by another process: the graph of this process is not
+    # invalidated, but it is reloaded as it does not know the commit.
+    with monkeypatch.context() as m:
+        m.setattr(commit_graphs, "invalidate", lambda repository: None)
+        new = Commit.create(
+            {
+                "sha": "77777",
+                "branch": "default",
+                "fork_point_sha": "77777",
+                "parent": "66666",
+                "repository": _fixtures.REPO,
+                "message": "message",
+                "author_name": "author_name",
+                "timestamp": datetime.datetime(2022, 1, 7),
+            }
+        )
+    assert new.get_parent_commit() == commit
+    assert _n_loads("stale") == n_stale + 1
+    assert len(new.commit_ancestry_query.all()) == 7
+
+
 def test_repository_to_name():
     expected = "apache/arrow"
     assert repository_to_name(None) == ""
@@ -428,3 +584,97 @@ def test_parse_pull_request_commit():
         "author_avatar": "https://avatars.githubusercontent.com/u/878798?v=4",
     }
     assert GitHubHTTPApiClient._parse_commit(commit) == expected
+
+
+def test_github_response_cache(httpserver: HTTPServer, monkeypatch):
+    # A local fake GitHub HTTP API which supports conditional requests for
+    # the repository resource.
+    monkeypatch.setattr(commit_module, "GITHUB", httpserver.url_for("").rstrip("/"))
+    monkeypatch.setenv("GITHUB_API_TOKEN", "fake-token")
+    sha = "3decc46119d583df56c7c66c77cf2803441c4458"
+
+    def _repo(request: Request) -> Response:
+        if request.headers.get("If-None-Match") == '"v1"':
+            return Response(status=304)
+        body = {"fork": False, "owner": {"login": "org"}, "default_branch": "main"}
+        return Response(
+            json.dumps(body), headers={"ETag": '"v1"'}, mimetype="application/json"
+        )
+
+    with open(os.path.join(this_dir, "github_child.json")) as f:
+        commit_body = f.read()
+
+    httpserver.expect_request("/repos/org/something").respond_with_handler(_repo)
+    httpserver.expect_request(f"/repos/org/something/commits/{sha}").respond_with_data(
+        commit_body, headers={"ETag": '"c1"'}, content_type="application/json"
+    )
+
+    sample = prometheus_client.REGISTRY.get_sample_value
+
+    def _n_lookups(outcome):
+        return (
+            sample("conbench_github_httpapi_cache_lookups_total", {"outcome": outcome})
+            or 0
+        )
+
+    def _n_saved():
+        return sample("conbench_github_httpapi_quota_saved_total") or 0
+
+    n_hit = _n_lookups("hit")
+    n_revalidated = _n_lookups("revalidated")
+    n_saved = _n_saved()
+
+    gh = GitHubHTTPApiClient()
+    assert gh.get_default_branch("org/something") == "org:main"
+    assert gh.get_default_branch("org/something") == "org:main"
+    # The second request was conditional, and answered with 304.
+    assert [resp.status_code for _, resp in httpserver.log] == [200, 304]
+    assert httpserver.log[1][0].headers["If-None-Match"] == '"v1"'
+    assert _n_lookups("revalidated") == n_revalidated + 1
+
+    # A commit by hash is requested once, also across client instances
+    # (processes).
+    expected = GitHubHTTPApiClient._parse_commit(json.loads(commit_body))
+    assert gh.get_commit_info("org/something", sha) == expected
+    assert GitHubHTTPApiClient().get_commit_info("org/something", sha) == expected
+    assert len(httpserver.log) == 3
+    assert _n_lookups("hit") == n_hit + 1
+    assert _n_saved() == n_saved + 2
+
+    stored = GitHubResponse.lookup(
+        httpserver.url_for(f"/repos/org/something/commits/{sha}")
+    )
+    assert stored is not None and stored.immutable and stored.etag == '"c1"'
+
+    # Disabled cache: unconditional requests.
+    monkeypatch.setattr(Config, "GITHUB_RESPONSE_CACHE", False)
+    assert gh.get_default_branch("org/something") == "org:main"
+    assert gh.get_commit_info("org/something", sha) == expected
+    assert [resp.status_code for _, resp in httpserver.log[3:]] == [200, 200]
+    assert "If-None-Match" not in httpserver.log[3][0].headers
+
+
+def test_github_response_cache_expiry_and_write_errors(monkeypatch):
+    repo_url = "https://api.github.com/repos/org/something"
+    commit_url = f"{repo_url}/commits/{'a' * 40}"
+    GitHubResponse.store(repo_url, etag='"v1"', last_modified=None, body={})
+    GitHubResponse.store(commit_url, etag='"c1"', last_modified=None, body={})
+    current_session.execute(
+        s.update(GitHubResponse).values(fetched_at=datetime.datetime(2000, 1, 1))
+    )
+    current_session.commit()
+
+    # Expired responses for mutable resources are deleted upon the next write.
+    GitHubResponse.store(f"{repo_url}/pulls/1", etag=None, last_modified=None, body={})
+    assert GitHubResponse.lookup(repo_url) is None
+    assert GitHubResponse.lookup(commit_url) is not None
+
+    # A failing write does not affect the caller's session.
+    dbcommit = Commit.create_unknown_context("bbbbb", "https://github.com/org/x")
+    current_session.add(dbcommit)
+    dbcommit.message = "pending"
+    # NaN is not valid JSON: the database rejects this.
+    GitHubResponse.store(repo_url, etag=None, last_modified=None, body=float("nan"))
+    assert GitHubResponse.lookup(repo_url) is None
+    current_session.commit()
+    assert Commit.first(sha="bbbbb").message == "pending"
@@ -0,0 +1,166 @@
+from datetime import datetime
+
+import pytest
+
+from ...entities import history
+from ...entities.commit import Commit
+from ...entities.distribution_stats import DistributionStats
+from ...entities.history import set_z_scores
+from ...tests.api import _fixtures
+from ...tests.entities.test_history import (
+    EXPECTED_Z_SCORES,
+    _get_head_of_default,
+    _get_parent,
+    assert_equal_leeway,
+)
+
+
+def _set_z_scores(benchmark_results, get_baseline_func):
+    for benchmark_result in benchmark_results:
+        baseline_commit = get_baseline_func(benchmark_result.run.commit)
+        if baseline_commit:
+            set_z_scores([benchmark_result], baseline_commit)
+        else:
+            benchmark_result.z_score = None
+    return [r.z_score for r in benchmark_results]
+
+
+def _stored_baseline_commit_ids():
+    return {row.baseline_commit_id for row in DistributionStats.all()}
+
+
+@pytest.mark.parametrize(
+    ["strategy_name", "get_baseline_func"],
+    [("parent", _get_parent), ("head_of_default", _get_head_of_default)],
+)
+def test_z_scores_from_stored_stats(strategy_name, get_baseline_func, monkeypatch):
+    _, benchmark_results = _fixtures.gen_fake_data()
+
+    # Stats are persisted upon first calculation.
+    z_scores = _set_z_scores(benchmark_results, get_baseline_func)
+    assert DistributionStats.all()
+
+    # Now, z-scores are calculated from the persisted stats only.
+    def _fail(*args, **kwargs):
+        raise AssertionError("unexpected distribution stats calculation")
+
+    monkeypatch.setattr(history, "_query_and_calculate_distribution_stats", _fail)
+    assert _set_z_scores(benchmark_results, get_baseline_func) == z_scores
+
+    for z_score, expected in zip(z_scores, EXPECTED_Z_SCORES[strategy_name]):
+        assert_equal_leeway(z_score, expected)
+
+
+def test_stored_stats_match_calculated_stats():
+    commits, benchmark_results = _fixtures.gen_fake_data()
+    run = benchmark_results[0].run
+    pairs = {(r.case_id, r.context_id) for r in benchmark_results}
+
+    for commit in commits.values():
+        calculated = history._query_and_calculate_distribution_stats(
+            run.id, commit, case_id=None, context_id=None
+        )
+        history._get_distribution_stats(run.id, commit, pairs)
+        stored = DistributionStats.lookup(commit.id, run.hardware.hash, pairs)
+
+        if commit.timestamp is None:
+            assert stored == {}
+            continue
+
+        assert set(stored) == pairs
+        for pair, (mean, stddev) in stored.items():
+            expected_mean, expected_stddev = calculated.get(pair, (None, None))
+            assert_equal_leeway(mean, history._to_float_or_none(expected_mean))
+            assert_equal_leeway(stddev, history._to_float_or_none(expected_stddev))
+
+
+def test_new_result_invalidates_stats_of_later_baseline_commits():
+    commits, benchmark_results = _fixtures.gen_fake_data()
+    _set_z_scores(benchmark_results, _get_head_of_default)
+    _set_z_scores(benchmark_results, _get_parent)
+    assert commits["66666"].id in _stored_baseline_commit_ids()
+    assert commits["33333"].id in _stored_baseline_commit_ids()
+
+    # A new result (for a commit in the middle of the history) in one of the
+    # series.
+    result = benchmark_results[0]
+    new = _fixtures.benchmark_result(
+        results=[1, 2, 3], commit=commits["44444"], name=result.case.name
+    )
+    case_id, context_id = new.case_id, new.context_id
+    assert (case_id, context_id) == (result.case_id, result.context_id)
+
+    rows = DistributionStats.all(case_id=case_id, context_id=context_id)
+    for row in rows:
+        if (row.repository, row.hardware_hash) == (
+            _fixtures.REPO,
+            new.run.hardware.hash,
+        ):
+            assert row.baseline_commit_timestamp < commits["44444"].timestamp
+
+    # Stats for other repositories and other hardware are not affected.
+    assert any(
+        row.baseline_commit_timestamp > commits["44444"].timestamp for row in rows
+    )
+
+    # Other cases are not affected.
+    n_other = len(
+        DistributionStats.all(filter_args=[DistributionStats.case_id != case_id])
+    )
+    assert n_other > 0
+
+    # Results for a commit without timestamp are not part of any distribution.
+    n_before = len(DistributionStats.all())
+    _fixtures.benchmark_result(
+        results=[1, 2, 3], commit=commits["sha"], name=result.case.name
+    )
+    assert len(DistributionStats.all()) == n_before
+
+
+def test_new_commit_invalidates_stats_of_later_baseline_commits():
+    commits, benchmark_results = _fixtures.gen_fake_data()
+    _set_z_scores(benchmark_results, _get_parent)
+    assert commits["55555"].id in _stored_baseline_commit_ids()
+
+    Commit.create(
+        {
+            "sha": "44445",
+            "branch": "default",
+            "fork_point_sha": "44445",
+            "parent": "44444",
+            "repository": _fixtures.REPO,
+            "message": "message",
+            "author_name": "author_name",
+            "timestamp": datetime(2022, 1, 4, 12),
+        }
+    )
+
+    stored = _stored_baseline_commit_ids()
+    assert commits["33333"].id in stored
+    assert commits["55555"].id not in stored
+
+
+def test_update_and_delete_invalidate_stats():
+    commits, benchmark_results = _fixtures.gen_fake_data()
+    result = next(r for r in benchmark_results if r.run.commit.sha == "22222")
+
+    series = dict(
+        case_id=result.case_id,
+        context_id=result.context_id,
+        hardware_hash=result.run.hardware.hash,
+        repository=result.run.commit.repository,
+    )
+
+    def _rows():
+        return DistributionStats.all(**series)
+
+    _set_z_scores(benchmark_results, _get_head_of_default)
+    assert _rows()
+
+    result.update({"change_annotations": {"begins_distribution_change": True}})
+    assert _rows() == []
+
+    _set_z_scores(benchmark_results, _get_head_of_default)
+    assert _rows()
+    result.delete()
+    assert _rows() == []
@@ -0,0 +1,76 @@
+import sqlalchemy as s
+
+from ...config import Config
+from ...dbsession import current_session
+from ...entities.case import Case
+from ...entities.context import Context
+from ...entities.pk_cache import entity_pk_cache
+
+
+def _count_statements():
+    statements = []
+
+    def _cb(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    s.event.listen(s.engine.Engine, "before_cursor_execute", _cb)
+    return statements, lambda: s.event.remove(
+        s.engine.Engine, "before_cursor_execute", _cb
+    )
+
+
+def test_get_or_create_id_cached():
+    props = {"name": "bench", "tags": {"a": "1", "b": "2"}}
+    case_id = Case.get_or_create_id(props)
+    assert Case.get_or_create(props).id == case_id
+
+    statements, stop = _count_statements()
+    try:
+        # Key order does not matter.
+        assert (
+            Case.get_or_create_id({"tags": {"b": "2", "a": "1"}, "name": "bench"})
+            == case_id
+        )
+        assert Context.get_or_create_id({"tags": props["tags"]}) != case_id
+    finally:
+        stop()
+
+    # Only the context lookup (and its creation) went to the database.
+    assert statements
+    assert all('"case"' not in st for st in statements)
+    assert len(entity_pk_cache) == 2
+
+
+def test_get_or_create_after_delete():
+    props = {"name": "bench", "tags": {"a": "1"}}
+    case = Case.get_or_create(props)
+    case.delete()
+    assert len(entity_pk_cache) == 0
+    assert Case.get_or_create_id(props) != case.id
+
+    # A deletion that bypasses EntityMixin.delete(): get_or_create() notices,
+    # get_or_create_id() relies on the cache.
+    case_id = Case.get_or_create_id(props)
+    current_session.execute(s.delete(Case.__table__))
+    current_session.commit()
+    current_session.expunge_all()
+    assert Case.get_or_create_id(props) == case_id
+    assert Case.get_or_create(props).id != case_id
+
+
+def test_pk_cache_size_bound(monkeypatch):
+    monkeypatch.setattr(Config, "ENTITY_PK_CACHE_MAX_ENTRIES", 2)
+    ids = [Context.get_or_create_id({"tags": {"i": str(i)}}) for i in range(3)]
+    assert len(entity_pk_cache) == 2
+
+    # The least recently used entry was evicted.
+    assert (
+        entity_pk_cache.get(entity_pk_cache.key("Context", {"tags": {"i": "0"}}))
+        is None
+    )
+    assert Context.get_or_create_id({"tags": {"i": "0"}}) == ids[0]
+
+    monkeypatch.setattr(Config, "ENTITY_PK_CACHE_MAX_ENTRIES", 0)
+    entity_pk_cache.clear()
+    assert Context.get_or_create_id({"tags": {"i": "1"}}) == ids[1]
+    assert len(entity_pk_cache) == 0
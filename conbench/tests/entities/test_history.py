@@ -1,19 +1,29 @@
+import copy
 from datetime import datetime
-from typing import Callable
+from typing import Callable, Optional, Tuple
 
 import numpy as np
 import pandas as pd
+import prometheus_client
 import pytest
 import sigfig
 import sqlalchemy as s
 
+from ...config import Config
 from ...db import _session as Session
 from ...entities.commit import Commit
 from ...entities.history import (
+    HistorySample,
+    HistorySampleZscoreStats,
+    _add_rolling_stats_columns_to_df,
     _detect_shifts_with_trimmed_estimators,
+    _lttb_indexes,
+    downsample_history_samples,
+    get_history_for_benchmark,
     get_history_for_cchr,
     set_z_scores,
 )
+from ...entities.history_cache import history_cache
 from ...tests.api import _fixtures
 
 
@@ -167,6 +177,32 @@ def test_get_history():
         assert expected_benchmark_result_ids == actual_benchmark_result_ids
 
 
+def test_history_samples_match_benchmark_results():
+    # The history query selects individual columns instead of BenchmarkResult
+    # entities. Confirm that the samples reflect the corresponding
+    # BenchmarkResult properties.
+    _, benchmark_results = _fixtures.gen_fake_data(one_sample_no_mean=True)
+    results_by_id = {r.id: r for r in benchmark_results}
+
+    for result in benchmark_results:
+        for sample in get_history_for_cchr(*_cchr(result)):
+            bmr = results_by_id[sample.benchmark_result_id]
+            assert (sample.case_id, sample.context_id) == (
+                bmr.case_id,
+                bmr.context_id,
+            )
+            assert sample.svs == sample.mean == bmr.svs
+            assert sample.svs_type == bmr.svs_type
+            assert sample.data == bmr.measurements
+            assert sample.times == [float(t) for t in bmr.times or []]
+            assert sample.unit == bmr.unit
+            assert sample.hardware_hash == bmr.run.hardware.hash
+            assert sample.commit_hash == bmr.run.commit.sha
+            assert sample.commit_msg == bmr.run.commit.message
+            assert sample.commit_timestamp == bmr.run.commit.timestamp
+            assert sample.run_name == bmr.run.name
+
+
 @pytest.mark.parametrize(
     ["strategy_name", "get_baseline_func"],
     [
@@ -322,3 +358,448 @@ def test_detect_shifts_with_trimmed_estimators():
     assert not np.any(result_df.is_step[:50])
     assert result_df.is_step[50]
     assert not np.any(result_df.is_step[51:])
+
+
+class _CommitIndexer(pd.api.indexers.BaseIndexer):
+    """pandas isn't great about rolling over ranges, so this class lets us roll over
+    the commit timestamp column correctly (not caring about time between commits)."""
+
+    def get_window_bounds(
+        self,
+        num_values: int = 0,
+        min_periods: Optional[int] = None,
+        center: Optional[bool] = None,
+        closed: Optional[str] = None,
+        step: Optional[int] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        commit_ranks = pd.Series(self.index_array).rank(method="dense").values
+        end_ixs = np.searchsorted(commit_ranks, commit_ranks, side=closed)  # type: ignore[call-overload]
+        start_ixs = np.searchsorted(
+            commit_ranks, commit_ranks - self.window_size, side=closed
+        )  # type: ignore[call-overload]
+        return start_ixs, end_ixs
+
+
+def _add_rolling_stats_columns_to_df_pandas(
+    df: pd.DataFrame, include_current_commit_in_rolling_stats: bool
+) -> pd.DataFrame:
+    """
+    The previous implementation of _add_rolling_stats_columns_to_df(), based on
+    pandas' groupby/rolling machinery. Serves as reference.
+    """
+    df = _detect_shifts_with_trimmed_estimators(df=df)
+    df.sort_values(
+        ["case_id", "context_id", "hash", "repository", "timestamp"],
+        inplace=True,
+        ignore_index=True,
+    )
+    df["begins_distribution_change"] = [
+        bool(x.get("begins_distribution_change", False)) if x else False
+        for x in df["change_annotations"]
+    ]
+    df["segment_id"] = (
+        df.groupby(["case_id", "context_id", "hash", "repository"])
+        .rolling(
+            _CommitIndexer(window_size=len(df) + 1),
+            on="timestamp",
+            closed="right",
+            min_periods=1,
+        )["begins_distribution_change"]
+        .sum()
+        .values
+    )
+    df.loc[~df.is_outlier, "rolling_mean_excluding_this_commit"] = (
+        df.loc[~df.is_outlier]
+        .groupby(["case_id", "context_id", "hash", "repository", "segment_id"])
+        .rolling(
+            _CommitIndexer(window_size=Config.DISTRIBUTION_COMMITS),
+            on="timestamp",
+            closed="left",
+            min_periods=1,
+        )["svs"]
+        .mean()
+        .values
+    )
+    df.loc[~df.is_outlier, "rolling_mean_excluding_this_commit"] = df.loc[
+        ~df.is_outlier, "rolling_mean_excluding_this_commit"
+    ].combine_first(df.loc[~df.is_outlier, "svs"])
+    if include_current_commit_in_rolling_stats:
+        df.loc[~df.is_outlier, "rolling_mean"] = (
+            df.loc[~df.is_outlier]
+            .groupby(["case_id", "context_id", "hash", "repository", "segment_id"])
+            .rolling(
+                _CommitIndexer(window_size=Config.DISTRIBUTION_COMMITS),
+                on="timestamp",
+                closed="right",
+                min_periods=1,
+            )["svs"]
+            .mean()
+            .values
+        )
+    else:
+        df["rolling_mean"] = df["rolling_mean_excluding_this_commit"]
+    df["residual"] = df["svs"] - df["rolling_mean_excluding_this_commit"]
+    df.loc[~df.is_outlier, "rolling_stddev"] = (
+        df.loc[~df.is_outlier]
+        .groupby(["case_id", "context_id", "hash", "repository"])
+        .rolling(
+            _CommitIndexer(window_size=Config.DISTRIBUTION_COMMITS),
+            on="timestamp",
+            closed="right" if include_current_commit_in_rolling_stats else "left",
+            min_periods=1,
+        )["residual"]
+        .std()
+        .values
+    )
+    return df
+
+
+def _random_history_df(rng: np.random.Generator) -> pd.DataFrame:
+    """
+    Many timeseries of different length and scale, with more than one result
+    for some commits, step changes, spikes, constant stretches, and annotated
+    distribution changes.
+    """
+    parts = []
+    for i in range(rng.integers(20, 40)):
+        n_commits = int(rng.integers(1, 300))
+        commit_times = np.sort(
+            rng.choice(np.arange(10**6), size=n_commits, replace=False)
+        )
+        # Repeat some commits (more than one result per commit).
+        times = np.repeat(commit_times, rng.integers(1, 4, size=n_commits))
+        n = len(times)
+        scale = 10.0 ** rng.integers(-3, 7)
+        svs = scale * (1 + 0.05 * rng.standard_normal(n))
+        half = n // 2
+        svs[half:] += scale * rng.choice([0.0, 1.0])
+        if i % 5 == 0:
+            svs[: n // 3] = scale
+        spikes = rng.random(n) < 0.02
+        svs[spikes] *= 3
+        annotations = [
+            {"begins_distribution_change": True} if rng.random() < 0.02 else None
+            for _ in range(n)
+        ]
+        parts.append(
+            pd.DataFrame(
+                {
+                    "case_id": f"case-{i % 7}",
+                    "context_id": f"context-{i % 3}",
+                    "hash": f"hw-{i}",
+                    "repository": "repo",
+                    "timestamp": pd.to_datetime(times, unit="s"),
+                    "result_timestamp": pd.to_datetime(np.arange(n), unit="s"),
+                    "svs": svs,
+                    "change_annotations": annotations,
+                }
+            )
+        )
+    # Shuffle rows (the implementation sorts).
+    df = pd.concat(parts, ignore_index=True)
+    return df.iloc[rng.permutation(len(df))].reset_index(drop=True)
+
+
+@pytest.mark.parametrize("distribution_commits", [100, 5])
+@pytest.mark.parametrize("include_current_commit", [True, False])
+def test_rolling_stats_match_pandas_reference(
+    distribution_commits, include_current_commit, monkeypatch
+):
+    monkeypatch.setattr(Config, "DISTRIBUTION_COMMITS", distribution_commits)
+    rng = np.random.default_rng(seed=distribution_commits)
+
+    for _ in range(3):
+        df = _random_history_df(rng)
+        expected = _add_rolling_stats_columns_to_df_pandas(
+            df.copy(), include_current_commit
+        )
+        actual = _add_rolling_stats_columns_to_df(df.copy(), include_current_commit)
+
+        assert list(actual.columns) == list(expected.columns)
+        for col in ("benchmark_result_id", "svs", "is_outlier"):
+            if col in df:
+                np.testing.assert_array_equal(actual[col], expected[col])
+        np.testing.assert_array_equal(actual.segment_id, expected.segment_id)
+        assert actual.segment_id.dtype == expected.segment_id.dtype
+
+        # Equal up to floating point error (sums are computed differently).
+        for col in (
+            "rolling_mean_excluding_this_commit",
+            "rolling_mean",
+            "residual",
+            "rolling_stddev",
+        ):
+            scale = np.abs(df.svs).max()
+            np.testing.assert_allclose(
+                actual[col], expected[col], rtol=1e-9, atol=1e-9 * scale, err_msg=col
+            )
+            # NaN (e.g. for outliers, and windows with too few values) in the
+            # same places, and exact zeros for windows with equal values.
+            np.testing.assert_array_equal(
+                np.isnan(actual[col]), np.isnan(expected[col])
+            )
+        np.testing.assert_array_equal(
+            actual.rolling_stddev == 0, expected.rolling_stddev == 0
+        )
+
+
+def _detect_shifts_with_trimmed_estimators_pandas(
+    df: pd.DataFrame, z_score_threshold=5.0
+) -> pd.DataFrame:
+    """
+    The previous implementation of _detect_shifts_with_trimmed_estimators(),
+    one timeseries at a time. Serves as reference.
+    """
+    tmp_df = copy.deepcopy(df)
+    tmp_df.sort_values(
+        [
+            "case_id",
+            "context_id",
+            "hash",
+            "repository",
+            "timestamp",
+            "result_timestamp",
+        ],
+        inplace=True,
+        ignore_index=True,
+    )
+    out_group_df_list = []
+    for _, group_df in tmp_df.groupby(["case_id", "context_id", "hash", "repository"]):
+        out_group_df = copy.deepcopy(group_df)
+        group_df["svs_diff"] = group_df["svs"].diff()
+        svs_diff_clipped = copy.deepcopy(group_df.svs_diff)
+        svs_diff_clipped.loc[
+            (group_df.svs_diff < group_df.svs_diff.quantile(0.05))
+            | (group_df.svs_diff > group_df.svs_diff.quantile(0.95))
+        ] = np.nan
+        group_df["rolling_mean"] = svs_diff_clipped.rolling(
+            Config.DISTRIBUTION_COMMITS, min_periods=1
+        ).mean()
+        group_df["rolling_std"] = svs_diff_clipped.rolling(
+            Config.DISTRIBUTION_COMMITS, min_periods=1
+        ).std()
+        group_df["z_score"] = (
+            group_df.svs_diff - group_df.rolling_mean
+        ) / group_df.rolling_std
+        group_df["is_shift"] = group_df.z_score.abs() > z_score_threshold
+        group_df["reverts"] = group_df.is_shift & group_df.is_shift.shift(-1)
+        out_group_df["is_step"] = (
+            group_df.is_shift
+            & ~group_df.reverts
+            & ~group_df.reverts.shift(1, fill_value=False)
+        )
+        out_group_df["is_outlier"] = group_df.is_shift & group_df.reverts
+        out_group_df_list.append(out_group_df)
+    return pd.concat(out_group_df_list)
+
+
+@pytest.mark.parametrize("distribution_commits", [100, 5])
+def test_detect_shifts_match_pandas_reference(distribution_commits, monkeypatch):
+    monkeypatch.setattr(Config, "DISTRIBUTION_COMMITS", distribution_commits)
+    rng = np.random.default_rng(seed=distribution_commits)
+
+    n_steps = n_outliers = 0
+    for _ in range(3):
+        df = _random_history_df(rng)
+        df_before = df.copy()
+        expected = _detect_shifts_with_trimmed_estimators_pandas(df)
+        actual = _detect_shifts_with_trimmed_estimators(df)
+
+        pd.testing.assert_frame_equal(df, df_before)
+        pd.testing.assert_frame_equal(actual, expected)
+        n_steps += actual.is_step.sum()
+        n_outliers += actual.is_outlier.sum()
+
+    # Make sure that the test data is interesting.
+    assert n_steps > 0
+    assert n_outliers > 0
+
+
+def _cache_sample(name, **labels):
+    return prometheus_client.REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_history_cache():
+    commits, benchmark_results = _fixtures.gen_fake_data()
+    result = benchmark_results[0]
+    cchr = _cchr(result)
+
+    hits_before = _cache_sample("conbench_history_cache_lookups_total", outcome="hit")
+    misses_before = _cache_sample(
+        "conbench_history_cache_lookups_total", outcome="miss"
+    )
+
+    samples = get_history_for_cchr(*cchr)
+    assert len(history_cache) == 1
+    assert get_history_for_cchr(*cchr) == samples
+    assert (
+        _cache_sample("conbench_history_cache_lookups_total", outcome="miss")
+        == misses_before + 1
+    )
+    assert (
+        _cache_sample("conbench_history_cache_lookups_total", outcome="hit")
+        == hits_before + 1
+    )
+
+    # A new result in this timeseries invalidates the cache entry.
+    new = _fixtures.benchmark_result(
+        results=[1, 2, 3], commit=commits["66666"], name=result.case.name
+    )
+    assert len(history_cache) == 0
+    new_samples = get_history_for_cchr(*cchr)
+    assert len(new_samples) == len(samples) + 1
+    assert new.id in {s.benchmark_result_id for s in new_samples}
+
+    # Changing a result, too.
+    new.update({"change_annotations": {"begins_distribution_change": True}})
+    assert len(history_cache) == 0
+
+
+def test_history_cache_lru_and_max_age(monkeypatch):
+    _, benchmark_results = _fixtures.gen_fake_data()
+    cchrs = {_cchr(r) for r in benchmark_results if r.run.commit is not None}
+    assert len(cchrs) > 2
+
+    monkeypatch.setattr(Config, "HISTORY_CACHE_MAX_ENTRIES", 2)
+    for cchr in cchrs:
+        get_history_for_cchr(*cchr)
+    assert len(history_cache) == 2
+
+    monkeypatch.setattr(Config, "HISTORY_CACHE_MAX_AGE_SECONDS", 0)
+    cchr = next(iter(cchrs))
+    get_history_for_cchr(*cchr)
+    assert history_cache.get(cchr) is None
+
+    monkeypatch.setattr(Config, "HISTORY_CACHE_MAX_ENTRIES", 0)
+    history_cache.clear()
+    get_history_for_cchr(*cchr)
+    assert len(history_cache) == 0
+
+
+def test_history_for_benchmark_bypasses_stale_cache(monkeypatch):
+    commits, benchmark_results = _fixtures.gen_fake_data()
+    result = benchmark_results[0]
+    samples = get_history_for_benchmark(result.id)
+
+    # A result submitted through another process: the invalidation does not
+    # reach the history cache of this process.
+    with monkeypatch.context() as m:
+        m.setattr(history_cache, "invalidate", lambda cchr: None)
+        new = _fixtures.benchmark_result(
+            results=[1, 2, 3], commit=commits["66666"], name=result.case.name
+        )
+    assert len(get_history_for_cchr(*_cchr(result))) == len(samples)
+    new_samples = get_history_for_benchmark(new.id)
+    assert new.id in {s.benchmark_result_id for s in new_samples}
+
+
+def test_history_batch_bypasses_stale_cache(client, monkeypatch):
+    commits, benchmark_results = _fixtures.gen_fake_data()
+    result = benchmark_results[0]
+    get_history_for_benchmark(result.id)
+
+    with monkeypatch.context() as m:
+        m.setattr(history_cache, "invalidate", lambda cchr: None)
+        new = _fixtures.benchmark_result(
+            results=[1, 2, 3], commit=commits["66666"], name=result.case.name
+        )
+    resp = client.post(
+        "/api/history/batch/", json={"benchmark_result_ids": [result.id, new.id]}
+    )
+    assert resp.status_code == 200, resp.text
+    (series,) = resp.json["series"]
+    assert series["benchmark_result_ids"] == [result.id, new.id]
+    assert new.id in {s["benchmark_result_id"] for s in series["history"]}
+
+
+def _cchr(result):
+    return (
+        result.case_id,
+        result.context_id,
+        result.run.hardware.hash,
+        result.run.commit.repository,
+    )
+
+
+def _lttb_reference(x, y, n_out):
+    # Straight-forward implementation, following the original description.
+    n = len(x)
+    every = (n - 2) / (n_out - 2)
+    bounds = [int(i * every) + 1 for i in range(n_out - 2)] + [n - 1, n]
+    selected = [0]
+    for i in range(n_out - 2):
+        a = selected[-1]
+        nxt = range(bounds[i + 1], bounds[i + 2])
+        avg_x = sum(x[j] for j in nxt) / len(nxt)
+        avg_y = sum(y[j] for j in nxt) / len(nxt)
+        areas = {
+            j: abs((x[a] - avg_x) * (y[j] - y[a]) - (x[a] - x[j]) * (avg_y - y[a]))
+            for j in range(bounds[i], bounds[i + 1])
+        }
+        selected.append(max(areas, key=areas.__getitem__))
+    selected.append(n - 1)
+    return selected
+
+
+@pytest.mark.parametrize("n_out", [3, 4, 10, 333])
+def test_lttb_indexes_match_reference(n_out):
+    rng = np.random.default_rng(7)
+    n = 1000
+    x = np.sort(rng.choice(np.arange(10**6), size=n, replace=False)).astype(float)
+    y = np.cumsum(rng.standard_normal(n))
+    indexes = _lttb_indexes(x, y, n_out)
+    assert list(indexes) == _lttb_reference(list(x), list(y), n_out)
+    assert list(_lttb_indexes(x, y, n + 1)) == list(range(n))
+
+
+def _history_samples(svs, is_outlier=(), begins_distribution_change=()):
+    return [
+        HistorySample(
+            benchmark_result_id=f"bmr-{i}",
+            case_id="case",
+            context_id="context",
+            mean=value,
+            svs=value,
+            svs_type="mean",
+            data=[value],
+            times=[value],
+            unit="s",
+            hardware_hash="hw",
+            repository="repo",
+            commit_hash=f"sha-{i}",
+            commit_msg="msg",
+            commit_timestamp=datetime(2022, 1, 1) + pd.Timedelta(hours=i),
+            run_name="run",
+            zscorestats=HistorySampleZscoreStats(
+                begins_distribution_change=i in begins_distribution_change,
+                segment_id="0",
+                rolling_mean_excluding_this_commit=0.0,
+                rolling_mean=0.0,
+                residual=0.0,
+                rolling_stddev=0.0,
+                is_outlier=i in is_outlier,
+            ),
+        )
+        for i, value in enumerate(svs)
+    ]
+
+
+def test_downsample_history_samples():
+    rng = np.random.default_rng(3)
+    svs = list(np.cumsum(rng.standard_normal(5000)))
+    svs[1234] = 1000.0
+    samples = _history_samples(
+        svs, is_outlier={17, 4000}, begins_distribution_change={2500}
+    )
+
+    assert downsample_history_samples(samples, 5000) == samples
+    assert downsample_history_samples(samples[:100], 500) == samples[:100]
+
+    down = downsample_history_samples(samples, 500, ["bmr-42"])
+    ids = [s.benchmark_result_id for s in down]
+    assert 490 <= len(down) <= 500
+    # Order is retained, and so are first and last sample, the spike,
+    # outliers, distribution changes and the explicitly kept result.
+    assert down == sorted(down, key=lambda s: s.commit_timestamp)
+    for i in (0, 17, 42, 1234, 2500, 4000, 4999):
+        assert f"bmr-{i}" in ids
@@ -0,0 +1,180 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from .. import bmrtsnapshot, job
+from ..tests.api import _fixtures
+
+
+@pytest.fixture
+def populated_bmrt_cache(application, monkeypatch):
+    """
+    Populate the (in-process) BMRT cache from fake data; restore the
+    module-level state after the test.
+    """
+    monkeypatch.setattr(job, "_refresh_state", job._CacheRefreshState())
+    for key in job.bmrt_cache:
+        monkeypatch.setitem(job.bmrt_cache, key, job.bmrt_cache[key])
+    _fixtures.gen_fake_data()
+    job._fetch_and_cache_most_recent_results()
+    assert len(job.bmrt_cache["by_id"]) > 0
+    return job.bmrt_cache
+
+
+RESULT_ATTRIBUTES = (
+    "id",
+    "svs",
+    "started_at",
+    "data",
+    "benchmark_name",
+    "case_id",
+    "case_text_id",
+    "case_dict",
+    "context_id",
+    "context_dict",
+    "hardware_id",
+    "hardware_name",
+    "run_id",
+    "run_reason",
+    "svs_type",
+    "unit",
+    "ui_time_started_at",
+    "ui_hardware_short",
+    "ui_non_null_sample_count",
+    "ui_mean_and_uncertainty",
+    "ui_rel_sem",
+    "started_at_iso",
+)
+
+
+def _attach(path):
+    snapshot = bmrtsnapshot.Snapshot(path)
+    return job._cache_dict_from_store(snapshot.store, snapshot.meta)
+
+
+def test_snapshot_results_match_cached_results(populated_bmrt_cache, tmp_path):
+    path = str(tmp_path / "snap")
+    bmrtsnapshot.write_snapshot(populated_bmrt_cache, path)
+    attached = _attach(path)
+
+    assert len(attached["by_id"]) == len(populated_bmrt_cache["by_id"])
+    for rid, expected in populated_bmrt_cache["by_id"].items():
+        result = attached["by_id"][rid]
+        for attr in RESULT_ATTRIBUTES:
+            assert getattr(result, attr) == pytest.approx(
+                getattr(expected, attr), nan_ok=True
+            )
+
+    with pytest.raises(KeyError):
+        attached["by_id"]["does-not-exist"]
+    assert "does-not-exist" not in attached["by_id"]
+
+    assert attached["meta"] == populated_bmrt_cache["meta"]
+
+
+def test_snapshot_groupings_match(populated_bmrt_cache, tmp_path):
+    path = str(tmp_path / "snap")
+    bmrtsnapshot.write_snapshot(populated_bmrt_cache, path)
+    attached = _attach(path)
+
+    for grouping in ("by_benchmark_name", "by_case_id", "by_4t_list"):
+        expected = populated_bmrt_cache[grouping]  # type: ignore[literal-required]
+        actual = attached[grouping]  # type: ignore[literal-required]
+        assert set(actual) == set(expected)
+        for key, results in expected.items():
+            # Same results, same order.
+            assert [r.id for r in actual[key]] == [r.id for r in results]
+
+    assert set(attached["timeseries"]) == set(populated_bmrt_cache["timeseries"])
+    for t4, df in populated_bmrt_cache["timeseries"].items():
+        pd.testing.assert_frame_equal(attached["timeseries"][t4], df)
+
+
+def test_publish_and_cleanup(populated_bmrt_cache, tmp_path):
+    basedir = str(tmp_path)
+    assert bmrtsnapshot.current_snapshot_path(basedir) is None
+
+    paths = [
+        bmrtsnapshot.publish(populated_bmrt_cache, basedir, update_seconds=1.5)
+        for _ in range(4)
+    ]
+    assert bmrtsnapshot.current_snapshot_path(basedir) == paths[-1]
+
+    # Only the most recent snapshots are retained.
+    remaining = sorted(n for n in os.listdir(basedir) if n.startswith("snapshot-"))
+    assert [os.path.join(basedir, n) for n in remaining] == paths[-2:]
+
+    snapshot = bmrtsnapshot.Snapshot(paths[-1])
+    assert snapshot.update_seconds == 1.5
+    assert snapshot.store.n_results == len(populated_bmrt_cache["by_id"])
+
+
+def test_views_render_with_snapshot_backed_cache(
+    populated_bmrt_cache, tmp_path, client, monkeypatch
+):
+    path = bmrtsnapshot.publish(populated_bmrt_cache, str(tmp_path), 0.0)
+    result = next(iter(populated_bmrt_cache["by_id"].values()))
+
+    job._set_cache(_attach(path))
+    assert isinstance(job.bmrt_cache["store"].svs, np.memmap)
+
+    for relpath in (
+        "/c-benchmarks/",
+        f"/c-benchmarks/{result.benchmark_name}",
+        f"/c-benchmarks/{result.benchmark_name}/trends",
+        f"/c-benchmarks/{result.benchmark_name}/{result.case_id}",
+    ):
+        resp = client.get(relpath)
+        assert resp.status_code == 200, (relpath, resp.text)
+
+
+def test_warm_start_from_persisted_snapshot(
+    populated_bmrt_cache, tmp_path, monkeypatch
+):
+    basedir = str(tmp_path)
+    assert not job._warm_start_from_persisted_snapshot(basedir)
+
+    persist = job._snapshot_persister(basedir)
+    # Nothing changed since the persister was created.
+    persist(1.0, True)
+    assert bmrtsnapshot.current_snapshot_path(basedir) is None
+
+    # Full rebuild.
+    job._refresh_state.cycles_since_full_refresh = 10**6
+    job._fetch_and_cache_most_recent_results()
+    persist(1.0, True)
+    path = bmrtsnapshot.current_snapshot_path(basedir)
+    assert path is not None
+    assert bmrtsnapshot.Snapshot(path).newest_result_timestamp == (
+        job._refresh_state.newest_result_timestamp
+    )
+
+    expected_ids = list(populated_bmrt_cache["by_id"])
+    newest_timestamp = job._refresh_state.newest_result_timestamp
+
+    # Simulate a restart: empty cache, pristine refresh state.
+    job._set_cache(
+        job._cache_dict_from_store(
+            job.BMRTStoreBuilder().build(), populated_bmrt_cache["meta"]
+        )
+    )
+    monkeypatch.setattr(job, "_refresh_state", job._CacheRefreshState())
+
+    assert job._warm_start_from_persisted_snapshot(basedir)
+    assert list(job.bmrt_cache["by_id"]) == expected_ids
+    assert job._refresh_state.newest_result_timestamp == newest_timestamp
+
+    # The next update is a delta update on top of the loaded state.
+    assert not job._next_update_is_full_refresh()
+    job._fetch_and_cache_most_recent_results()
+    assert list(job.bmrt_cache["by_id"]) == expected_ids
+
+
+def test_heartbeat(tmp_path):
+    basedir = str(tmp_path)
+    assert bmrtsnapshot.heartbeat_age_seconds(basedir) is None
+    bmrtsnapshot.touch_heartbeat(basedir)
+    age = bmrtsnapshot.heartbeat_age_seconds(basedir)
+    assert age is not None and 0 <= age < 60
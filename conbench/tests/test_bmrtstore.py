@@ -0,0 +1,260 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ..bmrtstore import (
+    ENTITY_TABLES,
+    BMRTStoreBuilder,
+    ResultsById,
+    TimeseriesFrame,
+    _deep_sizeof,
+    groupings_as_dicts,
+    tsdf_from_arrays,
+)
+
+
+def _add(builder, rid, started_at, bname="bench", case="case-1", hw="hw-1"):
+    enc = builder.encode
+    builder.add(
+        id=rid,
+        svs=float(started_at),
+        started_at=float(started_at),
+        data=[float(started_at)] * 3,
+        non_null_sample_count=3,
+        codes={
+            "benchmark_name": enc("benchmark_name", bname),
+            "case": enc("case", case, lambda: (f"text-{case}", {"c": case})),
+            "context": enc("context", "ctx-1", lambda: ({"arch": "x86"},)),
+            "hardware": enc("hardware", hw, lambda: (f"name-{hw}",)),
+            "run": enc("run", f"run-{rid}", lambda: ("commit",)),
+            "svs_type": enc("svs_type", "mean"),
+            "unit": enc("unit", "s"),
+        },
+    )
+
+
+def _build(rows, extends=None):
+    builder = BMRTStoreBuilder(extends=extends)
+    for row in rows:
+        _add(builder, *row)
+    return builder.build()
+
+
+def test_empty_store():
+    store = BMRTStoreBuilder().build()
+    assert store.n_results == 0
+    assert len(ResultsById(store)) == 0
+    with pytest.raises(KeyError):
+        ResultsById(store)["foo"]
+    assert groupings_as_dicts(store) == ({}, {}, {})
+
+
+def test_row_views_and_tables():
+    store = _build([("r3", 30, "b", "case-2"), ("r2", 20, "a"), ("r1", 10, "b")])
+
+    r = ResultsById(store)["r2"]
+    assert (r.id, r.benchmark_name, r.case_id) == ("r2", "a", "case-1")
+    assert r.case_dict == {"c": "case-1"}
+    assert r.case_text_id == "text-case-1"
+    assert r.context_dict == {"arch": "x86"}
+    assert r.hardware_name == "name-hw-1"
+    assert r.data == [20.0, 20.0, 20.0]
+    assert r.ui_non_null_sample_count == "3"
+    assert r.ui_hardware_short == "hw-1: name-hw-1"
+
+    # Entities are stored once.
+    assert store.tables["case_id"] == ["case-2", "case-1"]
+    assert store.tables["context_dict"] == [{"arch": "x86"}]
+    assert store.tables["benchmark_name"] == ["b", "a"]
+
+
+def test_groupings_newest_first():
+    store = _build(
+        [
+            ("r4", 40, "a", "case-1", "hw-2"),
+            ("r3", 30, "b"),
+            ("r2", 20, "a"),
+            ("r1", 10, "a"),
+        ]
+    )
+    by_name, by_case_id, by_4t = groupings_as_dicts(store)
+
+    assert [r.id for r in by_name["a"]] == ["r4", "r2", "r1"]
+    assert [r.id for r in by_name["b"]] == ["r3"]
+    assert [r.id for r in by_case_id["case-1"]] == ["r4", "r3", "r2", "r1"]
+    assert [r.id for r in by_4t[("a", "case-1", "ctx-1", "hw-1")]] == ["r2", "r1"]
+    assert [r.id for r in by_4t[("a", "case-1", "ctx-1", "hw-2")]] == ["r4"]
+    assert len(by_4t) == 3
+    assert [r.id for r in by_name["a"][1:]] == ["r2", "r1"]
+
+
+def test_concat_and_head():
+    old = _build([("r2", 20, "a"), ("r1", 10, "a", "case-1", "hw-1")])
+    new = _build([("r4", 40, "c", "case-3"), ("r3", 30, "a")], extends=old)
+
+    store = new.concat(old.head(1))
+    assert [store.row(i).id for i in range(store.n_results)] == ["r4", "r3", "r2"]
+    assert [store.row(i).data for i in range(store.n_results)] == [
+        [40.0] * 3,
+        [30.0] * 3,
+        [20.0] * 3,
+    ]
+    # Codes of the old results remain valid.
+    assert store.row(2).benchmark_name == "a"
+    assert store.row(0).case_id == "case-3"
+
+    by_name, _, _ = groupings_as_dicts(store)
+    assert [r.id for r in by_name["a"]] == ["r3", "r2"]
+    assert "r1" not in ResultsById(store)
+    assert ResultsById(store)["r3"].id == "r3"
+    assert math.isclose(store.row(1).svs, 30.0)
+
+
+def test_timeseries_frame():
+    store = _build(
+        [
+            ("r5", 50, "b"),
+            ("r4", 40, "a", "case-1", "hw-2"),
+            ("r3", 30, "b"),
+            ("r2", 20, "a"),
+            ("r1", 10, "a"),
+        ]
+    )
+    _, _, by_4t = groupings_as_dicts(store)
+    tsframe = TimeseriesFrame(store, list(by_4t))
+    assert len(tsframe) == 3
+
+    # One set of arrays: sorted by series code, then by time (oldest first).
+    assert np.all(np.diff(tsframe.series_codes) >= 0)
+    for code, t4 in enumerate(tsframe.t4s):
+        a, b = tsframe.offsets[code], tsframe.offsets[code + 1]
+        assert set(tsframe.series_codes[a:b]) == {code}
+        results = by_4t[t4]
+        assert tsframe.started_at[a:b].tolist() == sorted(r.started_at for r in results)
+        pd.testing.assert_frame_equal(
+            tsframe[t4],
+            tsdf_from_arrays([r.svs for r in results], [r.started_at for r in results]),
+        )
+
+    assert sorted(tsframe.codes_for_benchmark_name("a").tolist()) == sorted(
+        tsframe.code_by_t4[t4] for t4 in by_4t if t4[0] == "a"
+    )
+    assert len(tsframe.codes_for_benchmark_name("unknown")) == 0
+
+    df = tsframe.frame()
+    assert list(df.index.names) == ["series", "time"]
+    assert df["svs"].tolist() == tsframe.svs.tolist()
+
+
+def test_interning_across_rebuilds():
+    old = _build([("r2", 20, "a"), ("r1", 10, "a", "case-2")])
+
+    builder = BMRTStoreBuilder(intern_from=old)
+
+    def fail():
+        raise AssertionError("attributes of a known entity must be interned")
+
+    assert builder.encode("context", "ctx-1", fail) == 0
+    # Codes are not retained (`case-2` has code 1 in `old`).
+    assert builder.encode("case", "case-2", fail) == 0
+    builder.encode("case", "case-3", lambda: ("text-case-3", {"c": "case-3"}))
+    # Not interned: might change for a given key.
+    builder.encode("run", "run-r2", lambda: ("other",))
+
+    tables = builder.build().tables
+    assert tables["context_dict"][0] is old.tables["context_dict"][0]
+    assert tables["case_dict"][0] is old.value("case_dict", 1)
+    assert tables["case_dict"][0] == {"c": "case-2"}
+    assert tables["case_text_id"] == ["text-case-2", "text-case-3"]
+    assert tables["run_reason"] == ["other"]
+
+
+def test_dedup_bytes_saved():
+    store = _build([("r3", 30, "a"), ("r2", 20, "a"), ("r1", 10, "a", "case-2")])
+    saved = store.dedup_bytes_saved()
+    assert set(saved) == set(ENTITY_TABLES)
+    # Three results share one context, two results share a case. Each run is
+    # referenced once.
+    assert saved["context"] > 0
+    assert saved["case"] > 0
+    assert saved["run"] == 0
+    assert saved["context"] == 2 * sum(
+        _deep_sizeof(store.tables[c][0]) for c in ENTITY_TABLES["context"]
+    )
+
+
+def test_deferred_entity_attributes():
+    old = _build([("r1", 10, "a")])
+    builder = BMRTStoreBuilder(intern_from=old)
+
+    assert builder.encode_deferred("case", "case-1") == 0
+    assert builder.encode_deferred("case", "case-2") == 1
+    assert builder.encode_deferred("case", "case-2") == 1
+    # Known from `intern_from`: nothing to resolve.
+    assert builder.deferred_keys("case") == ["case-2"]
+
+    with pytest.raises(AssertionError):
+        builder.build()
+
+    builder.resolve_deferred("case", {"case-2": ("text-case-2", {"c": "case-2"})})
+    tables = builder.build().tables
+    assert tables["case_dict"] == [{"c": "case-1"}, {"c": "case-2"}]
+    assert tables["case_text_id"] == ["text-case-1", "text-case-2"]
+
+
+def test_take_compacts_tables():
+    store = _build([("r3", 30, "b", "case-2"), ("r2", 20, "a"), ("r1", 10, "b")])
+    taken = store.take(np.array([0, 2]))
+    assert [taken.row(i).id for i in range(taken.n_results)] == ["r3", "r1"]
+    assert [taken.row(i).data for i in range(taken.n_results)] == [
+        [30.0] * 3,
+        [10.0] * 3,
+    ]
+    assert taken.tables["benchmark_name"] == ["b"]
+    assert [taken.row(i).case_id for i in range(2)] == ["case-2", "case-1"]
+    assert ResultsById(taken)["r1"].run_id == "run-r1"
+
+
+def test_retain():
+    # A chatty time series (hw-1) and a sparse one with older results (hw-2).
+    rows = [(f"c{t}", t, "a", "case-1", "hw-1") for t in range(100, 80, -1)]
+    rows += [("s3", 50, "a", "case-1", "hw-2"), ("s2", 40, "a", "case-1", "hw-2")]
+    rows += [("s1", 5, "a", "case-1", "hw-2")]
+    store = _build(sorted(rows, key=lambda r: -r[1]))
+
+    outcome = store.retain()
+    assert outcome.store is store
+    assert outcome.n_evicted == 0
+
+    outcome = store.retain(min_started_at=30)
+    assert outcome.n_evicted == 1
+    assert "s1" not in ResultsById(outcome.store)
+
+    outcome = store.retain(max_per_series=5)
+    assert outcome.n_evicted == 15
+    assert outcome.n_series_truncated == 1
+    _, _, by_4t = groupings_as_dicts(outcome.store)
+    assert [r.id for r in by_4t[("a", "case-1", "ctx-1", "hw-1")]] == [
+        "c100",
+        "c99",
+        "c98",
+        "c97",
+        "c96",
+    ]
+    # The sparse time series retains its full history.
+    assert len(by_4t[("a", "case-1", "ctx-1", "hw-2")]) == 3
+    assert "s1" in ResultsById(outcome.store)
+
+    # The memory budget truncates the chatty time series first.
+    row_nbytes = int(store.row_nbytes()[0])
+    # Room for six results: the newest three of each time series.
+    budget = store.tables_nbytes() + 6 * row_nbytes
+    outcome = store.retain(max_bytes=budget)
+    assert outcome.max_per_series == 3
+    _, _, by_4t = groupings_as_dicts(outcome.store)
+    assert len(by_4t[("a", "case-1", "ctx-1", "hw-1")]) == 3
+    # The sparse time series retains its full history.
+    assert len(by_4t[("a", "case-1", "ctx-1", "hw-2")]) == 3
+    assert "s1" in ResultsById(outcome.store)
@@ -0,0 +1,287 @@
+from datetime import datetime
+
+import prometheus_client
+import pytest
+
+from .. import bmrtstore, job
+from ..db import _session as Session
+from ..tests.api import _fixtures
+
+
+@pytest.fixture
+def bmrt_cache(application, monkeypatch):
+    """
+    Provide an empty BMRT cache (and pristine refresh state); restore the
+    module-level state after the test.
+    """
+    monkeypatch.setattr(job, "_refresh_state", job._CacheRefreshState())
+    for key in job.bmrt_cache:
+        monkeypatch.setitem(job.bmrt_cache, key, job.bmrt_cache[key])
+    return job.bmrt_cache
+
+
+def _new_result_on_default_branch(commit, timestamp: datetime):
+    result = _fixtures.benchmark_result(results=[3.0, 3.1, 3.2], commit=commit)
+    result.timestamp = timestamp
+    Session.commit()
+    return result
+
+
+def test_full_refresh_caches_default_branch_results_only(bmrt_cache):
+    _, results = _fixtures.gen_fake_data()
+
+    job._fetch_and_cache_most_recent_results()
+
+    expected_ids = {
+        r.id for r in results if r.run.commit and r.run.commit.on_default_branch
+    }
+    assert expected_ids
+    assert set(bmrt_cache["by_id"]) == expected_ids
+    assert bmrt_cache["meta"].n_results == len(expected_ids)
+
+    n_in_4t_lists = sum(len(rs) for rs in bmrt_cache["by_4t_list"].values())
+    assert n_in_4t_lists == len(expected_ids)
+    assert set(bmrt_cache["timeseries"]) == set(bmrt_cache["by_4t_list"])
+
+    # Each list is sorted by time, newest first.
+    for grouping in ("by_benchmark_name", "by_case_id", "by_4t_list"):
+        for rs in bmrt_cache[grouping].values():  # type: ignore[literal-required]
+            times = [r.started_at for r in rs]
+            assert times == sorted(times, reverse=True)
+
+
+def test_cached_result_attributes(bmrt_cache):
+    _, results = _fixtures.gen_fake_data()
+    job._fetch_and_cache_most_recent_results()
+
+    for result in results:
+        if str(result.id) not in bmrt_cache["by_id"]:
+            continue
+        cached = bmrt_cache["by_id"][str(result.id)]
+        assert cached.id == result.id
+        assert cached.benchmark_name == result.case.name
+        assert cached.case_id == result.case_id
+        assert cached.case_dict == result.case.to_dict()
+        assert cached.context_id == result.context_id
+        assert cached.context_dict == result.context.to_dict()
+        assert cached.hardware_id == result.run.hardware.id
+        assert cached.hardware_name == result.run.hardware.name
+        assert cached.run_id == result.run_id
+        assert cached.data == result.measurements
+        assert cached.svs == pytest.approx(result.svs, nan_ok=True)
+        assert cached.started_at == result.timestamp.timestamp()
+        # The UI strings are computed on access; compare with the
+        # implementation in BenchmarkResult.
+        assert cached.ui_time_started_at == result.ui_time_started_at
+        assert cached.ui_hardware_short == result.ui_hardware_short
+        assert cached.ui_non_null_sample_count == result.ui_non_null_sample_count
+        assert cached.ui_mean_and_uncertainty == result.ui_mean_and_uncertainty
+        assert cached.ui_rel_sem == result.ui_rel_sem
+
+
+def test_delta_update_adds_new_results(bmrt_cache):
+    commits, _ = _fixtures.gen_fake_data()
+    job._fetch_and_cache_most_recent_results()
+    n_before = len(bmrt_cache["by_id"])
+    by_id_before = bmrt_cache["by_id"]
+
+    new = _new_result_on_default_branch(commits["66666"], datetime(2030, 1, 1))
+
+    job._fetch_and_cache_most_recent_results()
+    assert job._refresh_state.cycles_since_full_refresh == 1
+
+    assert len(bmrt_cache["by_id"]) == n_before + 1
+    assert new.id in bmrt_cache["by_id"]
+    # The dictionary exposed before the update must not have been mutated.
+    assert new.id not in by_id_before
+
+    bname = new.case.name
+    assert bmrt_cache["by_benchmark_name"][bname][0].id == new.id
+    assert bmrt_cache["by_case_id"][new.case_id][0].id == new.id
+
+    t4 = bmrtstore.t4_for_result(bmrt_cache["by_id"][new.id])
+    assert bmrt_cache["by_4t_list"][t4][0].id == new.id
+    assert len(bmrt_cache["timeseries"][t4]) == len(bmrt_cache["by_4t_list"][t4])
+    assert bmrt_cache["meta"].newest_result_time_str.startswith("2030-01-01")
+
+    # A delta update without new results does not change the cache.
+    by_id = bmrt_cache["by_id"]
+    job._fetch_and_cache_most_recent_results()
+    assert bmrt_cache["by_id"] is by_id
+
+
+def test_delta_update_evicts_oldest_results(bmrt_cache):
+    commits, _ = _fixtures.gen_fake_data()
+    old = _new_result_on_default_branch(commits["66666"], datetime(2010, 1, 1))
+
+    job._fetch_and_cache_most_recent_results()
+    n_before = len(bmrt_cache["by_id"])
+    assert old.id in bmrt_cache["by_id"]
+
+    # Pretend that the cache is full.
+    job._refresh_state.window_size = n_before
+
+    new = _new_result_on_default_branch(commits["66666"], datetime(2030, 1, 1))
+    job._fetch_and_cache_most_recent_results()
+
+    assert len(bmrt_cache["by_id"]) == n_before
+    assert new.id in bmrt_cache["by_id"]
+    assert old.id not in bmrt_cache["by_id"]
+    for results in bmrt_cache["by_benchmark_name"].values():
+        assert old.id not in {r.id for r in results}
+    for results in bmrt_cache["by_4t_list"].values():
+        assert old.id not in {r.id for r in results}
+
+
+def test_full_refresh_every_n_cycles(bmrt_cache, monkeypatch):
+    monkeypatch.setattr(job, "BMRT_CACHE_FULL_REFRESH_EVERY_N_CYCLES", 2)
+    _fixtures.gen_fake_data()
+
+    job._fetch_and_cache_most_recent_results()
+    assert job._refresh_state.cycles_since_full_refresh == 0
+    job._fetch_and_cache_most_recent_results()
+    job._fetch_and_cache_most_recent_results()
+    assert job._refresh_state.cycles_since_full_refresh == 2
+    assert job._next_update_is_full_refresh()
+    job._fetch_and_cache_most_recent_results()
+    assert job._refresh_state.cycles_since_full_refresh == 0
+
+
+def test_retention_policy(bmrt_cache, monkeypatch):
+    commits, _ = _fixtures.gen_fake_data()
+
+    monkeypatch.setattr(job.Config, "BMRT_CACHE_MAX_RESULTS_PER_SERIES", 2)
+    job._fetch_and_cache_most_recent_results()
+
+    meta = bmrt_cache["meta"]
+    assert meta.n_timeseries == len(bmrt_cache["by_4t_list"])
+    assert meta.n_timeseries_truncated > 0
+    assert "max 2 results per time series" in meta.retention_policy
+    for results in bmrt_cache["by_4t_list"].values():
+        assert len(results) <= 2
+
+    # Delta update: the policy is applied, too.
+    new = _new_result_on_default_branch(commits["66666"], datetime(2030, 1, 1))
+    job._fetch_and_cache_most_recent_results()
+    assert new.id in bmrt_cache["by_id"]
+    for results in bmrt_cache["by_4t_list"].values():
+        assert len(results) <= 2
+
+    # Max age: the fake data is from 2022/2023.
+    monkeypatch.setattr(job.Config, "BMRT_CACHE_MAX_RESULTS_PER_SERIES", 0)
+    monkeypatch.setattr(job.Config, "BMRT_CACHE_MAX_AGE_DAYS", 1)
+    job._refresh_state.cycles_since_full_refresh = 10**6
+    job._fetch_and_cache_most_recent_results()
+    assert list(bmrt_cache["by_id"]) == [new.id]
+    assert bmrt_cache["meta"].n_timeseries == 1
+
+
+def _sample(name, **labels):
+    return prometheus_client.REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_cache_update_metrics(bmrt_cache, client):
+    commits, _ = _fixtures.gen_fake_data()
+    n_fetched_before = _sample("conbench_bmrt_cache_rows_fetched_total", kind="full")
+    n_updates_before = _sample(
+        "conbench_bmrt_cache_update_duration_seconds_count", kind="full"
+    )
+
+    job._fetch_and_cache_most_recent_results()
+
+    assert _sample("conbench_bmrt_cache_results") == len(bmrt_cache["by_id"])
+    assert _sample("conbench_bmrt_cache_timeseries") == len(bmrt_cache["by_4t_list"])
+    assert _sample("conbench_bmrt_cache_bytes_estimated") > 0
+    assert 0 <= _sample("conbench_bmrt_cache_age_seconds") < 60
+    assert _sample(
+        "conbench_bmrt_cache_rows_fetched_total", kind="full"
+    ) == n_fetched_before + len(bmrt_cache["by_id"])
+    assert (
+        _sample("conbench_bmrt_cache_update_duration_seconds_count", kind="full")
+        == n_updates_before + 1
+    )
+    for phase in ("fetch", "resolve_entities", "build", "retention", "grouping"):
+        assert (
+            prometheus_client.REGISTRY.get_sample_value(
+                "conbench_bmrt_cache_update_phase_seconds",
+                {"kind": "full", "phase": phase},
+            )
+            is not None
+        )
+
+    # Delta update: the newest result is fetched again, and skipped.
+    n_skipped_before = _sample(
+        "conbench_bmrt_cache_rows_skipped_total", reason="already_cached"
+    )
+    job._refresh_state.window_size = len(bmrt_cache["by_id"])
+    n_evicted_before = _sample(
+        "conbench_bmrt_cache_results_evicted_total", reason="window"
+    )
+    _new_result_on_default_branch(commits["66666"], datetime(2030, 1, 1))
+    job._fetch_and_cache_most_recent_results()
+    assert (
+        _sample("conbench_bmrt_cache_rows_skipped_total", reason="already_cached")
+        > n_skipped_before
+    )
+    assert (
+        _sample("conbench_bmrt_cache_results_evicted_total", reason="window")
+        == n_evicted_before + 1
+    )
+
+    # Reads, by view.
+    bname = next(iter(bmrt_cache["by_benchmark_name"]))
+    reads_before = _sample(
+        "conbench_bmrt_cache_reads_total", view="show_benchmark_cases", outcome="hit"
+    )
+    misses_before = _sample(
+        "conbench_bmrt_cache_reads_total", view="show_benchmark_cases", outcome="miss"
+    )
+    client.get(f"/c-benchmarks/{bname}")
+    client.get("/c-benchmarks/does-not-exist")
+    assert (
+        _sample(
+            "conbench_bmrt_cache_reads_total",
+            view="show_benchmark_cases",
+            outcome="hit",
+        )
+        == reads_before + 1
+    )
+    assert (
+        _sample(
+            "conbench_bmrt_cache_reads_total",
+            view="show_benchmark_cases",
+            outcome="miss",
+        )
+        == misses_before + 1
+    )
+
+
+def test_cache_state(bmrt_cache, monkeypatch):
+    monkeypatch.setattr(job, "_STARTED", False)
+    monkeypatch.setattr(job, "_CACHE_CONFIRMED_AT", None)
+    assert job.cache_state() == "cold"
+    assert job.cache_age_seconds() is None
+
+    monkeypatch.setattr(job, "_STARTED", True)
+    assert job.cache_state() == "warming"
+
+    # An empty database: the cache is populated (with nothing), too.
+    job._fetch_and_cache_most_recent_results()
+    assert job.cache_state() == "ready"
+    assert len(bmrt_cache["by_id"]) == 0
+
+    _fixtures.gen_fake_data()
+    job._fetch_and_cache_most_recent_results()
+    assert job.cache_state() == "ready"
+
+    monkeypatch.setattr(job, "BMRT_CACHE_STALE_AFTER_SECONDS", 0)
+    assert job.cache_state() == "stale"
+
+    # A delta update without new results confirms that the cache is current.
+    monkeypatch.setattr(job, "BMRT_CACHE_STALE_AFTER_SECONDS", 60)
+    job._confirm_cache_is_current(120)
+    assert job.cache_state() == "stale"
+    by_id = bmrt_cache["by_id"]
+    job._fetch_and_cache_most_recent_results()
+    assert bmrt_cache["by_id"] is by_id
+    assert job.cache_state() == "ready"
@@ -0,0 +1,47 @@
+"""commit order
+
+Revision ID: 8e1f4c2a7b63
+Revises: 3c8a7f2e91d4
+Create Date: 2026-10-18 11:02:17.304611
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "8e1f4c2a7b63"
+down_revision = "3c8a7f2e91d4"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("commit", sa.Column("commit_order", sa.BigInteger(), nullable=True))
+
+    # Number the default-branch commits of each repository by timestamp, see
+    # Commit.update_commit_order().
+    op.execute(
+        """
+        UPDATE commit SET commit_order = ranked.commit_order
+        FROM (
+            SELECT id, row_number() OVER (
+                PARTITION BY repository ORDER BY timestamp, id
+            ) AS commit_order
+            FROM commit
+            WHERE sha = fork_point_sha AND timestamp IS NOT NULL
+        ) AS ranked
+        WHERE commit.id = ranked.id
+        """
+    )
+
+    op.create_index(
+        "commit_repository_order_index",
+        "commit",
+        ["repository", "commit_order"],
+        unique=False,
+    )
+
+
+def downgrade():
+    op.drop_index("commit_repository_order_index", table_name="commit")
+    op.drop_column("commit", "commit_order")